@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User
+from .models import Tache, User
 
 
 @admin.register(User)
@@ -24,3 +24,11 @@ class UserAdmin(BaseUserAdmin):
     )
     
     filter_horizontal = ('groups', 'user_permissions',)
+
+
+@admin.register(Tache)
+class TacheAdmin(admin.ModelAdmin):
+    list_display = ['id', 'nom', 'etat', 'utilisateur', 'tentatives', 'date_creation', 'date_fin']
+    list_filter = ['etat', 'nom']
+    exclude = ['contenu']
+    readonly_fields = ['date_creation']
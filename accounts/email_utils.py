@@ -1,56 +1,69 @@
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage, EmailMultiAlternatives, get_connection
 from django.template.loader import render_to_string
 from django.utils import timezone
 from django.conf import settings
-from django.db import models
+from datetime import timedelta
 from decimal import Decimal
 import io
-from .pdf_utils import export_dashboard_pdf
+from .pdf_utils import donnees_rapport_journalier, rapport_journalier_pdf
 
-def send_daily_balance_report(date=None):
-    """Envoyer un rapport quotidien du solde de caisse par email à l'administrateur"""
+def destinataires_admins():
+    """Adresses des administrateurs actifs (le login sert d'adresse)"""
     from accounts.models import User
-    from payments.models import Paiement
-    from expenses.models import Depense
-    
+    return list(User.objects.filter(role='Radmin', actif=True).values_list('login', flat=True))
+
+def _envoyer(messages_email, connexion=None):
+    """
+    Envoie les messages par une seule connexion SMTP (send_messages) ;
+    retourne le nombre de messages envoyés
+    """
+    connexion = connexion or get_connection(fail_silently=True)
+    envoyes = connexion.send_messages(messages_email) or 0
+    if envoyes < len(messages_email):
+        print(f"Erreur lors de l'envoi : {len(messages_email) - envoyes} email(s) sur {len(messages_email)} non envoyé(s)")
+    return envoyes
+
+def send_daily_balance_report(date=None, donnees=None, destinataires=None, connexion=None):
+    """
+    Envoyer un rapport quotidien du solde de caisse par email aux administrateurs
+
+    Les chiffres (`donnees`, voir donnees_rapport_journalier), le HTML et le
+    PDF sont produits une fois pour tous les destinataires, puis les emails
+    partent par une seule connexion.
+    """
     # Utiliser la date du jour si non spécifiée
     if date is None:
         date = timezone.now().date()
     
-    # Calculer les statistiques
-    total_entrées = Paiement.objects.filter(date_paiement__date=date).aggregate(
-        total=models.Sum('montant')
-    )['total'] or 0
-    
-    total_sorties = Depense.objects.filter(date_depense=date).aggregate(
-        total=models.Sum('montant')
-    )['total'] or 0
-    
-    solde_jour = total_entrées - total_sorties
-    
-    # Solde cumulé
-    total_entrées_cumul = Paiement.objects.aggregate(total=models.Sum('montant'))['total'] or 0
-    total_sorties_cumul = Depense.objects.aggregate(total=models.Sum('montant'))['total'] or 0
-    solde_cumul = total_entrées_cumul - total_sorties_cumul
-    
     # Récupérer les administrateurs
-    admins = User.objects.filter(role='Radmin', actif=True)
+    if destinataires is None:
+        destinataires = destinataires_admins()
     
-    if not admins.exists():
+    if not destinataires:
         print("Aucun administrateur actif trouvé pour l'envoi du rapport")
         return False
     
-    # Préparer le contexte pour l'email
+    # Calculer les statistiques (bilan journalier et transactions du jour)
+    if donnees is None:
+        donnees = donnees_rapport_journalier(date)
+    
+    # Préparer le contexte pour l'email : dix dernières transactions du jour
     context = {
         'date': date,
-        'total_entrées': total_entrées,
-        'total_sorties': total_sorties,
-        'solde_jour': solde_jour,
-        'solde_cumul': solde_cumul,
-        'nombre_paiements': Paiement.objects.filter(date_paiement__date=date).count(),
-        'nombre_depenses': Depense.objects.filter(date_depense=date).count(),
-        'paiements': Paiement.objects.filter(date_paiement__date=date).order_by('-date_paiement')[:10],
-        'depenses': Depense.objects.filter(date_depense=date).order_by('-date_depense')[:10],
+        'total_entrées': donnees['entrees'],
+        'total_sorties': donnees['sorties'],
+        'solde_jour': donnees['solde_jour'],
+        'solde_cumul': donnees['solde_cumul'],
+        'nombre_paiements': donnees['nb_paiements'],
+        'nombre_depenses': donnees['nb_depenses'],
+        'paiements': [
+            {'commande_id': commande_id, 'montant': montant_paye, 'date_paiement': heure}
+            for _, commande_id, montant_paye, _, heure in donnees['paiements'][:10]
+        ],
+        'depenses': [
+            {'description': description, 'montant': montant_depense, 'utilisateur': utilisateur}
+            for _, description, montant_depense, utilisateur in donnees['depenses'][:10]
+        ],
     }
     
     # Générer le contenu HTML de l'email
@@ -60,56 +73,30 @@ def send_daily_balance_report(date=None):
     
     # Générer le PDF en pièce jointe
     try:
-        # Créer une requête factice pour l'export PDF
-        from django.test import RequestFactory
-        factory = RequestFactory()
-        request = factory.get('/')
-        
-        # Générer le PDF
-        pdf_response = export_dashboard_pdf(request)
-        pdf_content = pdf_response.content
-        
-        # Envoyer l'email avec pièce jointe
-        success_count = 0
-        for admin in admins:
-            try:
-                from django.core.mail import EmailMessage
-                email = EmailMessage(
-                    sujet,
-                    message_html,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [admin.login],  # Utiliser le login comme email (adapter selon besoin)
-                )
-                email.content_subtype = 'html'
-                
-                # Ajouter la pièce jointe PDF
-                email.attach(
-                    f'rapport_caisse_{date.strftime("%Y%m%d")}.pdf',
-                    pdf_content,
-                    'application/pdf'
-                )
-                
-                email.send()
-                success_count += 1
-                print(f"Email envoyé à l'administrateur: {admin.login}")
-                
-            except Exception as e:
-                print(f"Erreur lors de l'envoi à {admin.login}: {str(e)}")
-        
-        return success_count > 0
-        
+        pdf_content = rapport_journalier_pdf(date, donnees)
     except Exception as e:
         print(f"Erreur lors de la génération du PDF: {str(e)}")
         return False
+    
+    # Un message par administrateur, envoyés ensemble
+    messages_email = []
+    for destinataire in destinataires:
+        email = EmailMessage(sujet, message_html, settings.DEFAULT_FROM_EMAIL, [destinataire])
+        email.content_subtype = 'html'
+        email.attach(f'rapport_caisse_{date.strftime("%Y%m%d")}.pdf', pdf_content, 'application/pdf')
+        messages_email.append(email)
+    
+    envoyes = _envoyer(messages_email, connexion)
+    print(f"Rapport envoyé à {envoyes} administrateur(s) sur {len(destinataires)}")
+    return envoyes > 0
 
-def send_balance_alert(solde, seuil_alerte=100000):
+def send_balance_alert(solde, seuil_alerte=100000, destinataires=None, connexion=None):
     """Envoyer une alerte email si le solde de caisse est bas"""
-    from accounts.models import User
-    
     if solde < seuil_alerte:
-        admins = User.objects.filter(role='Radmin', actif=True)
+        if destinataires is None:
+            destinataires = destinataires_admins()
         
-        if not admins.exists():
+        if not destinataires:
             return False
         
         sujet = f"⚠️ ALERTE CAISSE - Solde Critique: {solde:,.0f} GNF"
@@ -151,56 +138,70 @@ def send_balance_alert(solde, seuil_alerte=100000):
         </html>
         """
         
-        success_count = 0
-        for admin in admins:
-            try:
-                send_mail(
-                    sujet,
-                    "Alerte caisse - Veuillez consulter le système pour plus de détails.",
-                    settings.DEFAULT_FROM_EMAIL,
-                    [admin.login],  # Adapter selon la configuration email
-                    html_message=message_html,
-                    fail_silently=False,
-                )
-                success_count += 1
-                print(f"Alerte envoyée à l'administrateur: {admin.login}")
-                
-            except Exception as e:
-                print(f"Erreur lors de l'envoi de l'alerte à {admin.login}: {str(e)}")
+        messages_email = []
+        for destinataire in destinataires:
+            email = EmailMultiAlternatives(
+                sujet,
+                "Alerte caisse - Veuillez consulter le système pour plus de détails.",
+                settings.DEFAULT_FROM_EMAIL,
+                [destinataire],  # Adapter selon la configuration email
+            )
+            email.attach_alternative(message_html, 'text/html')
+            messages_email.append(email)
         
-        return success_count > 0
+        envoyes = _envoyer(messages_email, connexion)
+        print(f"Alerte envoyée à {envoyes} administrateur(s) sur {len(destinataires)}")
+        return envoyes > 0
     
     return True  # Pas d'alerte nécessaire
 
-def update_daily_balance(date=None):
-    """Mettre à jour automatiquement le solde de caisse pour une date donnée"""
-    from payments.models import Paiement
-    from expenses.models import Depense
+def update_daily_balance(date=None, en_file=False):
+    """
+    Mettre à jour automatiquement le solde de caisse pour une date donnée
+
+    Avec en_file, le rapport par email est confié au travailleur (tâche
+    'rapport_journalier') au lieu d'être envoyé ici.
+    """
+    from payments.bilans import cloturer_jour, recalculer_jour
+    from payments.models import BilanJournalier
+    from payments.mouvements import fin_journee, solde_caisse
     
     if date is None:
         date = timezone.now().date()
     
-    # Calculer le solde du jour
-    total_entrées = Paiement.objects.filter(date_paiement__date=date).aggregate(
-        total=models.Sum('montant')
-    )['total'] or 0
-    
-    total_sorties = Depense.objects.filter(date_depense=date).aggregate(
-        total=models.Sum('montant')
-    )['total'] or 0
+    # Finaliser le bilan du jour : une journée passée est clôturée, la
+    # journée en cours est recalculée et la veille clôturée si besoin
+    aujourdhui = timezone.now().date()
+    if date < aujourdhui:
+        bilan = cloturer_jour(date)
+    else:
+        veille = date - timedelta(days=1)
+        if not BilanJournalier.objects.filter(jour=veille, cloture=True).exists():
+            cloturer_jour(veille)
+        recalculer_jour(date)
+        bilan = BilanJournalier.objects.get(jour=date)
+    
+    total_entrées = bilan.total_entrees
+    total_sorties = bilan.total_sorties
     
     solde_jour = total_entrées - total_sorties
     
-    # Mettre à jour le solde cumulé
-    total_entrées_cumul = Paiement.objects.aggregate(total=models.Sum('montant'))['total'] or 0
-    total_sorties_cumul = Depense.objects.aggregate(total=models.Sum('montant'))['total'] or 0
-    solde_cumul = total_entrées_cumul - total_sorties_cumul
-    
-    # Envoyer le rapport quotidien
-    rapport_envoye = send_daily_balance_report(date)
-    
-    # Envoyer une alerte si le solde est critique
-    alerte_envoyee = send_balance_alert(solde_cumul)
+    destinataires = destinataires_admins()
+    
+    if en_file:
+        # Solde cumulé à la fin de la journée
+        solde_cumul = solde_caisse(fin_journee(date))
+        from .taches import mettre_en_file
+        rapport_envoye = mettre_en_file('rapport_journalier', jour=date.isoformat())
+        alerte_envoyee = send_balance_alert(solde_cumul, destinataires=destinataires)
+    else:
+        # Chiffres du rapport calculés une fois, à partir du bilan finalisé
+        donnees = donnees_rapport_journalier(date, bilan)
+        solde_cumul = donnees['solde_cumul']
+        # Rapport quotidien et alerte de solde critique par la même connexion
+        with get_connection(fail_silently=True) as connexion:
+            rapport_envoye = send_daily_balance_report(date, donnees, destinataires, connexion)
+            alerte_envoyee = send_balance_alert(solde_cumul, destinataires=destinataires, connexion=connexion)
     
     return {
         'date': date,
@@ -0,0 +1,93 @@
+import os
+import resource
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from openpyxl import Workbook
+from core.classeurs import SECTIONS, ecrire_classeur
+
+
+class Command(BaseCommand):
+    help = 'Mesure l\'écriture du classeur Excel détaillé sur des lignes générées (durée, mémoire, taille)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lignes', type=int, default=100000, help='Lignes générées au total (défaut 100000)')
+        parser.add_argument('--jours', type=int, default=31, help='Jours couverts (défaut 31)')
+        parser.add_argument('--decoupage', choices=['jour', 'mois'], help='Une feuille par jour ou par mois')
+        parser.add_argument(
+            '--comparer',
+            action='store_true',
+            help='Mesurer aussi un Workbook ordinaire (tout en mémoire) avec les mêmes lignes',
+        )
+
+    def handle(self, *args, **options):
+        debut = date(2025, 1, 1)
+        fin = debut + timedelta(days=options['jours'] - 1)
+        # Lignes par section et par jour : moitié paiements, un quart chacun pour le reste
+        par_jour = max(1, options['lignes'] // options['jours'])
+        repartition = [par_jour // 2, par_jour // 4, par_jour - par_jour // 2 - par_jour // 4]
+        sections = [
+            (titre, self._source(titre, nombre), colonnes)
+            for (titre, _, colonnes), nombre in zip(SECTIONS, repartition)
+        ]
+
+        self._mesurer('Write-only (core.classeurs)', lambda chemin: ecrire_classeur(
+            chemin, debut, fin, options['decoupage'], sections=sections
+        ))
+        if options['comparer']:
+            self._mesurer('Workbook ordinaire', lambda chemin: self._classeur_ordinaire(
+                chemin, debut, fin, sections
+            ))
+
+    def _source(self, titre, nombre):
+        """Générateur d'enregistrements factices pour une section et une période"""
+        def source(premier, dernier):
+            jour = premier
+            identifiant = 0
+            while jour <= dernier:
+                horodatage = datetime(jour.year, jour.month, jour.day, 12)
+                for i in range(nombre):
+                    identifiant += 1
+                    yield {
+                        'id': identifiant, 'date_paiement': horodatage, 'date_commande': horodatage,
+                        'date_depense': jour, 'commande': identifiant, 'table': f'T{i % 20}',
+                        'methode': 'ESPECE', 'montant': Decimal('15000.00'), 'caissier': 'caissier1',
+                        'categorie': 'Achats', 'description': f'{titre} {i}', 'utilisateur': 'comptable1',
+                        'serveur': 'serveur1', 'etat': 'TERMINEE', 'total': Decimal('45000.00'),
+                        'plat': 'Riz sauce', 'quantite': 3, 'prix_unitaire': Decimal('15000.00'),
+                        'sous_total': Decimal('45000.00'),
+                    }
+                jour += timedelta(days=1)
+        return source
+
+    def _classeur_ordinaire(self, chemin, debut, fin, sections):
+        classeur = Workbook()
+        feuille = classeur.active
+        lignes = 0
+        for _, source, colonnes in sections:
+            for enregistrement in source(debut, fin):
+                feuille.append([enregistrement.get(cle) for cle, _, _, _ in colonnes])
+                lignes += 1
+        classeur.save(chemin)
+        return {'feuilles': 1, 'lignes': lignes}
+
+    def _mesurer(self, libelle, ecrire):
+        descripteur, chemin = tempfile.mkstemp(suffix='.xlsx')
+        os.close(descripteur)
+        try:
+            depart = time.perf_counter()
+            resultat = ecrire(chemin)
+            duree = time.perf_counter() - depart
+            # Pic de mémoire résidente du processus depuis son démarrage (Ko sous
+            # Linux) : mesurer la variante la plus économe en premier
+            pic = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+            taille = os.path.getsize(chemin)
+        finally:
+            os.remove(chemin)
+        self.stdout.write(
+            f"{libelle:<28} {resultat['lignes']:>9} lignes  {resultat['feuilles']:>4} feuilles  "
+            f"{duree:7.1f} s  {resultat['lignes'] / duree:8.0f} lignes/s  "
+            f"RSS max {pic / 1024 / 1024:7.1f} Mo  fichier {taille / 1024 / 1024:6.1f} Mo"
+        )
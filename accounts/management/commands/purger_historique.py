@@ -0,0 +1,43 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from accounts.purge import JEUX, a_purger, purger
+
+
+class Command(BaseCommand):
+    help = 'Supprime par lots les commandes, paiements ou dépenses d\'une période (ou de tout l\'historique)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('jeu', choices=JEUX, help='Données à supprimer')
+        parser.add_argument('--debut', type=str, help='Premier jour supprimé (format: YYYY-MM-DD)')
+        parser.add_argument('--fin', type=str, help='Dernier jour supprimé (format: YYYY-MM-DD)')
+        parser.add_argument(
+            '--confirmer',
+            action='store_true',
+            help='Effectuer la suppression (sans cette option, affiche seulement le nombre de lignes)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            debut = self.lire_date(options['debut']) if options['debut'] else None
+            fin = self.lire_date(options['fin']) if options['fin'] else None
+        except ValueError:
+            raise CommandError('Format de date invalide. Utilisez YYYY-MM-DD')
+        if debut and fin and debut > fin:
+            raise CommandError('La date de début est postérieure à la date de fin.')
+
+        total = a_purger(options['jeu'], debut, fin).count()
+        if not options['confirmer']:
+            self.stdout.write(f'{total} ligne(s) à supprimer. Relancez avec --confirmer pour supprimer.')
+            return
+
+        def progression(supprimes):
+            self.stdout.write(f'  {supprimes}/{total} supprimée(s)')
+
+        resultat = purger(options['jeu'], debut, fin, progression=progression)
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {resultat['nombre']} ligne(s) supprimée(s), montant annulé en caisse : {resultat['montant']} GNF"
+        ))
+
+    @staticmethod
+    def lire_date(valeur):
+        return datetime.strptime(valeur, '%Y-%m-%d').date()
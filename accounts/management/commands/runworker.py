@@ -0,0 +1,72 @@
+import logging
+import signal
+import threading
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from accounts.taches import nettoyer, travailler
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Exécute les tâches de fond en attente (documents, exports, emails)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrence',
+            type=int,
+            default=getattr(settings, 'TACHES_CONCURRENCE', 2),
+            help='Tâches exécutées en parallèle au plus (défaut TACHES_CONCURRENCE)',
+        )
+        parser.add_argument(
+            '--attente',
+            type=float,
+            default=2.0,
+            help='Secondes entre deux consultations d\'une file vide (défaut 2)',
+        )
+        parser.add_argument(
+            '--une-fois',
+            action='store_true',
+            help='S\'arrêter dès que la file est vide (cron, tests)',
+        )
+
+    def handle(self, *args, **options):
+        concurrence = max(1, options['concurrence'])
+        arret = threading.Event()
+
+        def arreter(signum, frame):
+            self.stdout.write('Arrêt demandé : fin des tâches en cours...')
+            arret.set()
+
+        signal.signal(signal.SIGINT, arreter)
+        signal.signal(signal.SIGTERM, arreter)
+
+        supprimees = nettoyer()
+        if supprimees:
+            self.stdout.write(f'{supprimees} tâche(s) terminée(s) supprimée(s)')
+        self.stdout.write(f'Travailleur démarré ({concurrence} tâche(s) en parallèle)')
+
+        fils = [
+            threading.Thread(
+                target=travailler, args=(arret, options['attente'], options['une_fois']),
+                name=f'travailleur-{numero}', daemon=True,
+            )
+            for numero in range(concurrence)
+        ]
+        for fil in fils:
+            fil.start()
+
+        # Nettoyage périodique des résultats, jusqu'à l'arrêt ou la fin des fils
+        dernier_nettoyage = time.monotonic()
+        while any(fil.is_alive() for fil in fils):
+            for fil in fils:
+                fil.join(timeout=1)
+            if not options['une_fois'] and time.monotonic() - dernier_nettoyage > 3600:
+                dernier_nettoyage = time.monotonic()
+                try:
+                    nettoyer()
+                except Exception:
+                    logger.exception('Échec du nettoyage des tâches')
+        self.stdout.write(self.style.SUCCESS('Travailleur arrêté'))
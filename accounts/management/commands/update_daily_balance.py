@@ -16,6 +16,11 @@ class Command(BaseCommand):
             action='store_true',
             help='Exécuter en mode test (envoyer seulement au premier admin)',
         )
+        parser.add_argument(
+            '--en-file',
+            action='store_true',
+            help='Confier l\'envoi du rapport au travailleur (manage.py runworker)',
+        )
 
     def handle(self, *args, **options):
         # Récupérer la date
@@ -34,7 +39,7 @@ class Command(BaseCommand):
         self.stdout.write(f'Mise à jour du solde pour la date: {date}')
         
         # Exécuter la mise à jour
-        result = update_daily_balance(date)
+        result = update_daily_balance(date, en_file=options['en_file'])
         
         # Afficher les résultats
         self.stdout.write(self.style.SUCCESS('=== RAPPORT DE MISE À JOUR ==='))
@@ -44,7 +49,9 @@ class Command(BaseCommand):
         self.stdout.write(f'Total entrées: {result["total_entrées"]:,.0f} GNF')
         self.stdout.write(f'Total sorties: {result["total_sorties"]:,.0f} GNF')
         
-        if result['rapport_envoye']:
+        if options['en_file']:
+            self.stdout.write(self.style.SUCCESS(f'✅ Rapport quotidien mis en file (tâche #{result["rapport_envoye"].id})'))
+        elif result['rapport_envoye']:
             self.stdout.write(self.style.SUCCESS('✅ Rapport quotidien envoyé par email'))
         else:
             self.stdout.write(self.style.WARNING('⚠️ Échec de l\'envoi du rapport'))
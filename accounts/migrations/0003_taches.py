@@ -0,0 +1,44 @@
+# Generated by Django 5.0 on 2026-10-18 04:52
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_create_default_users'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=50, verbose_name='Tâche')),
+                ('arguments', models.JSONField(blank=True, default=dict, verbose_name='Arguments')),
+                ('etat', models.CharField(choices=[('EN_ATTENTE', 'En attente'), ('EN_COURS', 'En cours'), ('TERMINEE', 'Terminée'), ('ECHOUEE', 'Échouée')], default='EN_ATTENTE', max_length=20, verbose_name='État')),
+                ('tentatives', models.PositiveSmallIntegerField(default=0, verbose_name='Tentatives')),
+                ('max_tentatives', models.PositiveSmallIntegerField(default=3, verbose_name='Tentatives maximum')),
+                ('executer_apres', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Exécuter après')),
+                ('travailleur', models.CharField(blank=True, max_length=100, verbose_name='Travailleur')),
+                ('verrouillee_le', models.DateTimeField(blank=True, null=True, verbose_name='Prise en charge le')),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_fin', models.DateTimeField(blank=True, null=True, verbose_name='Terminée le')),
+                ('contenu', models.BinaryField(blank=True, null=True, verbose_name='Contenu')),
+                ('nom_fichier', models.CharField(blank=True, max_length=200, verbose_name='Nom du fichier')),
+                ('type_contenu', models.CharField(blank=True, max_length=100, verbose_name='Type de contenu')),
+                ('message', models.TextField(blank=True, verbose_name='Message')),
+                ('utilisateur', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='taches', to=settings.AUTH_USER_MODEL, verbose_name='Demandée par')),
+            ],
+            options={
+                'verbose_name': 'Tâche',
+                'verbose_name_plural': 'Tâches',
+                'db_table': 'taches',
+                'ordering': ['-date_creation'],
+                'indexes': [models.Index(fields=['etat', 'executer_apres'], name='tache_etat_executer_idx')],
+            },
+        ),
+    ]
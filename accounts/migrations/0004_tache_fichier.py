@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-18 04:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_taches'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tache',
+            name='fichier',
+            field=models.FileField(blank=True, upload_to='taches/', verbose_name='Fichier'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.core.validators import RegexValidator, MinLengthValidator
 
@@ -102,3 +103,66 @@ class User(AbstractBaseUser, PermissionsMixin):
     
     def is_admin(self):
         return self.role == 'Radmin'
+
+
+class EtatTache(models.TextChoices):
+    """États d'une tâche de fond"""
+    EN_ATTENTE = 'EN_ATTENTE', 'En attente'
+    EN_COURS = 'EN_COURS', 'En cours'
+    TERMINEE = 'TERMINEE', 'Terminée'
+    ECHOUEE = 'ECHOUEE', 'Échouée'
+
+
+class Tache(models.Model):
+    """
+    Tâche de fond (document, export, email) exécutée par `manage.py runworker`
+    (voir accounts.taches)
+    """
+    nom = models.CharField(max_length=50, verbose_name='Tâche')
+    arguments = models.JSONField(default=dict, blank=True, verbose_name='Arguments')
+    etat = models.CharField(
+        max_length=20,
+        choices=EtatTache.choices,
+        default=EtatTache.EN_ATTENTE,
+        verbose_name='État'
+    )
+    utilisateur = models.ForeignKey(
+        'User',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='taches',
+        verbose_name='Demandée par'
+    )
+    tentatives = models.PositiveSmallIntegerField(default=0, verbose_name='Tentatives')
+    max_tentatives = models.PositiveSmallIntegerField(default=3, verbose_name='Tentatives maximum')
+    executer_apres = models.DateTimeField(default=timezone.now, verbose_name='Exécuter après')
+    travailleur = models.CharField(max_length=100, blank=True, verbose_name='Travailleur')
+    verrouillee_le = models.DateTimeField(null=True, blank=True, verbose_name='Prise en charge le')
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_fin = models.DateTimeField(null=True, blank=True, verbose_name='Terminée le')
+
+    # Résultat : un fichier à télécharger et/ou un message (ou l'erreur). Le
+    # fichier est en base (contenu) ou, pour les gros exports, sur disque
+    contenu = models.BinaryField(null=True, blank=True, verbose_name='Contenu')
+    fichier = models.FileField(upload_to='taches/', blank=True, verbose_name='Fichier')
+    nom_fichier = models.CharField(max_length=200, blank=True, verbose_name='Nom du fichier')
+    type_contenu = models.CharField(max_length=100, blank=True, verbose_name='Type de contenu')
+    message = models.TextField(blank=True, verbose_name='Message')
+
+    class Meta:
+        db_table = 'taches'
+        verbose_name = 'Tâche'
+        verbose_name_plural = 'Tâches'
+        ordering = ['-date_creation']
+        indexes = [
+            # Prochaines tâches à exécuter
+            models.Index(fields=['etat', 'executer_apres'], name='tache_etat_executer_idx'),
+        ]
+
+    def __str__(self):
+        return f"Tâche #{self.id} {self.nom} ({self.get_etat_display()})"
+
+    @property
+    def terminee(self):
+        return self.etat in (EtatTache.TERMINEE, EtatTache.ECHOUEE)
@@ -0,0 +1,152 @@
+"""
+Purge de l'historique (commandes, paiements, dépenses) par lots.
+
+Un delete() de l'ORM charge chaque ligne et envoie ses signaux : pour un
+paiement, une mise à jour de la caisse, un mouvement du grand livre, le
+recalcul de l'occupation de sa table et de son bilan. Ici, chaque lot de
+TAILLE_LOT identifiants est supprimé par quelques DELETE ... WHERE id IN (...)
+dans sa propre transaction, avec au plus un mouvement de caisse net et une
+synchronisation des tables du lot. Les bilans journaliers de la période
+touchée sont recalculés une fois, à la fin.
+"""
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Max, Min, Sum
+from django.utils import timezone
+from core.periodes import debut_jour
+
+
+# Lignes supprimées par transaction
+TAILLE_LOT = 1000
+
+JEUX = ('commandes', 'paiements', 'depenses')
+
+
+def _supprimer(queryset):
+    """DELETE ensembliste, sans chargement des objets ni signaux"""
+    return queryset._raw_delete(queryset.db)
+
+
+def _bornes(champ, debut, fin, dates=True):
+    """Arguments de filter() pour les jours debut à fin inclus, chaque borne pouvant manquer"""
+    filtres = {}
+    if debut:
+        filtres[f'{champ}__gte'] = debut_jour(debut) if dates else debut
+    if fin:
+        if dates:
+            filtres[f'{champ}__lt'] = debut_jour(fin + timedelta(days=1))
+        else:
+            filtres[f'{champ}__lte'] = fin
+    return filtres
+
+
+def a_purger(jeu, debut=None, fin=None):
+    """Lignes concernées par une purge (jours debut à fin inclus, ou tout l'historique)"""
+    from orders.models import Commande
+    from payments.models import Paiement
+    from expenses.models import Depense
+    if jeu == 'commandes':
+        return Commande.objects.filter(**_bornes('date_commande', debut, fin))
+    if jeu == 'paiements':
+        return Paiement.objects.filter(**_bornes('date_paiement', debut, fin))
+    if jeu == 'depenses':
+        return Depense.objects.filter(**_bornes('date_depense', debut, fin, dates=False))
+    raise ValueError(f'Jeu inconnu : {jeu}')
+
+
+def _annuler_paiements(paiements, utilisateur, libelle):
+    """
+    Détache les mouvements des paiements et contre-passe leur total en un
+    mouvement ; retourne (montant, jours min/max, tables)
+    """
+    from payments.models import Caisse, MouvementCaisse, TypeMouvement
+    from payments.mouvements import enregistrer_mouvement
+    resume = paiements.aggregate(montant=Sum('montant'), premier=Min('date_paiement'), dernier=Max('date_paiement'))
+    tables = set(paiements.values_list('commande__table_id', flat=True))
+    montant = resume['montant'] or 0
+    MouvementCaisse.objects.filter(paiement__in=paiements).update(paiement=None)
+    if montant:
+        Caisse.crediter(-montant)
+        enregistrer_mouvement(TypeMouvement.PAIEMENT, -montant, libelle=libelle, utilisateur=utilisateur)
+    jours = [timezone.localdate(d) for d in (resume['premier'], resume['dernier']) if d]
+    return montant, jours, tables
+
+
+def _purger_lot(jeu, ids, utilisateur):
+    """Supprime un lot ; retourne (montant, jours touchés)"""
+    from orders.models import Commande, CommandePlat, HistoriqueEtatCommande, TicketPoste
+    from orders.queries import synchroniser_occupation
+    from payments.models import Caisse, MouvementCaisse, Paiement, TypeMouvement
+    from payments.mouvements import enregistrer_mouvement
+    from expenses.models import Depense
+    from restaurant.models import TableRestaurant
+
+    if jeu == 'depenses':
+        depenses = Depense.objects.filter(id__in=ids)
+        resume = depenses.aggregate(montant=Sum('montant'), premier=Min('date_depense'), dernier=Max('date_depense'))
+        montant = resume['montant'] or 0
+        MouvementCaisse.objects.filter(depense__in=depenses).update(depense=None)
+        _supprimer(depenses)
+        if montant:
+            Caisse.crediter(montant)
+            enregistrer_mouvement(TypeMouvement.DEPENSE, montant, utilisateur=utilisateur,
+                                  libelle=f'Purge de {len(ids)} dépense(s)')
+        return montant, [resume['premier'], resume['dernier']]
+
+    if jeu == 'paiements':
+        paiements = Paiement.objects.filter(id__in=ids)
+        montant, jours, tables = _annuler_paiements(paiements, utilisateur, f'Purge de {len(ids)} paiement(s)')
+        _supprimer(paiements)
+        # Une commande servie redevient impayée : sa table peut être réoccupée
+        synchroniser_occupation(TableRestaurant.objects.filter(id__in=tables))
+        return montant, jours
+
+    commandes = Commande.objects.filter(id__in=ids)
+    resume = commandes.aggregate(premier=Min('date_commande'), dernier=Max('date_commande'))
+    tables = set(commandes.values_list('table_id', flat=True))
+    paiements = Paiement.objects.filter(commande_id__in=ids)
+    montant, jours, _ = _annuler_paiements(
+        paiements, utilisateur, f'Purge des paiements de {len(ids)} commande(s)'
+    )
+    _supprimer(paiements)
+    _supprimer(CommandePlat.objects.filter(commande_id__in=ids))
+    _supprimer(TicketPoste.objects.filter(commande_id__in=ids))
+    _supprimer(HistoriqueEtatCommande.objects.filter(commande_id__in=ids))
+    _supprimer(commandes)
+    synchroniser_occupation(TableRestaurant.objects.filter(id__in=tables))
+    jours += [timezone.localdate(d) for d in (resume['premier'], resume['dernier']) if d]
+    return montant, jours
+
+
+def purger(jeu, debut=None, fin=None, utilisateur=None, progression=None):
+    """
+    Supprime les commandes (avec lignes, tickets, historique et paiements),
+    les paiements ou les dépenses des jours debut à fin inclus, ou de tout
+    l'historique
+
+    La caisse reçoit un seul ajustement net par lot. `progression(supprimes)`
+    est appelé après chaque lot. Retourne {'nombre', 'montant'}.
+    """
+    from payments.bilans import JOURS_PAR_PASSE, reconstruire
+    lignes = a_purger(jeu, debut, fin).order_by('id').values_list('id', flat=True)
+    nombre, montant, jours = 0, 0, []
+    while True:
+        ids = list(lignes[:TAILLE_LOT])
+        if not ids:
+            break
+        with transaction.atomic():
+            montant_lot, jours_lot = _purger_lot(jeu, ids, utilisateur)
+        nombre += len(ids)
+        montant += montant_lot
+        jours += [j for j in jours_lot if j]
+        if progression:
+            progression(nombre)
+
+    # Bilans des jours touchés, recalculés par passes
+    if jours:
+        jour, dernier = min(jours), max(jours)
+        while jour <= dernier:
+            fin_passe = min(jour + timedelta(days=JOURS_PAR_PASSE - 1), dernier)
+            reconstruire(jour, fin_passe)
+            jour = fin_passe + timedelta(days=1)
+    return {'nombre': nombre, 'montant': montant}
@@ -0,0 +1,108 @@
+"""
+Statistiques partagées des tableaux de bord et des exports.
+
+Chaque famille de compteurs (commandes, paiements, dépenses, plats,
+utilisateurs) est calculée par un seul aggregate() à agrégats conditionnels
+(Count/Sum avec filter=Q(...)) au lieu d'un count() par valeur.
+"""
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from core.periodes import bornes_jour
+
+
+def statistiques_commandes(jour=None, paiements_jour=False):
+    """
+    Commandes : total, du jour, en cours (cuisine et service) et par état
+
+    Avec paiements_jour, ajoute le total des paiements du jour
+    ('total_paiements_jour') dans la même requête : chaque commande a au plus
+    un paiement, la jointure ne double aucune ligne.
+    """
+    from orders.models import Commande, EtatCommande
+    debut, fin = bornes_jour(jour)
+    en_cours = [EtatCommande.EN_ATTENTE, EtatCommande.EN_PREPARATION, EtatCommande.EN_COURS]
+    agregats = {
+        'nombre': Count('id'),
+        'nombre_jour': Count('id', filter=Q(date_commande__gte=debut, date_commande__lt=fin)),
+        'en_cours': Count('id', filter=Q(etat__in=en_cours)),
+        **{f'etat_{etat}': Count('id', filter=Q(etat=etat)) for etat in EtatCommande.values}
+    }
+    if paiements_jour:
+        agregats['total_paiements_jour'] = Sum('paiement__montant', filter=Q(
+            paiement__date_paiement__gte=debut, paiement__date_paiement__lt=fin
+        ))
+    resultat = Commande.objects.aggregate(**agregats)
+    statistiques = {
+        'nombre': resultat['nombre'],
+        'nombre_jour': resultat['nombre_jour'],
+        'en_cours': resultat['en_cours'],
+        'par_etat': {etat: resultat[f'etat_{etat}'] for etat in EtatCommande.values},
+    }
+    if paiements_jour:
+        statistiques['total_paiements_jour'] = resultat['total_paiements_jour'] or 0
+    return statistiques
+
+
+def statistiques_paiements(jour=None):
+    """Paiements : nombre et total, global et du jour, et répartition du jour par méthode"""
+    from payments.models import Paiement, MethodePaiement
+    debut, fin = bornes_jour(jour)
+    du_jour = Q(date_paiement__gte=debut, date_paiement__lt=fin)
+    agregats = {
+        'nombre': Count('id'),
+        'total': Sum('montant'),
+        'nombre_jour': Count('id', filter=du_jour),
+        'total_jour': Sum('montant', filter=du_jour),
+    }
+    for methode in MethodePaiement.values:
+        agregats[f'nombre_{methode}'] = Count('id', filter=du_jour & Q(methode=methode))
+        agregats[f'total_{methode}'] = Sum('montant', filter=du_jour & Q(methode=methode))
+    resultat = Paiement.objects.aggregate(**agregats)
+    return {
+        'nombre': resultat['nombre'],
+        'total': resultat['total'] or 0,
+        'nombre_jour': resultat['nombre_jour'],
+        'total_jour': resultat['total_jour'] or 0,
+        'par_methode_jour': {
+            methode: {'total': resultat[f'total_{methode}'] or 0, 'count': resultat[f'nombre_{methode}']}
+            for methode in MethodePaiement.values
+        },
+    }
+
+
+def statistiques_depenses(jour=None):
+    """Dépenses : nombre et total, global et du jour"""
+    from expenses.models import Depense
+    jour = jour or timezone.now().date()
+    resultat = Depense.objects.aggregate(
+        nombre=Count('id'),
+        total=Sum('montant'),
+        nombre_jour=Count('id', filter=Q(date_depense=jour)),
+        total_jour=Sum('montant', filter=Q(date_depense=jour)),
+    )
+    resultat['total'] = resultat['total'] or 0
+    resultat['total_jour'] = resultat['total_jour'] or 0
+    return resultat
+
+
+def statistiques_plats():
+    """Plats : nombre total et disponibles"""
+    from restaurant.models import Plat
+    return Plat.objects.aggregate(
+        nombre=Count('id'),
+        disponibles=Count('id', filter=Q(disponible=True)),
+    )
+
+
+def statistiques_utilisateurs():
+    """Utilisateurs : nombre total et par rôle"""
+    from accounts.models import User
+    roles = [role for role, _ in User.ROLE_CHOICES]
+    resultat = User.objects.aggregate(
+        nombre=Count('id'),
+        **{f'role_{role}': Count('id', filter=Q(role=role)) for role in roles}
+    )
+    return {
+        'nombre': resultat['nombre'],
+        'par_role': {role: resultat[f'role_{role}'] for role in roles},
+    }
@@ -0,0 +1,311 @@
+"""
+File de tâches de fond en base de données, sans courtier externe.
+
+Les vues enregistrent une Tache (mettre_en_file) et répondent aussitôt ;
+`manage.py runworker` exécute les tâches en attente dans TACHES_CONCURRENCE
+fils au plus. Une tâche est prise par un UPDATE conditionnel (etat=EN_ATTENTE),
+si bien que plusieurs travailleurs ne l'exécutent jamais deux fois. En cas
+d'erreur, elle est replanifiée avec un délai croissant jusqu'à max_tentatives ;
+une tâche restée EN_COURS au-delà de DELAI_VERROU (travailleur arrêté) est
+remise en attente, cette tentative interrompue comptant comme les autres.
+
+Le résultat (fichier et/ou message) est stocké sur la tâche et téléchargeable
+depuis accounts:tache_detail.
+"""
+import logging
+import os
+import tempfile
+import socket
+import threading
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.core.files import File
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import EtatTache, Tache
+
+
+logger = logging.getLogger(__name__)
+
+# Tâche EN_COURS sans fin au-delà de ce délai : travailleur considéré comme arrêté
+DELAI_VERROU = timedelta(minutes=15)
+
+# Délai avant la nouvelle tentative n (DELAI_REESSAI * 2**(n-1))
+DELAI_REESSAI = timedelta(seconds=30)
+
+# Pause maximale du travailleur après des erreurs successives (secondes)
+ATTENTE_ERREUR_MAX = 60
+
+TYPE_PDF = 'application/pdf'
+TYPE_EXCEL = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# nom -> fonction(**arguments) retournant un dictionnaire (contenu ou
+# fichier, nom_fichier, type_contenu, message ; chaque clé est facultative).
+# `fichier` est le chemin d'un fichier temporaire, déplacé dans MEDIA_ROOT
+# par morceaux plutôt que chargé en mémoire
+_TACHES = {}
+
+
+class TacheInconnue(KeyError):
+    """Aucune tâche enregistrée sous ce nom"""
+
+
+def tache(nom):
+    """Enregistre une fonction comme tâche `nom`"""
+    def enregistrer(fonction):
+        _TACHES[nom] = fonction
+        return fonction
+    return enregistrer
+
+
+def mettre_en_file(nom, utilisateur=None, max_tentatives=3, **arguments):
+    """
+    Enregistre la tâche `nom` (arguments sérialisables en JSON) et la retourne
+
+    Un travailleur ne la voit qu'après la validation de la transaction en
+    cours. Avec TACHES_EXECUTION_IMMEDIATE (développement, sans travailleur),
+    elle est exécutée dès cette validation.
+    """
+    if nom not in _TACHES:
+        raise TacheInconnue(nom)
+    tache = Tache.objects.create(
+        nom=nom, arguments=arguments, max_tentatives=max_tentatives,
+        utilisateur=utilisateur if utilisateur and utilisateur.is_authenticated else None,
+    )
+    if getattr(settings, 'TACHES_EXECUTION_IMMEDIATE', False):
+        transaction.on_commit(lambda: executer(tache))
+    return tache
+
+
+def identifiant_travailleur():
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+
+def _reprendre(taches, executer_apres, message):
+    """
+    Remet en attente des tâches EN_COURS interrompues, pour exécution après
+    `executer_apres`. La tentative interrompue compte : une tâche qui fait
+    tomber son travailleur n'est pas reprise indéfiniment, elle échoue au
+    bout de max_tentatives avec `message`
+    """
+    taches.filter(tentatives__gte=F('max_tentatives') - 1).update(
+        etat=EtatTache.ECHOUEE, travailleur='', tentatives=F('tentatives') + 1, date_fin=timezone.now(),
+        message=message,
+    )
+    taches.update(
+        etat=EtatTache.EN_ATTENTE, travailleur='', tentatives=F('tentatives') + 1, executer_apres=executer_apres,
+    )
+
+
+def prendre(travailleur):
+    """Réserve la prochaine tâche exécutable pour `travailleur` ; None si aucune"""
+    maintenant = timezone.now()
+    # Tâches abandonnées par un travailleur arrêté
+    _reprendre(
+        Tache.objects.filter(etat=EtatTache.EN_COURS, verrouillee_le__lt=maintenant - DELAI_VERROU),
+        maintenant, 'Travailleur arrêté pendant l\'exécution',
+    )
+    candidates = (Tache.objects
+                  .filter(etat=EtatTache.EN_ATTENTE, executer_apres__lte=maintenant)
+                  .order_by('executer_apres', 'id')
+                  .values_list('id', flat=True)[:10])
+    for tache_id in candidates:
+        prise = Tache.objects.filter(id=tache_id, etat=EtatTache.EN_ATTENTE).update(
+            etat=EtatTache.EN_COURS, travailleur=travailleur, verrouillee_le=maintenant
+        )
+        if prise:
+            return Tache.objects.get(id=tache_id)
+    return None
+
+
+def executer(tache):
+    """Exécute une tâche réservée et enregistre son résultat ou son échec"""
+    tache.tentatives += 1
+    try:
+        fonction = _TACHES[tache.nom]
+    except KeyError:
+        fonction = None
+    try:
+        if fonction is None:
+            raise TacheInconnue(tache.nom)
+        resultat = fonction(**tache.arguments) or {}
+    except Exception as e:
+        logger.exception('Échec de la tâche #%s (%s)', tache.id, tache.nom)
+        tache.message = ''.join(traceback.format_exception_only(type(e), e)).strip()
+        if fonction is not None and tache.tentatives < tache.max_tentatives:
+            tache.etat = EtatTache.EN_ATTENTE
+            tache.executer_apres = timezone.now() + DELAI_REESSAI * 2 ** (tache.tentatives - 1)
+        else:
+            tache.etat = EtatTache.ECHOUEE
+            tache.date_fin = timezone.now()
+    else:
+        tache.etat = EtatTache.TERMINEE
+        tache.date_fin = timezone.now()
+        tache.contenu = resultat.get('contenu')
+        if resultat.get('fichier'):
+            chemin = resultat['fichier']
+            try:
+                with open(chemin, 'rb') as fichier:
+                    tache.fichier.save(resultat.get('nom_fichier', os.path.basename(chemin)), File(fichier),
+                                       save=False)
+            finally:
+                os.remove(chemin)
+        tache.nom_fichier = resultat.get('nom_fichier', '')
+        tache.type_contenu = resultat.get('type_contenu', '')
+        tache.message = resultat.get('message', '')
+    tache.travailleur = ''
+    tache.save()
+    return tache
+
+
+def nettoyer():
+    """
+    Supprime les tâches terminées depuis plus de TACHES_CONSERVATION_JOURS
+    jours ; celles en attente depuis aussi longtemps (aucun travailleur) sont
+    marquées échouées, puis supprimées à leur tour au terme du même délai
+    """
+    maintenant = timezone.now()
+    limite = maintenant - timedelta(days=getattr(settings, 'TACHES_CONSERVATION_JOURS', 7))
+    Tache.objects.filter(etat=EtatTache.EN_ATTENTE, executer_apres__lt=limite).update(
+        etat=EtatTache.ECHOUEE, date_fin=maintenant, message='Expirée : aucun travailleur ne l\'a exécutée',
+    )
+    anciennes = Tache.objects.filter(etat__in=[EtatTache.TERMINEE, EtatTache.ECHOUEE], date_fin__lt=limite)
+    stockage = Tache._meta.get_field('fichier').storage
+    for nom in anciennes.exclude(fichier='').values_list('fichier', flat=True):
+        stockage.delete(nom)
+    supprimees, _ = anciennes.delete()
+    return supprimees
+
+
+def _liberer(tache, travailleur):
+    """
+    Remet en attente une tâche réservée dont l'exécution n'a pu être menée
+    à son terme (erreur hors de la fonction de la tâche)
+    """
+    if tache is None:
+        return
+    _reprendre(
+        Tache.objects.filter(id=tache.id, etat=EtatTache.EN_COURS, travailleur=travailleur),
+        timezone.now() + DELAI_REESSAI, 'Erreur du travailleur pendant l\'exécution',
+    )
+
+
+def travailler(arret, attente=2.0, une_fois=False):
+    """
+    Boucle d'un fil du travailleur : exécute les tâches disponibles, attend
+    `attente` secondes quand la file est vide, jusqu'à ce que `arret` (Event)
+    soit levé ; `une_fois` s'arrête dès que la file est vide
+
+    Une erreur hors des tâches (base verrouillée, fichier impossible à
+    écrire...) est journalisée et ne termine pas le fil : la tâche en cours
+    est remise en attente et la boucle reprend après une pause croissante,
+    plafonnée à ATTENTE_ERREUR_MAX.
+    """
+    travailleur = identifiant_travailleur()
+    erreurs = 0
+    while not arret.is_set():
+        tache = None
+        try:
+            close_old_connections()
+            tache = prendre(travailleur)
+            if tache is None:
+                if une_fois:
+                    break
+                arret.wait(attente)
+                continue
+            executer(tache)
+            erreurs = 0
+        except Exception:
+            erreurs += 1
+            logger.exception('Erreur du travailleur %s (tâche %s)', travailleur, tache and tache.id)
+            try:
+                _liberer(tache, travailleur)
+            except Exception:
+                logger.exception('Tâche #%s non libérée : reprise après DELAI_VERROU', tache.id)
+            arret.wait(min(attente * 2 ** (erreurs - 1), ATTENTE_ERREUR_MAX))
+    close_old_connections()
+
+
+# --- Tâches -------------------------------------------------------------------
+
+@tache('dashboard_pdf')
+def _dashboard_pdf(jour=None):
+    from .pdf_utils import dashboard_pdf
+    from core.exports import lire_date
+    jour = lire_date(jour) or timezone.localdate()
+    return {
+        'contenu': dashboard_pdf(jour),
+        'nom_fichier': f'dashboard_restaurant_{jour.strftime("%Y%m%d")}.pdf',
+        'type_contenu': TYPE_PDF,
+    }
+
+
+@tache('dashboard_excel')
+def _dashboard_excel(jour=None):
+    from .utils import dashboard_excel
+    from core.exports import lire_date
+    jour = lire_date(jour) or timezone.localdate()
+    return {
+        'contenu': dashboard_excel(jour),
+        'nom_fichier': f'dashboard_restaurant_{jour.strftime("%Y%m%d")}.xlsx',
+        'type_contenu': TYPE_EXCEL,
+    }
+
+
+@tache('excel_detail')
+def _excel_detail(debut, fin, decoupage=None):
+    """Classeur détaillé (core.classeurs), écrit dans un fichier temporaire"""
+    from core.classeurs import ecrire_classeur
+    from core.exports import lire_date
+    debut, fin = lire_date(debut), lire_date(fin)
+    descripteur, chemin = tempfile.mkstemp(suffix='.xlsx')
+    os.close(descripteur)
+    try:
+        resume = ecrire_classeur(chemin, debut, fin, decoupage)
+    except Exception:
+        os.remove(chemin)
+        raise
+    return {
+        'fichier': chemin,
+        'nom_fichier': f'detail_{debut.strftime("%Y%m%d")}_{fin.strftime("%Y%m%d")}.xlsx',
+        'type_contenu': TYPE_EXCEL,
+        'message': f"{resume['lignes']} lignes sur {resume['feuilles']} feuilles",
+    }
+
+
+@tache('pieces_paiement')
+def _pieces_paiement(paiement_id):
+    """Prépare le reçu et la facture d'un paiement dans le cache des documents"""
+    from payments.documents import charger_paiement, donnees_piece, piece_pdf
+    from payments.models import Paiement
+    try:
+        paiement = charger_paiement(paiement_id=paiement_id)
+    except Paiement.DoesNotExist:
+        return {'message': f'Paiement #{paiement_id} supprimé entre-temps'}
+    donnees = donnees_piece(paiement)
+    piece_pdf('recu', donnees)
+    if paiement.methode:
+        piece_pdf('facture', donnees)
+    return {'message': f'Reçu et facture du paiement #{paiement_id} prêts'}
+
+
+@tache('rapport_journalier')
+def _rapport_journalier(jour=None):
+    """Rapport journalier de caisse par email aux administrateurs"""
+    from .email_utils import send_daily_balance_report
+    from core.exports import lire_date
+    jour = lire_date(jour) or timezone.localdate()
+    if not send_daily_balance_report(jour):
+        raise RuntimeError(f'Rapport du {jour:%d/%m/%Y} non envoyé')
+    return {'message': f'Rapport du {jour:%d/%m/%Y} envoyé'}
+
+
+@tache('analytique')
+def _analytique(reconstruire=False):
+    """Rafraîchit les colonnes NumPy de l'historique des lignes (orders.analytique)"""
+    from orders.analytique import rafraichir
+    resultat = rafraichir(reconstruire=reconstruire)
+    return {'message': f"{resultat['ajoutees']} ligne(s) ajoutée(s), {resultat['retirees']} retirée(s), "
+                       f"{resultat['lignes']} au total"}
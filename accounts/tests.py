@@ -0,0 +1,313 @@
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.db import OperationalError, connection
+from django.db.models import Sum
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from core.periodes import debut_jour
+from expenses.models import CategorieDepense, Depense
+from orders.models import Commande, CommandePlat, EtatCommande, HistoriqueEtatCommande, TicketPoste
+from orders.services import creer_commande, preparer_lignes
+from orders.transitions import changer_etat
+from payments.models import BilanJournalier, Caisse, MouvementCaisse, Paiement
+from payments.mouvements import totaux_caisse
+from payments.views import caisse_dashboard
+from restaurant.models import Plat, TableRestaurant
+from restaurant.views import admin_dashboard
+from . import email_utils
+from .email_utils import send_balance_alert, send_daily_balance_report, update_daily_balance
+from .models import EtatTache, Tache, User
+from .purge import purger
+from . import taches
+from .taches import DELAI_REESSAI, DELAI_VERROU, mettre_en_file, nettoyer, prendre, travailler
+from .views import dashboard
+
+
+class BudgetRequetesTableauxDeBordTests(TestCase):
+    """
+    Chaque tableau de bord se rend en au plus cinq requêtes, quel que soit le
+    volume de données (accounts.statistiques). La session et l'utilisateur
+    sont hors budget : la requête est construite déjà authentifiée.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(login='admin01', password='secret')
+        for role, _ in User.ROLE_CHOICES:
+            User.objects.create_user(login=f'{role.lower()}01', password='secret', role=role)
+        categorie = CategorieDepense.objects.create(nom='Achats')
+        for numero in range(5):
+            table = TableRestaurant.objects.create(numero_table=f'T{numero:02}', nombre_places=4)
+            for etat in EtatCommande.values:
+                commande = Commande.objects.create(table=table, etat=etat, total=Decimal('25000'))
+                if etat == EtatCommande.TERMINEE:
+                    Paiement.objects.create(commande=commande, montant=commande.total)
+            Depense.objects.create(
+                description=f'Achat {numero}', montant=Decimal('5000'),
+                categorie=categorie, date_depense=timezone.localdate(),
+            )
+
+    def rendre(self, vue, budget):
+        request = RequestFactory().get('/')
+        request.user = self.admin
+        with self.assertNumQueries(budget):
+            response = vue(request)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_dashboard(self):
+        self.rendre(dashboard, 4)
+
+    def test_admin_dashboard(self):
+        response = self.rendre(admin_dashboard, 5)
+        # Paiements du jour, lus avec les statistiques des commandes
+        self.assertContains(response, "125000 GNF aujourd'hui")
+
+    def test_caisse_dashboard(self):
+        self.rendre(caisse_dashboard, 2)
+
+
+class FileTachesTests(TestCase):
+    """Reprise et expiration des tâches de fond (accounts.taches)"""
+
+    def abandonnee(self, tentatives):
+        """Tâche prise par un travailleur arrêté depuis plus de DELAI_VERROU"""
+        return Tache.objects.create(
+            nom='rapport_journalier', etat=EtatTache.EN_COURS, tentatives=tentatives, max_tentatives=3,
+            travailleur='arrete:1:1', verrouillee_le=timezone.now() - DELAI_VERROU - timedelta(minutes=1),
+        )
+
+    def test_reprise_compte_la_tentative(self):
+        tache = self.abandonnee(tentatives=0)
+        reprise = prendre('travailleur')
+        self.assertEqual(reprise.id, tache.id)
+        self.assertEqual((reprise.etat, reprise.tentatives), (EtatTache.EN_COURS, 1))
+
+    def test_reprise_echoue_au_maximum(self):
+        tache = self.abandonnee(tentatives=2)
+        self.assertIsNone(prendre('travailleur'))
+        tache.refresh_from_db()
+        self.assertEqual((tache.etat, tache.tentatives, tache.travailleur), (EtatTache.ECHOUEE, 3, ''))
+        self.assertIsNotNone(tache.date_fin)
+
+    def travailler(self):
+        """Une passe du travailleur, jusqu'à ce que la file soit vide"""
+        travailler(threading.Event(), attente=0, une_fois=True)
+
+    def test_boucle_reessai_puis_succes(self):
+        fonction = mock.Mock(side_effect=[
+            RuntimeError('échec passager'),
+            {'contenu': b'ok', 'nom_fichier': 'essai.txt', 'type_contenu': 'text/plain', 'message': 'fait'},
+        ])
+        with mock.patch.dict(taches._TACHES, {'essai': fonction}):
+            tache = mettre_en_file('essai', valeur=1)
+            with self.assertLogs('accounts.taches', 'ERROR'):
+                self.travailler()
+            tache.refresh_from_db()
+            self.assertEqual((tache.etat, tache.tentatives), (EtatTache.EN_ATTENTE, 1))
+            self.assertIn('échec passager', tache.message)
+            # Replanifiée après DELAI_REESSAI : pas reprise dans la même passe
+            self.assertGreater(tache.executer_apres, timezone.now() + DELAI_REESSAI - timedelta(seconds=5))
+
+            Tache.objects.filter(pk=tache.pk).update(executer_apres=timezone.now())
+            self.travailler()
+        tache.refresh_from_db()
+        self.assertEqual((tache.etat, tache.tentatives, tache.message), (EtatTache.TERMINEE, 2, 'fait'))
+        self.assertEqual(bytes(tache.contenu), b'ok')
+        fonction.assert_called_with(valeur=1)
+
+    def test_boucle_survit_a_une_base_verrouillee(self):
+        fonction = mock.Mock(return_value={'message': 'fait'})
+        vraie_prise = prendre
+        prises = []
+
+        def prendre_apres_un_echec(travailleur):
+            prises.append(travailleur)
+            if len(prises) == 1:
+                raise OperationalError('database is locked')
+            return vraie_prise(travailleur)
+
+        with mock.patch.dict(taches._TACHES, {'essai': fonction}):
+            tache = mettre_en_file('essai')
+            with mock.patch('accounts.taches.prendre', side_effect=prendre_apres_un_echec), \
+                    self.assertLogs('accounts.taches', 'ERROR'):
+                self.travailler()
+        tache.refresh_from_db()
+        self.assertEqual((tache.etat, tache.tentatives), (EtatTache.TERMINEE, 1))
+        self.assertEqual(len(prises), 3)
+
+    def test_echec_d_enregistrement_libere_la_tache(self):
+        with mock.patch.dict(taches._TACHES, {'essai': mock.Mock(return_value={'message': 'fait'})}):
+            tache = mettre_en_file('essai')
+            with mock.patch.object(Tache, 'save', side_effect=OperationalError('database is locked')), \
+                    self.assertLogs('accounts.taches', 'ERROR'):
+                self.travailler()
+        tache.refresh_from_db()
+        # Remise en attente aussitôt, au lieu de rester EN_COURS jusqu'à DELAI_VERROU
+        self.assertEqual((tache.etat, tache.tentatives, tache.travailleur), (EtatTache.EN_ATTENTE, 1, ''))
+
+    def test_nettoyage_expire_les_attentes_anciennes(self):
+        ancienne = Tache.objects.create(nom='rapport_journalier', executer_apres=timezone.now() - timedelta(days=8))
+        recente = Tache.objects.create(nom='rapport_journalier')
+        nettoyer()
+        ancienne.refresh_from_db()
+        recente.refresh_from_db()
+        self.assertEqual(ancienne.etat, EtatTache.ECHOUEE)
+        self.assertEqual(recente.etat, EtatTache.EN_ATTENTE)
+
+
+class ConnexionsComptees(locmem.EmailBackend):
+    """Backend locmem qui compte les connexions ouvertes"""
+
+    ouvertes = 0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        ConnexionsComptees.ouvertes += 1
+
+
+@override_settings(EMAIL_BACKEND='accounts.tests.ConnexionsComptees')
+class EmailsAdministrateursTests(TestCase):
+    """
+    Rapport journalier et alerte de caisse (accounts.email_utils) : chiffres
+    et PDF produits une fois, une seule connexion pour tous les destinataires
+    """
+
+    def setUp(self):
+        ConnexionsComptees.ouvertes = 0
+        Paiement.objects.create(
+            commande=Commande.objects.create(
+                table=TableRestaurant.objects.create(numero_table='T01', nombre_places=4),
+                etat=EtatCommande.TERMINEE, total=Decimal('25000'),
+            ),
+            montant=Decimal('25000'),
+        )
+
+    def ajouter_admins(self, nombre):
+        depart = User.objects.filter(role='Radmin').count()
+        for numero in range(depart, depart + nombre):
+            User.objects.create_user(login=f'admin{numero:02}@exemple.gn', password='secret', role='Radmin')
+
+    def envoyer(self, envoi):
+        """Nombre de requêtes et de connexions d'un envoi, boîte vidée avant"""
+        mail.outbox = []
+        ConnexionsComptees.ouvertes = 0
+        with CaptureQueriesContext(connection) as requetes:
+            self.assertTrue(envoi())
+        return len(requetes), ConnexionsComptees.ouvertes
+
+    def test_rapport_journalier(self):
+        self.ajouter_admins(2)
+        with mock.patch.object(email_utils, 'rapport_journalier_pdf',
+                               wraps=email_utils.rapport_journalier_pdf) as pdf:
+            requetes, connexions = self.envoyer(send_daily_balance_report)
+        self.assertEqual(connexions, 1)
+        self.assertEqual(pdf.call_count, 1)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['admin00@exemple.gn', 'admin01@exemple.gn'])
+
+        # Dix fois plus de destinataires : ni requête ni connexion de plus
+        self.ajouter_admins(18)
+        self.assertEqual(self.envoyer(send_daily_balance_report), (requetes, 1))
+        self.assertEqual(len(mail.outbox), 20)
+
+    def test_alerte_solde(self):
+        self.ajouter_admins(2)
+        requetes, connexions = self.envoyer(lambda: send_balance_alert(Decimal('5000')))
+        self.assertEqual((requetes, connexions, len(mail.outbox)), (1, 1, 2))
+        self.ajouter_admins(18)
+        self.assertEqual(self.envoyer(lambda: send_balance_alert(Decimal('5000'))), (1, 1))
+        self.assertEqual(len(mail.outbox), 20)
+
+    def test_mise_a_jour_quotidienne(self):
+        # Rapport et alerte par la même connexion
+        self.ajouter_admins(3)
+        update_daily_balance()
+        mail.outbox = []
+        ConnexionsComptees.ouvertes = 0
+        resultat = update_daily_balance()
+        self.assertTrue(resultat['rapport_envoye'])
+        self.assertTrue(resultat['alerte_envoyee'])
+        self.assertEqual(ConnexionsComptees.ouvertes, 1)
+        self.assertEqual(len(mail.outbox), 6)
+
+
+@mock.patch('accounts.purge.TAILLE_LOT', 4)
+class PurgeHistoriqueTests(TestCase):
+    """
+    Purge par lots (accounts.purge) : la caisse et le grand livre restent
+    égaux aux paiements moins les dépenses, sans ligne orpheline
+    """
+
+    def setUp(self):
+        Caisse.get_instance()
+        Caisse.reinitialiser()
+        self.ancien = timezone.localdate() - timedelta(days=40)
+        self.aujourdhui = timezone.localdate()
+        table = TableRestaurant.objects.create(numero_table='T01', nombre_places=4)
+        plat = Plat.objects.create(nom='Riz sauce', prix_unitaire=Decimal('20000'))
+        midi = debut_jour(self.ancien) + timedelta(hours=12)
+        for numero in range(10):
+            commande = creer_commande(table, preparer_lignes([(plat.id, 1 + numero % 3)]))
+            changer_etat(commande, EtatCommande.EN_PREPARATION)
+            if numero % 2 == 0:
+                paiement = Paiement.objects.create(commande=commande, montant=commande.total, methode='especes')
+            if numero < 6:
+                Commande.objects.filter(pk=commande.pk).update(date_commande=midi)
+                if numero % 2 == 0:
+                    Paiement.objects.filter(pk=paiement.pk).update(date_paiement=midi)
+        for numero in range(12):
+            Depense.objects.create(
+                description=f'Achat {numero}', montant=Decimal('1500'),
+                date_depense=self.ancien if numero < 9 else self.aujourdhui,
+            )
+
+    def verifier(self):
+        attendu = (Paiement.objects.aggregate(total=Sum('montant'))['total'] or 0) - \
+            (Depense.objects.aggregate(total=Sum('montant'))['total'] or 0)
+        self.assertEqual(Caisse.get_instance().solde_actuel, attendu)
+        self.assertEqual(totaux_caisse()['solde'], attendu)
+        commandes = Commande.objects.values('id')
+        for modele in (CommandePlat, TicketPoste, HistoriqueEtatCommande, Paiement):
+            self.assertFalse(modele.objects.exclude(commande_id__in=commandes).exists(), modele.__name__)
+        self.assertFalse(MouvementCaisse.objects.filter(paiement__isnull=False)
+                         .exclude(paiement_id__in=Paiement.objects.values('id')).exists())
+        self.assertFalse(MouvementCaisse.objects.filter(depense__isnull=False)
+                         .exclude(depense_id__in=Depense.objects.values('id')).exists())
+
+    def test_purge_des_paiements(self):
+        self.verifier()
+        resultat = purger('paiements', self.ancien, self.ancien)
+        self.assertEqual(resultat, {'nombre': 3, 'montant': Decimal('120000')})
+        self.assertEqual(Paiement.objects.count(), 2)
+        self.assertEqual(Commande.objects.count(), 10)
+        self.verifier()
+
+    def test_purge_des_depenses(self):
+        resultat = purger('depenses', self.ancien, self.ancien)
+        self.assertEqual(resultat, {'nombre': 9, 'montant': Decimal('13500')})
+        self.assertEqual(Depense.objects.count(), 3)
+        self.verifier()
+
+    def test_purge_des_commandes(self):
+        resultat = purger('commandes', self.ancien, self.ancien)
+        self.assertEqual(resultat['nombre'], 6)
+        self.assertEqual(Commande.objects.count(), 4)
+        self.assertEqual(Paiement.objects.count(), 2)
+        self.assertEqual(CommandePlat.objects.count(), 4)
+        self.verifier()
+        # Bilan de la journée purgée recalculé
+        self.assertEqual(BilanJournalier.objects.get(jour=self.ancien).nb_commandes, 0)
+
+    def test_purge_de_tout_l_historique(self):
+        for jeu in ('commandes', 'depenses'):
+            purger(jeu)
+        self.assertFalse(Commande.objects.exists())
+        self.assertFalse(Depense.objects.exists())
+        self.verifier()
+        self.assertEqual(Caisse.get_instance().solde_actuel, 0)
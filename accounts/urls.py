@@ -25,4 +25,8 @@ urlpatterns = [
     path('system/data/reset/caisse/', views.admin_reset_caisse, name='admin_reset_caisse'),
     path('system/export/excel/', views.export_excel_dashboard, name='export_excel_dashboard'),
     path('system/export/pdf/', views.export_pdf_dashboard, name='export_pdf_dashboard'),
+    path('system/export/excel/detail/', views.export_excel_detail, name='export_excel_detail'),
+    path('taches/<int:tache_id>/', views.tache_detail, name='tache_detail'),
+    path('taches/<int:tache_id>/statut/', views.tache_statut, name='tache_statut'),
+    path('taches/<int:tache_id>/telecharger/', views.tache_telecharger, name='tache_telecharger'),
 ]
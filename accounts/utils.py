@@ -1,6 +1,6 @@
 from django.http import HttpResponse
 from django.utils import timezone
-from django.db import models
+from core.periodes import filtre_jour
 from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 from openpyxl.utils import get_column_letter
@@ -8,43 +8,43 @@ from datetime import datetime, timedelta
 from decimal import Decimal
 import io
 
-def export_dashboard_excel(request):
-    """Exporter les données du dashboard en format Excel"""
+def dashboard_excel(jour=None):
+    """Classeur Excel (bytes) du dashboard pour une journée, aujourd'hui par défaut"""
     # Récupérer les données
-    from orders.models import Commande, EtatCommande
-    from restaurant.models import Plat
     from payments.models import Paiement
+    from payments.mouvements import totaux_caisse
     from expenses.models import Depense
+    from .statistiques import (statistiques_commandes, statistiques_depenses, statistiques_paiements,
+                               statistiques_plats)
     
-    today = timezone.now().date()
+    today = jour or timezone.now().date()
     
     # Statistiques des commandes
-    total_commandes = Commande.objects.count()
-    commandes_en_cours = Commande.objects.filter(
-        etat__in=[EtatCommande.EN_ATTENTE, EtatCommande.EN_PREPARATION, EtatCommande.EN_COURS]
-    ).count()
-    commandes_terminees = Commande.objects.filter(etat=EtatCommande.TERMINEE).count()
+    commandes = statistiques_commandes(today)
+    total_commandes = commandes['nombre']
+    commandes_en_cours = commandes['en_cours']
+    commandes_terminees = commandes['par_etat']['TERMINEE']
     
     # Statistiques des plats
-    total_plats = Plat.objects.count()
-    plats_disponibles = Plat.objects.filter(disponible=True).count()
+    plats = statistiques_plats()
+    total_plats = plats['nombre']
+    plats_disponibles = plats['disponibles']
     
     # Statistiques des paiements du jour
-    paiements_aujourdhui = Paiement.objects.filter(date_paiement__date=today).count()
-    total_ventes_aujourdhui = Paiement.objects.filter(date_paiement__date=today).aggregate(
-        total=models.Sum('montant')
-    )['total'] or 0
+    paiements = statistiques_paiements(today)
+    paiements_aujourdhui = paiements['nombre_jour']
+    total_ventes_aujourdhui = paiements['total_jour']
     
     # Statistiques des dépenses du jour
-    depenses_aujourdhui = Depense.objects.filter(date_depense=today).count()
-    total_depenses_aujourdhui = Depense.objects.filter(date_depense=today).aggregate(
-        total=models.Sum('montant')
-    )['total'] or 0
+    depenses = statistiques_depenses(today)
+    depenses_aujourdhui = depenses['nombre_jour']
+    total_depenses_aujourdhui = depenses['total_jour']
     
     # Solde de caisse
-    total_entrées = Paiement.objects.aggregate(total=models.Sum('montant'))['total'] or 0
-    total_sorties = Depense.objects.aggregate(total=models.Sum('montant'))['total'] or 0
-    solde_caisse = total_entrées - total_sorties
+    totaux = totaux_caisse()
+    total_entrées = totaux['entrees']
+    total_sorties = totaux['sorties']
+    solde_caisse = totaux['solde']
     
     # Créer le workbook
     wb = Workbook()
@@ -141,10 +141,10 @@ def export_dashboard_excel(request):
         cell.alignment = center_alignment
     
     row += 1
-    paiements_du_jour = Paiement.objects.filter(date_paiement__date=today).order_by('-date_paiement')
+    paiements_du_jour = Paiement.objects.filter(**filtre_jour('date_paiement', today)).order_by('-date_paiement')
     for paiement in paiements_du_jour:
         ws.cell(row=row, column=1, value=paiement.id)
-        ws.cell(row=row, column=2, value=f"#{paiement.commande.id}")
+        ws.cell(row=row, column=2, value=f"#{paiement.commande_id}")
         ws.cell(row=row, column=3, value=f"{paiement.montant:,.0f}")
         ws.cell(row=row, column=4, value=paiement.get_methode_display())
         ws.cell(row=row, column=5, value=paiement.date_paiement.strftime('%H:%M:%S'))
@@ -169,7 +169,7 @@ def export_dashboard_excel(request):
         cell.alignment = center_alignment
     
     row += 1
-    depenses_du_jour = Depense.objects.filter(date_depense=today).order_by('-date_depense')
+    depenses_du_jour = Depense.objects.filter(date_depense=today).select_related('utilisateur').order_by('-date_depense')
     for depense in depenses_du_jour:
         ws.cell(row=row, column=1, value=depense.id)
         ws.cell(row=row, column=2, value=depense.description)
@@ -187,13 +187,17 @@ def export_dashboard_excel(request):
     for i, width in enumerate(column_widths, 1):
         ws.column_dimensions[get_column_letter(i)].width = width
     
-    # Préparer la réponse HTTP
+    tampon = io.BytesIO()
+    wb.save(tampon)
+    return tampon.getvalue()
+
+
+def export_dashboard_excel(request):
+    """Exporter les données du dashboard en format Excel"""
+    today = timezone.now().date()
     response = HttpResponse(
+        dashboard_excel(today),
         content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
     )
     response['Content-Disposition'] = f'attachment; filename=dashboard_restaurant_{today.strftime("%Y%m%d")}.xlsx'
-    
-    # Sauvegarder le workbook dans la réponse
-    wb.save(response)
-    
     return response
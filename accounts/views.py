@@ -1,17 +1,20 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db import models
-from .models import User
+from django.db import models, transaction
+from .models import EtatTache, Tache, User
 from .forms import UserCreationForm, UserEditForm
-from .utils import export_dashboard_excel
-from .pdf_utils import export_dashboard_pdf
+from .decorators import admin_or_financial_required
+from .taches import mettre_en_file
+from .statistiques import (statistiques_commandes, statistiques_depenses, statistiques_paiements,
+                           statistiques_plats)
 from orders.models import Commande, EtatCommande
 from restaurant.models import Plat
 from payments.models import Paiement
 from django.utils import timezone
+from datetime import datetime
 
 def home(request):
     """Page d'accueil du restaurant"""
@@ -55,47 +58,26 @@ def dashboard(request):
     elif user.role == 'Rcomptable':
         return redirect('restaurant:comptable_home')
     
-    # Calculer les statistiques pour les autres rôles
-    from orders.models import Commande, EtatCommande
-    from restaurant.models import Plat
-    from payments.models import Paiement
-    
-    # Statistiques des commandes
-    total_commandes = Commande.objects.count()
-    commandes_en_cours = Commande.objects.filter(
-        etat__in=[EtatCommande.EN_ATTENTE, EtatCommande.EN_PREPARATION, EtatCommande.EN_COURS]
-    ).count()
-    commandes_terminees = Commande.objects.filter(etat=EtatCommande.TERMINEE).count()
-    
-    # Statistiques des plats
-    total_plats = Plat.objects.count()
-    plats_disponibles = Plat.objects.filter(disponible=True).count()
-    
-    # Statistiques des paiements du jour
-    from django.utils import timezone
-    today = timezone.now().date()
-    paiements_aujourdhui = Paiement.objects.filter(date_paiement__date=today).count()
-    total_ventes_aujourdhui = Paiement.objects.filter(date_paiement__date=today).aggregate(
-        total=models.Sum('montant')
-    )['total'] or 0
-    
-    # Total des revenus (tous les paiements)
-    total_revenus = Paiement.objects.aggregate(
-        total=models.Sum('montant')
-    )['total'] or 0
-    
-    # Nombre total de paiements
-    total_paiements = Paiement.objects.count()
-    
-    # Statistiques des dépenses (total)
-    from expenses.models import Depense
-    total_depenses = Depense.objects.count()
-    depenses_aujourdhui = Depense.objects.filter(date_depense=today).count()
-    total_depenses_aujourdhui = Depense.objects.filter(date_depense=today).aggregate(
-        total=models.Sum('montant')
-    )['total'] or 0
+    # Calculer les statistiques pour les autres rôles (une requête par famille)
+    commandes = statistiques_commandes()
+    plats = statistiques_plats()
+    paiements = statistiques_paiements()
+    depenses = statistiques_depenses()
+    
+    total_commandes = commandes['nombre']
+    commandes_en_cours = commandes['en_cours']
+    commandes_terminees = commandes['par_etat'][EtatCommande.TERMINEE]
+    total_plats = plats['nombre']
+    plats_disponibles = plats['disponibles']
+    paiements_aujourdhui = paiements['nombre_jour']
+    total_ventes_aujourdhui = paiements['total_jour']
+    total_revenus = paiements['total']
+    total_paiements = paiements['nombre']
+    total_depenses = depenses['nombre']
+    total_depenses_aujourdhui = depenses['total_jour']
     
     # Dépenses récentes (pour le dashboard admin)
+    from expenses.models import Depense
     depenses_recentes = Depense.objects.order_by('-date_depense')[:5]
     
     context = {
@@ -206,48 +188,63 @@ def admin_data_management(request):
     context = {'stats': stats}
     return render(request, 'accounts/admin_data_management.html', context)
 
+def _purger_depuis_requete(request, jeu, libelle):
+    """
+    Purge par lots de `jeu` sur la période postée (date_debut, date_fin,
+    facultatives) et message du résultat
+    """
+    from .purge import purger
+    try:
+        debut, fin = (
+            datetime.strptime(request.POST[champ], '%Y-%m-%d').date() if request.POST.get(champ) else None
+            for champ in ('date_debut', 'date_fin')
+        )
+    except ValueError:
+        messages.error(request, "Format de date invalide. Utilisez AAAA-MM-JJ.")
+        return
+    if debut and fin and debut > fin:
+        messages.error(request, "La date de début est postérieure à la date de fin.")
+        return
+    
+    resultat = purger(jeu, debut, fin, utilisateur=request.user)
+    periode = ''
+    if debut or fin:
+        periode = f" (du {debut or 'début'} au {fin or 'ce jour'})"
+    messages.success(request, f"{resultat['nombre']} {libelle}{periode} avec succès!")
+
 @login_required
 def admin_clear_commandes(request):
-    """Supprimer toutes les commandes (admin seulement)"""
+    """Supprimer les commandes, toutes ou d'une période (admin seulement)"""
     if request.user.role != 'Radmin':
         messages.error(request, "Accès non autorisé.")
         return redirect('accounts:dashboard')
     
     if request.method == 'POST':
-        from orders.models import Commande
-        count = Commande.objects.count()
-        Commande.objects.all().delete()
-        messages.success(request, f"{count} commande(s) supprimée(s) avec succès!")
+        _purger_depuis_requete(request, 'commandes', "commande(s) supprimée(s)")
     
     return redirect('accounts:admin_data_management')
 
 @login_required
 def admin_clear_paiements(request):
-    """Supprimer tous les paiements (admin seulement)"""
+    """Supprimer les paiements, tous ou d'une période (admin seulement)"""
     if request.user.role != 'Radmin':
         messages.error(request, "Accès non autorisé.")
         return redirect('accounts:dashboard')
     
     if request.method == 'POST':
-        from payments.models import Paiement
-        count = Paiement.objects.count()
-        Paiement.objects.all().delete()
-        messages.success(request, f"{count} paiement(s) supprimé(s) avec succès!")
+        _purger_depuis_requete(request, 'paiements', "paiement(s) supprimé(s)")
     
     return redirect('accounts:admin_data_management')
 
 @login_required
 def admin_clear_depenses(request):
-    """Supprimer toutes les dépenses (admin seulement)"""
+    """Supprimer les dépenses, toutes ou d'une période (admin seulement)"""
     if request.user.role != 'Radmin':
         messages.error(request, "Accès non autorisé.")
         return redirect('accounts:dashboard')
     
     if request.method == 'POST':
-        from expenses.models import Depense
-        count = Depense.objects.count()
-        Depense.objects.all().delete()
-        messages.success(request, f"{count} dépense(s) supprimée(s) avec succès!")
+        _purger_depuis_requete(request, 'depenses', "dépense(s) supprimée(s)")
     
     return redirect('accounts:admin_data_management')
 
@@ -259,11 +256,16 @@ def admin_reset_caisse(request):
         return redirect('accounts:dashboard')
     
     if request.method == 'POST':
-        from payments.models import Caisse
-        caisse = Caisse.get_instance()
-        old_solde = caisse.solde_actuel
-        caisse.solde_actuel = 0
-        caisse.save()
+        from payments.models import Caisse, TypeMouvement
+        from payments.mouvements import enregistrer_mouvement, solde_caisse
+        old_solde = Caisse.get_instance().solde_actuel
+        with transaction.atomic():
+            Caisse.reinitialiser()
+            # Le grand livre repart de zéro par un ajustement de l'ancien solde
+            solde = solde_caisse()
+            if solde:
+                enregistrer_mouvement(TypeMouvement.AJUSTEMENT, -solde,
+                                      libelle='Réinitialisation de la caisse', utilisateur=request.user)
         messages.success(request, f"Caisse réinitialisée! Ancien solde: {old_solde} GNF")
     
     return redirect('accounts:admin_data_management')
@@ -275,7 +277,9 @@ def export_excel_dashboard(request):
         messages.error(request, "Accès non autorisé.")
         return redirect('accounts:dashboard')
     
-    return export_dashboard_excel(request)
+    # Généré par le travailleur : la requête rend la main aussitôt
+    tache = mettre_en_file('dashboard_excel', utilisateur=request.user, jour=timezone.localdate().isoformat())
+    return redirect('accounts:tache_detail', tache_id=tache.id)
 
 @login_required
 def export_pdf_dashboard(request):
@@ -284,7 +288,85 @@ def export_pdf_dashboard(request):
         messages.error(request, "Accès non autorisé.")
         return redirect('accounts:dashboard')
     
-    return export_dashboard_pdf(request)
+    tache = mettre_en_file('dashboard_pdf', utilisateur=request.user, jour=timezone.localdate().isoformat())
+    return redirect('accounts:tache_detail', tache_id=tache.id)
+
+@admin_or_financial_required
+def export_excel_detail(request):
+    """
+    Classeur Excel détaillé d'une période (paiements, dépenses, lignes de
+    commande ; une feuille par jour ou par mois), préparé par le travailleur
+    """
+    from core.classeurs import DECOUPAGES
+    from core.exports import ExportInvalide, lire_periode
+    try:
+        debut, fin = lire_periode(request.GET)
+    except ExportInvalide as e:
+        messages.error(request, str(e))
+        return redirect('payments:rapport_paiements')
+    today = timezone.localdate()
+    debut = debut or today.replace(day=1)
+    fin = fin or today
+    decoupage = request.GET.get('decoupage') or None
+    if decoupage and decoupage not in DECOUPAGES:
+        messages.error(request, 'Découpage invalide (jour ou mois).')
+        return redirect('payments:rapport_paiements')
+    
+    tache = mettre_en_file('excel_detail', utilisateur=request.user, debut=debut.isoformat(),
+                           fin=fin.isoformat(), decoupage=decoupage)
+    return redirect('accounts:tache_detail', tache_id=tache.id)
+
+def _tache_visible(request, tache_id):
+    """Tâche demandée par l'utilisateur (toutes pour un administrateur)"""
+    taches = Tache.objects.defer('contenu')
+    if request.user.role != 'Radmin':
+        taches = taches.filter(utilisateur=request.user)
+    return get_object_or_404(taches, id=tache_id)
+
+def _statut_tache(tache):
+    return {
+        'id': tache.id,
+        'nom': tache.nom,
+        'etat': tache.etat,
+        'etat_libelle': tache.get_etat_display(),
+        'terminee': tache.terminee,
+        'tentatives': tache.tentatives,
+        'message': tache.message,
+        'fichier': tache.nom_fichier if tache.etat == EtatTache.TERMINEE else '',
+    }
+
+@login_required
+def tache_detail(request, tache_id):
+    """Suivi d'une tâche de fond, avec le lien de téléchargement une fois terminée"""
+    tache = _tache_visible(request, tache_id)
+    context = {
+        'tache': tache,
+        'statut': _statut_tache(tache),
+        'title': f'Tâche #{tache.id}'
+    }
+    return render(request, 'accounts/tache_detail.html', context)
+
+@login_required
+def tache_statut(request, tache_id):
+    """État d'une tâche de fond (JSON)"""
+    return JsonResponse(_statut_tache(_tache_visible(request, tache_id)))
+
+@login_required
+def tache_telecharger(request, tache_id):
+    """Télécharger le fichier produit par une tâche terminée"""
+    from core.exports import reponse_fichier
+    tache = _tache_visible(request, tache_id)
+    if tache.etat != EtatTache.TERMINEE or not tache.nom_fichier:
+        messages.error(request, "Ce document n'est pas encore disponible.")
+        return redirect('accounts:tache_detail', tache_id=tache.id)
+    type_contenu = tache.type_contenu or 'application/octet-stream'
+    if tache.fichier:
+        # Gros fichier : envoyé par morceaux depuis le disque
+        return reponse_fichier(request, tache.fichier.open('rb'), tache.nom_fichier, type_contenu)
+    contenu = Tache.objects.filter(id=tache.id).values_list('contenu', flat=True).get()
+    response = HttpResponse(bytes(contenu), content_type=type_contenu)
+    response['Content-Disposition'] = f'attachment; filename="{tache.nom_fichier}"'
+    return response
 
 @login_required
 def admin_edit_user(request, user_id):
@@ -3,6 +3,13 @@ ASGI config for restaurant_management project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Le flux temps réel des commandes (restaurant:flux_commandes) n'est servi
+que par ce point d'entrée : chaque client connecté n'y coûte qu'une tâche
+asyncio. Le diffuseur des événements (orders/events.py) étant en mémoire,
+lancer un seul worker, par exemple :
+
+    gunicorn core.asgi:application -k uvicorn.workers.UvicornWorker --workers 1
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 """
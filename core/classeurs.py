@@ -0,0 +1,269 @@
+"""
+Classeurs Excel détaillés, écrits en flux (openpyxl en mode write-only).
+
+Un Workbook ordinaire garde toutes ses cellules en mémoire. Ici chaque ligne
+est écrite dès qu'elle est lue (QuerySet.iterator par lots, voir
+core.exports) dans le fichier temporaire de sa feuille, en chaînes en ligne
+sans table partagée : la mémoire ne dépend pas du nombre de lignes. Les
+styles sont déclarés une fois par classeur (styles nommés) et chaque colonne
+stylée réutilise la même cellule d'une ligne à l'autre.
+
+Le classeur contient une feuille Résumé (une ligne par période, tirée des
+bilans journaliers) puis une feuille par jour ou par mois : paiements,
+dépenses et lignes de commande de la période.
+"""
+from datetime import datetime, timedelta
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, NamedStyle, PatternFill
+from openpyxl.utils import get_column_letter
+from django.utils import timezone
+
+
+DECOUPAGES = ('jour', 'mois')
+
+# Au-delà, une feuille par mois plutôt que par jour
+JOURS_MAX_DECOUPAGE_JOUR = 31
+
+BLEU = '2E86AB'
+
+# Nom -> (police, remplissage, format de nombre, alignement)
+_STYLES = {
+    'titre': (Font(bold=True, size=14, color=BLEU), None, 'General', None),
+    'section': (Font(bold=True, size=12, color=BLEU), None, 'General', None),
+    'entete': (Font(bold=True, color='FFFFFF'), PatternFill('solid', start_color=BLEU, end_color=BLEU),
+               'General', Alignment(horizontal='center')),
+    'montant': (Font(), None, '#,##0', None),
+    'date': (Font(), None, 'DD/MM/YYYY', None),
+    'date_heure': (Font(), None, 'DD/MM/YYYY HH:MM:SS', None),
+}
+
+
+def _parametres(debut, fin):
+    return {'date_debut': debut.isoformat(), 'date_fin': fin.isoformat()}
+
+
+def _paiements(debut, fin):
+    from payments.exports import enregistrements, paiements_filtres
+    return enregistrements(paiements_filtres(_parametres(debut, fin)))
+
+
+def _depenses(debut, fin):
+    from expenses.exports import depenses_filtrees, enregistrements
+    return enregistrements(depenses_filtrees(_parametres(debut, fin)))
+
+
+def _lignes_commande(debut, fin):
+    from orders.exports import commandes_filtrees, enregistrements_csv
+    return enregistrements_csv(commandes_filtrees(_parametres(debut, fin)))
+
+
+# Sections d'une feuille de période : (titre, source(debut, fin) -> dictionnaires,
+# [(clé, libellé, style, largeur)])
+SECTIONS = [
+    ('Paiements', _paiements, [
+        ('id', 'ID', None, 8),
+        ('date_paiement', 'Date', 'date_heure', 20),
+        ('commande', 'Commande', None, 11),
+        ('table', 'Table', None, 10),
+        ('methode', 'Méthode', None, 15),
+        ('montant', 'Montant (GNF)', 'montant', 15),
+        ('caissier', 'Caissier', None, 15),
+    ]),
+    ('Dépenses', _depenses, [
+        ('id', 'ID', None, 8),
+        ('date_depense', 'Date', 'date', 20),
+        ('categorie', 'Catégorie', None, 15),
+        ('description', 'Description', None, 30),
+        ('montant', 'Montant (GNF)', 'montant', 15),
+        ('utilisateur', 'Utilisateur', None, 15),
+    ]),
+    ('Lignes de commande', _lignes_commande, [
+        ('id', 'Commande', None, 8),
+        ('date_commande', 'Date', 'date_heure', 20),
+        ('table', 'Table', None, 11),
+        ('serveur', 'Serveur', None, 10),
+        ('etat', 'État', None, 15),
+        ('total', 'Total commande', 'montant', 15),
+        ('plat', 'Plat', None, 15),
+        ('quantite', 'Quantité', None, 10),
+        ('prix_unitaire', 'Prix unitaire', 'montant', 15),
+        ('sous_total', 'Sous-total', 'montant', 15),
+    ]),
+]
+
+COLONNES_RESUME = [
+    ('Période', None, 14), ('Paiements', None, 11), ('Entrées (GNF)', 'montant', 16),
+    ('Dépenses', None, 11), ('Sorties (GNF)', 'montant', 16), ('Solde (GNF)', 'montant', 16),
+    ('Commandes', None, 11), ('Chiffre commandes (GNF)', 'montant', 22),
+]
+
+
+def decoupage_par_defaut(debut, fin):
+    """Une feuille par jour jusqu'à un mois, par mois au-delà"""
+    return 'jour' if (fin - debut).days < JOURS_MAX_DECOUPAGE_JOUR else 'mois'
+
+
+def periodes(debut, fin, decoupage):
+    """(nom de feuille, premier jour, dernier jour) des périodes couvrant debut à fin"""
+    resultat = []
+    jour = debut
+    while jour <= fin:
+        if decoupage == 'jour':
+            dernier = jour
+            nom = jour.isoformat()
+        else:
+            mois_suivant = (jour.replace(day=1) + timedelta(days=32)).replace(day=1)
+            dernier = min(mois_suivant - timedelta(days=1), fin)
+            nom = jour.strftime('%Y-%m')
+        resultat.append((nom, jour, dernier))
+        jour = dernier + timedelta(days=1)
+    return resultat
+
+
+def _valeur(valeur):
+    """Valeur acceptée par Excel : datetimes en heure locale, sans fuseau"""
+    if isinstance(valeur, datetime) and valeur.tzinfo is not None:
+        return timezone.localtime(valeur).replace(tzinfo=None)
+    return valeur
+
+
+class _Feuille:
+    """Feuille write-only avec une cellule stylée réutilisable par style"""
+
+    def __init__(self, classeur, titre, largeurs):
+        self.feuille = classeur.create_sheet(title=titre)
+        for colonne, largeur in enumerate(largeurs, 1):
+            self.feuille.column_dimensions[get_column_letter(colonne)].width = largeur
+        self._cellules = {}
+        self.lignes = 0
+
+    def cellule(self, style, valeur):
+        """Cellule stylée partagée : sa valeur est sérialisée avant la ligne suivante"""
+        cellule = self._cellules.get(style)
+        if cellule is None:
+            cellule = self._cellules[style] = WriteOnlyCell(self.feuille)
+            cellule.style = style
+        cellule.value = valeur
+        return cellule
+
+    def ajouter(self, valeurs):
+        self.feuille.append(valeurs)
+
+    def titre(self, texte, style='titre'):
+        self.ajouter([self.cellule(style, texte)])
+
+    def entetes(self, libelles):
+        # Une cellule par en-tête : les cellules partagées ne valent que pour
+        # des colonnes distinctes d'une même ligne
+        ligne = []
+        for libelle in libelles:
+            cellule = WriteOnlyCell(self.feuille, value=libelle)
+            cellule.style = 'entete'
+            ligne.append(cellule)
+        self.ajouter(ligne)
+
+    def donnees(self, colonnes, enregistrements):
+        """Une ligne par enregistrement ; retourne le nombre de lignes écrites"""
+        # Une cellule partagée par colonne stylée (une même ligne peut
+        # contenir plusieurs montants)
+        cellules = [(cle, WriteOnlyCell(self.feuille) if style else None, style) for cle, _, style, _ in colonnes]
+        for _, cellule, style in cellules:
+            if cellule is not None:
+                cellule.style = style
+        nombre = 0
+        for enregistrement in enregistrements:
+            ligne = []
+            for cle, cellule, _ in cellules:
+                valeur = _valeur(enregistrement.get(cle))
+                if cellule is not None and valeur is not None:
+                    cellule.value = valeur
+                    ligne.append(cellule)
+                else:
+                    ligne.append(valeur)
+            self.ajouter(ligne)
+            nombre += 1
+        self.lignes += nombre
+        return nombre
+
+
+def _styles(classeur):
+    for nom, (police, remplissage, format_nombre, alignement) in _STYLES.items():
+        style = NamedStyle(name=nom, font=police, number_format=format_nombre)
+        if remplissage is not None:
+            style.fill = remplissage
+        if alignement is not None:
+            style.alignment = alignement
+        classeur.add_named_style(style)
+
+
+def _resume(debut, fin, decoupage):
+    """Totaux par période, à partir des bilans journaliers (une lecture)"""
+    from payments.models import BilanJournalier
+    totaux = {}
+    bilans = (BilanJournalier.objects
+              .filter(jour__gte=debut, jour__lte=fin)
+              .values_list('jour', 'nb_paiements', 'total_entrees', 'nb_depenses', 'total_sorties',
+                           'nb_commandes', 'chiffre_commandes'))
+    for jour, *valeurs in bilans:
+        cle = jour.isoformat() if decoupage == 'jour' else jour.strftime('%Y-%m')
+        cumul = totaux.setdefault(cle, [0] * len(valeurs))
+        for i, valeur in enumerate(valeurs):
+            cumul[i] += valeur
+    return totaux
+
+
+def ecrire_classeur(destination, debut, fin, decoupage=None, sections=None):
+    """
+    Écrit dans `destination` (chemin ou fichier binaire) le classeur détaillé
+    des jours debut à fin inclus ; retourne {'feuilles', 'lignes'}
+
+    `sections` remplace SECTIONS (mêmes tuples), par exemple pour mesurer
+    l'écriture sur des données générées.
+    """
+    decoupage = decoupage or decoupage_par_defaut(debut, fin)
+    if decoupage not in DECOUPAGES:
+        raise ValueError(f'Découpage inconnu : {decoupage} (jour ou mois)')
+    sections = SECTIONS if sections is None else sections
+    liste = periodes(debut, fin, decoupage)
+
+    classeur = Workbook(write_only=True)
+    _styles(classeur)
+
+    # Résumé
+    resume = _Feuille(classeur, 'Résumé', [largeur for _, _, largeur in COLONNES_RESUME])
+    resume.titre(f"Détail du {debut.strftime('%d/%m/%Y')} au {fin.strftime('%d/%m/%Y')}")
+    resume.ajouter([f"Généré le {timezone.localtime().strftime('%d/%m/%Y %H:%M:%S')}"])
+    resume.ajouter([])
+    resume.entetes([libelle for libelle, _, _ in COLONNES_RESUME])
+    totaux = _resume(debut, fin, decoupage)
+    lignes_resume = []
+    for nom, _, _ in liste:
+        nb_p, entrees, nb_d, sorties, nb_c, chiffre = totaux.get(nom, (0,) * 6)
+        lignes_resume.append({
+            'Période': nom, 'Paiements': nb_p, 'Entrées (GNF)': entrees, 'Dépenses': nb_d,
+            'Sorties (GNF)': sorties, 'Solde (GNF)': entrees - sorties,
+            'Commandes': nb_c, 'Chiffre commandes (GNF)': chiffre,
+        })
+    resume.donnees([(libelle, libelle, style, largeur) for libelle, style, largeur in COLONNES_RESUME],
+                   lignes_resume)
+
+    # Une feuille par période
+    lignes = 0
+    largeurs = [max(colonnes[i][3] if i < len(colonnes) else 0 for _, _, colonnes in sections)
+                for i in range(max(len(colonnes) for _, _, colonnes in sections))]
+    for nom, premier, dernier in liste:
+        feuille = _Feuille(classeur, nom, largeurs)
+        if premier == dernier:
+            feuille.titre(f"Détail du {premier.strftime('%d/%m/%Y')}")
+        else:
+            feuille.titre(f"Détail du {premier.strftime('%d/%m/%Y')} au {dernier.strftime('%d/%m/%Y')}")
+        for titre, source, colonnes in sections:
+            feuille.ajouter([])
+            feuille.titre(titre, style='section')
+            feuille.entetes([libelle for _, libelle, _, _ in colonnes])
+            feuille.donnees(colonnes, source(premier, dernier))
+        lignes += feuille.lignes
+
+    classeur.save(destination)
+    return {'feuilles': len(liste) + 1, 'lignes': lignes}
@@ -0,0 +1,374 @@
+"""
+Moteur de documents PDF (reportlab) : reçus, factures et rapports.
+
+Les feuilles de styles, styles de paragraphes et de tableaux sont préparés
+une seule fois par processus (styles()). Chaque mise en page est un gabarit
+enregistré par @gabarit : une fonction qui reçoit un dictionnaire de données
+déjà calculées et retourne la liste des éléments (story) du document.
+
+    rendre('recu', donnees) -> bytes
+
+Les données sont préparées par les applications (payments.documents,
+accounts.pdf_utils) ; ce module n'interroge jamais la base.
+"""
+import io
+from functools import cache
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_LEFT
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+
+
+BLEU = colors.HexColor('#2E86AB')
+
+# Coordonnées imprimées en tête des reçus et factures
+RESTAURANT = [
+    "RESTAURANT",
+    "Adresse complète du restaurant",
+    "Téléphone: +224 XXX XXX XXX",
+    "Email: contact@restaurant.com",
+    "NIF: XXXXXXXXX | RCCM: XXXXXXXXX",
+]
+
+_GABARITS = {}
+
+
+class GabaritInconnu(KeyError):
+    """Aucun gabarit enregistré sous ce nom"""
+
+
+def gabarit(nom, marges=20):
+    """Enregistre une fonction donnees -> story comme gabarit `nom`"""
+    def enregistrer(fonction):
+        _GABARITS[nom] = (fonction, marges)
+        return fonction
+    return enregistrer
+
+
+def rendre(nom, donnees):
+    """PDF (bytes) du gabarit `nom` rempli avec `donnees`"""
+    try:
+        fonction, marges = _GABARITS[nom]
+    except KeyError:
+        raise GabaritInconnu(nom)
+    haut, droite, bas, gauche = marges if isinstance(marges, tuple) else (marges,) * 4
+    tampon = io.BytesIO()
+    document = SimpleDocTemplate(
+        tampon, pagesize=A4, topMargin=haut, rightMargin=droite, bottomMargin=bas, leftMargin=gauche,
+        # Pas d'horodatage ni d'identifiant aléatoire : mêmes données, mêmes octets
+        invariant=1,
+    )
+    document.build(fonction(donnees))
+    return tampon.getvalue()
+
+
+def montant(valeur, decimales=True):
+    """Montant en GNF avec séparateur de milliers"""
+    return f"{valeur:,} GNF" if decimales else f"{valeur:,.0f} GNF"
+
+
+@cache
+def styles():
+    """Styles partagés par tous les gabarits, construits au premier appel"""
+    base = getSampleStyleSheet()
+
+    def paragraphe(nom, parent, **options):
+        return ParagraphStyle(nom, parent=base[parent], **options)
+
+    return {
+        'normal': base['Normal'],
+        # Reçus et factures
+        'titre': paragraphe('Titre', 'Heading1', fontSize=28, spaceAfter=15, alignment=TA_CENTER,
+                            textColor=colors.black, fontName='Helvetica-Bold'),
+        'sous_titre': paragraphe('SousTitre', 'Normal', fontSize=12, spaceAfter=20, alignment=TA_CENTER,
+                                 textColor=colors.grey, fontName='Helvetica'),
+        'section': paragraphe('Section', 'Heading2', fontSize=14, spaceAfter=8, spaceBefore=12,
+                              alignment=TA_LEFT, textColor=colors.black, fontName='Helvetica-Bold'),
+        'pied': paragraphe('Pied', 'Normal', fontSize=9, spaceBefore=25, alignment=TA_CENTER,
+                           textColor=colors.grey, fontName='Helvetica'),
+        # Rapports
+        'rapport_titre': paragraphe('RapportTitre', 'Heading1', fontSize=20, spaceAfter=30,
+                                    alignment=TA_CENTER, textColor=BLEU),
+        'rapport_section': paragraphe('RapportSection', 'Heading2', fontSize=16, spaceAfter=20, textColor=BLEU),
+        'rapport_rubrique': paragraphe('RapportRubrique', 'Heading3', fontSize=14, spaceAfter=12, textColor=BLEU),
+        # Tableaux
+        'tableau_restaurant': TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 11),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ]),
+        'tableau_donnees': TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+            ('TOPPADDING', (0, 0), (-1, -1), 6),
+            ('LINEBELOW', (0, 0), (-1, 0), 1, colors.lightgrey),
+            ('LINEABOVE', (0, -1), (-1, -1), 1, colors.black),
+        ]),
+        'tableau_articles': TableStyle([
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 9),
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 1), (-1, -1), 9),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
+            ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),
+            ('ALIGN', (3, 0), (-1, -1), 'RIGHT'),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+            ('TOPPADDING', (0, 0), (-1, -1), 5),
+            ('LINEBELOW', (0, 0), (-1, 0), 1, colors.lightgrey),
+            ('LINEABOVE', (0, 0), (-1, 0), 1, colors.black),
+            ('LINEBELOW', (0, -1), (-1, -1), 1, colors.black),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.whitesmoke),
+            # Ligne de total
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, -1), (-1, -1), 14),
+            ('BOTTOMPADDING', (0, -1), (-1, -1), 12),
+            ('TOPPADDING', (0, -1), (-1, -1), 12),
+            ('BACKGROUND', (0, -1), (-1, -1), colors.lightgreen),
+            ('LINEABOVE', (0, -1), (-1, -1), 2, colors.green),
+        ]),
+        'tableau_cachet': TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('LINEBELOW', (0, 0), (-1, -1), 1, colors.lightgrey),
+            ('LINEABOVE', (0, 0), (-1, -1), 1, colors.lightgrey),
+            ('PADDING', (0, 0), (-1, -1), 20),
+        ]),
+        'tableau_statistiques': TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), BLEU),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ]),
+        'solde_positif': TableStyle([
+            ('BACKGROUND', (0, -1), (2, -1), colors.HexColor('#D4EDDA')),
+            ('TEXTCOLOR', (0, -1), (2, -1), colors.HexColor('#155724')),
+        ]),
+        'solde_negatif': TableStyle([
+            ('BACKGROUND', (0, -1), (2, -1), colors.HexColor('#F8D7DA')),
+            ('TEXTCOLOR', (0, -1), (2, -1), colors.HexColor('#721C24')),
+        ]),
+        'tableau_paiements': _style_liste('#28A745'),
+        'tableau_depenses': _style_liste('#DC3545'),
+    }
+
+
+def _style_liste(couleur):
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor(couleur)),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#F8F9FA')),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('FONTSIZE', (0, 1), (-1, -1), 8),
+    ])
+
+
+def _tableau(lignes, largeurs, *noms_styles):
+    tableau = Table(lignes, colWidths=[l * inch for l in largeurs])
+    for nom in noms_styles:
+        tableau.setStyle(styles()[nom])
+    return tableau
+
+
+def _pourcentage(partie, total):
+    return f"{(partie / total * 100):.1f}%" if total > 0 else "0%"
+
+
+def _en_tete_piece(titre, sous_titre):
+    """En-tête commun des reçus et factures"""
+    s = styles()
+    return [
+        Paragraph(titre, s['titre']),
+        Paragraph(sous_titre, s['sous_titre']),
+        Spacer(1, 10),
+        _tableau([[ligne, ""] for ligne in RESTAURANT], [4, 2], 'tableau_restaurant'),
+        Spacer(1, 12),
+    ]
+
+
+def _articles(lignes, total):
+    entete = [["Article", "Quantité", "Prix unitaire", "Total"]]
+    corps = [[nom[:25], str(quantite), montant(prix), montant(sous_total)]
+             for nom, quantite, prix, sous_total in lignes]
+    return _tableau(entete + corps + [["", "", "TOTAL:", montant(total)]],
+                    [3.2, 1, 1.4, 1.4], 'tableau_articles')
+
+
+@gabarit('recu')
+def recu(d):
+    """
+    Reçu de paiement d'une page : paiement_id, commande_id, table, date_commande,
+    serveur, lignes [(nom, quantité, prix, sous-total)], total, methode,
+    montant, date_paiement, caissier, genere_le
+    """
+    s = styles()
+    return _en_tete_piece("REÇU DE PAIEMENT", f"Reçu #{d['paiement_id']}") + [
+        Paragraph("INFORMATIONS DE LA COMMANDE", s['section']),
+        _tableau([
+            ["Numéro de commande:", f"#{d['commande_id']}"],
+            ["Table:", f"Table {d['table']}"],
+            ["Date:", d['date_commande'].strftime('%d/%m/%Y à %H:%M')],
+            ["Serveur:", d['serveur'] or "N/A"],
+        ], [3.5, 2.5], 'tableau_donnees'),
+        Spacer(1, 12),
+        Paragraph("DÉTAIL DES ARTICLES", s['section']),
+        # Limité pour tenir sur une page
+        _articles(d['lignes'][:6], d['total']),
+        Spacer(1, 15),
+        Paragraph("INFORMATIONS DE PAIEMENT", s['section']),
+        _tableau([
+            ["Méthode de paiement:", d['methode']],
+            ["Montant payé:", montant(d['montant'])],
+            ["Date de paiement:", d['date_paiement'].strftime('%d/%m/%Y à %H:%M')],
+            ["Caissier:", d['caissier'] or "N/A"],
+        ], [3.5, 2.5], 'tableau_donnees'),
+        Spacer(1, 20),
+        _tableau([["", ""]], [3, 3], 'tableau_cachet'),
+        Paragraph("CACHET ET SIGNATURE", s['sous_titre']),
+        Paragraph("MERCI POUR VOTRE CONFIANCE !", s['pied']),
+        Paragraph("Ce reçu est généré automatiquement et constitue une preuve de paiement valide.", s['pied']),
+        Paragraph(f"Document généré le {d['genere_le'].strftime('%d/%m/%Y %H:%M:%S')}", s['pied']),
+    ]
+
+
+@gabarit('facture')
+def facture(d):
+    """Facture client : mêmes données que le reçu, toutes les lignes de la commande"""
+    s = styles()
+    return _en_tete_piece("FACTURE", f"Facture #{d['paiement_id']}") + [
+        _tableau([
+            ["N° Commande:", f"#{d['commande_id']}"],
+            ["Table:", d['table']],
+            ["Date:", d['date_paiement'].strftime('%d/%m/%Y %H:%M')],
+            ["Caissier:", d['caissier'] or "N/A"],
+        ], [3.5, 2.5], 'tableau_donnees'),
+        Spacer(1, 12),
+        Paragraph("DÉTAIL DE LA COMMANDE", s['section']),
+        _articles(d['lignes'], d['montant']),
+        Spacer(1, 15),
+        _tableau([
+            ["Moyen de paiement:", d['methode']],
+            ["Montant reçu:", montant(d['montant'])],
+        ], [3.5, 2.5], 'tableau_donnees'),
+        Paragraph("MERCI DE VOTRE VISITE !", s['pied']),
+        Paragraph("Au plaisir de vous revoir", s['pied']),
+        Paragraph("Facture établie par le système de gestion Restaurant", s['pied']),
+    ]
+
+
+def _liste_paiements(paiements):
+    """Tableau des paiements : (id, commande_id, montant, méthode, heure)"""
+    s = styles()
+    if not paiements:
+        return Paragraph("Aucun paiement ce jour", s['normal'])
+    lignes = [['ID', 'Commande', 'Montant', 'Méthode', 'Heure']] + [
+        [str(id_), f"#{commande_id}", montant(m, False), methode, heure.strftime('%H:%M:%S')]
+        for id_, commande_id, m, methode, heure in paiements
+    ]
+    return _tableau(lignes, [0.8, 0.8, 1.2, 1.2, 1], 'tableau_paiements')
+
+
+def _liste_depenses(depenses):
+    """Tableau des dépenses : (id, description, montant, utilisateur)"""
+    s = styles()
+    if not depenses:
+        return Paragraph("Aucune dépense ce jour", s['normal'])
+    lignes = [['ID', 'Description', 'Montant', 'Utilisateur']] + [
+        [str(id_), description[:30] + '...' if len(description) > 30 else description,
+         montant(m, False), utilisateur or "N/A"]
+        for id_, description, m, utilisateur in depenses
+    ]
+    return _tableau(lignes, [0.8, 2, 1.2, 1.2], 'tableau_depenses')
+
+
+def _transactions(d, titre):
+    s = styles()
+    return [
+        Paragraph(titre, s['rapport_section']),
+        Paragraph("Paiements", s['rapport_rubrique']),
+        _liste_paiements(d['paiements']),
+        Spacer(1, 15),
+        Paragraph("Dépenses", s['rapport_rubrique']),
+        _liste_depenses(d['depenses']),
+        Spacer(1, 30),
+        Paragraph("Rapport généré automatiquement par Restaurant Management System", s['normal']),
+    ]
+
+
+@gabarit('tableau_de_bord', marges=(72, 72, 18, 72))
+def tableau_de_bord(d):
+    """
+    Rapport du tableau de bord : jour, genere_le, commandes, plats,
+    paiements_jour, depenses_jour, caisse, paiements, depenses
+    """
+    s = styles()
+    commandes, plats, caisse = d['commandes'], d['plats'], d['caisse']
+    lignes = [
+        ['Catégorie', 'Indicateur', 'Valeur', 'Détails'],
+        ['Commandes', 'Total', str(commandes['nombre']), ''],
+        ['', 'En cours', str(commandes['en_cours']), _pourcentage(commandes['en_cours'], commandes['nombre'])],
+        ['', 'Terminées', str(commandes['terminees']), _pourcentage(commandes['terminees'], commandes['nombre'])],
+        ['Plats', 'Total', str(plats['nombre']), ''],
+        ['', 'Disponibles', str(plats['disponibles']), _pourcentage(plats['disponibles'], plats['nombre'])],
+        ['Paiements du jour', 'Nombre', str(d['paiements_jour']['nombre']), ''],
+        ['', 'Montant total', montant(d['paiements_jour']['total'], False), ''],
+        ['Dépenses du jour', 'Nombre', str(d['depenses_jour']['nombre']), ''],
+        ['', 'Montant total', montant(d['depenses_jour']['total'], False), ''],
+        ['Caisse', 'Total entrées', montant(caisse['entrees'], False), ''],
+        ['', 'Total sorties', montant(caisse['sorties'], False), ''],
+        ['', 'Solde actuel', montant(caisse['solde'], False), 'POSITIF' if caisse['solde'] >= 0 else 'NÉGATIF'],
+    ]
+    solde = 'solde_positif' if caisse['solde'] >= 0 else 'solde_negatif'
+    return [
+        Paragraph("RAPPORT DASHBOARD RESTAURANT", s['rapport_titre']),
+        Paragraph(f"Date: {d['jour'].strftime('%d/%m/%Y')}", s['normal']),
+        Paragraph(f"Généré le {d['genere_le'].strftime('%d/%m/%Y %H:%M:%S')}", s['normal']),
+        Spacer(1, 20),
+        Paragraph("STATISTIQUES GLOBALES", s['rapport_section']),
+        _tableau(lignes, [1.5, 1.5, 1.2, 1.2], 'tableau_statistiques', solde),
+        Spacer(1, 20),
+    ] + _transactions(d, "TRANSACTIONS DU JOUR")
+
+
+@gabarit('rapport_journalier', marges=(72, 72, 18, 72))
+def rapport_journalier(d):
+    """
+    Rapport journalier de caisse : jour, genere_le, entrees, sorties,
+    nb_paiements, nb_depenses, solde_jour, solde_cumul, paiements, depenses
+    """
+    s = styles()
+    lignes = [
+        ['Rubrique', 'Indicateur', 'Valeur'],
+        ['Entrées', f"{d['nb_paiements']} paiement(s)", montant(d['entrees'], False)],
+        ['Sorties', f"{d['nb_depenses']} dépense(s)", montant(d['sorties'], False)],
+        ['Journée', 'Solde du jour', montant(d['solde_jour'], False)],
+        ['Caisse', 'Solde en fin de journée', montant(d['solde_cumul'], False)],
+    ]
+    solde = 'solde_positif' if d['solde_cumul'] >= 0 else 'solde_negatif'
+    return [
+        Paragraph("RAPPORT JOURNALIER DE CAISSE", s['rapport_titre']),
+        Paragraph(f"Date: {d['jour'].strftime('%d/%m/%Y')}", s['normal']),
+        Paragraph(f"Généré le {d['genere_le'].strftime('%d/%m/%Y %H:%M:%S')}", s['normal']),
+        Spacer(1, 20),
+        Paragraph("BILAN DE LA JOURNÉE", s['rapport_section']),
+        _tableau(lignes, [1.5, 2.2, 1.7], 'tableau_statistiques', solde),
+        Spacer(1, 20),
+    ] + _transactions(d, "TRANSACTIONS DE LA JOURNÉE")
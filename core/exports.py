@@ -0,0 +1,181 @@
+"""
+Exports en flux (CSV ou JSON Lines) de l'historique.
+
+Les lignes sont lues par lots (QuerySet.iterator(chunk_size=TAILLE_LOT)) et
+écrites une à une dans un StreamingHttpResponse ou un fichier : la mémoire
+utilisée ne dépend pas de la longueur de la période exportée. Sous ASGI,
+Django lirait un itérateur synchrone en entier avant d'envoyer quoi que ce
+soit : la réponse reçoit alors un itérateur asynchrone qui tire les lignes
+par lots dans le thread de la requête (flux_asynchrone). Il en va de même
+des fichiers déjà produits sur disque (reponse_fichier).
+
+Chaque jeu (paiements, commandes, dépenses) fournit ses colonnes, une
+fonction de filtrage qui lit les mêmes paramètres que ses listes et
+rapports, et un générateur d'enregistrements (dictionnaires).
+"""
+import csv
+import json
+from datetime import datetime
+from importlib import import_module
+from itertools import islice
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import content_disposition_header
+
+
+# Lignes lues par aller-retour avec la base
+TAILLE_LOT = 2000
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+# Jeu exporté -> module qui le décrit (fonction preparer(parametres, format))
+JEUX = {
+    'paiements': 'payments.exports',
+    'commandes': 'orders.exports',
+    'depenses': 'expenses.exports',
+}
+
+
+class ExportInvalide(ValueError):
+    """Format ou paramètre d'export invalide"""
+
+
+class _Tampon:
+    """Pseudo-fichier pour csv.writer : write() retourne la ligne au lieu de la stocker"""
+
+    def write(self, valeur):
+        return valeur
+
+
+def lire_date(valeur):
+    """Date au format YYYY-MM-DD, ou None si absente"""
+    if not valeur:
+        return None
+    try:
+        return datetime.strptime(valeur, '%Y-%m-%d').date()
+    except ValueError:
+        raise ExportInvalide(f'Date invalide : {valeur} (format attendu YYYY-MM-DD)')
+
+
+def lire_periode(parametres):
+    """
+    Période (debut, fin) demandée : date=jour, ou date_debut/date_fin comme
+    les rapports ; chaque borne peut manquer
+    """
+    jour = lire_date(parametres.get('date'))
+    if jour:
+        return jour, jour
+    debut = lire_date(parametres.get('date_debut'))
+    fin = lire_date(parametres.get('date_fin'))
+    if debut and fin and debut > fin:
+        raise ExportInvalide('La date de début est postérieure à la date de fin.')
+    return debut, fin
+
+
+def _cellule(valeur):
+    if valeur is None:
+        return ''
+    if isinstance(valeur, datetime):
+        return timezone.localtime(valeur).strftime('%Y-%m-%d %H:%M:%S')
+    return valeur
+
+
+def flux_csv(colonnes, enregistrements):
+    """Lignes CSV (séparateur ;, BOM pour Excel) : une par enregistrement"""
+    ecrivain = csv.writer(_Tampon(), delimiter=';')
+    yield '\ufeff' + ecrivain.writerow(colonnes)
+    for enregistrement in enregistrements:
+        yield ecrivain.writerow([_cellule(enregistrement.get(c)) for c in colonnes])
+
+
+def flux_jsonl(enregistrements):
+    """Un objet JSON par ligne"""
+    for enregistrement in enregistrements:
+        yield json.dumps(enregistrement, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def preparer(jeu, parametres, format):
+    """(colonnes, enregistrements) du jeu filtré par `parametres` (QueryDict ou dict)"""
+    if format not in FORMATS:
+        raise ExportInvalide(f'Format inconnu : {format} (csv ou jsonl)')
+    return import_module(JEUX[jeu]).preparer(parametres, format)
+
+
+def flux(jeu, parametres, format):
+    """Lignes (texte) de l'export du jeu au format demandé"""
+    colonnes, enregistrements = preparer(jeu, parametres, format)
+    if format == 'csv':
+        return flux_csv(colonnes, enregistrements)
+    return flux_jsonl(enregistrements)
+
+
+async def flux_asynchrone(lignes, taille=TAILLE_LOT):
+    """
+    Itérateur asynchrone sur un flux synchrone de lignes (texte) : chaque lot
+    est lu par sync_to_async dans le thread de la requête, qui détient la
+    connexion à la base, et envoyé d'un bloc
+    """
+    lignes = iter(lignes)
+    lire = sync_to_async(lambda: list(islice(lignes, taille)), thread_sensitive=True)
+    try:
+        while lot := await lire():
+            yield ''.join(lot).encode('utf-8')
+    finally:
+        # Client parti en cours de route : libère le curseur du générateur
+        if hasattr(lignes, 'close'):
+            await sync_to_async(lignes.close, thread_sensitive=True)()
+
+
+def reponse_flux(requete, lignes, content_type):
+    """StreamingHttpResponse sur des lignes de texte, asynchrone sous ASGI"""
+    if isinstance(requete, ASGIRequest):
+        contenu = flux_asynchrone(lignes)
+    else:
+        contenu = (ligne.encode('utf-8') for ligne in lignes)
+    return StreamingHttpResponse(contenu, content_type=content_type)
+
+
+async def fichier_asynchrone(fichier, taille=FileResponse.block_size):
+    """
+    Itérateur asynchrone sur un fichier ouvert en binaire, lu par morceaux
+    hors de la boucle d'événements ; le fichier est fermé à la fin
+    """
+    lire = sync_to_async(fichier.read, thread_sensitive=False)
+    try:
+        while bloc := await lire(taille):
+            yield bloc
+    finally:
+        await sync_to_async(fichier.close, thread_sensitive=False)()
+
+
+def reponse_fichier(requete, fichier, nom_fichier, content_type):
+    """
+    Fichier (déjà ouvert, en binaire) en pièce jointe : FileResponse sous
+    WSGI, itérateur asynchrone sous ASGI
+    """
+    if not isinstance(requete, ASGIRequest):
+        return FileResponse(fichier, as_attachment=True, filename=nom_fichier, content_type=content_type)
+    reponse = StreamingHttpResponse(fichier_asynchrone(fichier), content_type=content_type)
+    reponse['Content-Length'] = fichier.size
+    reponse['Content-Disposition'] = content_disposition_header(True, nom_fichier)
+    return reponse
+
+
+def reponse_export(requete, jeu):
+    """
+    StreamingHttpResponse en pièce jointe jeu_AAAAMMJJ_HHMM.format, filtrée par
+    les paramètres GET (format=csv par défaut, ou jsonl)
+    """
+    format = requete.GET.get('format', 'csv')
+    lignes = flux(jeu, requete.GET, format)
+    reponse = reponse_flux(requete, lignes, FORMATS[format])
+    horodatage = timezone.localtime().strftime('%Y%m%d_%H%M')
+    reponse['Content-Disposition'] = f'attachment; filename="{jeu}_{horodatage}.{format}"'
+    return reponse
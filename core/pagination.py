@@ -0,0 +1,243 @@
+"""
+Pagination par curseur (keyset) pour les listes d'historique.
+
+Au lieu d'un OFFSET, chaque page reprend après la dernière ligne affichée :
+WHERE (date, id) < (date_derniere, id_derniere) ORDER BY date DESC, id DESC
+LIMIT n. Le coût d'une page ne dépend pas de sa position dans l'historique
+et l'ordre reste stable grâce à l'identifiant en dernier critère.
+
+Le nombre total de lignes est facultatif : exact (COUNT), approché
+(estimation du planificateur PostgreSQL, sinon comptage plafonné) ou absent.
+"""
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connections
+from django.db.models import F, Q
+
+
+# Au-delà, le comptage approché s'arrête (total affiché comme approché)
+PLAFOND_COMPTAGE = 1000
+
+
+class CurseurInvalide(ValueError):
+    """Curseur de page illisible ou incompatible avec le tri demandé"""
+
+
+class PageCurseur:
+    """
+    Une page de résultats : itérable comme une liste, avec les liens vers les
+    pages voisines (url_suivante, url_precedente) et le total éventuel
+    """
+
+    def __init__(self, objets, suivant, precedent, requete, parametre, total=None, total_approche=False):
+        self.objets = objets
+        self.suivant = suivant
+        self.precedent = precedent
+        self.total = total
+        self.total_approche = total_approche
+        self._requete = requete
+        self._parametre = parametre
+
+    def __iter__(self):
+        return iter(self.objets)
+
+    def __len__(self):
+        return len(self.objets)
+
+    def __bool__(self):
+        return bool(self.objets)
+
+    def __getitem__(self, index):
+        return self.objets[index]
+
+    @property
+    def has_other_pages(self):
+        return bool(self.suivant or self.precedent)
+
+    def _url(self, curseur):
+        parametres = self._requete.GET.copy()
+        parametres[self._parametre] = curseur
+        return f'?{parametres.urlencode()}'
+
+    @property
+    def url_suivante(self):
+        return self._url(self.suivant) if self.suivant else None
+
+    @property
+    def url_precedente(self):
+        return self._url(self.precedent) if self.precedent else None
+
+
+def _normaliser_tri(tri):
+    """[(champ, descendant), ...] terminé par l'identifiant, pour un ordre total"""
+    criteres = [(c.lstrip('-'), c.startswith('-')) for c in tri]
+    if criteres[-1][0] not in ('id', 'pk'):
+        criteres.append(('id', criteres[-1][1]))
+    return criteres
+
+
+def _ordre(criteres, inverse=False):
+    """Expressions order_by ; les NULL sont toujours traités comme les plus petites valeurs"""
+    expressions = []
+    for champ, descendant in criteres:
+        if descendant != inverse:
+            expressions.append(F(champ).desc(nulls_last=True))
+        else:
+            expressions.append(F(champ).asc(nulls_first=True))
+    return expressions
+
+
+def _apres(criteres, valeurs, inverse=False):
+    """Condition « strictement après la ligne de valeurs `valeurs` » dans l'ordre donné"""
+    condition = Q(pk__in=[])
+    egalites = Q()
+    for (champ, descendant), valeur in zip(criteres, valeurs):
+        descendant = descendant != inverse
+        if valeur is None:
+            # NULL est le minimum : rien ne le suit en ordre décroissant,
+            # toutes les valeurs non nulles le suivent en ordre croissant
+            suivante = Q(pk__in=[]) if descendant else Q(**{f'{champ}__isnull': False})
+            egalite = Q(**{f'{champ}__isnull': True})
+        else:
+            if descendant:
+                suivante = Q(**{f'{champ}__lt': valeur}) | Q(**{f'{champ}__isnull': True})
+            else:
+                suivante = Q(**{f'{champ}__gt': valeur})
+            egalite = Q(**{champ: valeur})
+        condition |= egalites & suivante
+        egalites &= egalite
+    return condition
+
+
+def _valeur(objet, champ):
+    for nom in champ.split('__'):
+        if objet is None:
+            return None
+        objet = getattr(objet, 'pk' if nom == 'pk' else nom)
+    return objet
+
+
+def _serialiser(valeur):
+    # Précision complète : un horodatage tronqué ferait sauter des lignes
+    if isinstance(valeur, (datetime, date)):
+        return valeur.isoformat()
+    if isinstance(valeur, Decimal):
+        return str(valeur)
+    return valeur
+
+
+def _encoder(sens, valeurs):
+    brut = json.dumps([sens, [_serialiser(v) for v in valeurs]])
+    return base64.urlsafe_b64encode(brut.encode()).decode().rstrip('=')
+
+
+def _decoder(curseur, nb_criteres):
+    try:
+        brut = base64.urlsafe_b64decode(curseur + '=' * (-len(curseur) % 4))
+        sens, valeurs = json.loads(brut)
+    except (ValueError, TypeError):
+        raise CurseurInvalide(curseur)
+    if sens not in ('s', 'p') or not isinstance(valeurs, list) or len(valeurs) != nb_criteres:
+        raise CurseurInvalide(curseur)
+    return sens, valeurs
+
+
+def _champ(modele, chemin):
+    """Champ de modèle désigné par `chemin` (relations suivies), ou None (annotation)"""
+    champ = None
+    for nom in chemin.split('__'):
+        if modele is None:
+            return None
+        try:
+            champ = modele._meta.pk if nom == 'pk' else modele._meta.get_field(nom)
+        except FieldDoesNotExist:
+            return None
+        modele = champ.related_model
+    return champ
+
+
+def _convertir(modele, criteres, valeurs, curseur):
+    """
+    Valeurs du curseur converties par leur champ (to_python) : une valeur
+    d'un mauvais type rend le curseur invalide au lieu d'échouer dans le filtre
+    """
+    converties = []
+    for (chemin, _), valeur in zip(criteres, valeurs):
+        champ = _champ(modele, chemin)
+        if valeur is not None and champ is not None:
+            try:
+                valeur = champ.to_python(valeur)
+            except ValidationError:
+                raise CurseurInvalide(curseur)
+        converties.append(valeur)
+    return converties
+
+
+def compter_approximativement(queryset):
+    """
+    Estimation du nombre de lignes : plan de PostgreSQL (aucune lecture des
+    données), sinon comptage plafonné à PLAFOND_COMPTAGE. Retourne (total, approché)
+    """
+    connexion = connections[queryset.db]
+    if connexion.vendor == 'postgresql':
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connexion.cursor() as curseur:
+            curseur.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = curseur.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows']), True
+    total = queryset.order_by()[:PLAFOND_COMPTAGE + 1].count()
+    return min(total, PLAFOND_COMPTAGE), total > PLAFOND_COMPTAGE
+
+
+def paginer(requete, queryset, tri, par_page=20, comptage=None, parametre='curseur'):
+    """
+    Page de `queryset` désignée par le paramètre GET `parametre`
+
+    tri : critères d'ordre (ex. ['-date_paiement', '-id']) ; l'identifiant est
+    ajouté en dernier critère s'il manque. comptage : None, 'exact' ou
+    'approche'. Un curseur illisible renvoie la première page.
+    """
+    criteres = _normaliser_tri(tri)
+    sens, valeurs = 's', None
+    curseur = requete.GET.get(parametre)
+    if curseur:
+        try:
+            sens, valeurs = _decoder(curseur, len(criteres))
+            valeurs = _convertir(queryset.model, criteres, valeurs, curseur)
+        except CurseurInvalide:
+            sens, valeurs = 's', None
+
+    inverse = sens == 'p'
+    page = queryset.order_by(*_ordre(criteres, inverse))
+    if valeurs is not None:
+        page = page.filter(_apres(criteres, valeurs, inverse))
+    objets = list(page[:par_page + 1])
+    encore = len(objets) > par_page
+    objets = objets[:par_page]
+    if inverse:
+        objets.reverse()
+
+    suivant = precedent = None
+    if objets:
+        premiere = [_valeur(objets[0], champ) for champ, _ in criteres]
+        derniere = [_valeur(objets[-1], champ) for champ, _ in criteres]
+        if inverse:
+            # Page obtenue en reculant : la page de départ la suit toujours
+            suivant = _encoder('s', derniere)
+            precedent = _encoder('p', premiere) if encore else None
+        else:
+            suivant = _encoder('s', derniere) if encore else None
+            precedent = _encoder('p', premiere) if valeurs is not None else None
+
+    total, approche = None, False
+    if comptage == 'exact':
+        total = queryset.count()
+    elif comptage == 'approche':
+        total, approche = compter_approximativement(queryset)
+
+    return PageCurseur(objets, suivant, precedent, requete, parametre, total, approche)
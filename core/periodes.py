@@ -0,0 +1,38 @@
+"""
+Bornes de journées et de périodes pour filtrer les colonnes date/heure.
+
+Un filtre champ__date=jour enveloppe la colonne dans un DATE(...) et empêche
+la base d'utiliser son index. Ces fonctions traduisent une journée locale
+(TIME_ZONE) ou une période de jours en intervalle semi-ouvert
+[début, fin[ sur la colonne brute : champ__gte=début, champ__lt=fin.
+"""
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+
+
+def debut_jour(jour):
+    """Premier instant d'une journée locale (datetime conscient)"""
+    return timezone.make_aware(datetime.combine(jour, time.min))
+
+
+def bornes_periode(debut, fin):
+    """Intervalle [début, fin[ couvrant les jours debut à fin inclus"""
+    return debut_jour(debut), debut_jour(fin + timedelta(days=1))
+
+
+def bornes_jour(jour=None):
+    """Intervalle [début, fin[ d'une journée locale, aujourd'hui par défaut"""
+    jour = jour or timezone.localdate()
+    return bornes_periode(jour, jour)
+
+
+def filtre_periode(champ, debut, fin):
+    """Arguments de filter() pour les jours debut à fin inclus sur un champ date/heure"""
+    de, a = bornes_periode(debut, fin)
+    return {f'{champ}__gte': de, f'{champ}__lt': a}
+
+
+def filtre_jour(champ, jour=None):
+    """Arguments de filter() pour une journée locale sur un champ date/heure"""
+    jour = jour or timezone.localdate()
+    return filtre_periode(champ, jour, jour)
@@ -31,6 +31,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.humanize',
     
     # Local apps
     'accounts',
@@ -136,6 +137,24 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Cache disque des reçus et factures PDF (payments.documents)
+PIECES_PDF_DOSSIER = BASE_DIR / 'cache' / 'pieces'
+PIECES_PDF_TAILLE_MAX = 50 * 1024 * 1024  # octets
+
+# Colonnes NumPy de l'historique des lignes de commande (orders.analytique) ;
+# le travailleur les rafraîchit quand elles ont plus de ANALYTIQUE_RAFRAICHISSEMENT secondes
+ANALYTIQUE_DOSSIER = BASE_DIR / 'cache' / 'analytique'
+ANALYTIQUE_RAFRAICHISSEMENT = 60
+
+# Durée de cache des séries d'activité des jours passés (payments.series), en secondes
+SERIES_CACHE_DUREE = 24 * 3600
+
+# File de tâches de fond (accounts.taches, manage.py runworker)
+TACHES_CONCURRENCE = 2
+TACHES_CONSERVATION_JOURS = 7
+# Exécuter les tâches dans la requête, sans travailleur (développement)
+TACHES_EXECUTION_IMMEDIATE = False
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -0,0 +1,50 @@
+"""
+Outils communs aux tests de concurrence (TransactionTestCase à plusieurs fils)
+"""
+import threading
+from django.db import OperationalError, connection
+
+
+class ConcurrenceMixin:
+    """
+    Lance une action dans FILS fils partis ensemble et rejoue les écritures
+    que SQLite refuse sous concurrence
+    """
+
+    FILS = 8
+
+    def en_parallele(self, action):
+        """Lance action(numero) dans FILS fils partis ensemble, retourne les résultats"""
+        depart = threading.Barrier(self.FILS)
+        resultats = [None] * self.FILS
+        erreurs = []
+
+        def fil(numero):
+            try:
+                depart.wait()
+                resultats[numero] = action(numero)
+            except Exception as e:
+                erreurs.append(e)
+            finally:
+                connection.close()
+
+        fils = [threading.Thread(target=fil, args=(numero,)) for numero in range(self.FILS)]
+        for f in fils:
+            f.start()
+        for f in fils:
+            f.join()
+        self.assertEqual(erreurs, [])
+        return resultats
+
+    def reessayer(self, action):
+        """
+        SQLite en mémoire partagée refuse une écriture concurrente au lieu de
+        l'attendre : l'écriture refusée n'a rien écrit et la même tentative,
+        avec l'état lu au départ, est rejouée
+        """
+        for _ in range(100):
+            try:
+                return action()
+            except OperationalError:
+                continue
+        return action()
@@ -0,0 +1,181 @@
+import tempfile
+from datetime import timedelta
+from asgiref.sync import async_to_sync
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase
+from django.utils import timezone
+from expenses.models import Depense
+from orders.models import Commande, EtatCommande
+from payments.models import Paiement
+from accounts.models import Tache
+from .exports import reponse_fichier, reponse_flux
+from .pagination import _encoder, paginer
+from .periodes import filtre_jour, filtre_periode
+
+
+class PlansRequetesTests(TestCase):
+    """
+    Les requêtes fréquentes filtrent les dates par intervalle sur la colonne
+    brute (core.periodes) et passent par les index prévus pour elles
+    """
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # Sur des tables presque vides, PostgreSQL préfère toujours un
+            # parcours séquentiel : on ne veut savoir que si l'index est utilisable
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertIndex(self, queryset, index):
+        """L'index sert à chercher (SEARCH, Index Cond), pas à tout parcourir"""
+        plan = queryset.explain()
+        if connection.vendor == 'postgresql':
+            self.assertRegex(plan, rf'(Index (Only )?Scan (Backward )?using|Bitmap Index Scan on) {index}\b')
+            self.assertIn('Index Cond', plan)
+        else:
+            self.assertRegex(plan, rf'SEARCH \w+ USING (COVERING )?INDEX {index}\b')
+
+    def test_paiements_du_jour(self):
+        self.assertIndex(
+            Paiement.objects.filter(**filtre_jour('date_paiement')),
+            'paiement_date_methode_idx',
+        )
+
+    def test_filtre_date_sans_index(self):
+        # Le filtre __date enveloppe la colonne : l'index ne sert plus à chercher
+        with self.assertRaises(AssertionError):
+            self.assertIndex(
+                Paiement.objects.filter(date_paiement__date=timezone.localdate()),
+                'paiement_date_methode_idx',
+            )
+
+    def test_commandes_d_une_periode(self):
+        aujourdhui = timezone.localdate()
+        self.assertIndex(
+            Commande.objects.filter(**filtre_periode('date_commande', aujourdhui - timedelta(days=30), aujourdhui)),
+            'commande_date_idx',
+        )
+
+    def test_file_de_la_cuisine(self):
+        self.assertIndex(
+            Commande.objects.filter(
+                etat__in=[EtatCommande.EN_ATTENTE, EtatCommande.EN_PREPARATION, EtatCommande.EN_COURS]
+            ).order_by('date_commande'),
+            'commande_etat_date_idx',
+        )
+
+    def test_historique_d_une_table(self):
+        self.assertIndex(
+            Commande.objects.filter(table_id=1).order_by('-date_commande'),
+            'commande_table_date_idx',
+        )
+
+    def test_depenses_d_une_periode(self):
+        aujourdhui = timezone.localdate()
+        self.assertIndex(
+            Depense.objects.filter(date_depense__gte=aujourdhui - timedelta(days=30), date_depense__lte=aujourdhui),
+            'depense_date_categorie_idx',
+        )
+
+
+class ReponseFluxTests(SimpleTestCase):
+    """Sous ASGI, l'export est servi par un itérateur asynchrone (core.exports)"""
+
+    def lignes(self):
+        for i in range(5000):
+            yield f'{i};ligne é\n'
+
+    def test_wsgi(self):
+        reponse = reponse_flux(RequestFactory().get('/'), self.lignes(), 'text/csv')
+        self.assertFalse(reponse.is_async)
+        self.assertEqual(b''.join(reponse), ''.join(self.lignes()).encode('utf-8'))
+
+    def test_asgi(self):
+        reponse = reponse_flux(AsyncRequestFactory().get('/'), self.lignes(), 'text/csv')
+        self.assertTrue(reponse.is_async)
+
+        async def lire():
+            return [bloc async for bloc in reponse]
+
+        blocs = async_to_sync(lire)()
+        # Un bloc par lot de lignes, pas un par ligne ni un seul pour tout
+        self.assertEqual(len(blocs), 3)
+        self.assertEqual(b''.join(blocs), ''.join(self.lignes()).encode('utf-8'))
+
+    def test_fichier_asgi(self):
+        donnees = bytes(range(256)) * 1000
+        disque = tempfile.TemporaryFile()
+        disque.write(donnees)
+        disque.seek(0)
+        fichier = File(disque)
+        reponse = reponse_fichier(AsyncRequestFactory().get('/'), fichier, 'détail.xlsx', 'application/octet-stream')
+        self.assertTrue(reponse.is_async)
+        self.assertEqual(reponse['Content-Length'], str(len(donnees)))
+        self.assertIn("filename*=utf-8''d%C3%A9tail.xlsx", reponse['Content-Disposition'])
+
+        async def lire():
+            return [bloc async for bloc in reponse]
+
+        blocs = async_to_sync(lire)()
+        self.assertGreater(len(blocs), 1)
+        self.assertEqual(b''.join(blocs), donnees)
+        self.assertTrue(fichier.closed)
+
+    def test_fichier_wsgi(self):
+        reponse = reponse_fichier(RequestFactory().get('/'), ContentFile(b'abc'), 'a.pdf', 'application/pdf')
+        self.assertFalse(reponse.is_async)
+        self.assertEqual(b''.join(reponse), b'abc')
+
+
+class PaginationCurseurTests(TestCase):
+    """Pagination par curseur (core.pagination), avec des NULL et des ex æquo dans le tri"""
+
+    @classmethod
+    def setUpTestData(cls):
+        maintenant = timezone.now().replace(microsecond=123456)
+        # Dates répétées, et un tiers de NULL (les plus petites valeurs)
+        cls.taches = Tache.objects.bulk_create([
+            Tache(nom='essai', date_fin=None if i % 3 == 0 else maintenant - timedelta(minutes=i // 2))
+            for i in range(23)
+        ])
+
+    def attendu(self, descendant):
+        """Ordre attendu calculé en Python : NULL d'abord en croissant, identifiant en dernier"""
+        croissant = sorted(
+            Tache.objects.all(),
+            key=lambda t: (t.date_fin is not None, t.date_fin.timestamp() if t.date_fin else 0, t.id),
+        )
+        ids = [t.id for t in croissant]
+        return ids[::-1] if descendant else ids
+
+    def page(self, tri, curseur=None):
+        requete = RequestFactory().get('/', {'curseur': curseur} if curseur else {})
+        return paginer(requete, Tache.objects.all(), tri, par_page=4)
+
+    def parcourir(self, tri):
+        """Pages successives en avançant (suivant), puis en reculant (precedent) depuis la dernière"""
+        pages = [self.page(tri)]
+        while pages[-1].suivant:
+            pages.append(self.page(tri, pages[-1].suivant))
+        retour = [pages[-1]]
+        while retour[-1].precedent:
+            retour.append(self.page(tri, retour[-1].precedent))
+        return [[t.id for t in p] for p in pages], [[t.id for t in p] for p in reversed(retour)]
+
+    def test_tri_decroissant(self):
+        avant, arriere = self.parcourir(['-date_fin', '-id'])
+        self.assertEqual(sum(avant, []), self.attendu(descendant=True))
+        self.assertEqual(arriere, avant)
+        self.assertEqual(len(avant), 6)
+
+    def test_tri_croissant(self):
+        avant, arriere = self.parcourir(['date_fin'])
+        self.assertEqual(sum(avant, []), self.attendu(descendant=False))
+        self.assertEqual(arriere, avant)
+
+    def test_curseur_de_mauvais_type(self):
+        premiere = [t.id for t in self.page(['-date_fin', '-id'])]
+        for curseur in (_encoder('s', ['x', 5]), _encoder('s', [None, 'y']), 'illisible!', _encoder('z', [None, 1])):
+            self.assertEqual([t.id for t in self.page(['-date_fin', '-id'], curseur)], premiere)
@@ -0,0 +1,37 @@
+"""
+Export en flux des dépenses (voir core.exports)
+"""
+from core.exports import TAILLE_LOT, lire_periode
+from .models import Depense
+
+
+COLONNES = ['id', 'date_depense', 'categorie', 'description', 'montant', 'utilisateur']
+
+
+def depenses_filtrees(parametres):
+    """Dépenses filtrées comme depense_list et rapport_depenses : categorie, date, date_debut, date_fin"""
+    depenses = Depense.objects.all()
+    categorie = parametres.get('categorie')
+    if categorie:
+        depenses = depenses.filter(categorie_id=categorie)
+    debut, fin = lire_periode(parametres)
+    if debut:
+        depenses = depenses.filter(date_depense__gte=debut)
+    if fin:
+        depenses = depenses.filter(date_depense__lte=fin)
+    return depenses
+
+
+def enregistrements(depenses):
+    """Un dictionnaire par dépense, de la plus ancienne à la plus récente"""
+    lignes = (depenses
+              .order_by('date_depense', 'id')
+              .values_list('id', 'date_depense', 'categorie__nom', 'description', 'montant', 'utilisateur__login')
+              .iterator(chunk_size=TAILLE_LOT))
+    for ligne in lignes:
+        yield dict(zip(COLONNES, ligne))
+
+
+def preparer(parametres, format):
+    """(colonnes, enregistrements) de l'export des dépenses"""
+    return COLONNES, enregistrements(depenses_filtrees(parametres))
@@ -0,0 +1,19 @@
+# Generated by Django 5.0 on 2026-10-18 04:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='depense',
+            index=models.Index(fields=['date_depense', 'categorie'], name='depense_date_categorie_idx'),
+        ),
+    ]
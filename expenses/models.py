@@ -66,6 +66,10 @@ class Depense(models.Model):
         verbose_name = 'Dépense'
         verbose_name_plural = 'Dépenses'
         ordering = ['-date_depense']
+        indexes = [
+            # Dépenses d'une journée ou d'une période, réparties par catégorie
+            models.Index(fields=['date_depense', 'categorie'], name='depense_date_categorie_idx'),
+        ]
     
     def __str__(self):
         return f"{self.description} - {self.montant} GNF ({self.date_depense.strftime('%d/%m/%Y')})"
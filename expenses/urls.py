@@ -11,4 +11,5 @@ urlpatterns = [
     path('supprimer/<int:depense_id>/', views.supprimer_depense, name='supprimer_depense'),
     path('statistiques/', views.statistiques_depenses, name='statistiques_depenses'),
     path('rapport/', views.rapport_depenses, name='rapport_depenses'),
+    path('export/', views.export_depenses, name='export_depenses'),
 ]
@@ -3,15 +3,20 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
-from django.db.models import Sum, Count
+from django.db.models import Sum
 from django.utils import timezone
 from datetime import datetime, date
+from django.utils.http import urlencode
+from accounts.decorators import admin_or_financial_required
+from core.exports import ExportInvalide, reponse_export
+from core.pagination import paginer
+from core.periodes import filtre_jour
 from .models import Depense, CategorieDepense
 
 @login_required
 def depense_list(request):
     """Liste des dépenses"""
-    depenses = Depense.objects.all().order_by('-date_depense')
+    depenses = Depense.objects.select_related('categorie', 'utilisateur')
     
     # Filtrer par catégorie si spécifié
     categorie = request.GET.get('categorie')
@@ -23,7 +28,7 @@ def depense_list(request):
     if date_filter:
         try:
             filter_date = datetime.strptime(date_filter, '%Y-%m-%d').date()
-            depenses = depenses.filter(date_depense__date=filter_date)
+            depenses = depenses.filter(date_depense=filter_date)
         except ValueError:
             pass
     
@@ -38,7 +43,7 @@ def depense_list(request):
     if date_filter:
         try:
             filter_date = datetime.strptime(date_filter, '%Y-%m-%d').date()
-            paiements = paiements.filter(date_paiement__date=filter_date)
+            paiements = paiements.filter(**filtre_jour('date_paiement', filter_date))
         except ValueError:
             pass
     
@@ -47,7 +52,7 @@ def depense_list(request):
     
     categories = CategorieDepense.objects.all()
     context = {
-        'depenses': depenses,
+        'depenses': paginer(request, depenses, ['-date_depense', '-id'], comptage='approche'),
         'categories': categories,
         'categorie_filter': categorie,
         'date_filter': date_filter,
@@ -178,33 +183,30 @@ def supprimer_depense(request, depense_id):
 @login_required
 def statistiques_depenses(request):
     """Statistiques des dépenses"""
+    from payments.bilans import periode
     today = timezone.now().date()
     
     # Statistiques du jour
-    depenses_aujourdhui = Depense.objects.filter(date_depense=today)
-    total_aujourdhui = depenses_aujourdhui.aggregate(Sum('montant'))['montant__sum'] or 0
-    nb_depenses_aujourdhui = depenses_aujourdhui.count()
+    bilan_jour = periode(today, today)
+    total_aujourdhui = bilan_jour['total_sorties']
+    nb_depenses_aujourdhui = bilan_jour['nb_depenses']
     
-    # Statistiques du mois
+    # Statistiques du mois (une ligne de bilan par jour)
     month_start = today.replace(day=1)
-    depenses_mois = Depense.objects.filter(date_depense__gte=month_start)
-    total_mois = depenses_mois.aggregate(Sum('montant'))['montant__sum'] or 0
-    nb_depenses_mois = depenses_mois.count()
+    bilan_mois = periode(month_start, today)
+    total_mois = bilan_mois['total_sorties']
+    nb_depenses_mois = bilan_mois['nb_depenses']
     
     # Par catégorie
-    stats_par_categorie = []
-    categorie_stats = depenses_mois.values('categorie__nom').annotate(
-        total=Sum('montant'),
-        count=Count('id')
-    ).order_by('-total')
-    
-    # Convertir les dictionnaires en objets simples
-    for stat in categorie_stats:
-        stats_par_categorie.append({
-            'categorie_nom': stat['categorie__nom'] or 'Non catégorisé',
+    stats_par_categorie = [
+        {
+            'categorie_nom': categorie or 'Non catégorisé',
             'total': stat['total'],
             'count': stat['count']
-        })
+        }
+        for categorie, stat in bilan_mois['par_categorie'].items()
+    ]
+    stats_par_categorie.sort(key=lambda stat: stat['total'], reverse=True)
     
     context = {
         'total_aujourdhui': total_aujourdhui,
@@ -240,24 +242,22 @@ def rapport_depenses(request):
         date_depense__lte=date_fin
     )
     
-    # Statistiques
-    total = depenses.aggregate(Sum('montant'))['montant__sum'] or 0
-    nb_depenses = depenses.count()
+    # Statistiques, à partir des bilans journaliers de la période
+    from payments.bilans import periode
+    bilan = periode(date_debut, date_fin)
+    total = bilan['total_sorties']
+    nb_depenses = bilan['nb_depenses']
     
     # Par catégorie
-    stats_par_categorie = []
-    categorie_stats = depenses.values('categorie__nom').annotate(
-        total=Sum('montant'),
-        count=Count('id')
-    ).order_by('-total')
-    
-    # Convertir les dictionnaires en objets simples
-    for stat in categorie_stats:
-        stats_par_categorie.append({
-            'categorie_nom': stat['categorie__nom'] or 'Non catégorisé',
+    stats_par_categorie = [
+        {
+            'categorie_nom': categorie or 'Non catégorisé',
             'total': stat['total'],
             'count': stat['count']
-        })
+        }
+        for categorie, stat in bilan['par_categorie'].items()
+    ]
+    stats_par_categorie.sort(key=lambda stat: stat['total'], reverse=True)
     
     context = {
         'depenses': depenses,
@@ -265,7 +265,17 @@ def rapport_depenses(request):
         'nb_depenses': nb_depenses,
         'stats_par_categorie': stats_par_categorie,
         'date_debut': date_debut,
-        'date_fin': date_fin
+        'date_fin': date_fin,
+        'parametres_export': urlencode({'date_debut': date_debut, 'date_fin': date_fin}),
     }
     
     return render(request, 'expenses/rapport_depenses.html', context)
+
+@admin_or_financial_required
+def export_depenses(request):
+    """Export en flux (CSV ou JSON Lines) des dépenses, mêmes filtres que la liste et le rapport"""
+    try:
+        return reponse_export(request, 'depenses')
+    except ExportInvalide as e:
+        messages.error(request, str(e))
+        return redirect('expenses:depense_list')
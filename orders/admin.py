@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Commande, CommandePlat
+from .models import Commande, CommandePlat, HistoriqueEtatCommande, StatistiquePreparation, TicketPoste
 
 
 class CommandePlatInline(admin.TabularInline):
@@ -8,13 +8,29 @@ class CommandePlatInline(admin.TabularInline):
     readonly_fields = ['prix_unitaire']
 
 
+class TicketPosteInline(admin.TabularInline):
+    model = TicketPoste
+    extra = 0
+    readonly_fields = ['date_creation', 'date_modification']
+
+
+class HistoriqueEtatCommandeInline(admin.TabularInline):
+    model = HistoriqueEtatCommande
+    extra = 0
+    can_delete = False
+    readonly_fields = ['date', 'ancien_etat', 'nouvel_etat', 'utilisateur', 'charge_cuisine']
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Commande)
 class CommandeAdmin(admin.ModelAdmin):
     list_display = ['id', 'table', 'serveur', 'etat', 'total', 'date_commande']
     list_filter = ['etat', 'date_commande', 'table']
     search_fields = ['table__numero_table', 'serveur__login']
     list_editable = ['etat']
-    inlines = [CommandePlatInline]
+    inlines = [CommandePlatInline, TicketPosteInline, HistoriqueEtatCommandeInline]
     ordering = ['-date_commande']
     
     fieldsets = (
@@ -28,3 +44,10 @@ class CommandeAdmin(admin.ModelAdmin):
     )
     
     readonly_fields = ['date_commande', 'date_modification']
+
+
+@admin.register(StatistiquePreparation)
+class StatistiquePreparationAdmin(admin.ModelAdmin):
+    list_display = ['type_duree', 'plat', 'niveau_charge', 'nb_mesures', 'moyenne_secondes', 'date_modification']
+    list_filter = ['type_duree', 'niveau_charge']
+    readonly_fields = ['date_modification']
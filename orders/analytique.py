@@ -0,0 +1,444 @@
+"""
+Moteur d'analyse en mémoire de l'historique des lignes de commande.
+
+Les lignes (CommandePlat et leur commande) sont copiées en colonnes NumPy
+compactes : identifiant de ligne, commande, plat, quantité, prix unitaire en
+GNF entiers, horodatage (secondes UTC), table et état de la commande. Chaque
+colonne est un fichier binaire du dossier ANALYTIQUE_DOSSIER, ouvert en
+mémoire projetée (np.memmap) : le système ne charge que les pages lues et les
+processus se partagent le cache de pages.
+
+Le rafraîchissement est incrémental, avec deux marques :
+- les lignes d'identifiant supérieur à la dernière ligne lue sont ajoutées ;
+- les commandes modifiées depuis le dernier passage (date_modification, mise
+  à jour par les transitions d'état et les modifications de lignes) ont leurs
+  anciennes lignes retirées (état RETIREE) et leurs lignes actuelles
+  ajoutées. Une marge couvre les transactions validées après leur horodatage.
+
+Le rafraîchissement est fait par le travailleur des tâches de fond (tâche
+'analytique', demandée par colonnes() quand les données ont vieilli) ou par
+manage.py analytique, jamais pendant une requête.
+
+Les lignes retirées sont éliminées quand elles dépassent TAUX_COMPACTAGE des
+lignes. Les commandes supprimées ne laissent pas de trace datée : elles
+disparaissent à la reconstruction (manage.py analytique --reconstruire).
+
+Les agrégats (panier moyen, dépense par table, matrice heure x plat) sont
+calculés par regroupements vectorisés (np.unique, np.bincount), sans boucle
+Python par ligne.
+"""
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from core.exports import TAILLE_LOT
+from core.periodes import debut_jour
+from .models import Commande, CommandePlat, EtatCommande
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou entre processus (serveur de développement)
+    fcntl = None
+
+
+VERSION = 1
+
+# Colonne -> type NumPy
+SCHEMA = {
+    'id': np.int64,
+    'commande': np.int64,
+    'plat': np.int32,
+    'quantite': np.int32,
+    'prix': np.int64,
+    'horodatage': np.int64,
+    'table': np.int32,
+    'etat': np.int8,
+}
+
+# Code d'état : position dans EtatCommande, ou RETIREE pour une ligne remplacée
+ETATS = list(EtatCommande.values)
+RETIREE = -1
+
+# Commandes relues à chaque passage au-delà de la marque de temps
+MARGE = timedelta(minutes=5)
+
+# Part de lignes retirées au-delà de laquelle les fichiers sont réécrits
+TAUX_COMPACTAGE = 0.25
+
+# Lignes converties et écrites à la fois lors d'un rafraîchissement
+LIGNES_PAR_ECRITURE = 50000
+
+
+def _dossier():
+    dossier = getattr(settings, 'ANALYTIQUE_DOSSIER', settings.BASE_DIR / 'cache' / 'analytique')
+    os.makedirs(dossier, exist_ok=True)
+    return dossier
+
+
+def _chemin(nom):
+    return os.path.join(_dossier(), nom)
+
+
+def _lire_meta():
+    """Métadonnées du dernier rafraîchissement, ou None (absentes ou d'une autre version)"""
+    try:
+        with open(_chemin('meta.json'), encoding='utf-8') as fichier:
+            meta = json.load(fichier)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get('version') == VERSION else None
+
+
+def _ecrire_meta(meta):
+    temporaire = _chemin('meta.json.tmp')
+    with open(temporaire, 'w', encoding='utf-8') as fichier:
+        json.dump(meta, fichier)
+    os.replace(temporaire, _chemin('meta.json'))
+
+
+def _supprimer(noms):
+    for nom in noms:
+        try:
+            os.remove(_chemin(nom))
+        except OSError:
+            # Fichier encore projeté par un autre processus (Windows) : le
+            # prochain passage réécrit sous un autre nom
+            pass
+
+
+@contextmanager
+def _verrou():
+    """Un seul rafraîchissement à la fois entre processus"""
+    with open(_chemin('verrou'), 'w') as fichier:
+        if fcntl is not None:
+            fcntl.flock(fichier, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fichier, fcntl.LOCK_UN)
+
+
+def _nouveaux_fichiers(colonnes, crees):
+    """Noms de fichiers neufs (une génération) pour les colonnes données, ajoutés à `crees`"""
+    generation = time.time_ns()
+    noms = {colonne: f'{colonne}.{generation}.bin' for colonne in colonnes}
+    for nom in noms.values():
+        open(_chemin(nom), 'wb').close()
+        crees.append(nom)
+    return noms
+
+
+def _projeter(nom, colonne, lignes):
+    if not lignes:
+        return np.empty(0, dtype=SCHEMA[colonne])
+    return np.memmap(_chemin(nom), dtype=SCHEMA[colonne], mode='r', shape=(lignes,))
+
+
+class Colonnes:
+    """Lignes de commande en colonnes (une ndarray par colonne de SCHEMA)"""
+
+    def __init__(self, tableaux):
+        self.tableaux = tableaux
+
+    def __getattr__(self, nom):
+        try:
+            return self.__dict__['tableaux'][nom]
+        except KeyError:
+            raise AttributeError(nom)
+
+    def __len__(self):
+        return len(self.tableaux['id'])
+
+    def selection(self, masque):
+        """Copie des lignes retenues par un masque booléen"""
+        return Colonnes({nom: tableau[masque] for nom, tableau in self.tableaux.items()})
+
+    def montants(self):
+        """Sous-total de chaque ligne (quantité x prix), en GNF"""
+        return self.quantite.astype(np.int64) * self.prix
+
+
+def _convertir(lignes):
+    """Tableaux NumPy d'un lot de lignes lues en base"""
+    if not lignes:
+        return {colonne: np.empty(0, dtype=type_) for colonne, type_ in SCHEMA.items()}
+    ids, commandes, plats, quantites, prix, dates, tables, etats = zip(*lignes)
+    codes = {etat: code for code, etat in enumerate(ETATS)}
+    return {
+        'id': np.array(ids, dtype=SCHEMA['id']),
+        'commande': np.array(commandes, dtype=SCHEMA['commande']),
+        'plat': np.array(plats, dtype=SCHEMA['plat']),
+        'quantite': np.array(quantites, dtype=SCHEMA['quantite']),
+        # Le franc guinéen n'a pas de subdivision en usage
+        'prix': np.array([round(p) for p in prix], dtype=SCHEMA['prix']),
+        'horodatage': np.array([int(d.timestamp()) for d in dates], dtype=SCHEMA['horodatage']),
+        'table': np.array([t or 0 for t in tables], dtype=SCHEMA['table']),
+        'etat': np.array([codes.get(e, RETIREE) for e in etats], dtype=SCHEMA['etat']),
+    }
+
+
+def _lire_lignes(filtre):
+    """Lots de tableaux des lignes de commande retenues par `filtre`"""
+    requete = (CommandePlat.objects
+               .filter(filtre)
+               .order_by('id')
+               .values_list('id', 'commande_id', 'plat_id', 'quantite', 'prix_unitaire',
+                            'commande__date_commande', 'commande__table_id', 'commande__etat')
+               .iterator(chunk_size=TAILLE_LOT))
+    lot = []
+    for ligne in requete:
+        lot.append(ligne)
+        if len(lot) >= LIGNES_PAR_ECRITURE:
+            yield _convertir(lot)
+            lot = []
+    if lot:
+        yield _convertir(lot)
+
+
+def _compacter(meta, crees, obsoletes):
+    """Réécrit toutes les colonnes sans les lignes retirées"""
+    etat = _projeter(meta['fichiers']['etat'], 'etat', meta['lignes'])
+    garder = etat != RETIREE
+    fichiers = _nouveaux_fichiers(SCHEMA, crees)
+    for colonne, nom in fichiers.items():
+        _projeter(meta['fichiers'][colonne], colonne, meta['lignes'])[garder].tofile(_chemin(nom))
+    obsoletes.extend(meta['fichiers'].values())
+    meta['fichiers'] = fichiers
+    meta['lignes'] = int(garder.sum())
+    meta['retirees'] = 0
+
+
+def rafraichir(reconstruire=False):
+    """
+    Met les colonnes à jour depuis la base (ou les reconstruit entièrement) ;
+    retourne {'ajoutees', 'retirees', 'lignes'}
+    """
+    with _verrou():
+        crees, obsoletes = [], []
+        try:
+            resultat = _rafraichir(reconstruire, crees, obsoletes)
+        except BaseException:
+            # Les métadonnées n'ont pas changé : seuls les fichiers neufs sont en trop
+            _supprimer(crees)
+            raise
+        _supprimer(obsoletes)
+        return resultat
+
+
+def _rafraichir(reconstruire, crees, obsoletes):
+    meta = None if reconstruire else _lire_meta()
+    if meta is None:
+        ancienne = _lire_meta()
+        if ancienne is not None:
+            obsoletes.extend(ancienne['fichiers'].values())
+        meta = {
+            'version': VERSION, 'lignes': 0, 'retirees': 0, 'marque_id': 0, 'marque_temps': None,
+            'fichiers': _nouveaux_fichiers(SCHEMA, crees),
+        }
+    debut = timezone.now()
+
+    # Octets écrits après les dernières métadonnées (passage interrompu)
+    for colonne, nom in meta['fichiers'].items():
+        os.truncate(_chemin(nom), meta['lignes'] * np.dtype(SCHEMA[colonne]).itemsize)
+
+    # Commandes modifiées : leurs lignes connues sont retirées puis relues.
+    # La colonne d'état est réécrite sous un autre nom pour que les
+    # lecteurs en cours gardent une vue cohérente.
+    marque_id = meta['marque_id']
+    filtres = [Q(id__gt=marque_id)]
+    retirees = 0
+    if meta['marque_temps'] is not None:
+        # Sans tri : la lecture suit l'index de date_modification
+        modifiees = (Commande.objects
+                     .filter(date_modification__gte=datetime.fromisoformat(meta['marque_temps']))
+                     .order_by())
+        revisees = np.fromiter(modifiees.values_list('id', flat=True), dtype=SCHEMA['commande'])
+        if len(revisees):
+            # Deux lectures indexées plutôt qu'un OR sur la jointure
+            filtres.append(Q(commande_id__in=modifiees.values('id'), id__lte=marque_id))
+        if len(revisees) and meta['lignes']:
+            commande = _projeter(meta['fichiers']['commande'], 'commande', meta['lignes'])
+            etat = np.array(_projeter(meta['fichiers']['etat'], 'etat', meta['lignes']))
+            masque = np.isin(commande, revisees) & (etat != RETIREE)
+            retirees = int(masque.sum())
+            if retirees:
+                etat[masque] = RETIREE
+                nom = _nouveaux_fichiers(['etat'], crees)['etat']
+                etat.tofile(_chemin(nom))
+                obsoletes.append(meta['fichiers']['etat'])
+                meta['fichiers']['etat'] = nom
+                meta['retirees'] += retirees
+
+    ajoutees = 0
+    fichiers = {colonne: open(_chemin(nom), 'ab') for colonne, nom in meta['fichiers'].items()}
+    try:
+        for filtre in filtres:
+            for lot in _lire_lignes(filtre):
+                for colonne, tableau in lot.items():
+                    fichiers[colonne].write(tableau.tobytes())
+                ajoutees += len(lot['id'])
+                meta['marque_id'] = max(meta['marque_id'], int(lot['id'].max()))
+    finally:
+        for fichier in fichiers.values():
+            fichier.close()
+
+    meta['lignes'] += ajoutees
+    meta['marque_temps'] = (debut - MARGE).isoformat()
+    meta['rafraichi_le'] = time.time()
+    if meta['lignes'] and meta['retirees'] > TAUX_COMPACTAGE * meta['lignes']:
+        _compacter(meta, crees, obsoletes)
+    _ecrire_meta(meta)
+    return {'ajoutees': ajoutees, 'retirees': retirees, 'lignes': meta['lignes']}
+
+
+_projection = {}
+
+
+def charger():
+    """Colonnes du dernier rafraîchissement (projetées en mémoire, en lecture seule)"""
+    meta = _lire_meta()
+    if meta is None:
+        return Colonnes({colonne: np.empty(0, dtype=type_) for colonne, type_ in SCHEMA.items()})
+    cle = (tuple(sorted(meta['fichiers'].values())), meta['lignes'])
+    if _projection.get('cle') != cle:
+        _projection['colonnes'] = Colonnes({
+            colonne: _projeter(nom, colonne, meta['lignes']) for colonne, nom in meta['fichiers'].items()
+        })
+        _projection['cle'] = cle
+    return _projection['colonnes']
+
+
+def rafraichi_le():
+    """Date du dernier rafraîchissement, ou None si les colonnes n'existent pas encore"""
+    meta = _lire_meta()
+    if meta is None or 'rafraichi_le' not in meta:
+        return None
+    return datetime.fromtimestamp(meta['rafraichi_le'], tz=timezone.get_current_timezone())
+
+
+def demander_rafraichissement(reconstruire=False):
+    """Confie un rafraîchissement au travailleur (tâche 'analytique'), sauf s'il en a déjà un"""
+    from accounts.models import EtatTache, Tache
+    from accounts.taches import mettre_en_file
+    if not Tache.objects.filter(nom='analytique', etat__in=[EtatTache.EN_ATTENTE, EtatTache.EN_COURS]).exists():
+        mettre_en_file('analytique', reconstruire=reconstruire)
+
+
+def colonnes():
+    """
+    Colonnes du dernier rafraîchissement, telles quelles : au-delà de
+    ANALYTIQUE_RAFRAICHISSEMENT secondes, un rafraîchissement est demandé au
+    travailleur. Une requête ne reconstruit jamais les fichiers elle-même
+    (plusieurs secondes, qui bloqueraient le fil des vues synchrones).
+    """
+    meta = _lire_meta()
+    delai = getattr(settings, 'ANALYTIQUE_RAFRAICHISSEMENT', 60)
+    if meta is None or time.time() - meta.get('rafraichi_le', 0) > delai:
+        demander_rafraichissement()
+    return charger()
+
+
+def selection(debut=None, fin=None, annulees=False, donnees=None):
+    """
+    Lignes des commandes passées les jours debut à fin inclus (bornes
+    facultatives), hors lignes retirées et, sauf demande, hors commandes
+    annulées
+    """
+    donnees = colonnes() if donnees is None else donnees
+    masque = donnees.etat != RETIREE
+    if not annulees:
+        masque &= donnees.etat != ETATS.index(EtatCommande.ANNULEE)
+    if debut is not None:
+        masque &= donnees.horodatage >= int(debut_jour(debut).timestamp())
+    if fin is not None:
+        masque &= donnees.horodatage < int(debut_jour(fin + timedelta(days=1)).timestamp())
+    return donnees.selection(masque)
+
+
+def heures_locales(horodatage):
+    """
+    Horodatages UTC (secondes) convertis en secondes « locales » (TIME_ZONE) ;
+    le décalage est calculé une fois par heure distincte
+    """
+    if not len(horodatage):
+        return horodatage
+    fuseau = ZoneInfo(settings.TIME_ZONE)
+    heures, inverse = np.unique(horodatage // 3600, return_inverse=True)
+    decalages = np.array([
+        int(datetime.fromtimestamp(int(heure) * 3600, fuseau).utcoffset().total_seconds())
+        for heure in heures
+    ], dtype=np.int64)
+    return horodatage + decalages[inverse.reshape(-1)]
+
+
+def grouper(cles, *valeurs):
+    """
+    Regroupement vectorisé : (clés distinctes triées, sommes de chaque tableau
+    de valeurs par clé, effectifs par clé)
+    """
+    distinctes, inverse = np.unique(cles, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    sommes = [
+        np.bincount(inverse, weights=valeur, minlength=len(distinctes)).round().astype(np.int64)
+        for valeur in valeurs
+    ]
+    return distinctes, sommes, np.bincount(inverse, minlength=len(distinctes))
+
+
+def panier_moyen(debut=None, fin=None, donnees=None):
+    """Panier moyen et médian (GNF), articles et lignes par commande"""
+    lignes = selection(debut, fin, donnees=donnees)
+    commandes, (montants, articles), nb_lignes = grouper(lignes.commande, lignes.montants(), lignes.quantite)
+    if not len(commandes):
+        return {'commandes': 0, 'chiffre': 0, 'panier_moyen': 0, 'panier_median': 0,
+                'articles_moyens': 0, 'lignes_moyennes': 0}
+    return {
+        'commandes': len(commandes),
+        'chiffre': int(montants.sum()),
+        'panier_moyen': float(montants.mean()),
+        'panier_median': float(np.median(montants)),
+        'articles_moyens': float(articles.mean()),
+        'lignes_moyennes': float(nb_lignes.mean()),
+    }
+
+
+def depense_par_table(debut=None, fin=None, donnees=None):
+    """Par table : commandes, chiffre, panier moyen et articles ; trié par chiffre décroissant"""
+    from restaurant.models import TableRestaurant
+    lignes = selection(debut, fin, donnees=donnees)
+    # Une commande n'a qu'une table : table de sa première ligne
+    commandes, premieres = np.unique(lignes.commande, return_index=True)
+    _, (montants, articles), _ = grouper(lignes.commande, lignes.montants(), lignes.quantite)
+    tables, (chiffres, quantites), nb_commandes = grouper(lignes.table[premieres], montants, articles)
+    numeros = dict(TableRestaurant.objects.filter(id__in=tables.tolist()).values_list('id', 'numero_table'))
+    resultat = [
+        {
+            'table_id': int(table), 'table': numeros.get(int(table), '—'),
+            'commandes': int(nombre), 'chiffre': int(chiffre), 'articles': int(quantite),
+            'panier_moyen': chiffre / nombre,
+        }
+        for table, chiffre, quantite, nombre in zip(tables, chiffres, quantites, nb_commandes)
+    ]
+    resultat.sort(key=lambda t: -t['chiffre'])
+    return resultat
+
+
+def matrice_heure_plat(debut=None, fin=None, valeur='quantite', donnees=None):
+    """
+    (identifiants des plats, matrice 24 x plats) des quantités vendues (ou des
+    montants avec valeur='montant') par heure locale de la commande
+    """
+    lignes = selection(debut, fin, donnees=donnees)
+    plats, inverse = np.unique(lignes.plat, return_inverse=True)
+    heures = (heures_locales(lignes.horodatage) // 3600) % 24
+    poids = lignes.montants() if valeur == 'montant' else lignes.quantite
+    cases = heures * len(plats) + inverse.reshape(-1)
+    matrice = np.bincount(cases, weights=poids, minlength=24 * len(plats))
+    return plats, matrice.round().astype(np.int64).reshape(24, len(plats))
@@ -0,0 +1,213 @@
+"""
+Estimation des temps d'attente et de préparation à partir du journal des états.
+
+Chaque transition apprise met à jour une moyenne glissante par plat et par
+niveau de charge de la cuisine (StatistiquePreparation) : l'historique n'est
+jamais relu en entier. L'API cuisine lit toutes les statistiques en une
+requête et en déduit l'heure de fin probable de chaque commande.
+
+- attente : de la création de la commande à sa prise en charge
+- préparation : de la prise en charge à la commande prête (TERMINEE),
+  attribuée à chaque plat à préparer de la commande
+"""
+import math
+from collections import defaultdict
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Max, OuterRef, Subquery
+from django.utils import timezone
+from .models import (Commande, CommandePlat, EtatCommande, HistoriqueEtatCommande,
+                     StatistiquePreparation, TypeDuree)
+
+
+# Estimation retenue tant qu'aucune mesure n'existe (minutes)
+TEMPS_ESTIME_DEFAUT = 15
+
+# Poids d'une nouvelle mesure dans la moyenne glissante ; en dessous de
+# 1 / ALPHA mesures, c'est la moyenne simple
+ALPHA = 0.2
+
+# Mesures aberrantes ignorées (commande oubliée, clôturée le lendemain...)
+DUREE_MAX = timedelta(hours=3)
+
+# Bornes basses des niveaux de charge, en commandes actives en cuisine
+SEUILS_CHARGE = (0, 4, 9)
+
+ETATS_CUISINE = [EtatCommande.EN_ATTENTE, EtatCommande.EN_PREPARATION, EtatCommande.EN_COURS]
+
+
+def charge_cuisine():
+    """Nombre de commandes actives en cuisine (une requête)"""
+    return Commande.objects.filter(etat__in=ETATS_CUISINE).count()
+
+
+def niveau_charge(nb_commandes):
+    """0 (calme), 1 (normal) ou 2 (rush) selon le nombre de commandes actives"""
+    niveau = 0
+    for i, seuil in enumerate(SEUILS_CHARGE):
+        if nb_commandes >= seuil:
+            niveau = i
+    return niveau
+
+
+def avec_debut_preparation(commandes):
+    """Annote chaque commande avec l'heure de sa dernière prise en charge"""
+    prises = HistoriqueEtatCommande.objects.filter(
+        commande=OuterRef('pk'), nouvel_etat=EtatCommande.EN_PREPARATION
+    ).order_by('-date')
+    return commandes.annotate(debut_preparation=Subquery(prises.values('date')[:1]))
+
+
+def apprendre(entrees, charge):
+    """
+    Met à jour les statistiques avec les transitions journalisées
+
+    entrees : HistoriqueEtatCommande venant d'être enregistrés (commande chargée)
+    charge : commandes actives en cuisine au moment des transitions
+
+    Coût fixe : quatre lectures et deux écritures groupées, quel que soit le
+    nombre de transitions.
+    """
+    mesures = []  # (type, plat_id, niveau, secondes)
+
+    prises_en_charge = [e for e in entrees if e.nouvel_etat == EtatCommande.EN_PREPARATION
+                        and e.ancien_etat == EtatCommande.EN_ATTENTE]
+    for entree in prises_en_charge:
+        mesures.append((TypeDuree.ATTENTE, None, niveau_charge(charge),
+                        entree.date - entree.commande.date_commande))
+
+    terminees = {e.commande_id: e for e in entrees if e.nouvel_etat == EtatCommande.TERMINEE
+                 and e.ancien_etat in (EtatCommande.EN_PREPARATION, EtatCommande.EN_COURS)}
+    if terminees:
+        # Dernière prise en charge de chaque commande, avec la charge d'alors
+        debuts = {}
+        dernieres = (HistoriqueEtatCommande.objects
+                     .filter(commande_id__in=terminees, nouvel_etat=EtatCommande.EN_PREPARATION)
+                     .values('commande_id').annotate(debut=Max('date')))
+        for ligne in dernieres:
+            debuts[ligne['commande_id']] = ligne['debut']
+        charges = dict(HistoriqueEtatCommande.objects.filter(
+            commande_id__in=debuts, nouvel_etat=EtatCommande.EN_PREPARATION, date__in=debuts.values()
+        ).values_list('commande_id', 'charge_cuisine'))
+
+        plats = defaultdict(set)
+        for commande_id, plat_id in CommandePlat.objects.filter(
+            commande_id__in=debuts, plat__necessite_preparation=True
+        ).values_list('commande_id', 'plat_id'):
+            plats[commande_id].add(plat_id)
+
+        for commande_id, debut in debuts.items():
+            duree = terminees[commande_id].date - debut
+            niveau = niveau_charge(charges.get(commande_id, charge))
+            for plat_id in plats[commande_id]:
+                mesures.append((TypeDuree.PREPARATION, plat_id, niveau, duree))
+
+    mesures = [(t, p, n, d.total_seconds()) for t, p, n, d in mesures if timedelta(0) <= d <= DUREE_MAX]
+    if mesures:
+        enregistrer_mesures(mesures)
+
+
+def _statistiques_verrouillees(cles, stats):
+    """
+    Ajoute à `stats` les statistiques des clés (type, plat_id, niveau) lues
+    verrouillées ; en cas de doublon, la plus ancienne est gardée
+    """
+    for s in StatistiquePreparation.objects.select_for_update().filter(
+        type_duree__in={t for t, _, _ in cles},
+        niveau_charge__in={n for _, _, n in cles},
+    ).order_by('id'):
+        cle = (s.type_duree, s.plat_id, s.niveau_charge)
+        if cle in cles:
+            stats.setdefault(cle, s)
+
+
+def enregistrer_mesures(mesures):
+    """
+    Intègre des mesures (type, plat_id, niveau, secondes) aux moyennes glissantes
+
+    Les statistiques existantes sont relues verrouillées : deux apprentissages
+    simultanés s'appliquent l'un après l'autre au lieu de s'écraser. Seules
+    les clés absentes sont insérées ; les contraintes d'unicité partielles
+    écartent alors les insertions concurrentes (MySQL, qui les ignore, ne
+    crée de doublon que dans cette course, et la plus ancienne ligne reste
+    celle qui apprend).
+    """
+    cles = {(t, p, n) for t, p, n, _ in mesures}
+    maintenant = timezone.now()
+
+    with transaction.atomic():
+        stats = {}
+        _statistiques_verrouillees(cles, stats)
+        manquantes = cles - stats.keys()
+        if manquantes:
+            StatistiquePreparation.objects.bulk_create([
+                StatistiquePreparation(type_duree=t, plat_id=p, niveau_charge=n, date_modification=maintenant)
+                for t, p, n in manquantes
+            ], ignore_conflicts=True)
+            _statistiques_verrouillees(manquantes, stats)
+        for type_duree, plat_id, niveau, secondes in mesures:
+            stat = stats[(type_duree, plat_id, niveau)]
+            stat.nb_mesures += 1
+            poids = max(1 / stat.nb_mesures, ALPHA)
+            stat.moyenne_secondes += poids * (secondes - stat.moyenne_secondes)
+            stat.date_modification = maintenant
+        StatistiquePreparation.objects.bulk_update(
+            stats.values(), ['nb_mesures', 'moyenne_secondes', 'date_modification']
+        )
+
+
+class Estimateur:
+    """Estime la fin des commandes actives à partir des statistiques (une lecture)"""
+
+    def __init__(self, charge=None):
+        if charge is None:
+            charge = charge_cuisine()
+        self.niveau = niveau_charge(charge)
+        self.moyennes = {}
+        cumuls = defaultdict(lambda: [0, 0.0])
+        for stat in StatistiquePreparation.objects.all():
+            self.moyennes[(stat.type_duree, stat.plat_id, stat.niveau_charge)] = stat.moyenne_secondes
+            cumul = cumuls[(stat.type_duree, stat.plat_id)]
+            cumul[0] += stat.nb_mesures
+            cumul[1] += stat.nb_mesures * stat.moyenne_secondes
+        # Repli toutes charges confondues quand le niveau courant n'a pas de mesure
+        self.moyennes_globales = {cle: total / nb for cle, (nb, total) in cumuls.items() if nb}
+
+    def duree(self, type_duree, plat_id=None):
+        """Durée moyenne en secondes, ou None sans aucune mesure"""
+        moyenne = self.moyennes.get((type_duree, plat_id, self.niveau))
+        if moyenne is None:
+            moyenne = self.moyennes_globales.get((type_duree, plat_id))
+        return moyenne
+
+    def duree_preparation(self, commande):
+        """Les plats sont préparés en parallèle : le plus long fixe la durée"""
+        durees = [
+            self.duree(TypeDuree.PREPARATION, ligne.plat_id)
+            for ligne in commande.commandeplat_set.all()
+            if ligne.plat.necessite_preparation
+        ]
+        durees = [d for d in durees if d is not None]
+        return max(durees) if durees else TEMPS_ESTIME_DEFAUT * 60
+
+    def secondes_restantes(self, commande, maintenant=None):
+        """
+        Temps restant avant que la commande soit prête, ou None si elle est sortie
+        de la cuisine ; utilise commande.debut_preparation (avec_debut_preparation)
+        """
+        maintenant = maintenant or timezone.now()
+        if commande.etat == EtatCommande.EN_ATTENTE:
+            attente = self.duree(TypeDuree.ATTENTE) or 0
+            ecoule = (maintenant - commande.date_commande).total_seconds()
+            return max(attente - ecoule, 0) + self.duree_preparation(commande)
+        if commande.etat in (EtatCommande.EN_PREPARATION, EtatCommande.EN_COURS):
+            debut = getattr(commande, 'debut_preparation', None) or commande.date_modification
+            ecoule = (maintenant - debut).total_seconds()
+            return max(self.duree_preparation(commande) - ecoule, 0)
+        return None
+
+    def minutes_restantes(self, commande, maintenant=None):
+        secondes = self.secondes_restantes(commande, maintenant)
+        if secondes is None:
+            return None
+        return max(1, math.ceil(secondes / 60))
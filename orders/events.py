@@ -0,0 +1,124 @@
+"""
+Diffusion en temps réel des changements de commandes (Server-Sent Events).
+
+Les signaux de orders publient chaque commande enregistrée ou supprimée ;
+les flux ouverts par restaurant.views.flux_commandes s'y abonnent. Les abonnés
+sont de simples files asyncio en mémoire : un client inactif ne coûte aucune
+requête SQL et le filtrage par table se fait sur le message déjà construit.
+
+Le diffuseur vit dans le processus : le flux doit être servi par un seul
+worker ASGI (voir core/asgi.py) pour que tous les abonnés reçoivent tous
+les événements.
+"""
+import asyncio
+import json
+import threading
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+class Abonnement:
+    """File d'événements d'un client connecté au flux"""
+
+    def __init__(self, loop, table_id=None, taille_max=100):
+        self.loop = loop
+        self.table_id = table_id
+        self.file = asyncio.Queue(maxsize=taille_max)
+
+    def accepte(self, message):
+        """Une table ne reçoit que ses propres commandes, la cuisine reçoit tout"""
+        return self.table_id is None or self.table_id == message['table_id']
+
+    def pousser(self, message):
+        """Dépose un message depuis n'importe quel thread"""
+        try:
+            self.loop.call_soon_threadsafe(self._deposer, message)
+        except RuntimeError:
+            # Boucle fermée : le client est parti, il sera désabonné
+            pass
+
+    def _deposer(self, message):
+        if self.file.full():
+            # Client trop lent : on sacrifie le plus ancien événement
+            self.file.get_nowait()
+        self.file.put_nowait(message)
+
+
+class DiffuseurCommandes:
+    """Registre des abonnés au flux des commandes (un par processus)"""
+
+    def __init__(self):
+        self._abonnes = set()
+        self._lock = threading.Lock()
+
+    def abonner(self, table_id=None):
+        abonnement = Abonnement(asyncio.get_running_loop(), table_id)
+        with self._lock:
+            self._abonnes.add(abonnement)
+        return abonnement
+
+    def desabonner(self, abonnement):
+        with self._lock:
+            self._abonnes.discard(abonnement)
+
+    def nombre_abonnes(self):
+        with self._lock:
+            return len(self._abonnes)
+
+    def publier(self, message):
+        with self._lock:
+            abonnes = list(self._abonnes)
+        for abonnement in abonnes:
+            if abonnement.accepte(message):
+                abonnement.pousser(message)
+
+
+diffuseur = DiffuseurCommandes()
+
+
+def message_commande(commande):
+    """Construit le message diffusé pour une commande"""
+    return {
+        'id': commande.id,
+        'table_id': commande.table_id,
+        'table_numero': commande.table.numero_table,
+        'etat': commande.etat,
+        'etat_display': commande.get_etat_display(),
+        'heure': commande.date_commande.strftime('%H:%M'),
+        'total': str(commande.total),
+        'date_modification': commande.date_modification.isoformat(),
+    }
+
+
+def publier_commande(commande):
+    """Diffuse l'état courant d'une commande à tous les abonnés concernés"""
+    if diffuseur.nombre_abonnes():
+        diffuseur.publier(message_commande(commande))
+
+
+def publier_suppression(commande_id, table_id):
+    """Diffuse la disparition d'une commande"""
+    if diffuseur.nombre_abonnes():
+        diffuseur.publier({'id': commande_id, 'table_id': table_id, 'supprimee': True})
+
+
+def format_sse(message, evenement='commande'):
+    data = json.dumps(message, cls=DjangoJSONEncoder)
+    return f"event: {evenement}\ndata: {data}\n\n"
+
+
+async def flux_sse(table_id=None, intervalle_ping=15):
+    """Générateur asynchrone du flux text/event-stream d'un client"""
+    abonnement = diffuseur.abonner(table_id)
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            try:
+                message = await asyncio.wait_for(abonnement.file.get(), intervalle_ping)
+            except asyncio.TimeoutError:
+                # Commentaire SSE : garde la connexion ouverte à travers les proxys
+                yield ': ping\n\n'
+                continue
+            yield format_sse(message)
+    finally:
+        diffuseur.desabonner(abonnement)
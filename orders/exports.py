@@ -0,0 +1,76 @@
+"""
+Export en flux des commandes et de leurs lignes (voir core.exports)
+
+En CSV, une ligne par plat commandé (les colonnes de la commande sont
+répétées) ; en JSON Lines, un objet par commande avec la liste de ses lignes.
+Les deux sont produits par une seule requête parcourue par lots.
+"""
+from datetime import timedelta
+from itertools import groupby
+from core.exports import TAILLE_LOT, lire_periode
+from core.periodes import debut_jour
+from .models import Commande
+
+
+COLONNES_COMMANDE = ['id', 'date_commande', 'table', 'serveur', 'etat', 'total']
+COLONNES_LIGNE = ['plat', 'quantite', 'prix_unitaire', 'sous_total']
+COLONNES = COLONNES_COMMANDE + COLONNES_LIGNE
+
+
+def commandes_filtrees(parametres):
+    """Commandes filtrées comme commande_list : etat, date, date_debut, date_fin"""
+    commandes = Commande.objects.all()
+    etat = parametres.get('etat')
+    if etat:
+        commandes = commandes.filter(etat=etat)
+    debut, fin = lire_periode(parametres)
+    if debut:
+        commandes = commandes.filter(date_commande__gte=debut_jour(debut))
+    if fin:
+        commandes = commandes.filter(date_commande__lt=debut_jour(fin + timedelta(days=1)))
+    return commandes
+
+
+def _lignes(commandes):
+    """(commande, ligne) par plat commandé, les commandes sans plat ayant une ligne vide"""
+    champs = (
+        'id', 'date_commande', 'table__numero_table', 'serveur__login', 'etat', 'total',
+        'commandeplat_set__plat__nom', 'commandeplat_set__quantite', 'commandeplat_set__prix_unitaire',
+    )
+    lignes = (commandes
+              .order_by('date_commande', 'id', 'commandeplat_set__id')
+              .values_list(*champs)
+              .iterator(chunk_size=TAILLE_LOT))
+    for ligne in lignes:
+        commande = dict(zip(COLONNES_COMMANDE, ligne[:6]))
+        plat, quantite, prix = ligne[6:]
+        if plat is None and quantite is None:
+            yield commande, None
+        else:
+            yield commande, {
+                'plat': plat, 'quantite': quantite, 'prix_unitaire': prix,
+                'sous_total': quantite * prix,
+            }
+
+
+def enregistrements_csv(commandes):
+    """Un dictionnaire par plat commandé"""
+    for commande, ligne in _lignes(commandes):
+        yield {**commande, **(ligne or {})}
+
+
+def enregistrements_jsonl(commandes):
+    """Un dictionnaire par commande, avec ses lignes"""
+    for _, groupe in groupby(_lignes(commandes), key=lambda paire: paire[0]['id']):
+        groupe = list(groupe)
+        commande = groupe[0][0]
+        commande['lignes'] = [ligne for _, ligne in groupe if ligne is not None]
+        yield commande
+
+
+def preparer(parametres, format):
+    """(colonnes, enregistrements) de l'export des commandes"""
+    commandes = commandes_filtrees(parametres)
+    if format == 'jsonl':
+        return COLONNES, enregistrements_jsonl(commandes)
+    return COLONNES, enregistrements_csv(commandes)
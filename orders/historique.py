@@ -0,0 +1,39 @@
+"""
+Journal des changements d'état des commandes.
+
+Les transitions (orders.transitions) et la prise de commande (orders.services)
+appellent journaliser avec les changements qu'elles viennent d'écrire : une
+seule insertion groupée dans historique_etats_commandes. Les statistiques de
+l'estimateur sont mises à jour après la validation de la transaction : un
+apprentissage en échec est journalisé mais n'annule jamais une transition.
+"""
+from django.db import transaction
+from .estimations import apprendre, charge_cuisine
+from .models import HistoriqueEtatCommande
+
+
+def journaliser(changements, utilisateur=None):
+    """
+    Enregistre des changements d'état [(commande, ancien_etat, nouvel_etat, date), ...]
+
+    À appeler dans la transaction qui a écrit les nouveaux états.
+    """
+    if not changements:
+        return []
+
+    if utilisateur is not None and not utilisateur.is_authenticated:
+        utilisateur = None
+    charge = charge_cuisine()
+    entrees = HistoriqueEtatCommande.objects.bulk_create([
+        HistoriqueEtatCommande(
+            commande=commande,
+            ancien_etat=ancien_etat,
+            nouvel_etat=nouvel_etat,
+            utilisateur=utilisateur,
+            date=date,
+            charge_cuisine=charge,
+        )
+        for commande, ancien_etat, nouvel_etat, date in changements
+    ])
+    transaction.on_commit(lambda: apprendre(entrees, charge), robust=True)
+    return entrees
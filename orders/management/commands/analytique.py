@@ -0,0 +1,30 @@
+import time
+from django.core.management.base import BaseCommand
+from orders.analytique import charger, panier_moyen, rafraichir
+
+
+class Command(BaseCommand):
+    help = 'Rafraîchit les colonnes NumPy de l\'historique des lignes de commande (orders.analytique)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reconstruire',
+            action='store_true',
+            help='Tout relire depuis la base (élimine aussi les commandes supprimées)',
+        )
+
+    def handle(self, *args, **options):
+        depart = time.perf_counter()
+        resultat = rafraichir(reconstruire=options['reconstruire'])
+        duree = time.perf_counter() - depart
+        self.stdout.write(
+            f"{resultat['ajoutees']} ligne(s) ajoutée(s), {resultat['retirees']} retirée(s), "
+            f"{resultat['lignes']} au total en {duree:.1f} s"
+        )
+
+        depart = time.perf_counter()
+        panier = panier_moyen(donnees=charger())
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {panier['commandes']} commande(s), panier moyen {panier['panier_moyen']:,.0f} GNF "
+            f"(calculé en {(time.perf_counter() - depart) * 1000:.0f} ms)"
+        ))
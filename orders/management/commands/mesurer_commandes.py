@@ -0,0 +1,74 @@
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from restaurant.models import Plat, TableRestaurant
+from orders.models import Commande, CommandePlat, EtatCommande
+from orders.services import creer_commande, preparer_lignes
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare la prise de commande ligne par ligne (ancien chemin des vues) et le service '
+        'orders.services (requêtes et durée par commande) ; rien n\'est conservé en base'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lignes', type=int, nargs='+', default=[1, 10, 50],
+            help='Tailles de panier mesurées (défaut 1 10 50)',
+        )
+        parser.add_argument('--repetitions', type=int, default=20, help='Commandes créées par mesure (défaut 20)')
+
+    def handle(self, *args, **options):
+        # Tout est annulé à la fin : plats et table de mesure compris. Les
+        # requêtes comptées incluent les points de sauvegarde des transactions
+        # imbriquées, identiques pour les deux chemins.
+        with transaction.atomic():
+            table = TableRestaurant.objects.create(numero_table='MESURE', nombre_places=4)
+            plats = Plat.objects.bulk_create([
+                Plat(nom=f'Plat de mesure {i}', prix_unitaire=Decimal('10000') + i)
+                for i in range(max(options['lignes']))
+            ])
+
+            self.stdout.write(f"{'Lignes':>6}  {'Ligne par ligne':>24}  {'Service':>24}")
+            for nombre in options['lignes']:
+                panier = [(plat.id, 2) for plat in plats[:nombre]]
+                avant = self._mesurer(lambda: self._ligne_par_ligne(table, panier), options['repetitions'])
+                apres = self._mesurer(
+                    lambda: creer_commande(table, preparer_lignes(panier)), options['repetitions']
+                )
+                self.stdout.write(f'{nombre:>6}  {avant}  {apres}')
+
+            transaction.set_rollback(True)
+
+    def _ligne_par_ligne(self, table, panier):
+        """Ancien chemin des vues : une lecture de plat et un INSERT par ligne"""
+        commande = Commande.objects.create(table=table, etat=EtatCommande.EN_ATTENTE, total=0)
+        total = 0
+        for plat_id, quantite in panier:
+            plat = Plat.objects.get(id=plat_id)
+            CommandePlat.objects.create(
+                commande=commande, plat=plat, quantite=quantite, prix_unitaire=plat.prix_unitaire
+            )
+            total += plat.prix_unitaire * quantite
+        commande.total = total
+        commande.save()
+
+    def _mesurer(self, creer, repetitions):
+        creer()  # préparation hors mesure
+        requetes = 0
+
+        def compter(execute, sql, params, many, context):
+            nonlocal requetes
+            requetes += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(compter):
+            depart = time.perf_counter()
+            for _ in range(repetitions):
+                creer()
+            duree = time.perf_counter() - depart
+        return (
+            f'{requetes / repetitions:6.0f} requêtes {duree / repetitions * 1000:7.1f} ms'
+        ).rjust(24)
@@ -0,0 +1,165 @@
+"""
+Ingénierie de menu : popularité et chiffre d'affaires de chaque plat sur une
+période, comparés à la période précédente de même durée.
+
+Les chiffres viennent des bilans journaliers (payments.bilans), qui gardent
+par jour et par plat la quantité vendue, le nombre de commandes et le montant
+au prix de la commande (prix_unitaire * quantite), hors commandes annulées.
+La période et la période précédente sont lues ensemble, une ligne par jour :
+le coût ne dépend pas du nombre de lignes de commande.
+
+Classement (méthode Kasavana et Smith) : un plat est populaire si sa part des
+quantités atteint 70 % de la part moyenne (1 / nombre de plats), rentable si
+son prix moyen de vente atteint le prix moyen pondéré du menu. Le coût de
+revient des plats n'étant pas connu, le prix de vente tient lieu de marge.
+"""
+from datetime import timedelta
+from decimal import Decimal
+from restaurant.models import Plat
+from .models import EtatCommande
+
+
+ZERO = Decimal('0')
+
+SEUIL_POPULARITE = Decimal('0.7')
+
+# (populaire, rentable) -> classe
+CLASSES = {
+    (True, True): 'Vedette',
+    (True, False): 'Cheval de labour',
+    (False, True): 'Énigme',
+    (False, False): 'Poids mort',
+}
+
+COLONNES = [
+    'plat_id', 'plat', 'type', 'disponible', 'prix_actuel', 'quantite', 'part_quantite',
+    'nb_commandes', 'part_commandes', 'montant', 'part_montant', 'prix_moyen',
+    'quantite_precedente', 'montant_precedent', 'tendance_quantite', 'tendance_montant', 'classe',
+]
+
+
+def periode_precedente(debut, fin):
+    """Période de même durée qui précède debut"""
+    duree = fin - debut + timedelta(days=1)
+    return debut - duree, debut - timedelta(days=1)
+
+
+def _cumuls(debut, fin):
+    """
+    Cumuls par plat de la période et de la période précédente, et nombre de
+    commandes non annulées de la période (une lecture des bilans)
+    """
+    from payments.models import BilanJournalier
+    precedent_debut, _ = periode_precedente(debut, fin)
+    courant, precedent = {}, {}
+    nb_commandes = 0
+    bilans = (BilanJournalier.objects
+              .filter(jour__gte=precedent_debut, jour__lte=fin)
+              .values_list('jour', 'nb_commandes', 'commandes_par_etat', 'plats'))
+    for jour, nombre, par_etat, plats in bilans:
+        cumuls = courant if jour >= debut else precedent
+        if jour >= debut:
+            nb_commandes += nombre - par_etat.get(EtatCommande.ANNULEE, 0)
+        for plat_id, (nom, quantite, commandes, montant) in plats.items():
+            cumul = cumuls.setdefault(int(plat_id), [nom, 0, 0, ZERO])
+            cumul[1] += quantite
+            cumul[2] += commandes
+            cumul[3] += Decimal(montant)
+    return courant, precedent, nb_commandes
+
+
+def _part(valeur, total):
+    return valeur * 100 / total if total else 0
+
+
+def _tendance(valeur, precedente):
+    """Variation en % par rapport à la période précédente, None sans base de comparaison"""
+    if not precedente:
+        return None
+    return (valeur - precedente) * 100 / precedente
+
+
+def analyse(debut, fin):
+    """
+    Analyse du menu des jours debut à fin inclus : une ligne par plat (plats
+    disponibles et plats vendus sur l'une des deux périodes), triée par
+    chiffre d'affaires décroissant, et totaux
+    """
+    courant, precedent, nb_commandes = _cumuls(debut, fin)
+    carte = {
+        plat['id']: plat
+        for plat in Plat.objects.values('id', 'nom', 'type_plat', 'prix_unitaire', 'disponible')
+    }
+    types = dict(Plat.TYPE_PLAT_CHOICES)
+    # Plats à la carte ou vendus sur la période ; les plats vendus seulement
+    # sur la période précédente sont listés mais ne comptent pas dans le seuil
+    au_menu = {i for i, plat in carte.items() if plat['disponible']} | set(courant)
+    identifiants = au_menu | set(precedent)
+
+    total_quantite = sum(c[1] for c in courant.values())
+    total_montant = sum((c[3] for c in courant.values()), ZERO)
+    prix_moyen_menu = total_montant / total_quantite if total_quantite else ZERO
+    # Part des quantités attendue d'un plat « moyen », pondérée du seuil
+    seuil = SEUIL_POPULARITE / len(au_menu) if au_menu else ZERO
+
+    plats = []
+    for plat_id in identifiants:
+        fiche = carte.get(plat_id)
+        nom, quantite, commandes, montant = courant.get(plat_id, [None, 0, 0, ZERO])
+        _, quantite_precedente, _, montant_precedent = precedent.get(plat_id, [None, 0, 0, ZERO])
+        if fiche is not None:
+            nom = fiche['nom']
+        elif nom is None:
+            nom = precedent[plat_id][0]
+        prix_moyen = montant / quantite if quantite else ZERO
+        populaire = bool(total_quantite) and Decimal(quantite) / total_quantite >= seuil
+        rentable = bool(quantite) and prix_moyen >= prix_moyen_menu
+        plats.append({
+            'plat_id': plat_id,
+            'plat': nom,
+            'type': types.get(fiche['type_plat'], '') if fiche else '',
+            'disponible': fiche['disponible'] if fiche else False,
+            'prix_actuel': fiche['prix_unitaire'] if fiche else None,
+            'quantite': quantite,
+            'part_quantite': _part(quantite, total_quantite),
+            'nb_commandes': commandes,
+            'part_commandes': _part(commandes, nb_commandes),
+            'montant': montant,
+            'part_montant': _part(montant, total_montant),
+            'prix_moyen': prix_moyen,
+            'quantite_precedente': quantite_precedente,
+            'montant_precedent': montant_precedent,
+            'tendance_quantite': _tendance(quantite, quantite_precedente),
+            'tendance_montant': _tendance(montant, montant_precedent),
+            'classe': CLASSES[populaire, rentable],
+        })
+    plats.sort(key=lambda p: (-p['montant'], -p['quantite'], p['plat']))
+
+    precedent_debut, precedent_fin = periode_precedente(debut, fin)
+    return {
+        'debut': debut,
+        'fin': fin,
+        'precedent_debut': precedent_debut,
+        'precedent_fin': precedent_fin,
+        'plats': plats,
+        'total': {
+            'quantite': total_quantite,
+            'montant': total_montant,
+            'nb_commandes': nb_commandes,
+            'prix_moyen': prix_moyen_menu,
+            'quantite_precedente': sum(c[1] for c in precedent.values()),
+            'montant_precedent': sum((c[3] for c in precedent.values()), ZERO),
+        },
+    }
+
+
+def enregistrements(donnees):
+    """Lignes CSV de l'analyse (parts et tendances arrondies à 0,1 %)"""
+    for plat in donnees['plats']:
+        ligne = dict(plat)
+        for cle in ('part_quantite', 'part_commandes', 'part_montant', 'tendance_quantite', 'tendance_montant'):
+            if ligne[cle] is not None:
+                ligne[cle] = round(float(ligne[cle]), 1)
+        ligne['prix_moyen'] = round(ligne['prix_moyen'], 2)
+        ligne['disponible'] = 'oui' if ligne['disponible'] else 'non'
+        yield ligne
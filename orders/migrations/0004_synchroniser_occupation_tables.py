@@ -0,0 +1,35 @@
+from django.db import migrations
+
+
+ETATS_EN_SERVICE = ['EN_ATTENTE', 'EN_PREPARATION', 'EN_COURS']
+
+
+def synchroniser_occupation(apps, schema_editor):
+    """Initialise est_occupee à partir de la dernière commande de chaque table"""
+    TableRestaurant = apps.get_model('restaurant', 'TableRestaurant')
+    Commande = apps.get_model('orders', 'Commande')
+    Paiement = apps.get_model('payments', 'Paiement')
+
+    for table in TableRestaurant.objects.all():
+        derniere = Commande.objects.filter(table=table).order_by('-date_commande', '-id').first()
+        occupee = False
+        if derniere is not None:
+            if derniere.etat in ETATS_EN_SERVICE:
+                occupee = True
+            elif derniere.etat == 'TERMINEE':
+                occupee = not Paiement.objects.filter(commande=derniere).exists()
+        if table.est_occupee != occupee:
+            TableRestaurant.objects.filter(pk=table.pk).update(est_occupee=occupee)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_commande_utilisateur_alter_commande_serveur'),
+        ('payments', '0001_initial'),
+        ('restaurant', '0005_qrcode'),
+    ]
+
+    operations = [
+        migrations.RunPython(synchroniser_occupation, migrations.RunPython.noop),
+    ]
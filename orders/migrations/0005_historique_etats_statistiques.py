@@ -0,0 +1,54 @@
+# Generated by Django 5.0 on 2026-10-18 04:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_synchroniser_occupation_tables'),
+        ('restaurant', '0005_qrcode'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistoriqueEtatCommande',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ancien_etat', models.CharField(blank=True, choices=[('EN_ATTENTE', 'En attente'), ('EN_COURS', 'En cours'), ('EN_PREPARATION', 'En préparation'), ('TERMINEE', 'Terminée'), ('ANNULEE', 'Annulée')], max_length=20, null=True, verbose_name='Ancien état')),
+                ('nouvel_etat', models.CharField(choices=[('EN_ATTENTE', 'En attente'), ('EN_COURS', 'En cours'), ('EN_PREPARATION', 'En préparation'), ('TERMINEE', 'Terminée'), ('ANNULEE', 'Annulée')], max_length=20, verbose_name='Nouvel état')),
+                ('date', models.DateTimeField(verbose_name='Date')),
+                ('charge_cuisine', models.PositiveIntegerField(default=0, verbose_name='Commandes actives en cuisine')),
+                ('commande', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historique_etats', to='orders.commande', verbose_name='Commande')),
+                ('utilisateur', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+            ],
+            options={
+                'verbose_name': "Changement d'état",
+                'verbose_name_plural': 'Historique des états',
+                'db_table': 'historique_etats_commandes',
+                'ordering': ['date', 'id'],
+                'indexes': [models.Index(fields=['commande', 'date'], name='historique_commande_date_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StatistiquePreparation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_duree', models.CharField(choices=[('ATTENTE', 'Attente avant prise en charge'), ('PREPARATION', 'Préparation')], max_length=20, verbose_name='Type de durée')),
+                ('niveau_charge', models.PositiveSmallIntegerField(verbose_name='Niveau de charge')),
+                ('nb_mesures', models.PositiveIntegerField(default=0, verbose_name='Nombre de mesures')),
+                ('moyenne_secondes', models.FloatField(default=0, verbose_name='Durée moyenne (s)')),
+                ('date_modification', models.DateTimeField(auto_now=True)),
+                ('plat', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='statistiques_preparation', to='restaurant.plat', verbose_name='Plat')),
+            ],
+            options={
+                'verbose_name': 'Statistique de préparation',
+                'verbose_name_plural': 'Statistiques de préparation',
+                'db_table': 'statistiques_preparation',
+                'unique_together': {('type_duree', 'plat', 'niveau_charge')},
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.0 on 2026-10-18 04:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_historique_etats_statistiques'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketPoste',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('poste', models.CharField(choices=[('CHAUD', 'Cuisine chaude'), ('FROID', 'Garde-manger (froid)'), ('DESSERT', 'Pâtisserie'), ('BAR', 'Bar')], max_length=20, verbose_name='Poste')),
+                ('etat', models.CharField(choices=[('EN_ATTENTE', 'En attente'), ('EN_PREPARATION', 'En préparation'), ('PRET', 'Prêt')], default='EN_ATTENTE', max_length=20, verbose_name='État')),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_modification', models.DateTimeField(auto_now=True)),
+                ('commande', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tickets', to='orders.commande', verbose_name='Commande')),
+            ],
+            options={
+                'verbose_name': 'Ticket de poste',
+                'verbose_name_plural': 'Tickets de poste',
+                'db_table': 'tickets_postes',
+                'ordering': ['date_creation', 'id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='commandeplat',
+            name='ticket',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lignes', to='orders.ticketposte', verbose_name='Ticket de poste'),
+        ),
+        migrations.AddIndex(
+            model_name='ticketposte',
+            index=models.Index(fields=['poste', 'etat', 'date_creation'], name='ticket_file_poste_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='ticketposte',
+            unique_together={('commande', 'poste')},
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0 on 2026-10-18 04:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_tickets_postes'),
+        ('restaurant', '0006_categorie_poste'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='commande',
+            index=models.Index(fields=['etat', 'date_commande'], name='commande_etat_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='commande',
+            index=models.Index(fields=['table', '-date_commande'], name='commande_table_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='commande',
+            index=models.Index(fields=['date_commande'], name='commande_date_idx'),
+        ),
+    ]
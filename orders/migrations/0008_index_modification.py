@@ -0,0 +1,20 @@
+# Generated by Django 5.0 on 2026-10-18 05:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_index_dates'),
+        ('restaurant', '0006_categorie_poste'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='commande',
+            index=models.Index(fields=['date_modification'], name='commande_modification_idx'),
+        ),
+    ]
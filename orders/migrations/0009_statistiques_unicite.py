@@ -0,0 +1,49 @@
+# Generated by Django 5.0 on 2026-10-18 05:32
+
+from django.db import migrations, models
+
+
+def fusionner_doublons(apps, schema_editor):
+    """
+    Fusionne les statistiques sans plat en double (l'ancienne contrainte ne
+    les empêchait pas) en une moyenne pondérée par le nombre de mesures
+    """
+    StatistiquePreparation = apps.get_model('orders', 'StatistiquePreparation')
+
+    groupes = {}
+    for stat in StatistiquePreparation.objects.filter(plat__isnull=True).order_by('id'):
+        groupes.setdefault((stat.type_duree, stat.niveau_charge), []).append(stat)
+    for stats in groupes.values():
+        if len(stats) < 2:
+            continue
+        gardee = stats[0]
+        nb_mesures = sum(stat.nb_mesures for stat in stats)
+        if nb_mesures:
+            gardee.moyenne_secondes = sum(stat.nb_mesures * stat.moyenne_secondes for stat in stats) / nb_mesures
+        gardee.nb_mesures = nb_mesures
+        gardee.save(update_fields=['nb_mesures', 'moyenne_secondes'])
+        StatistiquePreparation.objects.filter(pk__in=[stat.pk for stat in stats[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_index_modification'),
+        ('restaurant', '0006_categorie_poste'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='statistiquepreparation',
+            unique_together=set(),
+        ),
+        migrations.RunPython(fusionner_doublons, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='statistiquepreparation',
+            constraint=models.UniqueConstraint(condition=models.Q(('plat__isnull', False)), fields=('type_duree', 'plat', 'niveau_charge'), name='statistique_plat_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='statistiquepreparation',
+            constraint=models.UniqueConstraint(condition=models.Q(('plat__isnull', True)), fields=('type_duree', 'niveau_charge'), name='statistique_sans_plat_unique'),
+        ),
+    ]
@@ -1,7 +1,7 @@
 from django.db import models
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
-from restaurant.models import TableRestaurant, Plat
+from restaurant.models import TableRestaurant, Plat, Poste
 
 
 class EtatCommande(models.TextChoices):
@@ -60,6 +60,16 @@ class Commande(models.Model):
         verbose_name = 'Commande'
         verbose_name_plural = 'Commandes'
         ordering = ['-date_commande']
+        indexes = [
+            # Files par état (cuisine, service) et compteurs du jour par état
+            models.Index(fields=['etat', 'date_commande'], name='commande_etat_date_idx'),
+            # Commandes d'une table, de la plus récente à la plus ancienne
+            models.Index(fields=['table', '-date_commande'], name='commande_table_date_idx'),
+            # Filtres par journée ou période (bornes sur la colonne brute)
+            models.Index(fields=['date_commande'], name='commande_date_idx'),
+            # Commandes modifiées depuis un instant (delta cuisine, orders.analytique)
+            models.Index(fields=['date_modification'], name='commande_modification_idx'),
+        ]
     
     def __str__(self):
         return f"Commande #{self.id} - Table {self.table.numero_table} - {self.total} GNF"
@@ -74,6 +84,52 @@ class Commande(models.Model):
         return total
 
 
+class EtatTicket(models.TextChoices):
+    """États d'un ticket de poste"""
+    EN_ATTENTE = 'EN_ATTENTE', 'En attente'
+    EN_PREPARATION = 'EN_PREPARATION', 'En préparation'
+    PRET = 'PRET', 'Prêt'
+
+
+class TicketPoste(models.Model):
+    """
+    Part d'une commande préparée par un poste de la cuisine (chaud, froid, bar...)
+    """
+    commande = models.ForeignKey(
+        Commande,
+        on_delete=models.CASCADE,
+        related_name='tickets',
+        verbose_name='Commande'
+    )
+    poste = models.CharField(
+        max_length=20,
+        choices=Poste.choices,
+        verbose_name='Poste'
+    )
+    etat = models.CharField(
+        max_length=20,
+        choices=EtatTicket.choices,
+        default=EtatTicket.EN_ATTENTE,
+        verbose_name='État'
+    )
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_modification = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'tickets_postes'
+        verbose_name = 'Ticket de poste'
+        verbose_name_plural = 'Tickets de poste'
+        ordering = ['date_creation', 'id']
+        unique_together = ['commande', 'poste']
+        indexes = [
+            # File d'un poste : ses tickets ouverts, du plus ancien au plus récent
+            models.Index(fields=['poste', 'etat', 'date_creation'], name='ticket_file_poste_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Ticket {self.get_poste_display()} - Commande #{self.commande_id}"
+
+
 class CommandePlat(models.Model):
     """
     Modèle pour les plats d'une commande
@@ -98,6 +154,14 @@ class CommandePlat(models.Model):
         decimal_places=2,
         verbose_name='Prix unitaire'
     )
+    ticket = models.ForeignKey(
+        TicketPoste,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='lignes',
+        verbose_name='Ticket de poste'
+    )
     
     class Meta:
         db_table = 'commande_plats'
@@ -117,3 +181,112 @@ class CommandePlat(models.Model):
         if not self.prix_unitaire:
             self.prix_unitaire = self.plat.prix_unitaire
         super().save(*args, **kwargs)
+
+
+class HistoriqueEtatCommande(models.Model):
+    """
+    Journal des changements d'état d'une commande (une ligne par transition,
+    jamais modifiée ni supprimée hors suppression de la commande)
+    """
+    commande = models.ForeignKey(
+        Commande,
+        on_delete=models.CASCADE,
+        related_name='historique_etats',
+        verbose_name='Commande'
+    )
+    ancien_etat = models.CharField(
+        max_length=20,
+        choices=EtatCommande.choices,
+        blank=True,
+        null=True,
+        verbose_name='Ancien état'
+    )
+    nouvel_etat = models.CharField(
+        max_length=20,
+        choices=EtatCommande.choices,
+        verbose_name='Nouvel état'
+    )
+    utilisateur = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Utilisateur'
+    )
+    date = models.DateTimeField(verbose_name='Date')
+    charge_cuisine = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Commandes actives en cuisine'
+    )
+    
+    class Meta:
+        db_table = 'historique_etats_commandes'
+        verbose_name = "Changement d'état"
+        verbose_name_plural = "Historique des états"
+        ordering = ['date', 'id']
+        indexes = [
+            models.Index(fields=['commande', 'date'], name='historique_commande_date_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Commande #{self.commande_id} : {self.ancien_etat or '-'} → {self.nouvel_etat}"
+    
+    def save(self, *args, **kwargs):
+        """Le journal est en ajout seul"""
+        if self.pk is not None:
+            raise ValueError("L'historique des états ne peut pas être modifié.")
+        super().save(*args, **kwargs)
+
+
+class TypeDuree(models.TextChoices):
+    """Durées mesurées par l'estimateur"""
+    ATTENTE = 'ATTENTE', "Attente avant prise en charge"
+    PREPARATION = 'PREPARATION', 'Préparation'
+
+
+class StatistiquePreparation(models.Model):
+    """
+    Moyenne glissante d'une durée (attente ou préparation) par plat et par
+    niveau de charge de la cuisine, mise à jour à chaque mesure
+    """
+    type_duree = models.CharField(
+        max_length=20,
+        choices=TypeDuree.choices,
+        verbose_name='Type de durée'
+    )
+    plat = models.ForeignKey(
+        Plat,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='statistiques_preparation',
+        verbose_name='Plat'
+    )
+    niveau_charge = models.PositiveSmallIntegerField(verbose_name='Niveau de charge')
+    nb_mesures = models.PositiveIntegerField(default=0, verbose_name='Nombre de mesures')
+    moyenne_secondes = models.FloatField(default=0, verbose_name='Durée moyenne (s)')
+    date_modification = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'statistiques_preparation'
+        verbose_name = 'Statistique de préparation'
+        verbose_name_plural = 'Statistiques de préparation'
+        # NULL n'est jamais égal à NULL : les statistiques sans plat (attente)
+        # ont leur propre contrainte d'unicité
+        constraints = [
+            models.UniqueConstraint(
+                fields=['type_duree', 'plat', 'niveau_charge'],
+                condition=models.Q(plat__isnull=False),
+                name='statistique_plat_unique',
+            ),
+            models.UniqueConstraint(
+                fields=['type_duree', 'niveau_charge'],
+                condition=models.Q(plat__isnull=True),
+                name='statistique_sans_plat_unique',
+            ),
+        ]
+    
+    def __str__(self):
+        cible = self.plat_id and f"plat #{self.plat_id}" or 'toutes commandes'
+        return f"{self.get_type_duree_display()} ({cible}, charge {self.niveau_charge}) : {self.moyenne_secondes / 60:.1f} min"
@@ -0,0 +1,124 @@
+"""
+Routage des commandes vers les postes de la cuisine.
+
+À la prise de commande, les lignes à préparer sont réparties en un ticket par
+poste (Plat.poste : catégorie, sinon type de plat). Les lignes sans
+préparation sont servies directement et n'ont pas de ticket. Chaque poste ne
+lit que sa propre file de tickets ouverts (index poste, état, date).
+
+La commande suit ses tickets : prise en charge au premier ticket commencé,
+terminée quand le dernier ticket est prêt.
+"""
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from .models import Commande, CommandePlat, EtatCommande, EtatTicket, TicketPoste
+from .transitions import changer_etat
+
+
+TRANSITIONS_TICKET = {
+    EtatTicket.EN_ATTENTE: [EtatTicket.EN_PREPARATION],
+    EtatTicket.EN_PREPARATION: [EtatTicket.PRET],
+    EtatTicket.PRET: [],
+}
+
+ETATS_CUISINE = [EtatCommande.EN_ATTENTE, EtatCommande.EN_PREPARATION, EtatCommande.EN_COURS]
+
+
+def repartir_lignes(commande, lignes, utilisateur=None):
+    """
+    Rattache chaque ligne à préparer (issue de preparer_lignes) au ticket de
+    son poste, en créant les tickets manquants ; retourne les tickets utilisés
+
+    Les tickets existants de la commande sont conservés avec leur état, ceux
+    qui n'ont plus de ligne sont supprimés. À appeler avant de supprimer les
+    anciennes lignes : un ticket prêt qui reçoit un plat nouveau, ou en plus
+    grande quantité, est rouvert ; si tous les tickets restants sont prêts
+    une fois les tickets vides supprimés, la commande est terminée.
+    """
+    existants = {ticket.poste: ticket for ticket in commande.tickets.all()}
+    utilises = {}
+    for ligne in lignes:
+        ligne.ticket = None
+        if not ligne.plat.necessite_preparation:
+            continue
+        poste = ligne.plat.poste()
+        ticket = utilises.get(poste) or existants.get(poste)
+        if ticket is None:
+            ticket = TicketPoste.objects.create(commande=commande, poste=poste)
+        utilises[poste] = ticket
+        ligne.ticket = ticket
+
+    prets = {ticket.pk: ticket for ticket in utilises.values() if ticket.etat == EtatTicket.PRET}
+    if prets:
+        servis = {
+            (ticket_id, plat_id): quantite
+            for ticket_id, plat_id, quantite in CommandePlat.objects.filter(
+                ticket_id__in=prets
+            ).values_list('ticket_id', 'plat_id', 'quantite')
+        }
+        rouverts = {
+            ligne.ticket.pk for ligne in lignes
+            if ligne.ticket is not None and ligne.ticket.pk in prets
+            and ligne.quantite > servis.get((ligne.ticket.pk, ligne.plat_id), 0)
+        }
+        if rouverts:
+            TicketPoste.objects.filter(pk__in=rouverts).update(
+                etat=EtatTicket.EN_ATTENTE, date_modification=timezone.now()
+            )
+            for ticket_id in rouverts:
+                prets[ticket_id].etat = EtatTicket.EN_ATTENTE
+
+    obsoletes = [ticket.pk for poste, ticket in existants.items() if poste not in utilises]
+    if obsoletes:
+        TicketPoste.objects.filter(pk__in=obsoletes).delete()
+        if (utilises and commande.etat in ETATS_CUISINE
+                and all(ticket.etat == EtatTicket.PRET for ticket in utilises.values())):
+            changer_etat(commande, EtatCommande.TERMINEE, utilisateur, depuis=ETATS_CUISINE)
+    return list(utilises.values())
+
+
+def file_poste(poste):
+    """Tickets ouverts d'un poste avec leurs lignes, du plus ancien au plus récent (deux requêtes)"""
+    lignes = CommandePlat.objects.select_related('plat').only(
+        'id', 'ticket_id', 'plat_id', 'quantite', 'plat__id', 'plat__nom'
+    ).order_by('id')
+    return (TicketPoste.objects
+            .filter(poste=poste, etat__in=[EtatTicket.EN_ATTENTE, EtatTicket.EN_PREPARATION],
+                    commande__etat__in=ETATS_CUISINE)
+            .select_related('commande__table')
+            .only('id', 'poste', 'etat', 'date_creation', 'commande__id', 'commande__etat',
+                  'commande__date_commande', 'commande__table__id', 'commande__table__numero_table')
+            .prefetch_related(Prefetch('lignes', queryset=lignes))
+            .order_by('date_creation', 'id'))
+
+
+def changer_etat_ticket(ticket, nouvel_etat, utilisateur=None):
+    """
+    Fait avancer un ticket depuis l'état lu (ticket.etat), par un UPDATE
+    conditionnel, puis répercute sur la commande
+
+    Retourne True si cet appel a effectué la transition, False si le ticket
+    avait déjà changé. Lève ValueError si la transition n'est pas permise.
+    """
+    ancien_etat = ticket.etat
+    if nouvel_etat not in TRANSITIONS_TICKET.get(ancien_etat, []):
+        raise ValueError("Transition de ticket non autorisée.")
+
+    with transaction.atomic():
+        # Verrou sur la commande : deux postes qui finissent en même temps
+        # voient chacun le ticket de l'autre avant de conclure
+        commande = Commande.objects.select_for_update().get(pk=ticket.commande_id)
+        gagne = TicketPoste.objects.filter(pk=ticket.pk, etat=ancien_etat).update(
+            etat=nouvel_etat, date_modification=timezone.now()
+        )
+        if not gagne:
+            return False
+        ticket.etat = nouvel_etat
+
+        if nouvel_etat == EtatTicket.EN_PREPARATION and commande.etat == EtatCommande.EN_ATTENTE:
+            changer_etat(commande, EtatCommande.EN_PREPARATION, utilisateur)
+        elif (nouvel_etat == EtatTicket.PRET and commande.etat in ETATS_CUISINE
+              and not commande.tickets.exclude(etat=EtatTicket.PRET).exists()):
+            changer_etat(commande, EtatCommande.TERMINEE, utilisateur, depuis=ETATS_CUISINE)
+    return True
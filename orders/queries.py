@@ -0,0 +1,122 @@
+"""
+Requêtes partagées des tableaux de commandes (cuisine, service, API cuisine)
+et du plan de salle des serveurs.
+
+Le nombre de requêtes SQL y est fixe quel que soit le nombre de commandes,
+de lignes ou de tables : la table, le serveur et le paiement sont joints, les
+lignes et leurs plats sont préchargés en une seule requête, l'état de chaque
+table est calculé par sous-requêtes, et seules les colonnes affichées sont lues.
+"""
+from django.db.models import Exists, OuterRef, Prefetch, Q, Subquery
+from restaurant.models import TableRestaurant
+from .models import Commande, CommandePlat, EtatCommande
+
+
+CHAMPS_COMMANDE = (
+    'id', 'table_id', 'serveur_id', 'etat', 'total', 'date_commande', 'date_modification',
+    'table__id', 'table__numero_table',
+)
+CHAMPS_SERVEUR = ('serveur__id', 'serveur__login')
+CHAMPS_PAIEMENT = ('paiement__id', 'paiement__commande_id', 'paiement__methode', 'paiement__montant')
+CHAMPS_LIGNE = (
+    'id', 'commande_id', 'plat_id', 'quantite', 'prix_unitaire',
+    'plat__id', 'plat__nom', 'plat__necessite_preparation',
+)
+
+
+def lignes_prefetch():
+    """Précharge les lignes d'un lot de commandes avec leur plat (une requête)"""
+    lignes = CommandePlat.objects.select_related('plat').only(*CHAMPS_LIGNE).order_by('id')
+    return Prefetch('commandeplat_set', queryset=lignes)
+
+
+def commandes_tableau(commandes=None, lignes=True, serveur=False, paiement=False):
+    """
+    Projette un queryset de commandes pour l'affichage sur un tableau
+
+    - lignes : précharge les plats commandés (commande.commandeplat_set.all)
+    - serveur : joint le serveur (commande.serveur.login)
+    - paiement : joint le paiement éventuel (commande.paiement)
+    """
+    if commandes is None:
+        commandes = Commande.objects.all()
+
+    relations = ['table']
+    champs = list(CHAMPS_COMMANDE)
+    if serveur:
+        relations.append('serveur')
+        champs.extend(CHAMPS_SERVEUR)
+    if paiement:
+        relations.append('paiement')
+        champs.extend(CHAMPS_PAIEMENT)
+
+    commandes = commandes.select_related(*relations).only(*champs)
+    if lignes:
+        commandes = commandes.prefetch_related(lignes_prefetch())
+    return commandes
+
+
+# États d'une dernière commande qui occupent la table (en plus des commandes
+# servies mais pas encore payées)
+ETATS_EN_SERVICE = [EtatCommande.EN_ATTENTE, EtatCommande.EN_PREPARATION, EtatCommande.EN_COURS]
+
+# Libellé et couleur du plan de salle selon l'état de la dernière commande
+ETATS_TABLE = {
+    EtatCommande.EN_ATTENTE: ('Commande en attente', 'yellow'),
+    EtatCommande.EN_PREPARATION: ('Commande en préparation', 'orange'),
+    EtatCommande.EN_COURS: ('Commande en cours', 'blue'),
+}
+
+
+def derniere_commande(table):
+    """Commandes d'une table, la plus récente en premier (table peut être un OuterRef)"""
+    return Commande.objects.filter(table=table).order_by('-date_commande', '-id')
+
+
+def tables_avec_etat(tables=None):
+    """
+    Annote chaque table avec sa dernière commande (id, état, total, date) et
+    son paiement, en une seule requête quel que soit le nombre de tables
+    """
+    if tables is None:
+        tables = TableRestaurant.objects.all()
+
+    derniere = derniere_commande(OuterRef('pk'))
+    return tables.annotate(
+        derniere_commande_id=Subquery(derniere.values('id')[:1]),
+        derniere_commande_etat=Subquery(derniere.values('etat')[:1]),
+        derniere_commande_total=Subquery(derniere.values('total')[:1]),
+        derniere_commande_date=Subquery(derniere.values('date_commande')[:1]),
+        derniere_commande_payee=Exists(
+            Commande.objects.filter(pk=OuterRef('derniere_commande_id'), paiement__isnull=False)
+        ),
+    )
+
+
+def etat_salle(etat, payee):
+    """Retourne (libellé, couleur, occupée) d'une table selon sa dernière commande"""
+    if etat in ETATS_TABLE:
+        libelle, couleur = ETATS_TABLE[etat]
+        return libelle, couleur, True
+    if etat == EtatCommande.TERMINEE:
+        if payee:
+            return 'Commande payée', 'green', False
+        return 'Commande servie', 'purple', True
+    return 'Libre', 'green', False
+
+
+def synchroniser_occupation(tables=None):
+    """
+    Recalcule TableRestaurant.est_occupee en un seul UPDATE, avec la même règle
+    que etat_salle : dernière commande en service, ou servie et non payée
+    """
+    if tables is None:
+        tables = TableRestaurant.objects.all()
+
+    derniere_id = Subquery(derniere_commande(OuterRef(OuterRef('pk'))).values('id')[:1])
+    occupee = Exists(
+        Commande.objects.filter(pk=derniere_id).filter(
+            Q(etat__in=ETATS_EN_SERVICE) | Q(etat=EtatCommande.TERMINEE, paiement__isnull=True)
+        )
+    )
+    return tables.update(est_occupee=occupee)
@@ -0,0 +1,127 @@
+"""
+Prise de commande : création et modification d'une commande avec ses lignes.
+
+Le panier est validé contre une seule lecture des plats, les lignes sont
+insérées en un seul bulk_create et le total est calculé une fois, puis la
+commande n'est écrite qu'une fois, le tout dans une même transaction.
+Les signaux de CommandePlat (recalcul du total à chaque ligne) sont court-
+circuités : le coût ne dépend plus du nombre de lignes. Les lignes à préparer
+sont réparties en tickets de poste (orders.postes).
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.db import transaction
+from restaurant.models import Plat, TableRestaurant
+from .models import Commande, CommandePlat, EtatCommande
+from .historique import journaliser
+from .postes import ETATS_CUISINE, repartir_lignes
+from .queries import synchroniser_occupation
+
+
+# Vrai pendant une écriture groupée : les signaux de CommandePlat ne
+# recalculent pas le total, le service s'en charge une seule fois
+recalcul_total_suspendu = ContextVar('recalcul_total_suspendu', default=False)
+
+
+class CommandeInvalide(ValueError):
+    """Panier refusé (plat inconnu, quantité invalide, panier vide)"""
+
+
+@contextmanager
+def sans_recalcul_total():
+    jeton = recalcul_total_suspendu.set(True)
+    try:
+        yield
+    finally:
+        recalcul_total_suspendu.reset(jeton)
+
+
+def preparer_lignes(lignes):
+    """
+    Valide un panier [(plat_id, quantite), ...] et retourne les lignes
+    CommandePlat non enregistrées, avec leur plat et le prix du moment
+
+    Les quantités nulles sont ignorées et un même plat est regroupé en une
+    seule ligne. Une seule requête quelle que soit la taille du panier.
+    """
+    quantites = {}
+    for plat_id, quantite in lignes:
+        try:
+            plat_id, quantite = int(plat_id), int(quantite)
+        except (TypeError, ValueError):
+            raise CommandeInvalide("Plat ou quantité invalide.")
+        if quantite < 0:
+            raise CommandeInvalide("Quantité invalide.")
+        if quantite:
+            quantites[plat_id] = quantites.get(plat_id, 0) + quantite
+
+    if not quantites:
+        raise CommandeInvalide("Veuillez sélectionner au moins un plat.")
+
+    plats = Plat.objects.select_related('categorie').only(
+        'id', 'nom', 'prix_unitaire', 'necessite_preparation', 'type_plat', 'categorie', 'categorie__poste'
+    ).in_bulk(quantites)
+    inconnus = set(quantites) - set(plats)
+    if inconnus:
+        raise CommandeInvalide(f"Plat introuvable : {', '.join(map(str, sorted(inconnus)))}.")
+
+    return [
+        CommandePlat(plat=plats[plat_id], quantite=quantite, prix_unitaire=plats[plat_id].prix_unitaire)
+        for plat_id, quantite in quantites.items()
+    ]
+
+
+def total_lignes(lignes):
+    return sum((ligne.sous_total() for ligne in lignes), 0)
+
+
+def creer_commande(table, lignes, etat=EtatCommande.EN_ATTENTE, serveur=None, utilisateur=None):
+    """
+    Crée une commande et ses lignes (issues de preparer_lignes) :
+    un INSERT pour la commande, un par ticket de poste, un pour toutes les lignes
+    """
+    with transaction.atomic(), sans_recalcul_total():
+        commande = Commande.objects.create(
+            table=table,
+            serveur=serveur,
+            utilisateur=utilisateur,
+            etat=etat,
+            total=total_lignes(lignes),
+        )
+        for ligne in lignes:
+            ligne.commande = commande
+        if etat in ETATS_CUISINE:
+            repartir_lignes(commande, lignes)
+        CommandePlat.objects.bulk_create(lignes)
+        journaliser([(commande, None, etat, commande.date_commande)], serveur or utilisateur)
+    return commande
+
+
+def remplacer_lignes(commande, lignes, table_id=None, utilisateur=None):
+    """
+    Remplace toutes les lignes d'une commande existante et réécrit son total
+    (et éventuellement sa table) en une seule mise à jour
+    """
+    champs = ['total', 'date_modification']
+    ancienne_table_id = commande.table_id
+    if table_id is not None:
+        commande.table_id = int(table_id)
+        champs.append('table')
+
+    with transaction.atomic(), sans_recalcul_total():
+        for ligne in lignes:
+            ligne.commande = commande
+        if commande.etat in ETATS_CUISINE:
+            # Verrou sur la commande, comme changer_etat_ticket : un poste qui
+            # termine son ticket attend la nouvelle répartition. Avant la
+            # suppression : les tickets prêts se comparent aux anciennes lignes
+            list(Commande.objects.select_for_update().filter(pk=commande.pk).values_list('pk'))
+            repartir_lignes(commande, lignes, utilisateur)
+        CommandePlat.objects.filter(commande=commande).delete()
+        CommandePlat.objects.bulk_create(lignes)
+        commande.total = total_lignes(lignes)
+        commande.save(update_fields=champs)
+        if commande.table_id != ancienne_table_id:
+            # Le signal ne resynchronise que la nouvelle table
+            synchroniser_occupation(TableRestaurant.objects.filter(pk=ancienne_table_id))
+    return commande
@@ -2,13 +2,18 @@ from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.db import transaction
 from .models import Commande, CommandePlat
+from .events import publier_commande, publier_suppression
+from .queries import synchroniser_occupation
+from .services import recalcul_total_suspendu
+from .transitions import commande_transitionnee
+from restaurant.models import TableRestaurant
 
 @receiver(post_save, sender=CommandePlat)
 def mettre_a_jour_total_commande_ajout(sender, instance, created, **kwargs):
     """
     Met à jour le total de la commande lors de l'ajout d'un plat
     """
-    if created:
+    if created and not recalcul_total_suspendu.get():
         with transaction.atomic():
             instance.commande.calculer_total()
 
@@ -17,6 +22,8 @@ def mettre_a_jour_total_commande_suppression(sender, instance, **kwargs):
     """
     Met à jour le total de la commande lors de la suppression d'un plat
     """
+    if recalcul_total_suspendu.get():
+        return
     with transaction.atomic():
         instance.commande.calculer_total()
 
@@ -25,6 +32,37 @@ def mettre_a_jour_total_commande_modification(sender, instance, **kwargs):
     """
     Met à jour le total de la commande lors de la modification d'un plat
     """
-    if not kwargs.get('created', False):
+    if not kwargs.get('created', False) and not recalcul_total_suspendu.get():
         with transaction.atomic():
             instance.commande.calculer_total()
+
+@receiver(post_save, sender=Commande)
+def diffuser_commande(sender, instance, **kwargs):
+    """
+    Pousse le nouvel état de la commande vers les flux temps réel après validation
+    """
+    transaction.on_commit(lambda: publier_commande(instance))
+
+@receiver(post_delete, sender=Commande)
+def diffuser_suppression_commande(sender, instance, **kwargs):
+    """
+    Signale la suppression d'une commande aux flux temps réel
+    """
+    commande_id, table_id = instance.id, instance.table_id
+    transaction.on_commit(lambda: publier_suppression(commande_id, table_id))
+
+@receiver(post_save, sender=Commande)
+@receiver(post_delete, sender=Commande)
+def mettre_a_jour_occupation_table(sender, instance, **kwargs):
+    """
+    Tient à jour TableRestaurant.est_occupee à chaque écriture de commande
+    """
+    synchroniser_occupation(TableRestaurant.objects.filter(pk=instance.table_id))
+
+@receiver(commande_transitionnee, sender=Commande)
+def diffuser_transition(sender, commande, **kwargs):
+    """
+    Les transitions passent par update() : diffuse la commande comme le
+    ferait post_save
+    """
+    transaction.on_commit(lambda: publier_commande(commande))
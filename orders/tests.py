@@ -0,0 +1,415 @@
+import shutil
+import tempfile
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from accounts.models import EtatTache, Tache, User
+from core.testing import ConcurrenceMixin
+from payments.models import Paiement
+from restaurant.models import Plat, TableRestaurant
+from . import analytique
+from .estimations import enregistrer_mesures
+from .models import (Commande, CommandePlat, EtatCommande, EtatTicket, HistoriqueEtatCommande,
+                     StatistiquePreparation, TypeDuree)
+from .postes import changer_etat_ticket
+from .services import creer_commande, preparer_lignes, remplacer_lignes
+from .queries import commandes_tableau
+from .transitions import changer_etat, changer_etats
+
+
+ETATS_ACTIFS = [EtatCommande.EN_ATTENTE, EtatCommande.EN_PREPARATION, EtatCommande.EN_COURS]
+
+
+class BudgetRequetesTableauxTests(TestCase):
+    """
+    Le nombre de requêtes des tableaux de commandes ne dépend ni du nombre de
+    commandes ni du nombre de lignes (orders.queries)
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(login='admin01', password='secret')
+        cls.serveur = User.objects.create_user(login='serveur01', password='secret', role='Rserveur')
+        cls.table = TableRestaurant.objects.create(numero_table='T01', nombre_places=4)
+        cls.plats = [
+            Plat.objects.create(nom=f'Plat {i}', prix_unitaire=Decimal('10000'))
+            for i in range(3)
+        ]
+
+    def creer_commandes(self, nombre):
+        """Crée nombre commandes actives de trois lignes chacune"""
+        commandes = Commande.objects.bulk_create([
+            Commande(
+                table=self.table, serveur=self.serveur,
+                etat=ETATS_ACTIFS[i % len(ETATS_ACTIFS)], total=Decimal('30000'),
+            )
+            for i in range(nombre)
+        ])
+        CommandePlat.objects.bulk_create([
+            CommandePlat(commande=commande, plat=plat, quantite=1, prix_unitaire=plat.prix_unitaire)
+            for commande in commandes
+            for plat in self.plats
+        ])
+        Paiement.objects.create(
+            commande=commandes[0], montant=commandes[0].total, methode='especes',
+        )
+
+    def verifier_budget(self, nombre, budget, executer):
+        self.creer_commandes(nombre)
+        with self.assertNumQueries(budget):
+            executer()
+
+    def parcourir_tableau(self):
+        for commande in commandes_tableau(
+            Commande.objects.filter(etat__in=ETATS_ACTIFS), serveur=True, paiement=True
+        ):
+            commande.table.numero_table
+            commande.serveur.login
+            getattr(commande, 'paiement', None)
+            for ligne in commande.commandeplat_set.all():
+                ligne.plat.nom
+
+    def test_commandes_tableau_10(self):
+        self.verifier_budget(10, 2, self.parcourir_tableau)
+
+    def test_commandes_tableau_500(self):
+        self.verifier_budget(500, 2, self.parcourir_tableau)
+
+    def get(self, nom, budget, nombre, *args):
+        self.client.force_login(self.admin)
+        url = reverse(nom, args=args)
+        self.creer_commandes(nombre)
+        # Première requête hors budget (vérifications ponctuelles de la base)
+        self.client.get(url)
+        with self.assertNumQueries(budget):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_api_cuisine(self):
+        for nombre in (10, 490):
+            response = self.get('restaurant:etat_commandes_cuisine', 6, nombre)
+        self.assertEqual(len(response.json()['commandes']), 500)
+
+    def test_cuisinier_home(self):
+        for nombre in (10, 490):
+            self.get('restaurant:cuisinier_home', 4, nombre)
+
+    def test_commandes_en_cours(self):
+        for nombre in (10, 490):
+            self.get('orders:commandes_en_cours', 4, nombre)
+
+    def test_serveur_table_commandes(self):
+        for nombre in (10, 490):
+            self.get('restaurant:serveur_table_commandes', 4, nombre, self.table.id)
+
+
+class TransitionsTests(TestCase):
+    """Transitions d'une commande (orders.transitions) et correction par l'administrateur"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(login='admin01', password='secret')
+        cls.serveur = User.objects.create_user(login='serveur01', password='secret', role='Rserveur')
+        cls.table = TableRestaurant.objects.create(numero_table='T01', nombre_places=4)
+
+    def setUp(self):
+        self.commande = Commande.objects.create(table=self.table, etat=EtatCommande.EN_ATTENTE)
+
+    def test_echec_dans_la_transaction_rejouable(self):
+        # Le journal échoue : rien n'est écrit et l'objet garde l'état lu
+        with mock.patch('orders.transitions.journaliser', side_effect=OperationalError('database is locked')):
+            with self.assertRaises(OperationalError):
+                changer_etat(self.commande, EtatCommande.EN_PREPARATION)
+        self.assertEqual(self.commande.etat, EtatCommande.EN_ATTENTE)
+        self.assertTrue(changer_etat(self.commande, EtatCommande.EN_PREPARATION))
+        self.assertEqual(self.commande.etat, EtatCommande.EN_PREPARATION)
+        self.commande.refresh_from_db()
+        self.assertEqual(self.commande.etat, EtatCommande.EN_PREPARATION)
+
+    def changer(self, utilisateur, etat):
+        self.client.force_login(utilisateur)
+        self.client.post(reverse('orders:changer_etat_commande', args=[self.commande.id]), {'etat': etat})
+        self.commande.refresh_from_db()
+        return self.commande.etat
+
+    def test_correction_par_l_administrateur(self):
+        Commande.objects.filter(pk=self.commande.pk).update(etat=EtatCommande.TERMINEE)
+        self.assertEqual(self.changer(self.admin, EtatCommande.EN_ATTENTE), EtatCommande.EN_ATTENTE)
+        self.assertEqual(
+            HistoriqueEtatCommande.objects.get(commande=self.commande).ancien_etat, EtatCommande.TERMINEE
+        )
+
+    def test_serveur_limite_aux_transitions(self):
+        Commande.objects.filter(pk=self.commande.pk).update(etat=EtatCommande.TERMINEE)
+        self.assertEqual(self.changer(self.serveur, EtatCommande.EN_ATTENTE), EtatCommande.TERMINEE)
+
+    def test_choix_proposes(self):
+        self.client.force_login(self.serveur)
+        response = self.client.get(reverse('orders:commande_detail', args=[self.commande.id]))
+        self.assertEqual(
+            [etat for etat, _ in response.context['etat_choices']],
+            [EtatCommande.EN_PREPARATION, EtatCommande.ANNULEE],
+        )
+
+
+class ConcurrenceTransitionsTests(ConcurrenceMixin, TransactionTestCase):
+    """
+    Plusieurs cuisiniers agissent en même temps sur les mêmes commandes :
+    chaque UPDATE conditionnel n'a qu'un gagnant (orders.transitions)
+    """
+
+    def setUp(self):
+        self.table = TableRestaurant.objects.create(numero_table='T01', nombre_places=4)
+        self.commandes = Commande.objects.bulk_create([
+            Commande(table=self.table, etat=EtatCommande.EN_ATTENTE, total=Decimal('0'))
+            for _ in range(5)
+        ])
+
+    def test_prise_de_commande_un_seul_gagnant(self):
+        commande_id = self.commandes[0].id
+        # Chaque cuisinier a lu la commande en attente avant de la prendre
+        lues = [Commande.objects.get(pk=commande_id) for _ in range(self.FILS)]
+
+        def prendre(numero):
+            return self.reessayer(lambda: changer_etat(lues[numero], EtatCommande.EN_PREPARATION))
+
+        resultats = self.en_parallele(prendre)
+        self.assertEqual(resultats.count(True), 1)
+        self.assertEqual(
+            HistoriqueEtatCommande.objects.filter(
+                commande_id=commande_id, nouvel_etat=EtatCommande.EN_PREPARATION
+            ).count(),
+            1,
+        )
+
+    def test_lot_chaque_commande_gagnee_une_fois(self):
+        ids = [commande.id for commande in self.commandes]
+
+        def prendre_lot(numero):
+            return self.reessayer(lambda: changer_etats(ids, EtatCommande.EN_PREPARATION))
+
+        lots = self.en_parallele(prendre_lot)
+        for commande_id in ids:
+            self.assertEqual(sum(lot[commande_id].ok for lot in lots), 1)
+        self.assertEqual(
+            HistoriqueEtatCommande.objects.filter(
+                commande_id__in=ids, nouvel_etat=EtatCommande.EN_PREPARATION
+            ).count(),
+            len(ids),
+        )
+
+
+class ApprentissageTests(TestCase):
+    """Statistiques de l'estimateur (orders.estimations)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.plat = Plat.objects.create(nom='Riz sauce', prix_unitaire=Decimal('20000'))
+
+    def test_statistique_sans_plat_unique(self):
+        enregistrer_mesures([(TypeDuree.ATTENTE, None, 0, 60)])
+        enregistrer_mesures([(TypeDuree.ATTENTE, None, 0, 120)])
+        stat = StatistiquePreparation.objects.get()
+        self.assertEqual(stat.nb_mesures, 2)
+        self.assertEqual(stat.moyenne_secondes, 90)
+
+    def test_statistiques_existantes_sans_insertion(self):
+        # Sans contrainte partielle (MySQL), une insertion par appel créerait un doublon
+        mesures = [(TypeDuree.ATTENTE, None, 0, 60), (TypeDuree.PREPARATION, self.plat.id, 1, 600)]
+        enregistrer_mesures(mesures)
+        with CaptureQueriesContext(connection) as requetes:
+            enregistrer_mesures(mesures)
+        self.assertFalse([r for r in requetes if r['sql'].lstrip().upper().startswith('INSERT')])
+        self.assertEqual(StatistiquePreparation.objects.count(), 2)
+        self.assertEqual(set(StatistiquePreparation.objects.values_list('nb_mesures', flat=True)), {2})
+
+    def test_apprentissage_apres_validation(self):
+        table = TableRestaurant.objects.create(numero_table='T01', nombre_places=4)
+        commande = Commande.objects.create(table=table, etat=EtatCommande.EN_ATTENTE)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(changer_etat(commande, EtatCommande.EN_PREPARATION))
+            self.assertFalse(StatistiquePreparation.objects.exists())
+        self.assertEqual(StatistiquePreparation.objects.get().type_duree, TypeDuree.ATTENTE)
+
+    def test_echec_apprentissage_sans_effet_sur_la_transition(self):
+        table = TableRestaurant.objects.create(numero_table='T01', nombre_places=4)
+        commande = Commande.objects.create(table=table, etat=EtatCommande.EN_ATTENTE)
+        with mock.patch('orders.historique.apprendre', side_effect=RuntimeError), \
+                self.assertLogs('django', 'ERROR'), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(changer_etat(commande, EtatCommande.EN_PREPARATION))
+        commande.refresh_from_db()
+        self.assertEqual(commande.etat, EtatCommande.EN_PREPARATION)
+
+
+class RepartitionPostesTests(TestCase):
+    """Modification d'une commande déjà en cuisine (orders.postes)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.table = TableRestaurant.objects.create(numero_table='T01', nombre_places=4)
+        cls.chaud = Plat.objects.create(nom='Riz sauce', prix_unitaire=Decimal('20000'), type_plat='principal')
+        cls.dessert = Plat.objects.create(nom='Gâteau', prix_unitaire=Decimal('8000'), type_plat='dessert')
+
+    def commande_en_cuisine(self, panier):
+        commande = creer_commande(self.table, preparer_lignes(panier))
+        return commande, {ticket.poste: ticket for ticket in commande.tickets.all()}
+
+    def test_ticket_pret_rouvert_par_un_ajout(self):
+        commande, tickets = self.commande_en_cuisine([(self.chaud.id, 1), (self.dessert.id, 1)])
+        ticket = tickets[self.chaud.poste()]
+        changer_etat_ticket(ticket, EtatTicket.EN_PREPARATION)
+        changer_etat_ticket(ticket, EtatTicket.PRET)
+
+        remplacer_lignes(commande, preparer_lignes([(self.chaud.id, 2), (self.dessert.id, 1)]))
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.etat, EtatTicket.EN_ATTENTE)
+
+    def test_ticket_pret_garde_si_rien_n_est_ajoute(self):
+        commande, tickets = self.commande_en_cuisine([(self.chaud.id, 2), (self.dessert.id, 1)])
+        ticket = tickets[self.chaud.poste()]
+        changer_etat_ticket(ticket, EtatTicket.EN_PREPARATION)
+        changer_etat_ticket(ticket, EtatTicket.PRET)
+
+        remplacer_lignes(commande, preparer_lignes([(self.chaud.id, 1), (self.dessert.id, 1)]))
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.etat, EtatTicket.PRET)
+
+    def test_commande_terminee_quand_le_dernier_ticket_ouvert_disparait(self):
+        commande, tickets = self.commande_en_cuisine([(self.chaud.id, 1), (self.dessert.id, 1)])
+        ticket = tickets[self.chaud.poste()]
+        changer_etat_ticket(ticket, EtatTicket.EN_PREPARATION)
+        changer_etat_ticket(ticket, EtatTicket.PRET)
+
+        commande.refresh_from_db()
+        remplacer_lignes(commande, preparer_lignes([(self.chaud.id, 1)]))
+        commande.refresh_from_db()
+        self.assertEqual(commande.etat, EtatCommande.TERMINEE)
+        self.assertEqual(list(commande.tickets.values_list('poste', flat=True)), [self.chaud.poste()])
+
+
+class AnalytiqueTests(TestCase):
+    """
+    Rafraîchissement incrémental des colonnes (orders.analytique) : après
+    modifications, annulations et remplacements de lignes, les agrégats
+    restent ceux de l'ORM
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(login='admin01', password='secret')
+        cls.tables = [
+            TableRestaurant.objects.create(numero_table=f'T{i:02}', nombre_places=4) for i in range(2)
+        ]
+        cls.plats = [
+            Plat.objects.create(nom=f'Plat {i}', prix_unitaire=Decimal('5000') * (i + 1)) for i in range(3)
+        ]
+
+    def setUp(self):
+        dossier = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, dossier, ignore_errors=True)
+        reglages = override_settings(ANALYTIQUE_DOSSIER=dossier)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+
+    def commander(self, table, panier):
+        return creer_commande(table, preparer_lignes([(self.plats[i].id, quantite) for i, quantite in panier]))
+
+    def vieillir(self):
+        """Commandes actuelles hors de la marge de temps : seule la marque d'identifiant les couvre"""
+        Commande.objects.update(date_modification=timezone.now() - timedelta(days=1))
+
+    def verifier(self):
+        """Les agrégats des colonnes sont ceux calculés par l'ORM"""
+        montants, tables, quantites = defaultdict(int), {}, defaultdict(int)
+        for commande_id, table_id, plat_id, quantite, prix in (
+            CommandePlat.objects.exclude(commande__etat=EtatCommande.ANNULEE)
+            .values_list('commande_id', 'commande__table_id', 'plat_id', 'quantite', 'prix_unitaire')
+        ):
+            montants[commande_id] += quantite * int(prix)
+            tables[commande_id] = table_id
+            quantites[plat_id] += quantite
+        par_table = defaultdict(lambda: [0, 0])
+        for commande_id, montant in montants.items():
+            par_table[tables[commande_id]][0] += 1
+            par_table[tables[commande_id]][1] += montant
+
+        donnees = analytique.charger()
+        panier = analytique.panier_moyen(donnees=donnees)
+        self.assertEqual((panier['commandes'], panier['chiffre']), (len(montants), sum(montants.values())))
+        self.assertEqual(
+            {t['table_id']: [t['commandes'], t['chiffre']] for t in analytique.depense_par_table(donnees=donnees)},
+            dict(par_table),
+        )
+        plats, matrice = analytique.matrice_heure_plat(donnees=donnees)
+        self.assertEqual(dict(zip(plats.tolist(), matrice.sum(axis=0).tolist())), dict(quantites))
+
+    def test_rafraichissement_incremental(self):
+        premiere = self.commander(self.tables[0], [(0, 2), (1, 1)])
+        seconde = self.commander(self.tables[1], [(1, 3)])
+        troisieme = self.commander(self.tables[0], [(2, 1)])
+        self.assertEqual(analytique.rafraichir()['ajoutees'], 4)
+        self.verifier()
+        self.vieillir()
+
+        # Ligne modifiée, commande annulée, lignes remplacées, commande neuve
+        ligne = premiere.commandeplat_set.get(plat=self.plats[0])
+        ligne.quantite = 5
+        ligne.save()
+        self.assertTrue(changer_etat(seconde, EtatCommande.ANNULEE))
+        remplacer_lignes(troisieme, preparer_lignes([(self.plats[0].id, 1), (self.plats[2].id, 4)]))
+        self.commander(self.tables[1], [(0, 1), (2, 2)])
+
+        resultat = analytique.rafraichir()
+        # Lignes des trois commandes modifiées relues, plus les deux neuves
+        self.assertEqual(resultat['retirees'], 4)
+        self.assertEqual(resultat['ajoutees'], 7)
+        self.verifier()
+
+        # Rien de modifié depuis : rien de relu hors marge
+        self.vieillir()
+        self.assertEqual(analytique.rafraichir()['ajoutees'], 0)
+        self.verifier()
+
+    def test_compactage_et_reconstruction(self):
+        commande = self.commander(self.tables[0], [(0, 2), (1, 1)])
+        supprimee = self.commander(self.tables[1], [(2, 1)])
+        analytique.rafraichir()
+        self.vieillir()
+        remplacer_lignes(commande, preparer_lignes([(self.plats[1].id, 2)]))
+
+        with mock.patch('orders.analytique.TAUX_COMPACTAGE', 0):
+            analytique.rafraichir()
+        meta = analytique._lire_meta()
+        self.assertEqual((meta['retirees'], meta['lignes']), (0, CommandePlat.objects.count()))
+        self.verifier()
+
+        # Une commande supprimée ne disparaît qu'à la reconstruction
+        supprimee.delete()
+        analytique.rafraichir(reconstruire=True)
+        self.verifier()
+
+    def test_vue_sans_rafraichissement(self):
+        self.commander(self.tables[0], [(0, 1)])
+        self.client.force_login(self.admin)
+        for _ in range(2):
+            response = self.client.get(reverse('orders:analyses_commandes'))
+            self.assertContains(response, 'Préparation des analyses en cours')
+        # Confié au travailleur, une seule fois ; aucun fichier construit
+        self.assertEqual(Tache.objects.filter(nom='analytique', etat=EtatTache.EN_ATTENTE).count(), 1)
+        self.assertIsNone(analytique.rafraichi_le())
+
+        Tache.objects.all().delete()
+        analytique.rafraichir()
+        with mock.patch('orders.analytique.rafraichir') as rafraichir:
+            response = self.client.get(reverse('orders:analyses_commandes'))
+        rafraichir.assert_not_called()
+        self.assertContains(response, 'Données au')
+        self.assertFalse(Tache.objects.exists())
@@ -0,0 +1,161 @@
+"""
+Machine à états des commandes.
+
+Chaque transition est appliquée par un seul
+UPDATE commandes SET etat = ? WHERE id = ? AND etat = ? : si deux personnes
+agissent en même temps sur la même commande, une seule mise à jour touche la
+ligne et l'autre apprend qu'elle a perdu. Seuls etat et date_modification
+sont écrits, jamais le reste de la ligne (total, table...).
+
+update() ne déclenche pas post_save : l'occupation des tables est resynchronisée
+ici, chaque transition gagnée est inscrite au journal des états
+(orders.historique) et émet le signal commande_transitionnee, sur lequel
+orders.signals branche la diffusion temps réel.
+"""
+import copy
+from collections import defaultdict, namedtuple
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+from restaurant.models import TableRestaurant
+from .historique import journaliser
+from .models import Commande, EtatCommande
+from .queries import synchroniser_occupation
+
+
+# Transitions autorisées depuis chaque état
+TRANSITIONS = {
+    EtatCommande.EN_ATTENTE: [EtatCommande.EN_PREPARATION, EtatCommande.ANNULEE],
+    EtatCommande.EN_PREPARATION: [EtatCommande.EN_COURS, EtatCommande.ANNULEE],
+    EtatCommande.EN_COURS: [EtatCommande.TERMINEE, EtatCommande.EN_PREPARATION, EtatCommande.ANNULEE],
+    EtatCommande.TERMINEE: [],  # État final
+    EtatCommande.ANNULEE: [],   # État final
+}
+
+# Émis après chaque transition gagnée (arguments : commande, ancien_etat,
+# nouvel_etat, utilisateur, date)
+commande_transitionnee = Signal()
+
+
+class TransitionInterdite(ValueError):
+    """La transition demandée n'est pas permise depuis l'état courant"""
+
+
+# Résultat d'une transition dans un lot : erreur vaut None, 'introuvable',
+# 'interdite' ou 'conflit' (commande modifiée entre la lecture et l'écriture)
+ResultatTransition = namedtuple('ResultatTransition', ['ok', 'etat', 'erreur'])
+
+
+def transition_autorisee(ancien_etat, nouvel_etat):
+    return nouvel_etat in TRANSITIONS.get(ancien_etat, [])
+
+
+def changer_etat(commande, nouvel_etat, utilisateur=None, depuis=None):
+    """
+    Fait passer la commande de l'état lu (commande.etat) à nouvel_etat
+
+    - depuis : états de départ acceptés par l'appelant (par défaut, tout état
+      dont TRANSITIONS permet d'atteindre nouvel_etat)
+
+    Lève TransitionInterdite si la transition n'est pas permise. Retourne
+    True si cet appel a effectué la transition, False si la commande avait
+    déjà changé d'état entre la lecture et l'écriture.
+    """
+    ancien_etat = commande.etat
+    if depuis is not None:
+        permise = ancien_etat in depuis
+    else:
+        permise = transition_autorisee(ancien_etat, nouvel_etat)
+    if not permise:
+        raise TransitionInterdite("Transition d'état non autorisée.")
+
+    maintenant = timezone.now()
+    with transaction.atomic():
+        gagne = Commande.objects.filter(pk=commande.pk, etat=ancien_etat).update(
+            etat=nouvel_etat, date_modification=maintenant
+        )
+        if gagne:
+            # Le journal et les récepteurs voient la commande transitionnée ;
+            # l'objet de l'appelant ne change qu'une fois la transaction
+            # passée, pour qu'un nouvel essai rejoue la même transition
+            transitionnee = copy.copy(commande)
+            transitionnee.etat = nouvel_etat
+            transitionnee.date_modification = maintenant
+            synchroniser_occupation(TableRestaurant.objects.filter(pk=commande.table_id))
+            journaliser([(transitionnee, ancien_etat, nouvel_etat, maintenant)], utilisateur)
+            commande_transitionnee.send(
+                sender=Commande,
+                commande=transitionnee,
+                ancien_etat=ancien_etat,
+                nouvel_etat=nouvel_etat,
+                utilisateur=utilisateur,
+                date=maintenant,
+            )
+    if gagne:
+        commande.etat = nouvel_etat
+        commande.date_modification = maintenant
+    return bool(gagne)
+
+
+def changer_etats(commande_ids, nouvel_etat, utilisateur=None):
+    """
+    Applique la même transition à un lot de commandes, dans une transaction
+
+    Les commandes sont lues en une requête puis mises à jour par un seul
+    UPDATE ... WHERE id IN (...) AND etat = ? par état de départ. Retourne
+    {commande_id: ResultatTransition} pour chaque identifiant demandé.
+    """
+    commande_ids = set(commande_ids)
+    resultats = {}
+    maintenant = timezone.now()
+
+    with transaction.atomic():
+        etats = dict(Commande.objects.filter(pk__in=commande_ids).values_list('id', 'etat'))
+        par_etat = defaultdict(list)
+        for commande_id in commande_ids:
+            etat = etats.get(commande_id)
+            if etat is None:
+                resultats[commande_id] = ResultatTransition(False, None, 'introuvable')
+            elif not transition_autorisee(etat, nouvel_etat):
+                resultats[commande_id] = ResultatTransition(False, etat, 'interdite')
+            else:
+                par_etat[etat].append(commande_id)
+
+        if not par_etat:
+            return resultats
+
+        candidats = [commande_id for groupe in par_etat.values() for commande_id in groupe]
+        for ancien_etat, groupe in par_etat.items():
+            Commande.objects.filter(pk__in=groupe, etat=ancien_etat).update(
+                etat=nouvel_etat, date_modification=maintenant
+            )
+
+        # Les lignes portant notre horodatage sont celles que ce lot a gagnées
+        gagnees = list(Commande.objects.select_related('table').filter(
+            pk__in=candidats, etat=nouvel_etat, date_modification=maintenant
+        ))
+        perdues = set(candidats) - {commande.id for commande in gagnees}
+        if perdues:
+            etats.update(Commande.objects.filter(pk__in=perdues).values_list('id', 'etat'))
+            for commande_id in perdues:
+                resultats[commande_id] = ResultatTransition(False, etats.get(commande_id), 'conflit')
+
+        if gagnees:
+            synchroniser_occupation(TableRestaurant.objects.filter(
+                pk__in={commande.table_id for commande in gagnees}
+            ))
+            journaliser(
+                [(commande, etats[commande.id], nouvel_etat, maintenant) for commande in gagnees],
+                utilisateur,
+            )
+        for commande in gagnees:
+            resultats[commande.id] = ResultatTransition(True, nouvel_etat, None)
+            commande_transitionnee.send(
+                sender=Commande,
+                commande=commande,
+                ancien_etat=etats[commande.id],
+                nouvel_etat=nouvel_etat,
+                utilisateur=utilisateur,
+                date=maintenant,
+            )
+    return resultats
@@ -12,4 +12,8 @@ urlpatterns = [
     path('changer-etat/<int:commande_id>/', views.changer_etat_commande, name='changer_etat_commande'),
     path('en-cours/', views.commandes_en_cours, name='commandes_en_cours'),
     path('statistiques/', views.statistiques_commandes, name='statistiques_commandes'),
+    path('statistiques/menu/', views.analyse_menu, name='analyse_menu'),
+    path('statistiques/menu/export/', views.export_analyse_menu, name='export_analyse_menu'),
+    path('statistiques/analyses/', views.analyses_commandes, name='analyses_commandes'),
+    path('export/', views.export_commandes, name='export_commandes'),
 ]
@@ -3,15 +3,21 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
-from django.db.models import Sum, Count
 from django.utils import timezone
-from datetime import datetime, date
+from datetime import datetime, timedelta
+from accounts.decorators import admin_or_financial_required
+from core.exports import FORMATS, ExportInvalide, flux_csv, flux_jsonl, lire_periode, reponse_export, reponse_flux
+from core.pagination import paginer
+from core.periodes import filtre_jour
 from .models import Commande, CommandePlat, EtatCommande
+from .queries import commandes_tableau
+from .services import preparer_lignes, creer_commande, remplacer_lignes, CommandeInvalide
+from .transitions import changer_etat, TransitionInterdite, TRANSITIONS
 
 @login_required
 def commande_list(request):
     """Liste des commandes"""
-    commandes = Commande.objects.all().order_by('-date_commande')
+    commandes = Commande.objects.select_related('table', 'serveur')
     
     # Filtrer par état si spécifié
     etat = request.GET.get('etat')
@@ -23,19 +29,28 @@ def commande_list(request):
     if date_filter:
         try:
             filter_date = datetime.strptime(date_filter, '%Y-%m-%d').date()
-            commandes = commandes.filter(date_commande__date=filter_date)
+            commandes = commandes.filter(**filtre_jour('date_commande', filter_date))
         except ValueError:
             pass
     
     etats = EtatCommande.choices
     context = {
-        'commandes': commandes,
+        'commandes': paginer(request, commandes, ['-date_commande', '-id'], comptage='approche'),
         'etats': etats,
         'etat_filter': etat,
         'date_filter': date_filter
     }
     return render(request, 'orders/commande_list.html', context)
 
+@admin_or_financial_required
+def export_commandes(request):
+    """Export en flux (CSV ou JSON Lines) des commandes et de leurs lignes, mêmes filtres que la liste"""
+    try:
+        return reponse_export(request, 'commandes')
+    except ExportInvalide as e:
+        messages.error(request, str(e))
+        return redirect('orders:commande_list')
+
 @login_required
 def commande_detail(request, commande_id):
     """Détail d'une commande"""
@@ -44,10 +59,17 @@ def commande_detail(request, commande_id):
     # Récupérer les plats de la commande avec toutes les informations
     commande_plats = commande.commandeplat_set.select_related('plat').all()
     
+    # L'administrateur peut corriger vers n'importe quel état ; les autres
+    # ne voient que les transitions permises depuis l'état courant
+    if request.user.role == 'Radmin':
+        etat_choices = EtatCommande.choices
+    else:
+        etat_choices = [(etat, EtatCommande(etat).label) for etat in TRANSITIONS.get(commande.etat, [])]
+
     context = {
         'commande': commande,
         'commande_plats': commande_plats,
-        'etat_choices': EtatCommande.choices,
+        'etat_choices': etat_choices,
     }
     return render(request, 'orders/commande_detail.html', context)
 
@@ -71,28 +93,16 @@ def nouvelle_commande(request):
             messages.error(request, 'Veuillez sélectionner une table et au moins un plat.')
             return redirect('orders:nouvelle_commande')
         
-        # Créer la commande avec total initialisé à 0
-        commande = Commande.objects.create(
-            table_id=table_id,
-            serveur=request.user,
-            etat=EtatCommande.EN_COURS,
-            total=0  # Initialiser le total à 0
-        )
-        
-        # Ajouter les plats à la commande
-        total = 0
-        for plat_id, quantite in zip(plats, quantites):
-            if quantite and int(quantite) > 0:
-                commande_plat = CommandePlat.objects.create(
-                    commande=commande,
-                    plat_id=plat_id,
-                    quantite=int(quantite)
-                )
-                total += commande_plat.sous_total()
+        # Créer la commande et ses lignes en une seule transaction
+        from restaurant.models import TableRestaurant
+        table = get_object_or_404(TableRestaurant, id=table_id)
+        try:
+            lignes = preparer_lignes(zip(plats, [q or 0 for q in quantites]))
+        except CommandeInvalide as e:
+            messages.error(request, str(e))
+            return redirect('orders:nouvelle_commande')
         
-        # Mettre à jour le total
-        commande.total = total
-        commande.save()
+        commande = creer_commande(table, lignes, etat=EtatCommande.EN_COURS, serveur=request.user)
         
         messages.success(request, f'Commande #{commande.id} créée avec succès!')
         return redirect('orders:commande_detail', commande_id=commande.id)
@@ -116,10 +126,19 @@ def changer_etat_commande(request, commande_id):
     commande = get_object_or_404(Commande, id=commande_id)
     nouvel_etat = request.POST.get('etat')
     
-    if nouvel_etat in [choice[0] for choice in EtatCommande.choices]:
-        commande.etat = nouvel_etat
-        commande.save()
-        messages.success(request, f'État de la commande #{commande.id} mis à jour.')
+    # Correction par l'administrateur : depuis n'importe quel état (réouverture,
+    # retour en attente...) ; les autres rôles suivent TRANSITIONS
+    depuis = EtatCommande.values if request.user.role == 'Radmin' else None
+    if nouvel_etat == commande.etat:
+        messages.info(request, f'La commande #{commande.id} est déjà dans cet état.')
+    elif nouvel_etat in [choice[0] for choice in EtatCommande.choices]:
+        try:
+            if changer_etat(commande, nouvel_etat, request.user, depuis=depuis):
+                messages.success(request, f'État de la commande #{commande.id} mis à jour.')
+            else:
+                messages.error(request, f"L'état de la commande #{commande.id} vient d'être modifié par quelqu'un d'autre.")
+        except TransitionInterdite as e:
+            messages.error(request, str(e))
     else:
         messages.error(request, 'État invalide.')
     
@@ -128,33 +147,31 @@ def changer_etat_commande(request, commande_id):
 @login_required
 def commandes_en_cours(request):
     """Liste des commandes en cours"""
-    commandes = Commande.objects.filter(
+    commandes = commandes_tableau(Commande.objects.filter(
         etat__in=[EtatCommande.EN_COURS, EtatCommande.EN_PREPARATION]
-    ).order_by('-date_commande')
+    ), serveur=True).order_by('-date_commande')
     
     return render(request, 'orders/commandes_en_cours.html', {'commandes': commandes})
 
 @login_required
 def statistiques_commandes(request):
     """Statistiques des commandes"""
+    from payments.bilans import periode
     today = timezone.now().date()
     
     # Statistiques du jour
-    commandes_aujourdhui = Commande.objects.filter(date_commande__date=today)
-    total_aujourdhui = commandes_aujourdhui.aggregate(Sum('total'))['total__sum'] or 0
-    nb_commandes_aujourdhui = commandes_aujourdhui.count()
+    bilan_jour = periode(today, today)
+    total_aujourdhui = bilan_jour['chiffre_commandes']
+    nb_commandes_aujourdhui = bilan_jour['nb_commandes']
     
     # Statistiques du mois
     month_start = today.replace(day=1)
-    commandes_mois = Commande.objects.filter(date_commande__date__gte=month_start)
-    total_mois = commandes_mois.aggregate(Sum('total'))['total__sum'] or 0
-    nb_commandes_mois = commandes_mois.count()
+    bilan_mois = periode(month_start, today)
+    total_mois = bilan_mois['chiffre_commandes']
+    nb_commandes_mois = bilan_mois['nb_commandes']
     
-    # Plats les plus populaires
-    plats_populaires = CommandePlat.objects.values('plat__nom').annotate(
-        total_quantite=Sum('quantite'),
-        nb_commandes=Count('commande')
-    ).order_by('-total_quantite')[:10]
+    # Plats les plus vendus du mois (déjà cumulés dans le bilan du mois)
+    plats_populaires = bilan_mois['plats'][:10]
     
     context = {
         'total_aujourdhui': total_aujourdhui,
@@ -166,6 +183,90 @@ def statistiques_commandes(request):
     
     return render(request, 'orders/statistiques.html', context)
 
+def _periode_menu(request):
+    """(debut, fin) de l'analyse du menu ; 30 derniers jours par défaut"""
+    debut, fin = lire_periode(request.GET)
+    fin = fin or timezone.localdate()
+    debut = debut or fin - timedelta(days=29)
+    if debut > fin:
+        raise ExportInvalide('La date de début est postérieure à la date de fin.')
+    return debut, fin
+
+@admin_or_financial_required
+def analyse_menu(request):
+    """Ingénierie de menu : quantités, chiffre, part des commandes et tendance par plat"""
+    from .menu import analyse
+    try:
+        debut, fin = _periode_menu(request)
+    except ExportInvalide as e:
+        messages.error(request, str(e))
+        return redirect('orders:analyse_menu')
+    
+    donnees = analyse(debut, fin)
+    context = {
+        **donnees,
+        'date_debut': debut,
+        'date_fin': fin,
+        'parametres_export': f"date_debut={debut.isoformat()}&date_fin={fin.isoformat()}",
+    }
+    return render(request, 'orders/analyse_menu.html', context)
+
+@admin_or_financial_required
+def export_analyse_menu(request):
+    """Export CSV (ou JSON Lines) de l'analyse du menu, mêmes paramètres que la page"""
+    from .menu import COLONNES, analyse, enregistrements
+    format = request.GET.get('format', 'csv')
+    try:
+        if format not in FORMATS:
+            raise ExportInvalide(f'Format inconnu : {format} (csv ou jsonl)')
+        debut, fin = _periode_menu(request)
+    except ExportInvalide as e:
+        messages.error(request, str(e))
+        return redirect('orders:analyse_menu')
+    
+    lignes = enregistrements(analyse(debut, fin))
+    lignes = flux_csv(COLONNES, lignes) if format == 'csv' else flux_jsonl(lignes)
+    response = reponse_flux(request, lignes, FORMATS[format])
+    response['Content-Disposition'] = (
+        f'attachment; filename="menu_{debut:%Y%m%d}_{fin:%Y%m%d}.{format}"'
+    )
+    return response
+
+@admin_or_financial_required
+def analyses_commandes(request):
+    """Panier moyen, dépense par table et ventes par heure et par plat (orders.analytique)"""
+    from restaurant.models import Plat
+    from .analytique import colonnes, depense_par_table, matrice_heure_plat, panier_moyen, rafraichi_le
+    try:
+        debut, fin = _periode_menu(request)
+    except ExportInvalide as e:
+        messages.error(request, str(e))
+        return redirect('orders:analyses_commandes')
+    
+    donnees = colonnes()
+    plats, matrice = matrice_heure_plat(debut, fin, donnees=donnees)
+    # Les dix plats les plus vendus, heures sans vente omises
+    colonnes_plats = matrice.sum(axis=0).argsort()[::-1][:10]
+    heures = [h for h in range(24) if matrice[h, colonnes_plats].any()]
+    maximum = int(matrice[:, colonnes_plats].max()) if len(colonnes_plats) else 0
+    noms = dict(Plat.objects.filter(id__in=plats[colonnes_plats].tolist()).values_list('id', 'nom'))
+    
+    context = {
+        'panier': panier_moyen(debut, fin, donnees=donnees),
+        'tables': depense_par_table(debut, fin, donnees=donnees),
+        'plats_matrice': [noms.get(int(plats[c]), f'#{plats[c]}') for c in colonnes_plats],
+        'matrice': [
+            # Opacité de chaque case relative au maximum du tableau
+            (heure, [(int(matrice[heure, c]), int(matrice[heure, c]) / maximum if maximum else 0)
+                     for c in colonnes_plats])
+            for heure in heures
+        ],
+        'date_debut': debut,
+        'date_fin': fin,
+        'rafraichi_le': rafraichi_le(),
+    }
+    return render(request, 'orders/analyses_commandes.html', context)
+
 @login_required
 def modifier_commande(request, commande_id):
     """Modifier une commande existante"""
@@ -190,26 +291,14 @@ def modifier_commande(request, commande_id):
             messages.error(request, 'Veuillez sélectionner une table et au moins un plat.')
             return redirect('orders:modifier_commande', commande_id=commande.id)
         
-        # Mettre à jour la table
-        commande.table_id = table_id
-        
-        # Supprimer les anciens plats de la commande
-        CommandePlat.objects.filter(commande=commande).delete()
-        
-        # Ajouter les nouveaux plats
-        total = 0
-        for plat_id, quantite in zip(plats, quantites):
-            if quantite and int(quantite) > 0:
-                commande_plat = CommandePlat.objects.create(
-                    commande=commande,
-                    plat_id=plat_id,
-                    quantite=int(quantite)
-                )
-                total += commande_plat.sous_total()
+        # Remplacer les plats et mettre à jour la table et le total en une seule transaction
+        try:
+            lignes = preparer_lignes(zip(plats, [q or 0 for q in quantites]))
+        except CommandeInvalide as e:
+            messages.error(request, str(e))
+            return redirect('orders:modifier_commande', commande_id=commande.id)
         
-        # Mettre à jour le total
-        commande.total = total
-        commande.save()
+        remplacer_lignes(commande, lignes, table_id=table_id, utilisateur=request.user)
         
         messages.success(request, f'Commande #{commande.id} modifiée avec succès!')
         return redirect('orders:commande_detail', commande_id=commande.id)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Paiement, Caisse
+from .models import Paiement, Caisse, MouvementCaisse, PointCaisse, BilanJournalier
 
 
 @admin.register(Paiement)
@@ -23,3 +23,46 @@ class CaisseAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         # La caisse ne peut pas être supprimée
         return False
+
+
+@admin.register(MouvementCaisse)
+class MouvementCaisseAdmin(admin.ModelAdmin):
+    list_display = ['id', 'type_mouvement', 'montant', 'libelle', 'utilisateur', 'date']
+    list_filter = ['type_mouvement', 'date']
+    search_fields = ['libelle', 'paiement__id', 'depense__id']
+    ordering = ['-id']
+    
+    def has_add_permission(self, request):
+        # Le grand livre n'est alimenté que par les paiements, dépenses et ajustements
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(PointCaisse)
+class PointCaisseAdmin(admin.ModelAdmin):
+    list_display = ['dernier_mouvement_id', 'date', 'total_entrees', 'total_sorties', 'total_ajustements', 'solde']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(BilanJournalier)
+class BilanJournalierAdmin(admin.ModelAdmin):
+    list_display = ['jour', 'total_entrees', 'total_sorties', 'nb_commandes', 'couverts', 'cloture', 'date_modification']
+    list_filter = ['cloture']
+    date_hierarchy = 'jour'
+    
+    def has_add_permission(self, request):
+        # Les bilans sont calculés (signaux, update_daily_balance, reconstruire_bilans)
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,231 @@
+"""
+Bilans journaliers (BilanJournalier) : agrégats précalculés par jour.
+
+Un bilan se recalcule en cinq lectures groupées, quelle que soit la longueur
+de la période reconstruite :
+- la journée en cours est recalculée après chaque écriture (paiement,
+  dépense, commande, changement d'état), une fois par transaction ;
+- les journées passées sont clôturées par la commande update_daily_balance ;
+- la commande reconstruire_bilans recalcule n'importe quelle période.
+
+Les rapports additionnent ensuite une ligne par jour (periode) au lieu de
+relire les paiements, dépenses et commandes.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from core.periodes import bornes_periode
+from expenses.models import Depense
+from orders.models import Commande, CommandePlat, EtatCommande
+from .models import BilanJournalier, Paiement
+
+
+ZERO = Decimal('0')
+
+# Jours recalculés par appel à reconstruire() lors des recalculs en masse
+JOURS_PAR_PASSE = 90
+
+CHAMPS_BILAN = [
+    'total_entrees', 'nb_paiements', 'total_sorties', 'nb_depenses',
+    'chiffre_commandes', 'nb_commandes', 'couverts',
+    'entrees_par_methode', 'sorties_par_categorie', 'commandes_par_etat', 'plats',
+]
+
+
+def reconstruire(debut, fin, cloture=False):
+    """
+    Recalcule les bilans des jours debut à fin inclus et retourne le nombre
+    de bilans écrits
+
+    Les jours déjà présents sans activité sont remis à zéro. Avec cloture=True
+    chaque jour de la période est enregistré et marqué clôturé, même vide.
+    """
+    fuseau = timezone.get_current_timezone()
+    de, a = bornes_periode(debut, fin)
+    bilans = {}
+
+    def bilan(jour):
+        if jour not in bilans:
+            bilans[jour] = BilanJournalier(jour=jour, cloture=cloture)
+        return bilans[jour]
+
+    paiements = (Paiement.objects
+                 .filter(date_paiement__gte=de, date_paiement__lt=a)
+                 .annotate(jour=TruncDate('date_paiement', tzinfo=fuseau))
+                 .values('jour', 'methode')
+                 .annotate(total=Sum('montant'), nombre=Count('id'))
+                 .order_by())
+    for ligne in paiements:
+        b = bilan(ligne['jour'])
+        b.total_entrees += ligne['total']
+        b.nb_paiements += ligne['nombre']
+        b.entrees_par_methode[ligne['methode'] or ''] = [ligne['total'], ligne['nombre']]
+
+    depenses = (Depense.objects
+                .filter(date_depense__gte=debut, date_depense__lte=fin)
+                .values('date_depense', 'categorie__nom')
+                .annotate(total=Sum('montant'), nombre=Count('id'))
+                .order_by())
+    for ligne in depenses:
+        b = bilan(ligne['date_depense'])
+        b.total_sorties += ligne['total']
+        b.nb_depenses += ligne['nombre']
+        b.sorties_par_categorie[ligne['categorie__nom'] or ''] = [ligne['total'], ligne['nombre']]
+
+    commandes = (Commande.objects
+                 .filter(date_commande__gte=de, date_commande__lt=a)
+                 .annotate(jour=TruncDate('date_commande', tzinfo=fuseau))
+                 .values('jour', 'etat')
+                 .annotate(nombre=Count('id'), chiffre=Sum('total'), places=Sum('table__nombre_places'))
+                 .order_by())
+    for ligne in commandes:
+        b = bilan(ligne['jour'])
+        b.nb_commandes += ligne['nombre']
+        b.chiffre_commandes += ligne['chiffre'] or ZERO
+        b.commandes_par_etat[ligne['etat']] = ligne['nombre']
+        if ligne['etat'] != EtatCommande.ANNULEE:
+            b.couverts += ligne['places'] or 0
+
+    lignes = (CommandePlat.objects
+              .filter(commande__date_commande__gte=de, commande__date_commande__lt=a)
+              .exclude(commande__etat=EtatCommande.ANNULEE)
+              .annotate(jour=TruncDate('commande__date_commande', tzinfo=fuseau))
+              .values('jour', 'plat_id', 'plat__nom')
+              .annotate(
+                  total_quantite=Sum('quantite'),
+                  nb_commandes=Count('commande_id', distinct=True),
+                  montant=Sum(F('quantite') * F('prix_unitaire'),
+                              output_field=DecimalField(max_digits=14, decimal_places=2)),
+              )
+              .order_by())
+    for ligne in lignes:
+        bilan(ligne['jour']).plats[str(ligne['plat_id'])] = [
+            ligne['plat__nom'], ligne['total_quantite'], ligne['nb_commandes'], ligne['montant'],
+        ]
+
+    # Jours à remettre à zéro (activité supprimée) ou à clôturer sans activité
+    if cloture:
+        jour = debut
+        while jour <= fin:
+            bilan(jour)
+            jour += timedelta(days=1)
+    else:
+        for jour in BilanJournalier.objects.filter(jour__gte=debut, jour__lte=fin).values_list('jour', flat=True):
+            bilan(jour)
+
+    if not bilans:
+        return 0
+    champs = CHAMPS_BILAN + ['date_modification'] + (['cloture'] if cloture else [])
+    maintenant = timezone.now()
+    for b in bilans.values():
+        b.date_modification = maintenant
+    BilanJournalier.objects.bulk_create(
+        bilans.values(), update_conflicts=True, unique_fields=['jour'], update_fields=champs
+    )
+    return len(bilans)
+
+
+def _verrouiller_jour(jour):
+    """
+    Crée au besoin la ligne du jour puis la verrouille, dans la transaction
+    en cours : un recalcul concurrent du même jour attend la fin de celui-ci
+    et relit donc tout ce qu'il a vu (sous SQLite, l'insertion suffit à
+    prendre le verrou d'écriture de la base)
+    """
+    BilanJournalier.objects.bulk_create([BilanJournalier(jour=jour)], ignore_conflicts=True)
+    list(BilanJournalier.objects.select_for_update().filter(jour=jour).values_list('pk'))
+
+
+def recalculer_jour(jour):
+    """
+    Recalcule le bilan d'un seul jour
+
+    Les recalculs d'un même jour sont sérialisés : un recalcul parti plus tôt,
+    sur des données plus anciennes, ne peut plus écrire après un recalcul
+    plus récent.
+    """
+    with transaction.atomic():
+        _verrouiller_jour(jour)
+        return reconstruire(jour, jour)
+
+
+def cloturer_jour(jour):
+    """Recalcule et clôture le bilan d'un jour ; retourne le bilan"""
+    with transaction.atomic():
+        _verrouiller_jour(jour)
+        reconstruire(jour, jour, cloture=True)
+    return BilanJournalier.objects.get(jour=jour)
+
+
+def marquer_jour(jour):
+    """
+    Programme le recalcul du bilan de `jour` à la validation de la transaction
+    en cours, sauf si un recalcul de ce jour y est déjà programmé
+
+    Un recalcul déjà en attente sur la connexion suffit : un point de
+    sauvegarde annulé qui l'écarterait écarterait aussi celui-ci.
+    """
+    connexion = transaction.get_connection()
+    if connexion.in_atomic_block and any(
+        getattr(entree[1], 'jour_bilan', None) == jour for entree in connexion.run_on_commit
+    ):
+        return
+
+    def recalculer():
+        recalculer_jour(jour)
+
+    recalculer.jour_bilan = jour
+    transaction.on_commit(recalculer)
+
+
+def periode(debut, fin):
+    """
+    Additionne les bilans des jours debut à fin inclus (une lecture)
+
+    Retourne un dictionnaire : totaux, répartitions par méthode, catégorie et
+    état, et plats triés par quantité vendue décroissante.
+    """
+    resultat = {
+        'total_entrees': ZERO, 'nb_paiements': 0,
+        'total_sorties': ZERO, 'nb_depenses': 0,
+        'chiffre_commandes': ZERO, 'nb_commandes': 0, 'couverts': 0,
+    }
+    par_methode = defaultdict(lambda: [ZERO, 0])
+    par_categorie = defaultdict(lambda: [ZERO, 0])
+    par_etat = defaultdict(int)
+    plats = {}
+
+    for b in BilanJournalier.objects.filter(jour__gte=debut, jour__lte=fin):
+        resultat['total_entrees'] += b.total_entrees
+        resultat['nb_paiements'] += b.nb_paiements
+        resultat['total_sorties'] += b.total_sorties
+        resultat['nb_depenses'] += b.nb_depenses
+        resultat['chiffre_commandes'] += b.chiffre_commandes
+        resultat['nb_commandes'] += b.nb_commandes
+        resultat['couverts'] += b.couverts
+        for methode, (total, nombre) in b.entrees_par_methode.items():
+            par_methode[methode][0] += Decimal(total)
+            par_methode[methode][1] += nombre
+        for categorie, (total, nombre) in b.sorties_par_categorie.items():
+            par_categorie[categorie][0] += Decimal(total)
+            par_categorie[categorie][1] += nombre
+        for etat, nombre in b.commandes_par_etat.items():
+            par_etat[etat] += nombre
+        for plat_id, (nom, quantite, nb_commandes, montant) in b.plats.items():
+            plat = plats.setdefault(plat_id, {
+                'plat_id': int(plat_id), 'plat__nom': nom,
+                'total_quantite': 0, 'nb_commandes': 0, 'montant': ZERO,
+            })
+            plat['total_quantite'] += quantite
+            plat['nb_commandes'] += nb_commandes
+            plat['montant'] += Decimal(montant)
+
+    resultat['par_methode'] = {m: {'total': t, 'count': n} for m, (t, n) in par_methode.items()}
+    resultat['par_categorie'] = {c: {'total': t, 'count': n} for c, (t, n) in par_categorie.items()}
+    resultat['commandes_par_etat'] = dict(par_etat)
+    resultat['plats'] = sorted(plats.values(), key=lambda p: p['total_quantite'], reverse=True)
+    return resultat
@@ -0,0 +1,174 @@
+"""
+Données des reçus et factures PDF (gabarits 'recu' et 'facture' de core.documents)
+et cache disque des documents rendus.
+
+Un document est rangé sous {gabarit}_{paiement}_{empreinte}.pdf, l'empreinte
+étant un SHA-256 des lignes de la commande et des champs du paiement : une
+modification produit une autre clé, et l'empreinte sert aussi d'ETag. Le
+dossier est borné à PIECES_PDF_TAILLE_MAX octets ; au-delà, les fichiers les
+moins récemment servis (date de modification, rafraîchie à chaque lecture)
+sont supprimés.
+"""
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from core.documents import rendre
+from .models import Paiement
+
+
+# À incrémenter quand les gabarits 'recu' ou 'facture' changent : les
+# documents déjà en cache ne correspondent plus
+VERSION_PIECES = 1
+
+# Taille visée après une éviction, en fraction de la taille maximale
+_TAUX_APRES_EVICTION = 0.9
+
+# Octets occupés par le dossier, estimés par processus (None : à mesurer)
+_taille_cache = None
+
+
+def charger_paiement(paiement_id=None, commande_id=None):
+    """Paiement avec sa commande, sa table, son serveur, son caissier et ses lignes (trois requêtes)"""
+    paiements = (Paiement.objects
+                 .select_related('commande__table', 'commande__serveur', 'caissier')
+                 .prefetch_related('commande__commandeplat_set__plat'))
+    if paiement_id is not None:
+        return paiements.get(pk=paiement_id)
+    return paiements.get(commande_id=commande_id)
+
+
+def donnees_piece(paiement):
+    """Dictionnaire commun aux gabarits 'recu' et 'facture'"""
+    commande = paiement.commande
+    return {
+        'paiement_id': paiement.id,
+        'commande_id': commande.id,
+        'table': commande.table.numero_table,
+        'date_commande': timezone.localtime(commande.date_commande),
+        'serveur': commande.serveur.login if commande.serveur else None,
+        'lignes': [
+            (ligne.plat.nom, ligne.quantite, ligne.prix_unitaire, ligne.sous_total())
+            for ligne in commande.commandeplat_set.all()
+        ],
+        'total': commande.total,
+        'methode': paiement.get_methode_display(),
+        'montant': paiement.montant,
+        'date_paiement': timezone.localtime(paiement.date_paiement),
+        'caissier': paiement.caissier.login if paiement.caissier else None,
+        'genere_le': timezone.localtime(),
+    }
+
+
+def recu_pdf(paiement):
+    """Reçu de paiement (PDF, bytes)"""
+    return rendre('recu', donnees_piece(paiement))
+
+
+def facture_pdf(paiement):
+    """Facture client (PDF, bytes)"""
+    return rendre('facture', donnees_piece(paiement))
+
+
+def empreinte(nom, donnees):
+    """SHA-256 (hex) du gabarit et des données d'un document, hors date de génération"""
+    contenu = {cle: valeur for cle, valeur in donnees.items() if cle != 'genere_le'}
+    brut = json.dumps([VERSION_PIECES, nom, contenu], cls=DjangoJSONEncoder, sort_keys=True)
+    return hashlib.sha256(brut.encode('utf-8')).hexdigest()
+
+
+def _dossier():
+    return Path(getattr(settings, 'PIECES_PDF_DOSSIER', settings.BASE_DIR / 'cache' / 'pieces'))
+
+
+def _taille_max():
+    return getattr(settings, 'PIECES_PDF_TAILLE_MAX', 50 * 1024 * 1024)
+
+
+def _fichiers(dossier):
+    """(chemin, taille, date de dernier accès) des documents en cache"""
+    fichiers = []
+    try:
+        entrees = list(os.scandir(dossier))
+    except FileNotFoundError:
+        return fichiers
+    for entree in entrees:
+        if not entree.name.endswith('.pdf'):
+            continue
+        try:
+            infos = entree.stat()
+        except FileNotFoundError:
+            continue
+        fichiers.append((entree.path, infos.st_size, infos.st_mtime))
+    return fichiers
+
+
+def _evincer(dossier):
+    """Supprime les documents les moins récemment servis jusqu'à repasser sous la limite"""
+    global _taille_cache
+    fichiers = _fichiers(dossier)
+    taille = sum(f[1] for f in fichiers)
+    limite = _taille_max()
+    if taille > limite:
+        cible = limite * _TAUX_APRES_EVICTION
+        for chemin, octets, _ in sorted(fichiers, key=lambda f: f[2]):
+            if taille <= cible:
+                break
+            try:
+                os.remove(chemin)
+            except FileNotFoundError:
+                pass
+            taille -= octets
+    _taille_cache = taille
+
+
+def _lire(chemin):
+    """Contenu du document en cache (None si absent), marqué comme récemment servi"""
+    try:
+        contenu = chemin.read_bytes()
+        os.utime(chemin)
+    except FileNotFoundError:
+        return None
+    return contenu
+
+
+def _ecrire(chemin, contenu):
+    """Écriture atomique (fichier temporaire puis renommage), suivie d'une éviction si besoin"""
+    global _taille_cache
+    chemin.parent.mkdir(parents=True, exist_ok=True)
+    temporaire = chemin.with_name(f'{chemin.name}.{os.getpid()}.{time.monotonic_ns()}.tmp')
+    temporaire.write_bytes(contenu)
+    os.replace(temporaire, chemin)
+    if _taille_cache is None:
+        _evincer(chemin.parent)
+    else:
+        _taille_cache += len(contenu)
+        if _taille_cache > _taille_max():
+            _evincer(chemin.parent)
+
+
+def piece_pdf(nom, donnees, cle=None):
+    """
+    Document `nom` ('recu' ou 'facture') rempli avec `donnees` (donnees_piece),
+    servi depuis le cache ou rendu puis mis en cache
+    """
+    cle = cle or empreinte(nom, donnees)
+    chemin = _dossier() / f"{nom}_{donnees['paiement_id']}_{cle}.pdf"
+    contenu = _lire(chemin)
+    if contenu is None:
+        contenu = rendre(nom, donnees)
+        _ecrire(chemin, contenu)
+    return contenu
+
+
+def invalider(paiement_id):
+    """Supprime du cache les documents d'un paiement"""
+    for chemin in _dossier().glob(f'*_{paiement_id}_*.pdf'):
+        try:
+            os.remove(chemin)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,46 @@
+"""
+Export en flux des paiements (voir core.exports)
+"""
+from datetime import timedelta
+from django.db.models import Q
+from core.exports import TAILLE_LOT, lire_periode
+from core.periodes import debut_jour
+from .models import Paiement
+
+
+COLONNES = ['id', 'date_paiement', 'commande', 'table', 'methode', 'montant', 'caissier']
+
+
+def paiements_filtres(parametres):
+    """
+    Paiements filtrés comme paiement_list et rapport_paiements :
+    methode (dont NON_SPECIFIE), date, date_debut, date_fin
+    """
+    paiements = Paiement.objects.all()
+    methode = parametres.get('methode')
+    if methode == 'NON_SPECIFIE':
+        paiements = paiements.filter(Q(methode__isnull=True) | Q(methode=''))
+    elif methode:
+        paiements = paiements.filter(methode=methode)
+    debut, fin = lire_periode(parametres)
+    if debut:
+        paiements = paiements.filter(date_paiement__gte=debut_jour(debut))
+    if fin:
+        paiements = paiements.filter(date_paiement__lt=debut_jour(fin + timedelta(days=1)))
+    return paiements
+
+
+def enregistrements(paiements):
+    """Un dictionnaire par paiement, du plus ancien au plus récent"""
+    lignes = (paiements
+              .order_by('date_paiement', 'id')
+              .values_list('id', 'date_paiement', 'commande_id', 'commande__table__numero_table',
+                           'methode', 'montant', 'caissier__login')
+              .iterator(chunk_size=TAILLE_LOT))
+    for ligne in lignes:
+        yield dict(zip(COLONNES, ligne))
+
+
+def preparer(parametres, format):
+    """(colonnes, enregistrements) de l'export des paiements"""
+    return COLONNES, enregistrements(paiements_filtres(parametres))
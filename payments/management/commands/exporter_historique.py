@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.exports import FORMATS, JEUX, ExportInvalide, flux
+
+
+class Command(BaseCommand):
+    help = 'Exporte en flux (CSV ou JSON Lines) l\'historique des paiements, commandes ou dépenses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('jeu', choices=sorted(JEUX), help='Données à exporter')
+        parser.add_argument(
+            '--format',
+            choices=sorted(FORMATS),
+            default='csv',
+            help='Format du fichier (csv par défaut)',
+        )
+        parser.add_argument('--debut', type=str, help='Premier jour exporté (format: YYYY-MM-DD)')
+        parser.add_argument('--fin', type=str, help='Dernier jour exporté (format: YYYY-MM-DD)')
+        parser.add_argument('--methode', type=str, help='Paiements : méthode (ou NON_SPECIFIE)')
+        parser.add_argument('--etat', type=str, help='Commandes : état')
+        parser.add_argument('--categorie', type=str, help='Dépenses : identifiant de catégorie')
+        parser.add_argument(
+            '--sortie',
+            type=str,
+            help='Fichier de destination, par défaut la sortie standard',
+        )
+
+    def handle(self, *args, **options):
+        parametres = {
+            'date_debut': options['debut'],
+            'date_fin': options['fin'],
+            'methode': options['methode'],
+            'etat': options['etat'],
+            'categorie': options['categorie'],
+        }
+        try:
+            lignes = flux(options['jeu'], parametres, options['format'])
+        except ExportInvalide as e:
+            raise CommandError(str(e))
+
+        if not options['sortie']:
+            for ligne in lignes:
+                self.stdout.write(ligne, ending='')
+            return
+
+        nombre = -1 if options['format'] == 'csv' else 0
+        with open(options['sortie'], 'w', encoding='utf-8', newline='') as fichier:
+            for ligne in lignes:
+                fichier.write(ligne)
+                nombre += 1
+        self.stderr.write(self.style.SUCCESS(f'✅ {nombre} ligne(s) exportée(s) dans {options["sortie"]}'))
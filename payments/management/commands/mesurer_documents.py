@@ -0,0 +1,39 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from payments.documents import charger_paiement, donnees_piece, facture_pdf, piece_pdf, recu_pdf
+from payments.models import Paiement
+
+
+class Command(BaseCommand):
+    help = 'Mesure le débit de génération des reçus et factures PDF (documents par seconde)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nombre', type=int, default=200, help='Documents générés par mesure (défaut 200)')
+        parser.add_argument('--paiement', type=int, help='Paiement utilisé, par défaut le plus récent')
+
+    def handle(self, *args, **options):
+        paiement_id = options['paiement'] or Paiement.objects.order_by('-id').values_list('id', flat=True).first()
+        if paiement_id is None:
+            raise CommandError('Aucun paiement enregistré : créez-en un ou passez --paiement.')
+        nombre = options['nombre']
+
+        mesures = [
+            # Requêtes comprises, comme dans la vue telecharger_recu
+            ('Reçu (chargement + rendu)', lambda: recu_pdf(charger_paiement(paiement_id=paiement_id))),
+        ]
+        paiement = charger_paiement(paiement_id=paiement_id)
+        mesures += [
+            ('Reçu (rendu seul)', lambda: recu_pdf(paiement)),
+            ('Facture (rendu seul)', lambda: facture_pdf(paiement)),
+            # Comme la vue : chargement, empreinte puis lecture du cache disque
+            ('Reçu (chargement + cache)',
+             lambda: piece_pdf('recu', donnees_piece(charger_paiement(paiement_id=paiement_id)))),
+        ]
+
+        for libelle, generer in mesures:
+            generer()  # préparation des styles hors mesure
+            debut = time.perf_counter()
+            for _ in range(nombre):
+                generer()
+            duree = time.perf_counter() - debut
+            self.stdout.write(f'{libelle:<28} {nombre / duree:8.1f} doc/s  {duree / nombre * 1000:6.2f} ms/doc')
@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+from expenses.models import Depense
+from orders.models import Commande
+from payments.bilans import JOURS_PAR_PASSE, reconstruire
+from payments.models import Paiement
+
+
+class Command(BaseCommand):
+    help = 'Recalcule les bilans journaliers sur une période (par défaut tout l\'historique)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--debut',
+            type=str,
+            help='Premier jour à recalculer (format: YYYY-MM-DD), par défaut la première activité',
+        )
+        parser.add_argument(
+            '--fin',
+            type=str,
+            help='Dernier jour à recalculer (format: YYYY-MM-DD), par défaut aujourd\'hui',
+        )
+        parser.add_argument(
+            '--cloturer',
+            action='store_true',
+            help='Marquer les jours recalculés comme clôturés (jours passés uniquement)',
+        )
+
+    def handle(self, *args, **options):
+        aujourdhui = timezone.now().date()
+        try:
+            debut = self.lire_date(options['debut']) if options['debut'] else self.premiere_activite()
+            fin = self.lire_date(options['fin']) if options['fin'] else aujourdhui
+        except ValueError:
+            raise CommandError('Format de date invalide. Utilisez YYYY-MM-DD')
+
+        if debut is None:
+            self.stdout.write(self.style.SUCCESS('Aucune activité enregistrée, rien à recalculer.'))
+            return
+        if debut > fin:
+            raise CommandError('La date de début est postérieure à la date de fin.')
+
+        self.stdout.write(f'Recalcul des bilans du {debut} au {fin}')
+        total = 0
+        jour = debut
+        while jour <= fin:
+            fin_passe = min(jour + timedelta(days=JOURS_PAR_PASSE - 1), fin)
+            # La journée en cours n'est jamais clôturée
+            if options['cloturer'] and fin_passe >= aujourdhui:
+                if jour < aujourdhui:
+                    total += reconstruire(jour, aujourdhui - timedelta(days=1), cloture=True)
+                total += reconstruire(max(jour, aujourdhui), fin_passe)
+            else:
+                total += reconstruire(jour, fin_passe, cloture=options['cloturer'])
+            jour = fin_passe + timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} bilan(s) journalier(s) recalculé(s)'))
+
+    @staticmethod
+    def lire_date(valeur):
+        return datetime.strptime(valeur, '%Y-%m-%d').date()
+
+    @staticmethod
+    def premiere_activite():
+        """Premier jour ayant un paiement, une dépense ou une commande"""
+        dates = [
+            Paiement.objects.aggregate(debut=Min('date_paiement'))['debut'],
+            Commande.objects.aggregate(debut=Min('date_commande'))['debut'],
+        ]
+        jours = [timezone.localdate(d) for d in dates if d is not None]
+        premiere_depense = Depense.objects.aggregate(debut=Min('date_depense'))['debut']
+        if premiere_depense is not None:
+            jours.append(premiere_depense)
+        return min(jours) if jours else None
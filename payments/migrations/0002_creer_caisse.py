@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def creer_caisse(apps, schema_editor):
+    """Crée l'unique ligne de la caisse une fois pour toutes"""
+    Caisse = apps.get_model('payments', 'Caisse')
+    Caisse.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(creer_caisse, migrations.RunPython.noop),
+    ]
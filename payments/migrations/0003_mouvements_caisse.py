@@ -0,0 +1,91 @@
+# Generated by Django 5.0 on 2026-10-18 04:29
+
+import heapq
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def reprendre_historique(apps, schema_editor):
+    """Reporte les paiements et dépenses existants dans le grand livre, par ordre chronologique"""
+    Paiement = apps.get_model('payments', 'Paiement')
+    Depense = apps.get_model('expenses', 'Depense')
+    MouvementCaisse = apps.get_model('payments', 'MouvementCaisse')
+
+    paiements = (
+        (p.date_paiement, MouvementCaisse(
+            type_mouvement='PAIEMENT', montant=p.montant, date=p.date_paiement, paiement_id=p.pk,
+            libelle=f"Paiement commande #{p.commande_id}", utilisateur_id=p.caissier_id,
+        ))
+        for p in Paiement.objects.order_by('date_paiement', 'pk').iterator(chunk_size=2000)
+    )
+    depenses = (
+        (d.date_creation, MouvementCaisse(
+            type_mouvement='DEPENSE', montant=-d.montant, date=d.date_creation, depense_id=d.pk,
+            libelle=d.description[:255], utilisateur_id=d.utilisateur_id,
+        ))
+        for d in Depense.objects.order_by('date_creation', 'pk').iterator(chunk_size=2000)
+    )
+
+    lot = []
+    for _, mouvement in heapq.merge(paiements, depenses, key=lambda entree: entree[0]):
+        lot.append(mouvement)
+        if len(lot) >= 2000:
+            MouvementCaisse.objects.bulk_create(lot)
+            lot = []
+    if lot:
+        MouvementCaisse.objects.bulk_create(lot)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0001_initial'),
+        ('payments', '0002_creer_caisse'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PointCaisse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dernier_mouvement_id', models.PositiveBigIntegerField(unique=True, verbose_name='Dernier mouvement')),
+                ('date', models.DateTimeField(verbose_name='Date du dernier mouvement')),
+                ('total_entrees', models.DecimalField(decimal_places=2, max_digits=14, verbose_name='Total des paiements')),
+                ('total_sorties', models.DecimalField(decimal_places=2, max_digits=14, verbose_name='Total des dépenses')),
+                ('total_ajustements', models.DecimalField(decimal_places=2, max_digits=14, verbose_name='Total des ajustements')),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Point de caisse',
+                'verbose_name_plural': 'Points de caisse',
+                'db_table': 'points_caisse',
+                'ordering': ['-dernier_mouvement_id'],
+                'indexes': [models.Index(fields=['date'], name='point_caisse_date_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MouvementCaisse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_mouvement', models.CharField(choices=[('PAIEMENT', 'Paiement'), ('DEPENSE', 'Dépense'), ('AJUSTEMENT', 'Ajustement manuel')], max_length=20, verbose_name='Type')),
+                ('montant', models.DecimalField(decimal_places=2, help_text='Positif pour une entrée, négatif pour une sortie', max_digits=12, verbose_name='Montant')),
+                ('date', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Date')),
+                ('libelle', models.CharField(blank=True, max_length=255, verbose_name='Libellé')),
+                ('depense', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='mouvements_caisse', to='expenses.depense', verbose_name='Dépense')),
+                ('paiement', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='mouvements_caisse', to='payments.paiement', verbose_name='Paiement')),
+                ('utilisateur', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+            ],
+            options={
+                'verbose_name': 'Mouvement de caisse',
+                'verbose_name_plural': 'Mouvements de caisse',
+                'db_table': 'mouvements_caisse',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['date'], name='mouvement_caisse_date_idx')],
+            },
+        ),
+        migrations.RunPython(reprendre_historique, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0 on 2026-10-18 04:31
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0003_mouvements_caisse'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BilanJournalier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField(unique=True, verbose_name='Jour')),
+                ('total_entrees', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Total des paiements')),
+                ('nb_paiements', models.PositiveIntegerField(default=0, verbose_name='Nombre de paiements')),
+                ('total_sorties', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Total des dépenses')),
+                ('nb_depenses', models.PositiveIntegerField(default=0, verbose_name='Nombre de dépenses')),
+                ('chiffre_commandes', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Total des commandes')),
+                ('nb_commandes', models.PositiveIntegerField(default=0, verbose_name='Nombre de commandes')),
+                ('couverts', models.PositiveIntegerField(default=0, help_text='Places des tables servies (commandes non annulées)', verbose_name='Couverts')),
+                ('entrees_par_methode', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Paiements par méthode')),
+                ('sorties_par_categorie', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Dépenses par catégorie')),
+                ('commandes_par_etat', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Commandes par état')),
+                ('plats', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Plats vendus')),
+                ('cloture', models.BooleanField(default=False, help_text='Journée finalisée par la commande update_daily_balance', verbose_name='Clôturé')),
+                ('date_modification', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Bilan journalier',
+                'verbose_name_plural': 'Bilans journaliers',
+                'db_table': 'bilans_journaliers',
+                'ordering': ['-jour'],
+            },
+        ),
+    ]
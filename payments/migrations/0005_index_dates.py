@@ -0,0 +1,20 @@
+# Generated by Django 5.0 on 2026-10-18 04:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_index_dates'),
+        ('payments', '0004_bilans_journaliers'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='paiement',
+            index=models.Index(fields=['date_paiement', 'methode'], name='paiement_date_methode_idx'),
+        ),
+    ]
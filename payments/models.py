@@ -1,5 +1,9 @@
+from decimal import Decimal
 from django.db import models
+from django.db.models import F
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
 from django.core.validators import MinValueValidator
 from orders.models import Commande
 
@@ -49,6 +53,10 @@ class Paiement(models.Model):
         verbose_name = 'Paiement'
         verbose_name_plural = 'Paiements'
         ordering = ['-date_paiement']
+        indexes = [
+            # Paiements d'une journée ou d'une période, répartis par méthode
+            models.Index(fields=['date_paiement', 'methode'], name='paiement_date_methode_idx'),
+        ]
     
     def __str__(self):
         return f"Paiement #{self.id} - Commande #{self.commande.id} - {self.montant} GNF"
@@ -75,9 +83,12 @@ class Caisse(models.Model):
     def __str__(self):
         return f"Caisse - Solde: {self.solde_actuel} GNF"
     
+    # Clé de l'unique ligne, créée par la migration 0002_creer_caisse
+    PK = 1
+    
     def save(self, *args, **kwargs):
         """Assure qu'il n'y a qu'une seule instance de Caisse"""
-        self.pk = 1
+        self.pk = self.PK
         super().save(*args, **kwargs)
     
     def delete(self, *args, **kwargs):
@@ -87,24 +98,197 @@ class Caisse(models.Model):
     @classmethod
     def get_instance(cls):
         """Retourne l'instance unique de la caisse"""
-        obj, created = cls.objects.get_or_create(pk=1)
+        obj, created = cls.objects.get_or_create(pk=cls.PK)
         return obj
     
+    @classmethod
+    def crediter(cls, montant):
+        """
+        Ajoute un montant au solde en un seul UPDATE (solde = solde + montant) :
+        aucune mise à jour perdue entre caissiers simultanés
+        """
+        montant = _en_decimal(montant)
+        modifiees = cls.objects.filter(pk=cls.PK).update(
+            solde_actuel=F('solde_actuel') + montant, derniere_mise_a_jour=timezone.now()
+        )
+        if not modifiees:
+            # Base créée sans la migration de la caisse
+            cls.get_instance()
+            cls.crediter(montant)
+    
+    @classmethod
+    def debiter(cls, montant):
+        """
+        Retire un montant en un seul UPDATE, le contrôle du solde étant dans le
+        WHERE ; retourne False si le solde est insuffisant
+        """
+        montant = _en_decimal(montant)
+        modifiees = cls.objects.filter(pk=cls.PK, solde_actuel__gte=montant).update(
+            solde_actuel=F('solde_actuel') - montant, derniere_mise_a_jour=timezone.now()
+        )
+        return bool(modifiees)
+    
+    @classmethod
+    def reinitialiser(cls):
+        """Remet le solde à zéro"""
+        cls.objects.filter(pk=cls.PK).update(solde_actuel=0, derniere_mise_a_jour=timezone.now())
+    
     def ajouter_montant(self, montant):
         """Ajoute un montant à la caisse"""
-        from decimal import Decimal
-        if isinstance(montant, (int, float, str)):
-            montant = Decimal(str(montant))
-        self.solde_actuel += montant
-        self.save()
+        self.crediter(montant)
+        self.refresh_from_db(fields=['solde_actuel', 'derniere_mise_a_jour'])
     
     def retirer_montant(self, montant):
         """Retire un montant de la caisse"""
-        from decimal import Decimal
-        if isinstance(montant, (int, float, str)):
-            montant = Decimal(str(montant))
-        if self.solde_actuel >= montant:
-            self.solde_actuel -= montant
-            self.save()
-            return True
-        return False
+        retire = self.debiter(montant)
+        self.refresh_from_db(fields=['solde_actuel', 'derniere_mise_a_jour'])
+        return retire
+
+
+def _en_decimal(montant):
+    if isinstance(montant, (int, float, str)):
+        montant = Decimal(str(montant))
+    return montant
+
+
+class TypeMouvement(models.TextChoices):
+    """Origine d'un mouvement de caisse"""
+    PAIEMENT = 'PAIEMENT', 'Paiement'
+    DEPENSE = 'DEPENSE', 'Dépense'
+    AJUSTEMENT = 'AJUSTEMENT', 'Ajustement manuel'
+
+
+class MouvementCaisse(models.Model):
+    """
+    Grand livre de la caisse : une ligne par entrée ou sortie d'argent, jamais
+    modifiée. Une correction ou une suppression ajoute un mouvement inverse.
+    """
+    type_mouvement = models.CharField(
+        max_length=20,
+        choices=TypeMouvement.choices,
+        verbose_name='Type'
+    )
+    montant = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        verbose_name='Montant',
+        help_text='Positif pour une entrée, négatif pour une sortie'
+    )
+    date = models.DateTimeField(default=timezone.now, verbose_name='Date')
+    paiement = models.ForeignKey(
+        Paiement,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='mouvements_caisse',
+        verbose_name='Paiement'
+    )
+    depense = models.ForeignKey(
+        'expenses.Depense',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='mouvements_caisse',
+        verbose_name='Dépense'
+    )
+    libelle = models.CharField(max_length=255, blank=True, verbose_name='Libellé')
+    utilisateur = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Utilisateur'
+    )
+    
+    class Meta:
+        db_table = 'mouvements_caisse'
+        verbose_name = 'Mouvement de caisse'
+        verbose_name_plural = 'Mouvements de caisse'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['date'], name='mouvement_caisse_date_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_type_mouvement_display()} {self.montant:+} GNF ({self.date:%d/%m/%Y %H:%M})"
+    
+    def save(self, *args, **kwargs):
+        """Le grand livre est en ajout seul"""
+        if self.pk is not None:
+            raise ValueError("Un mouvement de caisse ne peut pas être modifié.")
+        super().save(*args, **kwargs)
+
+
+class PointCaisse(models.Model):
+    """
+    Point de contrôle du grand livre : totaux cumulés de tous les mouvements
+    jusqu'à dernier_mouvement_id inclus
+    """
+    dernier_mouvement_id = models.PositiveBigIntegerField(unique=True, verbose_name='Dernier mouvement')
+    date = models.DateTimeField(verbose_name='Date du dernier mouvement')
+    total_entrees = models.DecimalField(max_digits=14, decimal_places=2, verbose_name='Total des paiements')
+    total_sorties = models.DecimalField(max_digits=14, decimal_places=2, verbose_name='Total des dépenses')
+    total_ajustements = models.DecimalField(max_digits=14, decimal_places=2, verbose_name='Total des ajustements')
+    date_creation = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'points_caisse'
+        verbose_name = 'Point de caisse'
+        verbose_name_plural = 'Points de caisse'
+        ordering = ['-dernier_mouvement_id']
+        indexes = [
+            models.Index(fields=['date'], name='point_caisse_date_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Point au mouvement #{self.dernier_mouvement_id} - Solde: {self.solde} GNF"
+    
+    @property
+    def solde(self):
+        return self.total_entrees - self.total_sorties + self.total_ajustements
+
+
+class BilanJournalier(models.Model):
+    """
+    Agrégats d'une journée (date locale) : paiements, dépenses, commandes et
+    plats vendus. Les rapports sur une période additionnent ces lignes au lieu
+    de relire toutes les transactions.
+
+    Les répartitions sont stockées en JSON, montants en chaîne décimale :
+    - entrees_par_methode : {methode: [total, nombre]}
+    - sorties_par_categorie : {categorie: [total, nombre]}
+    - commandes_par_etat : {etat: nombre}
+    - plats : {plat_id: [nom, quantite, nb_commandes, montant]}
+    """
+    jour = models.DateField(unique=True, verbose_name='Jour')
+    total_entrees = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='Total des paiements')
+    nb_paiements = models.PositiveIntegerField(default=0, verbose_name='Nombre de paiements')
+    total_sorties = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='Total des dépenses')
+    nb_depenses = models.PositiveIntegerField(default=0, verbose_name='Nombre de dépenses')
+    chiffre_commandes = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='Total des commandes')
+    nb_commandes = models.PositiveIntegerField(default=0, verbose_name='Nombre de commandes')
+    couverts = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Couverts',
+        help_text='Places des tables servies (commandes non annulées)'
+    )
+    entrees_par_methode = models.JSONField(default=dict, encoder=DjangoJSONEncoder, verbose_name='Paiements par méthode')
+    sorties_par_categorie = models.JSONField(default=dict, encoder=DjangoJSONEncoder, verbose_name='Dépenses par catégorie')
+    commandes_par_etat = models.JSONField(default=dict, encoder=DjangoJSONEncoder, verbose_name='Commandes par état')
+    plats = models.JSONField(default=dict, encoder=DjangoJSONEncoder, verbose_name='Plats vendus')
+    cloture = models.BooleanField(
+        default=False,
+        verbose_name='Clôturé',
+        help_text='Journée finalisée par la commande update_daily_balance'
+    )
+    date_modification = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'bilans_journaliers'
+        verbose_name = 'Bilan journalier'
+        verbose_name_plural = 'Bilans journaliers'
+        ordering = ['-jour']
+    
+    def __str__(self):
+        return f"Bilan du {self.jour:%d/%m/%Y}"
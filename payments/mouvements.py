@@ -0,0 +1,137 @@
+"""
+Grand livre de la caisse (MouvementCaisse) et calcul du solde.
+
+Chaque paiement, dépense ou ajustement manuel ajoute un mouvement signé. Le
+solde, courant ou à une date passée, se lit sur le dernier point de contrôle
+(PointCaisse) plus les quelques mouvements qui le suivent : une requête,
+quelle que soit l'ancienneté de la caisse. Un nouveau point est posé dès que
+cette queue dépasse INTERVALLE_POINT mouvements ; il ne couvre que les
+mouvements de plus de MARGE_POINT, pour qu'une transaction plus lente à
+valider ne voie pas son mouvement (d'identifiant plus petit) passé sous le
+point sans y être compté.
+"""
+from datetime import timedelta
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, Max, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from core.periodes import bornes_jour
+from .models import MouvementCaisse, PointCaisse, TypeMouvement
+
+
+# Nombre de mouvements après lequel un nouveau point de contrôle est posé
+INTERVALLE_POINT = 1000
+
+# Âge minimal des mouvements couverts par un point de contrôle
+MARGE_POINT = timedelta(minutes=5)
+
+ZERO = Decimal('0')
+
+MONTANT = DecimalField(max_digits=14, decimal_places=2)
+
+
+def enregistrer_mouvement(type_mouvement, montant, libelle='', utilisateur=None, date=None, **liens):
+    """Ajoute un mouvement signé au grand livre (liens : paiement=, depense=)"""
+    if utilisateur is not None and not utilisateur.is_authenticated:
+        utilisateur = None
+    mouvement = MouvementCaisse(
+        type_mouvement=type_mouvement,
+        montant=montant,
+        libelle=libelle[:255],
+        utilisateur=utilisateur,
+        **liens
+    )
+    if date is not None:
+        mouvement.date = date
+    mouvement.save()
+    return mouvement
+
+
+def montant_enregistre(**liens):
+    """Somme des mouvements déjà enregistrés pour un paiement ou une dépense"""
+    return MouvementCaisse.objects.filter(**liens).aggregate(total=Sum('montant'))['total'] or ZERO
+
+
+def totaux_caisse(date=None):
+    """
+    Totaux cumulés de la caisse, au moment présent ou à la fin de `date`
+    (datetime) : {'entrees', 'sorties', 'ajustements', 'solde'}
+
+    Les sorties sont renvoyées en positif ; solde = entrées - sorties + ajustements.
+    Une seule requête : le dernier point de contrôle est lu par sous-requêtes
+    dans l'agrégat des mouvements qui le suivent.
+    """
+    points = PointCaisse.objects.order_by('-dernier_mouvement_id')
+    mouvements = MouvementCaisse.objects.all()
+    if date is not None:
+        points = points.filter(date__lte=date)
+        mouvements = mouvements.filter(date__lte=date)
+
+    def du_point(champ):
+        return Coalesce(Subquery(points.values(champ)[:1]), ZERO, output_field=MONTANT)
+
+    def de_la_queue(type_mouvement):
+        return Coalesce(Sum('montant', filter=Q(type_mouvement=type_mouvement)), ZERO, output_field=MONTANT)
+
+    totaux = mouvements.filter(
+        id__gt=Coalesce(Subquery(points.values('dernier_mouvement_id')[:1]), 0)
+    ).aggregate(
+        entrees=du_point('total_entrees') + de_la_queue(TypeMouvement.PAIEMENT),
+        sorties=du_point('total_sorties') - de_la_queue(TypeMouvement.DEPENSE),
+        ajustements=du_point('total_ajustements') + de_la_queue(TypeMouvement.AJUSTEMENT),
+        nombre=Count('id'),
+    )
+    if date is None and totaux['nombre'] >= INTERVALLE_POINT:
+        poser_point()
+
+    return {
+        'entrees': totaux['entrees'],
+        'sorties': totaux['sorties'],
+        'ajustements': totaux['ajustements'],
+        'solde': totaux['entrees'] - totaux['sorties'] + totaux['ajustements'],
+    }
+
+
+def solde_caisse(date=None):
+    """Solde de la caisse, au moment présent ou à la fin de `date`"""
+    return totaux_caisse(date)['solde']
+
+
+def fin_journee(jour):
+    """Dernier instant d'une journée (date locale), pour solde_caisse(date)"""
+    return bornes_jour(jour)[1] - timedelta(microseconds=1)
+
+
+def poser_point():
+    """
+    Pose un point de contrôle après le dernier, jusqu'au dernier mouvement de
+    plus de MARGE_POINT : tous les identifiants inférieurs ont été attribués
+    avant lui et leurs transactions sont validées (sans effet si un autre
+    processus a déjà posé ce point)
+    """
+    precedent = PointCaisse.objects.order_by('-dernier_mouvement_id').first()
+    mouvements = MouvementCaisse.objects.all()
+    if precedent is not None:
+        mouvements = mouvements.filter(id__gt=precedent.dernier_mouvement_id)
+    dernier = mouvements.filter(date__lte=timezone.now() - MARGE_POINT).aggregate(dernier=Max('id'))['dernier']
+    if dernier is None:
+        return None
+
+    queue = mouvements.filter(id__lte=dernier).aggregate(
+        entrees=Sum('montant', filter=Q(type_mouvement=TypeMouvement.PAIEMENT)),
+        sorties=Sum('montant', filter=Q(type_mouvement=TypeMouvement.DEPENSE)),
+        ajustements=Sum('montant', filter=Q(type_mouvement=TypeMouvement.AJUSTEMENT)),
+        derniere_date=Max('date'),
+    )
+    try:
+        with transaction.atomic():
+            return PointCaisse.objects.create(
+                dernier_mouvement_id=dernier,
+                date=queue['derniere_date'],
+                total_entrees=(precedent.total_entrees if precedent else ZERO) + (queue['entrees'] or ZERO),
+                total_sorties=(precedent.total_sorties if precedent else ZERO) - (queue['sorties'] or ZERO),
+                total_ajustements=(precedent.total_ajustements if precedent else ZERO) + (queue['ajustements'] or ZERO),
+            )
+    except IntegrityError:
+        return None
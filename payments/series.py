@@ -0,0 +1,224 @@
+"""
+Séries chronologiques des ventes : chiffre d'affaires, paiements et commandes
+par heure ou par jour, et profils par heure de la journée et par jour de la
+semaine (planification du personnel).
+
+Une période est lue en deux requêtes groupées (TruncHour + annotate), une
+sur les paiements et une sur les commandes, les heures étant découpées dans
+le fuseau TIME_ZONE. Les séries journalières et les profils sont déduits de
+la série horaire en Python ; les heures sans activité, absentes du résultat
+SQL, sont complétées par simple consultation d'un dictionnaire.
+
+Les jours passés changent rarement : leur série horaire est mise en cache par
+mois (SERIES_CACHE_DUREE secondes), avec la date du dernier recalcul des
+bilans du mois, qui la périme dès qu'un de ses jours est modifié. Seule la
+journée en cours est relue à chaque appel.
+"""
+from datetime import timedelta, timezone as dt_timezone
+from decimal import Decimal
+from zoneinfo import ZoneInfo
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncHour, TruncMonth
+from django.utils import timezone
+from core.periodes import bornes_periode, filtre_periode
+from orders.models import Commande, EtatCommande
+from .models import BilanJournalier, Paiement
+
+
+PAS = ('heure', 'jour')
+
+JOURS_SEMAINE = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
+
+ZERO = Decimal('0')
+
+# Valeurs d'un créneau : (chiffre, nombre de paiements, nombre de commandes)
+_VIDE = (ZERO, 0, 0)
+
+
+def _fuseau():
+    return ZoneInfo(settings.TIME_ZONE)
+
+
+def _duree_cache():
+    return getattr(settings, 'SERIES_CACHE_DUREE', 24 * 3600)
+
+
+def _heures(debut, fin):
+    """Série horaire creuse des jours debut à fin : {heure locale: (chiffre, paiements, commandes)}"""
+    fuseau = _fuseau()
+    paiements = (Paiement.objects
+                 .filter(**filtre_periode('date_paiement', debut, fin))
+                 .annotate(heure=TruncHour('date_paiement', tzinfo=fuseau))
+                 .values('heure')
+                 .annotate(chiffre=Sum('montant'), nombre=Count('id'))
+                 .values_list('heure', 'chiffre', 'nombre')
+                 .order_by())
+    commandes = (Commande.objects
+                 .filter(**filtre_periode('date_commande', debut, fin))
+                 .exclude(etat=EtatCommande.ANNULEE)
+                 .annotate(heure=TruncHour('date_commande', tzinfo=fuseau))
+                 .values('heure')
+                 .annotate(nombre=Count('id'))
+                 .values_list('heure', 'nombre')
+                 .order_by())
+    heures = {}
+    for heure, chiffre, nombre in paiements:
+        heures[heure] = (chiffre or ZERO, nombre, 0)
+    for heure, nombre in commandes:
+        chiffre, nb_paiements, _ = heures.get(heure, _VIDE)
+        heures[heure] = (chiffre, nb_paiements, nombre)
+    return heures
+
+
+def _tranches(debut, fin):
+    """Découpe debut à fin inclus en tranches d'au plus un mois civil"""
+    tranches = []
+    jour = debut
+    while jour <= fin:
+        mois_suivant = (jour.replace(day=1) + timedelta(days=32)).replace(day=1)
+        dernier = min(mois_suivant - timedelta(days=1), fin)
+        tranches.append((jour, dernier))
+        jour = dernier + timedelta(days=1)
+    return tranches
+
+
+def _cle(premier, dernier):
+    return f'series:heures:{premier.isoformat()}:{dernier.isoformat()}'
+
+
+def _marques(tranches):
+    """
+    {premier jour de tranche: dernière date_modification des bilans de ses
+    jours} : écrire, déplacer ou supprimer un paiement ou une commande (purge
+    comprise) fait recalculer le bilan de son jour (payments.bilans)
+    """
+    lignes = (BilanJournalier.objects
+              .filter(jour__gte=tranches[0][0], jour__lte=tranches[-1][1])
+              .annotate(mois=TruncMonth('jour'))
+              .values('mois')
+              .annotate(marque=Max('date_modification'))
+              .values_list('mois', 'marque')
+              .order_by())
+    par_mois = dict(lignes)
+    return {premier: par_mois.get(premier.replace(day=1)) for premier, _ in tranches}
+
+
+def heures(debut, fin):
+    """
+    Série horaire creuse des jours debut à fin inclus
+
+    Les jours passés sont mis en cache par mois : un mois clos reste en cache
+    d'un jour à l'autre et seul le mois en cours est relu. Un mois n'est
+    repris du cache que si aucun bilan de ses jours n'a été recalculé depuis
+    sa mise en cache, quel que soit le processus qui a écrit. Les mois
+    absents ou périmés sont lus ensemble, en une requête par modèle.
+    """
+    aujourdhui = timezone.localdate()
+    resultat = {}
+    if debut < aujourdhui:
+        tranches = _tranches(debut, min(fin, aujourdhui - timedelta(days=1)))
+        # Marques lues avant les données : un recalcul pendant la lecture
+        # périme le mois dès l'appel suivant
+        marques = _marques(tranches)
+        lus = cache.get_many([_cle(*tranche) for tranche in tranches])
+        en_cache = {
+            _cle(*tranche): lus[_cle(*tranche)]['heures']
+            for tranche in tranches
+            if _cle(*tranche) in lus and lus[_cle(*tranche)]['marque'] == marques[tranche[0]]
+        }
+        manquantes = [tranche for tranche in tranches if _cle(*tranche) not in en_cache]
+        if manquantes:
+            lues = _heures(manquantes[0][0], manquantes[-1][1])
+            par_tranche = {_cle(*tranche): {} for tranche in manquantes}
+            for heure, valeurs in lues.items():
+                # Les mois intercalés déjà en cache sont relus mais ignorés
+                tranche = next((t for t in manquantes if t[0] <= heure.date() <= t[1]), None)
+                if tranche is not None:
+                    par_tranche[_cle(*tranche)][heure] = valeurs
+            cache.set_many({
+                _cle(*tranche): {'marque': marques[tranche[0]], 'heures': par_tranche[_cle(*tranche)]}
+                for tranche in manquantes
+            }, _duree_cache())
+            en_cache.update(par_tranche)
+        for serie in en_cache.values():
+            resultat.update(serie)
+    if fin >= aujourdhui:
+        resultat.update(_heures(max(debut, aujourdhui), fin))
+    return resultat
+
+
+def activite(debut, fin, pas='jour'):
+    """
+    Série complète (créneaux vides inclus) au pas 'heure' ou 'jour', profils
+    par heure de la journée et par jour de la semaine, et totaux des jours
+    debut à fin inclus
+    """
+    if pas not in PAS:
+        raise ValueError(f'Pas inconnu : {pas} (heure ou jour)')
+    creuse = heures(debut, fin)
+    fuseau = _fuseau()
+
+    points = []
+    par_heure = [[ZERO, 0, 0] for _ in range(24)]
+    par_jour_semaine = [[ZERO, 0, 0] for _ in range(7)]
+    jours_semaine = [0] * 7
+    debut_instant, fin_instant = bornes_periode(debut, fin)
+    # Arithmétique en UTC : sur un datetime local, +1 h suivrait l'horloge murale
+    instant = debut_instant.astimezone(dt_timezone.utc)
+    jour_courant, cumul_jour = None, None
+    # Parcours heure par heure en UTC : chaque heure locale est visitée une fois
+    while instant < fin_instant:
+        heure = instant.astimezone(fuseau)
+        chiffre, nb_paiements, nb_commandes = creuse.get(heure, _VIDE)
+        for cumul in (par_heure[heure.hour], par_jour_semaine[heure.weekday()]):
+            cumul[0] += chiffre
+            cumul[1] += nb_paiements
+            cumul[2] += nb_commandes
+        if pas == 'heure':
+            points.append((heure, chiffre, nb_paiements, nb_commandes))
+        else:
+            if heure.date() != jour_courant:
+                jour_courant = heure.date()
+                jours_semaine[jour_courant.weekday()] += 1
+                cumul_jour = [jour_courant, ZERO, 0, 0]
+                points.append(cumul_jour)
+            cumul_jour[1] += chiffre
+            cumul_jour[2] += nb_paiements
+            cumul_jour[3] += nb_commandes
+        instant += timedelta(hours=1)
+
+    if pas == 'heure':
+        jours = (fin - debut).days + 1
+        for decalage in range(jours):
+            jours_semaine[(debut + timedelta(days=decalage)).weekday()] += 1
+
+    return {
+        'debut': debut,
+        'fin': fin,
+        'pas': pas,
+        'points': [
+            {'debut': debut_point, 'chiffre': chiffre, 'paiements': nb_paiements, 'commandes': nb_commandes}
+            for debut_point, chiffre, nb_paiements, nb_commandes in points
+        ],
+        'par_heure': [
+            {'heure': heure, 'chiffre': chiffre, 'paiements': nb_paiements, 'commandes': nb_commandes}
+            for heure, (chiffre, nb_paiements, nb_commandes) in enumerate(par_heure)
+        ],
+        'par_jour_semaine': [
+            {
+                'jour': JOURS_SEMAINE[jour], 'chiffre': chiffre, 'paiements': nb_paiements,
+                'commandes': nb_commandes, 'nombre_jours': jours_semaine[jour],
+                # Moyenne par occurrence du jour dans la période
+                'chiffre_moyen': chiffre / jours_semaine[jour] if jours_semaine[jour] else ZERO,
+                'commandes_moyennes': nb_commandes / jours_semaine[jour] if jours_semaine[jour] else 0,
+            }
+            for jour, (chiffre, nb_paiements, nb_commandes) in enumerate(par_jour_semaine)
+        ],
+        'total': {
+            'chiffre': sum((c[0] for c in par_heure), ZERO),
+            'paiements': sum(c[1] for c in par_heure),
+            'commandes': sum(c[2] for c in par_heure),
+        },
+    }
@@ -1,8 +1,17 @@
-from django.db.models.signals import post_save, post_delete
-from django.dispatch import receiver
+from datetime import date
 from django.db import transaction
-from .models import Paiement, Caisse
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from .bilans import marquer_jour
+from .documents import invalider
+from .models import Paiement, Caisse, TypeMouvement, _en_decimal
+from .mouvements import enregistrer_mouvement, montant_enregistre
 from expenses.models import Depense
+from orders.models import Commande
+from orders.queries import synchroniser_occupation
+from orders.transitions import commande_transitionnee
+from restaurant.models import TableRestaurant
 
 @receiver(post_save, sender=Paiement)
 def mettre_a_jour_caisse_paiement(sender, instance, created, **kwargs):
@@ -10,18 +19,41 @@ def mettre_a_jour_caisse_paiement(sender, instance, created, **kwargs):
     Met à jour le solde de la caisse lors d'un paiement
     """
     if created:
-        with transaction.atomic():
-            caisse = Caisse.get_instance()
-            caisse.ajouter_montant(instance.montant)
+        Caisse.crediter(instance.montant)
+        enregistrer_mouvement(
+            TypeMouvement.PAIEMENT, instance.montant, paiement=instance,
+            libelle=f"Paiement commande #{instance.commande_id}",
+            utilisateur=instance.caissier, date=instance.date_paiement
+        )
+    else:
+        # Montant corrigé : le grand livre reçoit l'écart
+        ecart = _en_decimal(instance.montant) - montant_enregistre(paiement=instance)
+        if ecart:
+            enregistrer_mouvement(
+                TypeMouvement.PAIEMENT, ecart, paiement=instance,
+                libelle=f"Correction paiement #{instance.pk}", utilisateur=instance.caissier
+            )
 
 @receiver(post_delete, sender=Paiement)
 def annuler_mise_a_jour_caisse_paiement(sender, instance, **kwargs):
     """
     Annule la mise à jour du solde de la caisse lors de la suppression d'un paiement
     """
-    with transaction.atomic():
-        caisse = Caisse.get_instance()
-        caisse.retirer_montant(instance.montant)
+    Caisse.debiter(instance.montant)
+    # Les mouvements du paiement sont déjà détachés (SET_NULL) : on contre-passe
+    # le montant connu de l'instance
+    enregistrer_mouvement(
+        TypeMouvement.PAIEMENT, -instance.montant,
+        libelle=f"Suppression paiement #{instance.pk}"
+    )
+
+@receiver(post_save, sender=Paiement)
+@receiver(post_delete, sender=Paiement)
+def mettre_a_jour_occupation_table(sender, instance, **kwargs):
+    """
+    Un paiement libère la table de sa commande (et sa suppression la réoccupe)
+    """
+    synchroniser_occupation(TableRestaurant.objects.filter(commandes__id=instance.commande_id))
 
 @receiver(post_save, sender=Depense)
 def mettre_a_jour_caisse_depense(sender, instance, created, **kwargs):
@@ -29,15 +61,100 @@ def mettre_a_jour_caisse_depense(sender, instance, created, **kwargs):
     Met à jour le solde de la caisse lors d'une dépense
     """
     if created:
-        with transaction.atomic():
-            caisse = Caisse.get_instance()
-            caisse.retirer_montant(instance.montant)
+        Caisse.debiter(instance.montant)
+        enregistrer_mouvement(
+            TypeMouvement.DEPENSE, -instance.montant, depense=instance,
+            libelle=instance.description, utilisateur=instance.utilisateur,
+            date=instance.date_creation
+        )
+    else:
+        ecart = -_en_decimal(instance.montant) - montant_enregistre(depense=instance)
+        if ecart:
+            enregistrer_mouvement(
+                TypeMouvement.DEPENSE, ecart, depense=instance,
+                libelle=f"Correction dépense #{instance.pk}", utilisateur=instance.utilisateur
+            )
 
 @receiver(post_delete, sender=Depense)
 def annuler_mise_a_jour_caisse_depense(sender, instance, **kwargs):
     """
     Annule la mise à jour du solde de la caisse lors de la suppression d'une dépense
     """
-    with transaction.atomic():
-        caisse = Caisse.get_instance()
-        caisse.ajouter_montant(instance.montant)
+    Caisse.crediter(instance.montant)
+    enregistrer_mouvement(
+        TypeMouvement.DEPENSE, instance.montant,
+        libelle=f"Suppression dépense #{instance.pk}"
+    )
+
+def _jour(valeur):
+    """Jour local d'une date, d'un datetime ou d'une chaîne AAAA-MM-JJ"""
+    if isinstance(valeur, str):
+        return date.fromisoformat(valeur[:10])
+    if hasattr(valeur, 'tzinfo'):
+        return timezone.localdate(valeur)
+    return valeur
+
+@receiver(post_save, sender=Paiement)
+@receiver(post_delete, sender=Paiement)
+def mettre_a_jour_bilan_paiement(sender, instance, **kwargs):
+    """
+    Recalcule le bilan du jour du paiement
+    """
+    marquer_jour(_jour(instance.date_paiement))
+
+@receiver(post_save, sender=Paiement)
+@receiver(post_delete, sender=Paiement)
+def invalider_pieces_paiement(sender, instance, created=False, **kwargs):
+    """
+    Retire du cache les reçus et factures d'un paiement modifié (méthode
+    changée par modifier_paiement, montant corrigé) ou supprimé
+    """
+    if not created:
+        invalider(instance.pk)
+
+@receiver(post_save, sender=Paiement)
+def preparer_pieces_paiement(sender, instance, created, **kwargs):
+    """
+    Le reçu et la facture d'un nouveau paiement sont rendus par le travailleur,
+    pour que leur premier téléchargement soit servi depuis le cache
+    """
+    if created:
+        from accounts.taches import mettre_en_file
+        paiement_id = instance.pk
+        transaction.on_commit(lambda: mettre_en_file('pieces_paiement', paiement_id=paiement_id))
+
+@receiver(post_init, sender=Depense)
+def memoriser_jour_depense(sender, instance, **kwargs):
+    """
+    Retient la date de la dépense au chargement, pour recalculer aussi
+    l'ancien jour si elle est déplacée
+    """
+    instance._jour_bilan = instance.__dict__.get('date_depense')
+
+@receiver(post_save, sender=Depense)
+@receiver(post_delete, sender=Depense)
+def mettre_a_jour_bilan_depense(sender, instance, **kwargs):
+    """
+    Recalcule le bilan du jour de la dépense (et de son ancien jour)
+    """
+    jour = _jour(instance.date_depense)
+    marquer_jour(jour)
+    ancien_jour = getattr(instance, '_jour_bilan', None)
+    if ancien_jour and _jour(ancien_jour) != jour:
+        marquer_jour(_jour(ancien_jour))
+    instance._jour_bilan = jour
+
+@receiver(post_save, sender=Commande)
+@receiver(post_delete, sender=Commande)
+def mettre_a_jour_bilan_commande(sender, instance, **kwargs):
+    """
+    Recalcule le bilan du jour de la commande
+    """
+    marquer_jour(_jour(instance.date_commande))
+
+@receiver(commande_transitionnee)
+def mettre_a_jour_bilan_transition(sender, commande, **kwargs):
+    """
+    Les changements d'état passent par des UPDATE conditionnels, sans post_save
+    """
+    marquer_jour(_jour(commande.date_commande))
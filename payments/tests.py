@@ -0,0 +1,312 @@
+import os
+import shutil
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+from django.db import transaction
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from accounts.models import User
+from core.testing import ConcurrenceMixin
+from orders.models import Commande, EtatCommande
+from restaurant.models import TableRestaurant
+from expenses.models import Depense
+from . import documents
+from .bilans import cloturer_jour, marquer_jour, recalculer_jour
+from .models import BilanJournalier, Caisse, MethodePaiement, Paiement, PointCaisse, TypeMouvement
+from .mouvements import enregistrer_mouvement, totaux_caisse
+from .series import activite
+
+
+class ConcurrenceCaisseTests(ConcurrenceMixin, TransactionTestCase):
+    """
+    Des caissiers simultanés ne perdent aucune mise à jour du solde : chaque
+    mouvement est un seul UPDATE relatif (Caisse.crediter / debiter)
+    """
+
+    # Mouvements par test, tous fils confondus
+    MOUVEMENTS = 10000
+
+    def setUp(self):
+        Caisse.get_instance()
+        Caisse.reinitialiser()
+
+    def test_aucun_credit_perdu(self):
+        par_fil = self.MOUVEMENTS // self.FILS
+
+        def encaisser(numero):
+            for _ in range(par_fil):
+                self.reessayer(lambda: Caisse.crediter(Decimal('1000')))
+
+        self.en_parallele(encaisser)
+        self.assertEqual(Caisse.get_instance().solde_actuel, Decimal('1000') * par_fil * self.FILS)
+
+    def test_debits_jamais_au_dela_du_solde(self):
+        disponibles = self.MOUVEMENTS // 4
+        Caisse.crediter(Decimal('1000') * disponibles)
+        # Chaque fil tente de retirer la moitié du solde
+        par_fil = disponibles // 2
+
+        def retirer(numero):
+            return sum(
+                self.reessayer(lambda: Caisse.debiter(Decimal('1000'))) for _ in range(par_fil)
+            )
+
+        reussis = self.en_parallele(retirer)
+        self.assertEqual(sum(reussis), disponibles)
+        self.assertEqual(Caisse.get_instance().solde_actuel, 0)
+
+    def test_credits_et_debits_melanges(self):
+        par_fil = self.MOUVEMENTS // self.FILS
+
+        def encaisser_puis_rendre(numero):
+            debits = 0
+            for _ in range(par_fil):
+                self.reessayer(lambda: Caisse.crediter(Decimal('1500')))
+                debits += self.reessayer(lambda: Caisse.debiter(Decimal('500')))
+            return debits
+
+        debits = sum(self.en_parallele(encaisser_puis_rendre))
+        self.assertEqual(debits, par_fil * self.FILS)
+        self.assertEqual(
+            Caisse.get_instance().solde_actuel, Decimal('1000') * par_fil * self.FILS
+        )
+
+
+class PointsCaisseTests(TestCase):
+    """Points de contrôle du grand livre (payments.mouvements)"""
+
+    def test_point_limite_aux_mouvements_anciens(self):
+        ancien = timezone.now() - timedelta(minutes=10)
+        enregistrer_mouvement(TypeMouvement.PAIEMENT, Decimal('5000'), date=ancien)
+        dernier_ancien = enregistrer_mouvement(TypeMouvement.DEPENSE, Decimal('-2000'), date=ancien)
+        # Mouvements récents : une transaction plus ancienne peut encore les précéder
+        enregistrer_mouvement(TypeMouvement.PAIEMENT, Decimal('7000'))
+        enregistrer_mouvement(TypeMouvement.AJUSTEMENT, Decimal('100'))
+
+        with mock.patch('payments.mouvements.INTERVALLE_POINT', 1):
+            totaux = totaux_caisse()
+        point = PointCaisse.objects.get()
+        self.assertEqual(point.dernier_mouvement_id, dernier_ancien.id)
+        self.assertEqual((point.total_entrees, point.total_sorties), (Decimal('5000'), Decimal('2000')))
+        self.assertEqual(totaux['solde'], Decimal('10100'))
+        self.assertEqual(totaux_caisse(), totaux)
+
+    def test_pas_de_point_sans_mouvement_ancien(self):
+        enregistrer_mouvement(TypeMouvement.PAIEMENT, Decimal('7000'))
+        with mock.patch('payments.mouvements.INTERVALLE_POINT', 1):
+            self.assertEqual(totaux_caisse()['solde'], Decimal('7000'))
+        self.assertFalse(PointCaisse.objects.exists())
+
+
+class BilansJournaliersTests(TestCase):
+    """Recalcul des bilans d'un jour (payments.bilans)"""
+
+    def test_recalcul_cree_le_bilan_du_jour(self):
+        jour = timezone.localdate()
+        Depense.objects.create(description='Gaz', montant=Decimal('30000'), date_depense=jour)
+        recalculer_jour(jour)
+        bilan = BilanJournalier.objects.get(jour=jour)
+        self.assertEqual((bilan.nb_depenses, bilan.total_sorties), (1, Decimal('30000')))
+
+    def test_recalcul_garde_la_cloture(self):
+        jour = timezone.localdate() - timedelta(days=1)
+        cloturer_jour(jour)
+        Depense.objects.create(description='Gaz', montant=Decimal('30000'), date_depense=jour)
+        recalculer_jour(jour)
+        bilan = BilanJournalier.objects.get(jour=jour)
+        self.assertTrue(bilan.cloture)
+        self.assertEqual(bilan.nb_depenses, 1)
+
+    def test_un_recalcul_par_transaction(self):
+        jour = timezone.localdate()
+        with mock.patch('payments.bilans.recalculer_jour') as recalcul:
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    marquer_jour(jour)
+                    marquer_jour(jour)
+                    marquer_jour(jour - timedelta(days=1))
+        self.assertEqual(sorted(c.args[0] for c in recalcul.call_args_list), [jour - timedelta(days=1), jour])
+
+    def test_point_de_sauvegarde_annule(self):
+        # Le recalcul programmé avant le point de sauvegarde survit à son annulation
+        jour = timezone.localdate()
+        with mock.patch('payments.bilans.recalculer_jour') as recalcul:
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    marquer_jour(jour)
+                    with self.assertRaises(ValueError), transaction.atomic():
+                        marquer_jour(jour)
+                        raise ValueError
+        recalcul.assert_called_once_with(jour)
+
+    def test_marque_dans_un_point_de_sauvegarde_annule(self):
+        # Le recalcul écarté avec le point de sauvegarde est reprogrammé ensuite
+        jour = timezone.localdate()
+        with mock.patch('payments.bilans.recalculer_jour') as recalcul:
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    with self.assertRaises(ValueError), transaction.atomic():
+                        marquer_jour(jour)
+                        raise ValueError
+                    marquer_jour(jour)
+        recalcul.assert_called_once_with(jour)
+
+
+class SeriesActiviteTests(TransactionTestCase):
+    """
+    Séries d'activité (payments.series) : heures locales, créneaux vides,
+    cache des mois clos. Sans transaction englobante, chaque écriture
+    recalcule aussitôt le bilan de son jour, comme en production.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.table = TableRestaurant.objects.create(numero_table='T01', nombre_places=4)
+        # Jour d'un mois clos
+        self.jour = (timezone.localdate().replace(day=1) - timedelta(days=40)).replace(day=15)
+
+    def payer(self, instant, montant=Decimal('10000')):
+        """Paiement (et sa commande) daté de `instant`"""
+        commande = Commande.objects.create(table=self.table, etat=EtatCommande.TERMINEE, total=montant)
+        Commande.objects.filter(pk=commande.pk).update(date_commande=instant)
+        paiement = Paiement.objects.create(commande=commande, montant=montant)
+        paiement.date_paiement = instant
+        paiement.save()
+        return paiement
+
+    def instant(self, jour, heure, minute=0):
+        return timezone.make_aware(datetime.combine(jour, datetime.min.time()).replace(hour=heure, minute=minute))
+
+    def test_creneaux_heure_locale_et_creneaux_vides(self):
+        self.payer(self.instant(self.jour, 23, 59))
+        self.payer(self.instant(self.jour + timedelta(days=1), 0, 0), Decimal('5000'))
+        serie = activite(self.jour, self.jour + timedelta(days=2), pas='heure')
+        self.assertEqual(len(serie['points']), 72)
+        non_vides = [(p['debut'], p['chiffre'], p['commandes']) for p in serie['points'] if p['paiements']]
+        self.assertEqual(non_vides, [
+            (self.instant(self.jour, 23), Decimal('10000'), 1),
+            (self.instant(self.jour + timedelta(days=1), 0), Decimal('5000'), 1),
+        ])
+        self.assertEqual(serie['par_heure'][23]['chiffre'], Decimal('10000'))
+        self.assertEqual(serie['par_heure'][0]['chiffre'], Decimal('5000'))
+
+        par_jour = activite(self.jour, self.jour + timedelta(days=2))
+        self.assertEqual(
+            [(p['debut'], p['chiffre']) for p in par_jour['points']],
+            [(self.jour, Decimal('10000')), (self.jour + timedelta(days=1), Decimal('5000')),
+             (self.jour + timedelta(days=2), Decimal('0'))],
+        )
+
+    @override_settings(TIME_ZONE='Europe/Paris')
+    def test_changement_d_heure(self):
+        # Passage à l'heure d'été : une journée de 23 heures
+        jour = date(2024, 3, 31)
+        self.payer(self.instant(jour, 3, 30))
+        serie = activite(jour, jour, pas='heure')
+        self.assertEqual(len(serie['points']), 23)
+        self.assertEqual(serie['par_heure'][3]['chiffre'], Decimal('10000'))
+        self.assertEqual(serie['par_heure'][2]['chiffre'], Decimal('0'))
+
+    def test_mois_clos_perime_par_une_modification(self):
+        premier = self.payer(self.instant(self.jour, 12))
+        self.assertEqual(activite(self.jour, self.jour)['total']['chiffre'], Decimal('10000'))
+        # Mois en cache : relu sans toucher aux paiements ni aux commandes
+        with self.assertNumQueries(1):
+            activite(self.jour, self.jour)
+
+        # Paiement antidaté dans le mois, puis suppression
+        self.payer(self.instant(self.jour + timedelta(days=3), 12), Decimal('5000'))
+        self.assertEqual(activite(self.jour, self.jour + timedelta(days=3))['total']['chiffre'], Decimal('15000'))
+        premier.delete()
+        self.assertEqual(activite(self.jour, self.jour + timedelta(days=3))['total']['chiffre'], Decimal('5000'))
+
+
+class PiecesPdfTests(TestCase):
+    """Cache disque des reçus et factures (payments.documents) et ETag des téléchargements"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(login='admin01', password='secret')
+        table = TableRestaurant.objects.create(numero_table='T01', nombre_places=4)
+        cls.paiements = [
+            Paiement.objects.create(
+                commande=Commande.objects.create(table=table, etat=EtatCommande.TERMINEE, total=Decimal('25000')),
+                montant=Decimal('25000'), methode=MethodePaiement.ESPECE,
+            )
+            for _ in range(3)
+        ]
+
+    def setUp(self):
+        self.dossier = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dossier, ignore_errors=True)
+        reglages = override_settings(PIECES_PDF_DOSSIER=self.dossier, PIECES_PDF_TAILLE_MAX=1024 * 1024)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        # Taille du dossier estimée par processus : à remesurer pour ce dossier
+        documents._taille_cache = None
+        self.client.force_login(self.admin)
+
+    def fichiers(self):
+        return sorted(os.listdir(self.dossier))
+
+    def facture(self, paiement, etag=None):
+        entetes = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(reverse('payments:telecharger_facture', args=[paiement.id]), **entetes)
+
+    def test_etag_et_304(self):
+        paiement = self.paiements[0]
+        with mock.patch('payments.documents.rendre', wraps=documents.rendre) as rendre:
+            premiere = self.facture(paiement)
+            self.assertEqual(premiere.status_code, 200)
+            self.assertEqual(premiere['Content-Type'], 'application/pdf')
+            etag = premiere['ETag']
+            self.assertEqual(len(self.fichiers()), 1)
+
+            inchangee = self.facture(paiement, etag)
+            self.assertEqual(inchangee.status_code, 304)
+            self.assertEqual(inchangee['ETag'], etag)
+
+            # Sans ETag : servie depuis le cache, sans nouveau rendu
+            seconde = self.facture(paiement)
+            self.assertEqual(seconde.content, premiere.content)
+        self.assertEqual(rendre.call_count, 1)
+
+    def test_modification_du_paiement(self):
+        paiement = self.paiements[0]
+        etag = self.facture(paiement)['ETag']
+        self.facture(self.paiements[1])
+        self.client.post(reverse('payments:modifier_paiement', args=[paiement.id]),
+                         {'methode': MethodePaiement.CARTE})
+        # Seuls les documents du paiement modifié sont retirés
+        self.assertEqual(len(self.fichiers()), 1)
+        self.assertTrue(self.fichiers()[0].startswith(f'facture_{self.paiements[1].id}_'))
+
+        reponse = self.facture(paiement, etag)
+        self.assertEqual(reponse.status_code, 200)
+        self.assertNotEqual(reponse['ETag'], etag)
+
+    @override_settings(PIECES_PDF_TAILLE_MAX=2500)
+    @mock.patch('payments.documents.rendre', return_value=b'%PDF' + b'x' * 996)
+    def test_eviction_des_moins_recemment_servis(self, rendre):
+        donnees = [documents.donnees_piece(documents.charger_paiement(p.id)) for p in self.paiements]
+        documents.piece_pdf('recu', donnees[0])
+        documents.piece_pdf('recu', donnees[1])
+        # Le reçu 0 est le plus ancien, puis relu : le reçu 1 devient le moins récemment servi
+        maintenant = time.time()
+        for numero, age in ((0, 100), (1, 50)):
+            chemin = os.path.join(self.dossier, f"recu_{self.paiements[numero].id}_{documents.empreinte('recu', donnees[numero])}.pdf")
+            os.utime(chemin, (maintenant - age, maintenant - age))
+        documents.piece_pdf('recu', donnees[0])
+        self.assertEqual(rendre.call_count, 2)
+
+        # 3000 octets pour 2500 autorisés : éviction jusqu'à 90 % de la limite
+        documents.piece_pdf('recu', donnees[2])
+        self.assertEqual(
+            sorted(nom.split('_')[1] for nom in self.fichiers()),
+            sorted([str(self.paiements[0].id), str(self.paiements[2].id)]),
+        )
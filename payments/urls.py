@@ -8,11 +8,15 @@ urlpatterns = [
     path('<int:paiement_id>/', views.paiement_detail, name='paiement_detail'),
     path('<int:paiement_id>/modifier/', views.modifier_paiement, name='modifier_paiement'),
     path('<int:paiement_id>/facture/', views.facture_client, name='facture_client'),
+    path('<int:paiement_id>/facture/pdf/', views.telecharger_facture, name='telecharger_facture'),
     path('<int:paiement_id>/recu-imprimable/', views.recu_imprimable, name='recu_imprimable'),
     path('nouveau/', views.nouveau_paiement, name='nouveau_paiement'),
     path('caisse/', views.caisse_dashboard, name='caisse_dashboard'),
     path('caisse/ajouter/', views.ajouter_montant_caisse, name='ajouter_montant_caisse'),
     path('caisse/retirer/', views.retirer_montant_caisse, name='retirer_montant_caisse'),
     path('rapport/', views.rapport_paiements, name='rapport_paiements'),
+    path('export/', views.export_paiements, name='export_paiements'),
+    path('activite/', views.activite_ventes, name='activite_ventes'),
+    path('activite/series/', views.series_ventes, name='series_ventes'),
     path('recu/<int:commande_id>/', views.telecharger_recu, name='telecharger_recu'),
 ]
@@ -2,44 +2,40 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
 from django.contrib import messages
-from django.db.models import Sum, Count, Q
+from django.db.models import Q
 from django.utils import timezone
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import urlencode
 from accounts.decorators import (admin_or_financial_required, admin_or_role_required, 
                                   admin_or_table_required, admin_or_serveur_required)
-from .models import Paiement, MethodePaiement, Caisse
-from django.core.paginator import Paginator
-from datetime import datetime
-import io
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
+from django.db import transaction
+from .models import Paiement, MethodePaiement, Caisse, TypeMouvement
+from .bilans import periode
+from .documents import charger_paiement, donnees_piece, empreinte, piece_pdf
+from .mouvements import enregistrer_mouvement
+from datetime import datetime, timedelta
+from core.exports import ExportInvalide, lire_periode, reponse_export
+from core.pagination import paginer
+from core.periodes import filtre_jour, filtre_periode
 
 @admin_or_financial_required
 def paiement_list(request):
     """Liste des paiements (et admin)"""
     paiements = Paiement.objects.all()
     
-    # Gérer le tri
+    # Gérer le tri (l'identifiant départage les égalités pour un ordre stable)
+    tris = {
+        'id': ['id'],
+        'commande': ['commande_id', 'id'],
+        'caissier': ['caissier__login', 'id'],
+        'montant': ['montant', 'id'],
+        'date': ['date_paiement', 'id'],
+    }
     sort_field = request.GET.get('sort')
-    if sort_field:
-        if sort_field == 'id':
-            paiements = paiements.order_by('id')
-        elif sort_field == 'commande':
-            paiements = paiements.order_by('commande__id')
-        elif sort_field == 'caissier':
-            paiements = paiements.order_by('caissier__login')
-        elif sort_field == 'montant':
-            paiements = paiements.order_by('montant')
-        elif sort_field == 'date':
-            paiements = paiements.order_by('date_paiement')
-        else:
-            paiements = paiements.order_by('-date_paiement')
-    else:
-        paiements = paiements.order_by('-date_paiement')
+    tri = tris.get(sort_field, ['-date_paiement', '-id'])
+    if sort_field == 'caissier':
+        paiements = paiements.select_related('caissier')
     
     # Filtrer par méthode si spécifié
     methode = request.GET.get('methode')
@@ -59,14 +55,12 @@ def paiement_list(request):
     if date_filter:
         try:
             filter_date = datetime.strptime(date_filter, '%Y-%m-%d').date()
-            paiements = paiements.filter(date_paiement__date=filter_date)
+            paiements = paiements.filter(**filtre_jour('date_paiement', filter_date))
         except ValueError:
             pass
     
-    # Pagination
-    paginator = Paginator(paiements, 20)  # 20 paiements par page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Pagination par curseur (20 paiements par page)
+    page_obj = paginer(request, paiements, tri, par_page=20, comptage='approche')
     
     methodes = MethodePaiement.choices
     context = {
@@ -74,7 +68,7 @@ def paiement_list(request):
         'methodes': methodes,
         'methode_filter': methode,
         'date_filter': date_filter,
-        'is_paginated': page_obj.has_other_pages(),
+        'is_paginated': page_obj.has_other_pages,
         'page_obj': page_obj,
     }
     return render(request, 'payments/paiement_list.html', context)
@@ -104,11 +98,11 @@ def modifier_paiement(request, paiement_id):
             return redirect('payments:modifier_paiement', paiement_id=paiement_id)
         
         # Mettre à jour la méthode de paiement
-        old_methode = paiement.get_methode_paiement_display() if paiement.methode else 'Non spécifié'
+        old_methode = paiement.get_methode_display() if paiement.methode else 'Non spécifié'
         paiement.methode = methode
         paiement.save()
         
-        new_methode = paiement.get_methode_paiement_display()
+        new_methode = paiement.get_methode_display()
         messages.success(request, f'Méthode de paiement mise à jour : {old_methode} → {new_methode}')
         return redirect('payments:paiement_detail', paiement_id=paiement.id)
     
@@ -234,16 +228,12 @@ def caisse_dashboard(request):
     """Tableau de bord de la caisse (et admin)"""
     caisse = Caisse.get_instance()
     
-    # Statistiques du jour
+    # Statistiques du jour (bilan journalier tenu à jour à chaque écriture)
     today = timezone.now().date()
-    paiements_aujourdhui = Paiement.objects.filter(date_paiement__date=today)
-    total_aujourdhui = paiements_aujourdhui.aggregate(Sum('montant'))['montant__sum'] or 0
-    nb_paiements_aujourdhui = paiements_aujourdhui.count()
-    
-    # Importer les dépenses pour calculer les sorties
-    from expenses.models import Depense
-    depenses_aujourdhui = Depense.objects.filter(date_depense=today)
-    total_sorties_aujourdhui = depenses_aujourdhui.aggregate(Sum('montant'))['montant__sum'] or 0
+    bilan = periode(today, today)
+    total_aujourdhui = bilan['total_entrees']
+    nb_paiements_aujourdhui = bilan['nb_paiements']
+    total_sorties_aujourdhui = bilan['total_sorties']
     
     # Calculer le solde actuel (entrées - sorties)
     solde_calculé = total_aujourdhui - total_sorties_aujourdhui
@@ -251,14 +241,12 @@ def caisse_dashboard(request):
     # Statistiques par méthode (simplifié)
     stats_par_methode = []
     for methode_choice, methode_label in MethodePaiement.choices:
-        paiements_methode = paiements_aujourdhui.filter(methode=methode_choice)
-        total_methode = paiements_methode.aggregate(Sum('montant'))['montant__sum'] or 0
-        count_methode = paiements_methode.count()
+        stat = bilan['par_methode'].get(methode_choice, {'total': 0, 'count': 0})
         stats_par_methode.append({
             'methode': methode_choice,
             'methode_label': methode_label,
-            'total': total_methode,
-            'count': count_methode
+            'total': stat['total'],
+            'count': stat['count']
         })
     
     # Trier par total décroissant
@@ -286,16 +274,18 @@ def ajouter_montant_caisse(request):
         return redirect('payments:caisse_dashboard')
     
     try:
-        from decimal import Decimal
+        from decimal import Decimal, InvalidOperation
         montant = Decimal(montant)
         if montant <= 0:
             raise ValueError()
-    except ValueError:
+    except (ValueError, InvalidOperation):
         messages.error(request, 'Montant invalide.')
         return redirect('payments:caisse_dashboard')
     
-    caisse = Caisse.get_instance()
-    caisse.ajouter_montant(montant)
+    with transaction.atomic():
+        Caisse.crediter(montant)
+        enregistrer_mouvement(TypeMouvement.AJUSTEMENT, montant,
+                              libelle='Ajout manuel', utilisateur=request.user)
     
     messages.success(request, f'{montant} GNF ajoutés à la caisse.')
     return redirect('payments:caisse_dashboard')
@@ -311,16 +301,21 @@ def retirer_montant_caisse(request):
         return redirect('payments:caisse_dashboard')
     
     try:
-        montant = float(montant)
+        from decimal import Decimal, InvalidOperation
+        montant = Decimal(montant)
         if montant <= 0:
             raise ValueError()
-    except ValueError:
+    except (ValueError, InvalidOperation):
         messages.error(request, 'Montant invalide.')
         return redirect('payments:caisse_dashboard')
     
-    caisse = Caisse.get_instance()
-    if caisse.solde_actuel >= montant:
-        caisse.retirer_montant(montant)
+    # Le contrôle du solde et le retrait forment un seul UPDATE
+    with transaction.atomic():
+        retire = Caisse.debiter(montant)
+        if retire:
+            enregistrer_mouvement(TypeMouvement.AJUSTEMENT, -montant,
+                                  libelle='Retrait manuel', utilisateur=request.user)
+    if retire:
         messages.success(request, f'{montant} GNF retirés de la caisse.')
     else:
         messages.error(request, 'Solde insuffisant dans la caisse.')
@@ -346,21 +341,19 @@ def rapport_paiements(request):
         date_debut = month_start
         date_fin = today
     
-    paiements = Paiement.objects.filter(
-        date_paiement__date__gte=date_debut,
-        date_paiement__date__lte=date_fin
-    )
+    paiements = Paiement.objects.filter(**filtre_periode('date_paiement', date_debut, date_fin))
     
-    # Statistiques
-    total = paiements.aggregate(Sum('montant'))['montant__sum'] or 0
-    nb_paiements = paiements.count()
+    # Statistiques, à partir des bilans journaliers de la période
+    bilan = periode(date_debut, date_fin)
+    total = bilan['total_entrees']
+    nb_paiements = bilan['nb_paiements']
     
     # Par méthode
     stats_par_methode = []
-    methode_stats = paiements.values('methode').annotate(
-        total=Sum('montant'),
-        count=Count('id')
-    ).order_by('-total')
+    methode_stats = sorted(
+        ({'methode': methode, **stat} for methode, stat in bilan['par_methode'].items()),
+        key=lambda stat: stat['total'], reverse=True
+    )
     
     # Convertir les dictionnaires en objets simples et normaliser les méthodes
     for stat in methode_stats:
@@ -391,264 +384,129 @@ def rapport_paiements(request):
         'nb_paiements': nb_paiements,
         'stats_par_methode': stats_par_methode,
         'date_debut': date_debut,
-        'date_fin': date_fin
+        'date_fin': date_fin,
+        'parametres_export': urlencode({'date_debut': date_debut, 'date_fin': date_fin}),
     }
     
     return render(request, 'payments/rapport_paiements.html', context)
 
+# Période maximale d'une série d'activité
+JOURS_MAX_ACTIVITE = 731
+
+def _periode_activite(request):
+    """(debut, fin, pas) demandés pour les séries d'activité ; 30 derniers jours par défaut"""
+    from .series import PAS
+    debut, fin = lire_periode(request.GET)
+    today = timezone.localdate()
+    fin = fin or today
+    debut = debut or fin - timedelta(days=29)
+    if debut > fin:
+        raise ExportInvalide('La date de début est postérieure à la date de fin.')
+    if (fin - debut).days >= JOURS_MAX_ACTIVITE:
+        raise ExportInvalide(f'Période limitée à {JOURS_MAX_ACTIVITE} jours.')
+    pas = request.GET.get('pas', 'jour')
+    if pas not in PAS:
+        raise ExportInvalide('Pas invalide (heure ou jour).')
+    return debut, fin, pas
+
 @admin_or_financial_required
-def telecharger_recu(request, commande_id):
-    """Télécharger le reçu PDF professionnel d'une seule page pour une commande payée (et admin)"""
+def activite_ventes(request):
+    """Activité par jour, par heure de la journée et par jour de la semaine (planification du personnel)"""
+    from .series import activite
+    try:
+        debut, fin, pas = _periode_activite(request)
+    except ExportInvalide as e:
+        messages.error(request, str(e))
+        return redirect('payments:activite_ventes')
+    
+    donnees = activite(debut, fin, 'jour')
+    # Hauteur relative des barres (pourcentage du maximum de chaque graphique)
+    for serie in ('points', 'par_heure', 'par_jour_semaine'):
+        maximum = max((point['chiffre'] for point in donnees[serie]), default=0) or 1
+        for point in donnees[serie]:
+            point['part'] = round(point['chiffre'] * 100 / maximum)
     
+    context = {
+        **donnees,
+        'date_debut': debut,
+        'date_fin': fin,
+        'parametres_series': urlencode({'date_debut': debut, 'date_fin': fin}),
+    }
+    return render(request, 'payments/activite_ventes.html', context)
+
+@admin_or_financial_required
+def series_ventes(request):
+    """
+    Séries d'activité en JSON : date_debut, date_fin (30 derniers jours par
+    défaut) et pas=jour|heure
+    """
+    from .series import activite
     try:
-        # Récupérer la commande et le paiement
-        from orders.models import Commande
-        commande = Commande.objects.get(id=commande_id)
-        paiement = Paiement.objects.get(commande=commande)
-        
-        # Créer le buffer pour le PDF
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, 
-                              leftMargin=20, rightMargin=20, topMargin=20, bottomMargin=20)
-        
-        # Styles professionnels
-        styles = getSampleStyleSheet()
-        
-        # Style pour le titre principal
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=28,
-            spaceAfter=15,
-            alignment=TA_CENTER,
-            textColor=colors.black,
-            fontName='Helvetica-Bold',
-            borderWidth=0,
-            padding=0
-        )
-        
-        # Style pour le sous-titre
-        subtitle_style = ParagraphStyle(
-            'CustomSubtitle',
-            parent=styles['Normal'],
-            fontSize=12,
-            spaceAfter=20,
-            alignment=TA_CENTER,
-            textColor=colors.grey,
-            fontName='Helvetica',
-            borderWidth=0,
-            padding=0
-        )
-        
-        # Style pour les sections
-        section_style = ParagraphStyle(
-            'SectionHeader',
-            parent=styles['Heading2'],
-            fontSize=14,
-            spaceAfter=8,
-            spaceBefore=12,
-            alignment=TA_LEFT,
-            textColor=colors.black,
-            fontName='Helvetica-Bold',
-            borderWidth=0,
-            borderPadding=0,
-            padding=0
-        )
-        
-        # Style pour les tableaux de données
-        data_table_style = TableStyle([
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-            ('TOPPADDING', (0, 0), (-1, -1), 6),
-            ('LINEBELOW', (0, 0), (-1, 0), 1, colors.lightgrey),
-            ('LINEABOVE', (0, -1), (-1, -1), 1, colors.black),
-        ])
-        
-        # Style pour le tableau des articles
-        articles_table_style = TableStyle([
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 9),
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
-            ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),
-            ('ALIGN', (3, 0), (-1, -1), 'RIGHT'),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-            ('TOPPADDING', (0, 0), (-1, -1), 5),
-            ('LINEBELOW', (0, 0), (-1, 0), 1, colors.lightgrey),
-            ('LINEABOVE', (0, 0), (-1, 0), 1, colors.black),
-            ('LINEBELOW', (0, -1), (-1, -1), 1, colors.black),
-            ('BACKGROUND', (0, 0), (-1, 0), colors.whitesmoke),
-        ])
-        
-        # Style pour le total
-        total_style = TableStyle([
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 14),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-            ('TOPPADDING', (0, 0), (-1, -1), 12),
-            ('BACKGROUND', (0, 0), (-1, -1), colors.lightgreen),
-            ('LINEABOVE', (0, 0), (-1, -1), 2, colors.green),
-        ])
-        
-        # Style pour le pied de page
-        footer_style = ParagraphStyle(
-            'Footer',
-            parent=styles['Normal'],
-            fontSize=9,
-            spaceBefore=25,
-            alignment=TA_CENTER,
-            textColor=colors.grey,
-            fontName='Helvetica',
-            borderWidth=0,
-            padding=0
-        )
-        
-        # Contenu du reçu professionnel
-        story = []
-        
-        # En-tête avec bordure double
-        story.append(Paragraph("REÇU DE PAIEMENT", title_style))
-        story.append(Paragraph(f"Reçu #{paiement.id}", subtitle_style))
-        
-        # Ligne de séparation
-        story.append(Spacer(1, 10))
-        
-        # Informations du restaurant
-        restaurant_data = [
-            ["RESTAURANT", ""],
-            ["Adresse complète du restaurant", ""],
-            ["Téléphone: +224 XXX XXX XXX", ""],
-            ["Email: contact@restaurant.com", ""],
-            ["NIF: XXXXXXXXX | RCCM: XXXXXXXXX", ""],
-        ]
-        
-        restaurant_table = Table(restaurant_data, colWidths=[4*inch, 2*inch])
-        restaurant_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 11),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ]))
-        
-        story.append(restaurant_table)
-        story.append(Spacer(1, 12))
-        
-        # Section commande
-        story.append(Paragraph("INFORMATIONS DE LA COMMANDE", section_style))
-        
-        commande_data = [
-            ["Numéro de commande:", f"#{commande.id}"],
-            ["Table:", f"Table {commande.table.numero_table}"],
-            ["Date:", commande.date_commande.strftime('%d/%m/%Y à %H:%M')],
-            ["Serveur:", commande.serveur.login if commande.serveur else "N/A"],
-        ]
-        
-        commande_table = Table(commande_data, colWidths=[3.5*inch, 2.5*inch])
-        commande_table.setStyle(data_table_style)
-        
-        story.append(commande_table)
-        story.append(Spacer(1, 12))
-        
-        # Section articles
-        story.append(Paragraph("DÉTAIL DES ARTICLES", section_style))
-        
-        # En-tête du tableau des articles
-        articles_data = [["Article", "Quantité", "Prix unitaire", "Total"]]
-        
-        # Ajouter les articles (limité pour tenir sur une page)
-        max_articles = 6  # Réduit de 8 à 6 articles
-        articles_count = 0
-        for item in commande.commandeplat_set.all():
-            if articles_count >= max_articles:
-                break
-            articles_data.append([
-                item.plat.nom[:25],  # Limiter la longueur du nom
-                str(item.quantite),
-                f"{item.prix_unitaire:,} GNF",  # Formatage avec séparateur de milliers
-                f"{item.sous_total():,} GNF"
-            ])
-            articles_count += 1
-        
-        # Ligne de total
-        articles_data.append(["", "", "TOTAL:", f"{commande.total:,} GNF"])
-        
-        articles_table = Table(articles_data, colWidths=[3.2*inch, 1*inch, 1.4*inch, 1.4*inch])
-        articles_table.setStyle(articles_table_style)
-        
-        # Appliquer un style spécial pour la ligne de total
-        articles_table.setStyle(TableStyle([
-            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, -1), (-1, -1), 14),
-            ('ALIGN', (0, -1), (-1, -1), 'LEFT'),
-            ('ALIGN', (1, -1), (-1, -1), 'CENTER'),
-            ('ALIGN', (2, -1), (-1, -1), 'RIGHT'),
-            ('ALIGN', (3, -1), (-1, -1), 'RIGHT'),
-            ('BOTTOMPADDING', (0, -1), (-1, -1), 12),
-            ('TOPPADDING', (0, -1), (-1, -1), 12),
-            ('BACKGROUND', (0, -1), (-1, -1), colors.lightgreen),
-            ('LINEABOVE', (0, -1), (-1, -1), 2, colors.green),
-        ]))
-        
-        story.append(articles_table)
-        story.append(Spacer(1, 15))
-        
-        # Section paiement
-        story.append(Paragraph("INFORMATIONS DE PAIEMENT", section_style))
-        
-        paiement_data = [
-            ["Méthode de paiement:", paiement.get_methode_display()],
-            ["Montant payé:", f"{paiement.montant:,} GNF"],
-            ["Date de paiement:", paiement.date_paiement.strftime('%d/%m/%Y à %H:%M')],
-            ["Caissier:", paiement.caissier.login if paiement.caissier else "N/A"],
-        ]
-        
-        paiement_table = Table(paiement_data, colWidths=[3.5*inch, 2.5*inch])
-        paiement_table.setStyle(data_table_style)
-        
-        story.append(paiement_table)
-        story.append(Spacer(1, 20))
-        
-        # Zone de cachet
-        cachet_data = [["", ""]]
-        cachet_table = Table(cachet_data, colWidths=[3*inch, 3*inch])
-        cachet_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('LINEBELOW', (0, 0), (-1, -1), 1, colors.lightgrey),
-            ('LINEABOVE', (0, 0), (-1, -1), 1, colors.lightgrey),
-            ('PADDING', (0, 0), (-1, -1), 20),
-        ]))
-        
-        story.append(cachet_table)
-        story.append(Paragraph("CACHET ET SIGNATURE", subtitle_style))
-        
-        # Pied de page professionnel
-        story.append(Paragraph("MERCI POUR VOTRE CONFIANCE !", footer_style))
-        story.append(Paragraph("Ce reçu est généré automatiquement et constitue une preuve de paiement valide.", footer_style))
-        story.append(Paragraph(f"Document généré le {timezone.now().strftime('%d/%m/%Y %H:%M:%S')}", footer_style))
-        
-        # Générer le PDF professionnel
-        doc.build(story)
-        
-        # Préparer la réponse HTTP
-        buffer.seek(0)
-        response = HttpResponse(buffer, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="recu_paiement_{paiement.id}_{commande.id}.pdf"'
-        
-        return response
-        
-    except Commande.DoesNotExist:
+        debut, fin, pas = _periode_activite(request)
+    except ExportInvalide as e:
+        return JsonResponse({'erreur': str(e)}, status=400)
+    
+    donnees = activite(debut, fin, pas)
+    # Montants en nombres pour les graphiques
+    for serie in ('points', 'par_heure', 'par_jour_semaine'):
+        for point in donnees[serie]:
+            for cle in ('chiffre', 'chiffre_moyen', 'commandes_moyennes'):
+                if cle in point:
+                    point[cle] = float(point[cle])
+    donnees['total']['chiffre'] = float(donnees['total']['chiffre'])
+    return JsonResponse(donnees)
+
+@admin_or_financial_required
+def export_paiements(request):
+    """Export en flux (CSV ou JSON Lines) des paiements, mêmes filtres que la liste et le rapport"""
+    try:
+        return reponse_export(request, 'paiements')
+    except ExportInvalide as e:
+        messages.error(request, str(e))
+        return redirect('payments:paiement_list')
+
+def _reponse_piece(request, nom, paiement, fichier):
+    """
+    Reçu ou facture PDF depuis le cache des documents, avec ETag : un client
+    qui présente l'empreinte courante (If-None-Match) reçoit un 304
+    """
+    donnees = donnees_piece(paiement)
+    cle = empreinte(nom, donnees)
+    etag = f'"{cle}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(piece_pdf(nom, donnees, cle), content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="{fichier}"'
+    response['ETag'] = etag
+    # Revalidation à chaque téléchargement : le document change avec le paiement
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+@admin_or_financial_required
+def telecharger_recu(request, commande_id):
+    """Télécharger le reçu PDF professionnel d'une seule page pour une commande payée (et admin)"""
+    from orders.models import Commande
+    if not Commande.objects.filter(id=commande_id).exists():
         messages.error(request, "Commande introuvable.")
         return redirect('restaurant:table_commandes')
+    try:
+        paiement = charger_paiement(commande_id=commande_id)
     except Paiement.DoesNotExist:
         messages.error(request, "Aucun paiement trouvé pour cette commande.")
         return redirect('restaurant:table_commandes')
+    
+    return _reponse_piece(request, 'recu', paiement, f'recu_paiement_{paiement.id}_{commande_id}.pdf')
+
+@admin_or_financial_required
+def telecharger_facture(request, paiement_id):
+    """Télécharger la facture client en PDF"""
+    try:
+        paiement = charger_paiement(paiement_id=paiement_id)
+    except Paiement.DoesNotExist:
+        messages.error(request, "Paiement introuvable.")
+        return redirect('payments:paiement_list')
+    if not paiement.methode:
+        messages.error(request, 'Impossible de générer une facture pour un paiement sans méthode de paiement.')
+        return redirect('payments:paiement_detail', paiement_id=paiement.id)
+    
+    return _reponse_piece(request, 'facture', paiement, f'facture_{paiement.id}.pdf')
@@ -4,7 +4,8 @@ from .models import Categorie, TableRestaurant, Plat
 
 @admin.register(Categorie)
 class CategorieAdmin(admin.ModelAdmin):
-    list_display = ['nom', 'date_creation']
+    list_display = ['nom', 'poste', 'date_creation']
+    list_filter = ['poste']
     search_fields = ['nom', 'description']
     ordering = ['nom']
 
@@ -6,7 +6,7 @@ class CategorieForm(forms.ModelForm):
     """Formulaire pour créer/éditer une catégorie"""
     class Meta:
         model = Categorie
-        fields = ['nom', 'description']
+        fields = ['nom', 'description', 'poste']
         widgets = {
             'nom': forms.TextInput(attrs={
                 'class': 'w-full px-3 py-2 border border-gray-300 rounded-lg focus:outline-none focus:border-blue-500',
@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-18 04:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0005_qrcode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categorie',
+            name='poste',
+            field=models.CharField(blank=True, choices=[('CHAUD', 'Cuisine chaude'), ('FROID', 'Garde-manger (froid)'), ('DESSERT', 'Pâtisserie'), ('BAR', 'Bar')], help_text='Laisser vide pour déduire le poste du type de plat.', max_length=20, verbose_name='Poste de préparation'),
+        ),
+    ]
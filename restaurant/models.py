@@ -7,6 +7,14 @@ import io
 import base64
 
 
+class Poste(models.TextChoices):
+    """Postes de la cuisine, qui reçoivent chacun leurs propres tickets"""
+    CHAUD = 'CHAUD', 'Cuisine chaude'
+    FROID = 'FROID', 'Garde-manger (froid)'
+    DESSERT = 'DESSERT', 'Pâtisserie'
+    BAR = 'BAR', 'Bar'
+
+
 class Categorie(models.Model):
     """
     Modèle pour les catégories de plats
@@ -20,6 +28,13 @@ class Categorie(models.Model):
         blank=True,
         verbose_name='Description'
     )
+    poste = models.CharField(
+        max_length=20,
+        choices=Poste.choices,
+        blank=True,
+        verbose_name='Poste de préparation',
+        help_text='Laisser vide pour déduire le poste du type de plat.'
+    )
     date_creation = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -84,6 +99,16 @@ class Plat(models.Model):
         ('accompagnement', 'Accompagnement'),
     ]
     
+    # Poste de préparation par défaut selon le type de plat
+    POSTE_PAR_TYPE = {
+        'entree': Poste.FROID,
+        'principal': Poste.CHAUD,
+        'special': Poste.CHAUD,
+        'dessert': Poste.DESSERT,
+        'boisson': Poste.BAR,
+        'accompagnement': Poste.CHAUD,
+    }
+    
     nom = models.CharField(
         max_length=200,
         verbose_name='Nom du plat'
@@ -137,6 +162,12 @@ class Plat(models.Model):
     
     def __str__(self):
         return f"{self.nom} - {self.prix_unitaire} FCFA"
+    
+    def poste(self):
+        """Poste qui prépare ce plat : celui de sa catégorie, sinon celui de son type"""
+        if self.categorie_id and self.categorie.poste:
+            return self.categorie.poste
+        return self.POSTE_PAR_TYPE.get(self.type_plat, Poste.CHAUD)
 
 class Panier(models.Model):
     """
@@ -42,6 +42,9 @@ urlpatterns = [
     path('cuisinier/commande/<int:commande_id>/prendre/', views.cuisinier_prendre_commande, name='cuisinier_prendre_commande'),
     path('cuisinier/commande/<int:commande_id>/etat/', views.cuisinier_changer_etat, name='cuisinier_changer_etat'),
     path('cuisinier/commande/<int:commande_id>/prete/', views.cuisinier_marquer_prete, name='cuisinier_marquer_prete'),
+    path('cuisinier/commandes/transition/', views.cuisinier_transition_lot, name='cuisinier_transition_lot'),
+    path('cuisinier/poste/<str:poste>/', views.poste_home, name='poste_home'),
+    path('cuisinier/ticket/<int:ticket_id>/etat/', views.poste_changer_etat_ticket, name='poste_changer_etat_ticket'),
     
     # Vues pour les comptables (Rcomptable)
     path('comptable/home/', views.comptable_home, name='comptable_home'),
@@ -51,6 +54,7 @@ urlpatterns = [
     
     # API pour l'état des commandes
     path('api/etat-commandes-cuisine/', views.etat_commandes_cuisine, name='etat_commandes_cuisine'),
+    path('api/flux-commandes/', views.flux_commandes, name='flux_commandes'),
     
     # Vues pour les QR codes
     path('qr-codes/', views.qr_code_list, name='qr_code_list'),
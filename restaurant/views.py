@@ -5,17 +5,33 @@ from accounts.decorators import (admin_or_role_required, admin_or_restaurant_sta
                                   admin_or_serveur_required, admin_or_cuisinier_required, admin_or_caissier_required,
                                   admin_or_comptable_required, admin_or_financial_required)
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
 from django.views.decorators.http import require_POST
 from django.db import models
 from django.views.decorators.csrf import csrf_exempt
-from .models import Plat, TableRestaurant, Categorie, QRCode
+from .models import Plat, TableRestaurant, Categorie, QRCode, Poste
 from .forms import PlatForm, CategorieForm
-from orders.models import Commande, EtatCommande
+from orders.models import Commande, EtatCommande, EtatTicket, TicketPoste
+from orders.events import flux_sse
+from orders.queries import commandes_tableau, tables_avec_etat, etat_salle
+from orders.transitions import changer_etat, changer_etats, TransitionInterdite
+from orders.estimations import Estimateur, avec_debut_preparation
+from orders.postes import file_poste, changer_etat_ticket
+from core.pagination import paginer
 from django.utils import timezone
 from django.core.serializers.json import DjangoJSONEncoder
+from datetime import datetime, timedelta, timezone as dt_timezone
 import json
 
+# Origine des curseurs de l'API cuisine
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+# Une autre personne a changé l'état de la commande juste avant
+MESSAGE_TRANSITION_PERDUE = "Commande #{} : son état vient d'être modifié par quelqu'un d'autre."
+
 def menu_list(request):
     """Liste des plats du menu avec filtres et suggestions AJAX"""
     # Vérifier si c'est une demande de suggestions AJAX
@@ -560,34 +576,16 @@ def table_valider_commande(request):
             return redirect('restaurant:table_home')
     
     if request.method == 'POST':
-        from orders.models import Commande, CommandePlat, EtatCommande
+        from orders.services import preparer_lignes, creer_commande, CommandeInvalide
         
-        # Créer la commande
-        commande = Commande.objects.create(
-            table=table,
-            serveur=None,  # Pas de serveur pour une commande de table
-            etat=EtatCommande.EN_ATTENTE,
-            total=0
-        )
-        
-        # Ajouter les plats à la commande
-        total = 0
-        for plat_id, item in panier.items():
-            plat = get_object_or_404(Plat, id=plat_id)
-            quantite = item['quantite']
-            
-            CommandePlat.objects.create(
-                commande=commande,
-                plat=plat,
-                quantite=quantite,
-                prix_unitaire=plat.prix_unitaire
-            )
-            
-            total += plat.prix_unitaire * quantite
+        # Créer la commande et ses lignes en une seule transaction
+        try:
+            lignes = preparer_lignes((plat_id, item['quantite']) for plat_id, item in panier.items())
+        except CommandeInvalide as e:
+            messages.error(request, str(e))
+            return redirect('restaurant:table_home')
         
-        # Mettre à jour le total
-        commande.total = total
-        commande.save()
+        commande = creer_commande(table, lignes, etat=EtatCommande.EN_ATTENTE)  # Pas de serveur pour une commande de table
         
         # Vider le panier
         request.session['panier'] = {}
@@ -613,44 +611,32 @@ def table_valider_commande(request):
 def serveur_home(request):
     """Page d'accueil pour les serveurs (et admin)"""
     
-    # Récupérer toutes les tables avec leur état
-    tables = TableRestaurant.objects.all().order_by('numero_table')
+    # Récupérer toutes les tables avec l'état de leur dernière commande (une requête)
+    tables = tables_avec_etat(TableRestaurant.objects.order_by('numero_table'))
     
     # Déterminer l'état de chaque table
     tables_data = []
     for table in tables:
-        # Chercher la dernière commande pour cette table
-        derniere_commande = Commande.objects.filter(table=table).order_by('-date_commande').first()
-        
-        etat_table = 'Libre'
-        etat_couleur = 'green'
-        
-        if derniere_commande:
-            if derniere_commande.etat == EtatCommande.EN_ATTENTE:
-                etat_table = 'Commande en attente'
-                etat_couleur = 'yellow'
-            elif derniere_commande.etat == EtatCommande.EN_PREPARATION:
-                etat_table = 'Commande en préparation'
-                etat_couleur = 'orange'
-            elif derniere_commande.etat == EtatCommande.EN_COURS:
-                etat_table = 'Commande en cours'
-                etat_couleur = 'blue'
-            elif derniere_commande.etat == EtatCommande.TERMINEE:
-                # Vérifier si la commande est payée
-                from payments.models import Paiement
-                paiement = Paiement.objects.filter(commande=derniere_commande).first()
-                if paiement:
-                    etat_table = 'Commande payée'
-                    etat_couleur = 'green'
-                else:
-                    etat_table = 'Commande servie'
-                    etat_couleur = 'purple'
+        etat_table, etat_couleur, occupee = etat_salle(
+            table.derniere_commande_etat, table.derniere_commande_payee
+        )
+        
+        commande_en_cours = None
+        if occupee:
+            commande_en_cours = {
+                'id': table.derniere_commande_id,
+                'total': table.derniere_commande_total,
+            }
         
         tables_data.append({
             'table': table,
             'etat': etat_table,
             'etat_couleur': etat_couleur,
-            'derniere_commande': derniere_commande
+            'statut': 'occupee' if occupee else 'libre',
+            'commande_en_cours': commande_en_cours,
+            'derniere_commande_id': table.derniere_commande_id,
+            'derniere_commande': table.derniere_commande_date,
+            'payee': table.derniere_commande_payee,
         })
     
     context = {
@@ -664,7 +650,9 @@ def serveur_table_commandes(request, table_id):
     """Consultation des commandes d'une table spécifique (et admin)"""
     
     table = get_object_or_404(TableRestaurant, id=table_id)
-    commandes = Commande.objects.filter(table=table).select_related('paiement').order_by('-date_commande')
+    commandes = commandes_tableau(
+        Commande.objects.filter(table=table), lignes=False, paiement=True
+    ).order_by('-date_commande')
     
     context = {
         'table': table,
@@ -682,29 +670,24 @@ def serveur_changer_etat_commande(request, commande_id):
     if request.method == 'POST':
         nouvel_etat = request.POST.get('nouvel_etat')
         
-        # Valider la transition d'état
-        etats_autorises = {
-            'EN_ATTENTE': ['EN_PREPARATION', 'ANNULEE'],
-            'EN_PREPARATION': ['EN_COURS', 'ANNULEE'],
-            'EN_COURS': ['TERMINEE', 'ANNULEE'],
-            'TERMINEE': [],  # État final
-            'ANNULEE': []    # État final
-        }
+        # Valider et appliquer la transition d'état
+        ancien_etat = commande.get_etat_display()
+        try:
+            effectuee = changer_etat(commande, nouvel_etat, request.user)
+        except TransitionInterdite as e:
+            messages.error(request, str(e))
+            return redirect('restaurant:serveur_table_commandes', table_id=commande.table_id)
         
-        if nouvel_etat in etats_autorises.get(commande.etat, []):
-            ancien_etat = commande.get_etat_display()
-            commande.etat = nouvel_etat
-            commande.save()
-            
+        if effectuee:
             messages.success(request, f"Commande #{commande.id} : {ancien_etat} → {commande.get_etat_display()}")
             
             # Si la commande est terminée, proposer le paiement
-            if nouvel_etat == 'TERMINEE' and not commande.paiement_set.exists():
+            if nouvel_etat == 'TERMINEE' and not hasattr(commande, 'paiement'):
                 messages.info(request, "La commande est prête. Vous pouvez maintenant enregistrer le paiement.")
         else:
-            messages.error(request, "Transition d'état non autorisée.")
+            messages.error(request, MESSAGE_TRANSITION_PERDUE.format(commande.id))
         
-        return redirect('restaurant:serveur_table_commandes', table_id=commande.table.id)
+        return redirect('restaurant:serveur_table_commandes', table_id=commande.table_id)
     
     # Déterminer les états possibles depuis l'état actuel
     etats_possibles = []
@@ -753,19 +736,74 @@ def serveur_valider_service(request, commande_id):
 def cuisinier_home(request):
     """Page d'accueil pour les cuisiniers (et admin)"""
     
-    # Récupérer les commandes en attente et en préparation
-    commandes_en_attente = Commande.objects.filter(etat=EtatCommande.EN_ATTENTE).order_by('date_commande')
-    commandes_en_preparation = Commande.objects.filter(
-        etat__in=[EtatCommande.EN_PREPARATION, EtatCommande.EN_COURS]
-    ).order_by('date_commande')
+    # Récupérer les commandes en attente et en préparation (une requête + les lignes)
+    commandes = commandes_tableau(Commande.objects.filter(
+        etat__in=[EtatCommande.EN_ATTENTE, EtatCommande.EN_PREPARATION, EtatCommande.EN_COURS]
+    )).order_by('date_commande')
+    commandes_en_attente = []
+    commandes_en_preparation = []
+    for commande in commandes:
+        if commande.etat == EtatCommande.EN_ATTENTE:
+            commandes_en_attente.append(commande)
+        else:
+            commandes_en_preparation.append(commande)
     
     context = {
         'commandes_en_attente': commandes_en_attente,
         'commandes_en_preparation': commandes_en_preparation,
+        'postes': Poste.choices,
     }
     return render(request, 'restaurant/cuisinier_home.html', context)
 
 
+@admin_or_cuisinier_required
+def poste_home(request, poste):
+    """File des tickets d'un poste de la cuisine (chaud, froid, pâtisserie, bar) (et admin)"""
+    
+    if poste not in Poste.values:
+        messages.error(request, "Poste inconnu.")
+        return redirect('restaurant:cuisinier_home')
+    
+    # Uniquement les tickets ouverts de ce poste (une requête + les lignes)
+    tickets_en_attente = []
+    tickets_en_preparation = []
+    for ticket in file_poste(poste):
+        if ticket.etat == EtatTicket.EN_ATTENTE:
+            tickets_en_attente.append(ticket)
+        else:
+            tickets_en_preparation.append(ticket)
+    
+    context = {
+        'poste': poste,
+        'poste_display': Poste(poste).label,
+        'postes': Poste.choices,
+        'tickets_en_attente': tickets_en_attente,
+        'tickets_en_preparation': tickets_en_preparation,
+    }
+    return render(request, 'restaurant/poste_home.html', context)
+
+
+@admin_or_cuisinier_required
+@require_POST
+def poste_changer_etat_ticket(request, ticket_id):
+    """Faire avancer un ticket de poste (EN_ATTENTE → EN_PREPARATION → PRET) (et admin)"""
+    
+    ticket = get_object_or_404(TicketPoste, id=ticket_id)
+    nouvel_etat = request.POST.get('nouvel_etat')
+    
+    try:
+        effectuee = changer_etat_ticket(ticket, nouvel_etat, request.user)
+    except ValueError as e:
+        messages.error(request, str(e))
+    else:
+        if effectuee:
+            messages.success(request, f"Commande #{ticket.commande_id} : ticket {ticket.get_poste_display()} {ticket.get_etat_display().lower()}.")
+        else:
+            messages.error(request, f"Commande #{ticket.commande_id} : ce ticket vient d'être modifié par quelqu'un d'autre.")
+    
+    return redirect('restaurant:poste_home', poste=ticket.poste)
+
+
 @admin_or_cuisinier_required
 def cuisinier_prendre_commande(request, commande_id):
     """Prendre une commande en charge (EN_ATTENTE → EN_PREPARATION) (et admin)"""
@@ -777,9 +815,10 @@ def cuisinier_prendre_commande(request, commande_id):
         return redirect('restaurant:cuisinier_home')
     
     if request.method == 'POST':
-        commande.etat = EtatCommande.EN_PREPARATION
-        commande.save()
-        messages.success(request, f"Commande #{commande.id} prise en charge.")
+        if changer_etat(commande, EtatCommande.EN_PREPARATION, request.user):
+            messages.success(request, f"Commande #{commande.id} prise en charge.")
+        else:
+            messages.error(request, MESSAGE_TRANSITION_PERDUE.format(commande.id))
         return redirect('restaurant:cuisinier_home')
     
     context = {
@@ -800,12 +839,18 @@ def cuisinier_changer_etat(request, commande_id):
     
     if request.method == 'POST':
         nouvel_etat = request.POST.get('nouvel_etat')
-        if nouvel_etat in ['EN_PREPARATION', 'EN_COURS']:
-            commande.etat = nouvel_etat
-            commande.save()
+        if nouvel_etat in ['EN_PREPARATION', 'EN_COURS'] and nouvel_etat != commande.etat:
+            try:
+                effectuee = changer_etat(commande, nouvel_etat, request.user)
+            except TransitionInterdite as e:
+                messages.error(request, str(e))
+                return redirect('restaurant:cuisinier_home')
             
-            etat_texte = "en préparation" if nouvel_etat == 'EN_PREPARATION' else "en cours de cuisson"
-            messages.success(request, f"Commande #{commande.id} marquée comme {etat_texte}.")
+            if effectuee:
+                etat_texte = "en préparation" if nouvel_etat == 'EN_PREPARATION' else "en cours de cuisson"
+                messages.success(request, f"Commande #{commande.id} marquée comme {etat_texte}.")
+            else:
+                messages.error(request, MESSAGE_TRANSITION_PERDUE.format(commande.id))
         
         return redirect('restaurant:cuisinier_home')
     
@@ -826,9 +871,10 @@ def cuisinier_marquer_prete(request, commande_id):
         return redirect('restaurant:cuisinier_home')
     
     if request.method == 'POST':
-        commande.etat = EtatCommande.TERMINEE
-        commande.save()
-        messages.success(request, f"Commande #{commande.id} marquée comme prête pour livraison.")
+        if changer_etat(commande, EtatCommande.TERMINEE, request.user):
+            messages.success(request, f"Commande #{commande.id} marquée comme prête pour livraison.")
+        else:
+            messages.error(request, MESSAGE_TRANSITION_PERDUE.format(commande.id))
         return redirect('restaurant:cuisinier_home')
     
     context = {
@@ -837,26 +883,55 @@ def cuisinier_marquer_prete(request, commande_id):
     return render(request, 'restaurant/cuisinier_marquer_prete.html', context)
 
 
+@admin_or_cuisinier_required
+@require_POST
+def cuisinier_transition_lot(request):
+    """
+    Fait avancer plusieurs commandes d'un coup (API JSON de l'écran cuisine)
+    
+    Corps : {"commandes": [id, ...], "etat": "EN_PREPARATION"}. Les commandes
+    sont mises à jour dans une transaction, un UPDATE par état de départ, et le
+    résultat de chacune est renvoyé pour mettre l'écran à jour sans recharger.
+    """
+    try:
+        donnees = json.loads(request.body or b'{}')
+        commande_ids = [int(commande_id) for commande_id in donnees.get('commandes', [])]
+        nouvel_etat = donnees.get('etat')
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'success': False, 'error': 'Requête invalide'}, status=400)
+    
+    if nouvel_etat not in EtatCommande.values:
+        return JsonResponse({'success': False, 'error': 'État invalide'}, status=400)
+    if not commande_ids:
+        return JsonResponse({'success': False, 'error': 'Aucune commande sélectionnée'}, status=400)
+    
+    resultats = changer_etats(commande_ids, nouvel_etat, request.user)
+    
+    return JsonResponse({
+        'success': True,
+        'etat': nouvel_etat,
+        'etat_display': EtatCommande(nouvel_etat).label,
+        'resultats': [
+            {'id': commande_id, 'ok': resultat.ok, 'etat': resultat.etat, 'erreur': resultat.erreur}
+            for commande_id, resultat in sorted(resultats.items())
+        ],
+        'nb_reussies': sum(1 for resultat in resultats.values() if resultat.ok),
+    })
+
+
 @admin_or_comptable_required
 def comptable_home(request):
     """Page d'accueil pour les comptables (et admin)"""
     
-    # Calculer le solde de la caisse
+    # Calculer le solde de la caisse (dernier point de contrôle + mouvements suivants)
     from payments.models import Paiement
+    from payments.mouvements import totaux_caisse
     from expenses.models import Depense
     
-    # Total des paiements (entrées)
-    total_entrées = Paiement.objects.aggregate(
-        total=models.Sum('montant')
-    )['total'] or 0
-    
-    # Total des dépenses (sorties)
-    total_sorties = Depense.objects.aggregate(
-        total=models.Sum('montant')
-    )['total'] or 0
-    
-    # Solde actuel
-    solde_caisse = total_entrées - total_sorties
+    totaux = totaux_caisse()
+    total_entrées = totaux['entrees']
+    total_sorties = totaux['sorties']
+    solde_caisse = totaux['solde']
     
     # Récupérer les commandes et paiements récents
     commandes_recentes = Commande.objects.order_by('-date_commande')[:10]
@@ -878,10 +953,10 @@ def comptable_home(request):
 def comptable_commandes(request):
     """Consultation de la liste des commandes (et admin)"""
     
-    commandes = Commande.objects.all().order_by('-date_commande')
+    commandes = Commande.objects.select_related('table')
     
     context = {
-        'commandes': commandes
+        'commandes': paginer(request, commandes, ['-date_commande', '-id'], comptage='approche')
     }
     return render(request, 'restaurant/comptable_commandes.html', context)
 
@@ -891,10 +966,10 @@ def comptable_paiements(request):
     """Consultation des paiements (et admin)"""
     
     from payments.models import Paiement
-    paiements = Paiement.objects.all().order_by('-date_paiement')
+    paiements = Paiement.objects.select_related('commande__table')
     
     context = {
-        'paiements': paiements
+        'paiements': paginer(request, paiements, ['-date_paiement', '-id'], comptage='approche')
     }
     return render(request, 'restaurant/comptable_paiements.html', context)
 
@@ -905,18 +980,10 @@ def comptable_nouvelle_depense(request):
     
     if request.method == 'POST':
         from expenses.models import Depense
-        from payments.models import Paiement
+        from payments.mouvements import solde_caisse as lire_solde_caisse
         
         # Vérifier le solde de la caisse
-        total_entrées = Paiement.objects.aggregate(
-            total=models.Sum('montant')
-        )['total'] or 0
-        
-        total_sorties = Depense.objects.aggregate(
-            total=models.Sum('montant')
-        )['total'] or 0
-        
-        solde_caisse = total_entrées - total_sorties
+        solde_caisse = lire_solde_caisse()
         montant_depense = float(request.POST.get('montant'))
         
         if montant_depense > solde_caisse:
@@ -973,58 +1040,43 @@ def serveur_creer_commande(request, table_id):
             messages.error(request, "Veuillez sélectionner au moins un plat.")
             return redirect('restaurant:serveur_prendre_commande', table_id=table_id)
         
-        # Créer la commande
-        commande = Commande.objects.create(
-            table=table,
-            serveur=request.user,
-            etat=EtatCommande.EN_ATTENTE
-        )
-        
-        # Ajouter les plats à la commande
-        total = 0
-        plats_a_preparer = False
-        plats_service_direct = False
+        from orders.services import preparer_lignes, creer_commande, CommandeInvalide
         
+        # Valider le panier (une seule lecture des plats)
+        panier = []
         for i, plat_id in enumerate(plat_ids):
             try:
-                plat = Plat.objects.get(id=plat_id)
-                quantite = int(quantites[i])
-                
-                if quantite > 0:
-                    CommandePlat.objects.create(
-                        commande=commande,
-                        plat=plat,
-                        quantite=quantite,
-                        prix_unitaire=plat.prix_unitaire
-                    )
-                    total += plat.prix_unitaire * quantite
-                    
-                    # Vérifier le type de service nécessaire
-                    if plat.necessite_preparation:
-                        plats_a_preparer = True
-                    else:
-                        plats_service_direct = True
-                        
-            except (Plat.DoesNotExist, ValueError, IndexError):
+                panier.append((int(plat_id), int(quantites[i])))
+            except (ValueError, IndexError):
                 continue
+        try:
+            lignes = preparer_lignes(panier)
+        except CommandeInvalide as e:
+            messages.error(request, str(e))
+            return redirect('restaurant:serveur_prendre_commande', table_id=table_id)
         
-        commande.calculer_total()
+        # Vérifier le type de service nécessaire
+        plats_a_preparer = any(ligne.plat.necessite_preparation for ligne in lignes)
+        plats_service_direct = any(not ligne.plat.necessite_preparation for ligne in lignes)
         
         # Déterminer l'état initial de la commande
-        if plats_a_preparer and plats_service_direct:
-            # Commande mixte : certains plats en cuisine, d'autres service direct
-            commande.etat = EtatCommande.EN_ATTENTE
-            messages.info(request, f"Commande #{commande.id} créée. Les plats nécessitant une préparation sont envoyés en cuisine.")
-        elif plats_service_direct and not plats_a_preparer:
+        if plats_service_direct and not plats_a_preparer:
             # Uniquement des plats service direct : marquer comme prête à servir
-            commande.etat = EtatCommande.TERMINEE
-            messages.success(request, f"Commande #{commande.id} créée et prête à être servie immédiatement.")
+            etat = EtatCommande.TERMINEE
         else:
-            # Uniquement des plats à préparer
-            commande.etat = EtatCommande.EN_ATTENTE
-            messages.success(request, f"Commande #{commande.id} créée et envoyée en cuisine.")
+            # Plats à préparer (éventuellement avec des plats service direct)
+            etat = EtatCommande.EN_ATTENTE
         
-        commande.save()
+        commande = creer_commande(table, lignes, etat=etat, serveur=request.user)
+        
+        postes = ', '.join(sorted({ligne.ticket.get_poste_display() for ligne in lignes if ligne.ticket}))
+        if plats_a_preparer and plats_service_direct:
+            # Commande mixte : certains plats aux postes, d'autres service direct
+            messages.info(request, f"Commande #{commande.id} créée. Les plats à préparer sont envoyés aux postes : {postes}.")
+        elif plats_service_direct:
+            messages.success(request, f"Commande #{commande.id} créée et prête à être servie immédiatement.")
+        else:
+            messages.success(request, f"Commande #{commande.id} créée et envoyée aux postes : {postes}.")
         
         return redirect('restaurant:serveur_table_commandes', table_id=table_id)
     
@@ -1078,70 +1130,146 @@ def table_commandes(request):
     
     # Récupérer uniquement les commandes de cette table
     from orders.models import Commande
-    commandes = Commande.objects.filter(table=table).order_by('-date_commande')
+    commandes = Commande.objects.filter(table=table).prefetch_related('commandeplat_set__plat')
     
     context = {
         'table': table,
-        'commandes': commandes
+        'commandes': paginer(request, commandes, ['-date_commande', '-id'], par_page=10)
     }
     return render(request, 'restaurant/table_commandes.html', context)
 
 
+# Commandes qui ont quitté le suivi cuisine
+ETATS_HORS_CUISINE = [EtatCommande.TERMINEE, EtatCommande.ANNULEE]
+
+# Retard du curseur delta : une transaction peut horodater date_modification
+# puis valider plus tard, avec une date antérieure au curseur déjà renvoyé.
+# Le curseur recule de MARGE_CURSEUR (la fenêtre est renvoyée, le client
+# remplace les commandes par identifiant) et aucune réponse 304 n'est faite
+# tant que la dernière modification est dans la fenêtre.
+MARGE_CURSEUR = timedelta(seconds=30)
+
+
+def encoder_curseur(date_modification):
+    """Curseur opaque (microsecondes depuis l'epoch) pour le mode delta de l'API cuisine"""
+    if date_modification is None:
+        return '0'
+    return str((date_modification - EPOCH) // timedelta(microseconds=1))
+
+
+def decoder_curseur(curseur):
+    """Inverse de encoder_curseur ; None si le curseur est absent ou invalide"""
+    try:
+        return EPOCH + timedelta(microseconds=int(curseur))
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def serialiser_commande_cuisine(commande, estimateur):
+    """Représentation JSON d'une commande pour l'API cuisine"""
+    # Temps restant estimé d'après les durées réellement mesurées
+    temps_estime = estimateur.minutes_restantes(commande)
+    
+    # Récupérer les plats
+    plats_data = []
+    for cp in commande.commandeplat_set.all():
+        plats_data.append({
+            'nom': cp.plat.nom,
+            'quantite': cp.quantite,
+            'prix_unitaire': str(cp.prix_unitaire),
+            'sous_total': str(cp.sous_total()),
+            'necessite_preparation': cp.plat.necessite_preparation
+        })
+    
+    return {
+        'id': commande.id,
+        'table_numero': commande.table.numero_table,
+        'etat': commande.etat,
+        'etat_display': commande.get_etat_display(),
+        'heure': commande.date_commande.strftime('%H:%M'),
+        'total': str(commande.total),
+        'plats': plats_data,
+        'temps_estime': temps_estime,
+        'date_modification': commande.date_modification.strftime('%H:%M:%S')
+    }
+
+
 @csrf_exempt
 def etat_commandes_cuisine(request):
-    """API pour obtenir l'état des commandes en cuisine"""
+    """
+    API pour obtenir l'état des commandes en cuisine
+    
+    Avec ?since=<curseur>, seules les commandes modifiées depuis le curseur sont
+    renvoyées, plus les identifiants de celles sorties de la liste (terminées ou
+    annulées). L'ETag permet de répondre 304 à un client déjà à jour.
+    """
     if request.method != 'GET':
         return JsonResponse({'error': 'Méthode non autorisée'}, status=405)
     
     try:
-        # Récupérer les commandes actives (non terminées)
-        commandes = Commande.objects.exclude(etat=EtatCommande.TERMINEE).order_by('-date_commande')
+        commandes = Commande.objects.all()
+        table_numero = None
         
         # Si l'utilisateur est une table, filtrer seulement ses commandes
         if request.user.role == 'Rtable':
             try:
                 table = request.user.table
+                table_numero = table.numero_table
                 commandes = commandes.filter(table=table)
             except TableRestaurant.DoesNotExist:
                 commandes = Commande.objects.none()
         
-        commandes_data = []
-        for commande in commandes:
-            # Calculer le temps estimé
-            temps_estime = None
-            if commande.etat in [EtatCommande.EN_ATTENTE, EtatCommande.EN_PREPARATION]:
-                temps_estime = 15  # 15 minutes par défaut
+        # Une seule requête d'agrégat décide si le client est à jour
+        actives = ~models.Q(etat__in=ETATS_HORS_CUISINE)
+        resume = commandes.aggregate(
+            derniere_modification=models.Max('date_modification'),
+            total=models.Count('id', filter=actives)
+        )
+        derniere = resume['derniere_modification']
+        curseur = encoder_curseur(derniere - MARGE_CURSEUR if derniere else None)
+        etag = quote_etag(f"{request.user.role}-{table_numero}-{curseur}-{resume['total']}")
+        
+        response = None
+        if derniere is None or derniere < timezone.now() - 2 * MARGE_CURSEUR:
+            response = get_conditional_response(request, etag=etag)
+        if response is None:
+            since = decoder_curseur(request.GET.get('since'))
+            supprimees = []
+            # Sans filtre de table, le total est déjà la charge de la cuisine
+            estimateur = Estimateur(charge=resume['total'] if table_numero is None else None)
             
-            # Récupérer les plats
-            plats_data = []
-            for cp in commande.commandeplat_set.all():
-                plats_data.append({
-                    'nom': cp.plat.nom,
-                    'quantite': cp.quantite,
-                    'prix_unitaire': str(cp.prix_unitaire),
-                    'sous_total': str(cp.sous_total()),
-                    'necessite_preparation': cp.plat.necessite_preparation
-                })
+            if since is None:
+                # Récupérer les commandes actives (non terminées, non annulées)
+                commandes_data = [
+                    serialiser_commande_cuisine(commande, estimateur)
+                    for commande in avec_debut_preparation(
+                        commandes_tableau(commandes.filter(actives))
+                    ).order_by('-date_commande')
+                ]
+            else:
+                # Mode delta : uniquement ce qui a changé depuis le curseur
+                commandes_data = []
+                modifiees = avec_debut_preparation(commandes_tableau(commandes.filter(date_modification__gt=since)))
+                for commande in modifiees.order_by('-date_commande'):
+                    if commande.etat in ETATS_HORS_CUISINE:
+                        supprimees.append(commande.id)
+                    else:
+                        commandes_data.append(serialiser_commande_cuisine(commande, estimateur))
             
-            commandes_data.append({
-                'id': commande.id,
-                'table_numero': commande.table.numero_table,
-                'etat': commande.etat,
-                'etat_display': commande.get_etat_display(),
-                'heure': commande.date_commande.strftime('%H:%M'),
-                'total': str(commande.total),
-                'plats': plats_data,
-                'temps_estime': temps_estime,
-                'date_modification': commande.date_modification.strftime('%H:%M:%S')
+            response = JsonResponse({
+                'success': True,
+                'commandes': commandes_data,
+                'supprimees': supprimees,
+                'delta': since is not None,
+                'curseur': curseur,
+                'total': resume['total'],
+                'user_role': request.user.role,
+                'table_numero': table_numero
             })
         
-        return JsonResponse({
-            'success': True,
-            'commandes': commandes_data,
-            'total': len(commandes_data),
-            'user_role': request.user.role,
-            'table_numero': getattr(request.user.table, 'numero_table', None) if request.user.role == 'Rtable' else None
-        })
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
         
     except Exception as e:
         return JsonResponse({
@@ -1150,6 +1278,30 @@ def etat_commandes_cuisine(request):
         })
 
 
+async def flux_commandes(request):
+    """Flux Server-Sent Events des changements de commandes (servi via core/asgi.py)"""
+    if not isinstance(request, ASGIRequest):
+        # Sous WSGI un flux infini bloquerait un worker : 204 ferme l'EventSource
+        # et le client repasse en polling de etat_commandes_cuisine
+        return HttpResponse(status=204)
+    
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Authentification requise'}, status=401)
+    
+    # Une table ne voit que ses commandes, la cuisine et le personnel voient tout
+    table_id = None
+    if user.role == 'Rtable':
+        table_id = await TableRestaurant.objects.filter(utilisateur=user).values_list('id', flat=True).afirst()
+        if table_id is None:
+            return JsonResponse({'error': 'Aucune table associée à votre compte'}, status=403)
+    
+    response = StreamingHttpResponse(flux_sse(table_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @login_required
 def admin_dashboard(request):
     """Tableau de bord administrateur avec accès à tout"""
@@ -1157,45 +1309,32 @@ def admin_dashboard(request):
         messages.error(request, "Accès réservé aux administrateurs.")
         return redirect('accounts:login')
     
-    # Statistiques générales
-    from orders.models import Commande, EtatCommande
+    # Statistiques générales (une requête par famille)
     from payments.models import Paiement
-    from expenses.models import Depense
-    from accounts.models import User
-    
-    # Statistiques des commandes
-    total_commandes = Commande.objects.count()
-    commandes_aujourdhui = Commande.objects.filter(date_commande__date=timezone.now().date()).count()
-    
-    commandes_par_etat = {
-        'EN_ATTENTE': Commande.objects.filter(etat=EtatCommande.EN_ATTENTE).count(),
-        'EN_PREPARATION': Commande.objects.filter(etat=EtatCommande.EN_PREPARATION).count(),
-        'EN_COURS': Commande.objects.filter(etat=EtatCommande.EN_COURS).count(),
-        'TERMINEE': Commande.objects.filter(etat=EtatCommande.TERMINEE).count(),
-        'ANNULEE': Commande.objects.filter(etat=EtatCommande.ANNULEE).count(),
-    }
+    from payments.mouvements import totaux_caisse
+    from accounts.statistiques import statistiques_commandes, statistiques_utilisateurs
+    
+    # Statistiques des commandes, avec les paiements du jour
+    commandes = statistiques_commandes(paiements_jour=True)
+    total_commandes = commandes['nombre']
+    commandes_aujourdhui = commandes['nombre_jour']
+    commandes_par_etat = commandes['par_etat']
     
     # Statistiques financières
-    total_entrées = Paiement.objects.aggregate(total=models.Sum('montant'))['total'] or 0
-    total_sorties = Depense.objects.aggregate(total=models.Sum('montant'))['total'] or 0
-    solde_net = total_entrées - total_sorties
+    totaux = totaux_caisse()
+    total_entrées = totaux['entrees']
+    total_sorties = totaux['sorties']
+    solde_net = totaux['solde']
     
-    paiements_aujourdhui = Paiement.objects.filter(date_paiement__date=timezone.now().date())
-    total_aujourdhui = paiements_aujourdhui.aggregate(total=models.Sum('montant'))['total'] or 0
+    total_aujourdhui = commandes['total_paiements_jour']
     
     # Statistiques utilisateurs
-    total_utilisateurs = User.objects.count()
-    utilisateurs_par_role = {
-        'Rtable': User.objects.filter(role='Rtable').count(),
-        'Rserveur': User.objects.filter(role='Rserveur').count(),
-        'Rcuisinier': User.objects.filter(role='Rcuisinier').count(),
-        'Rcaissier': User.objects.filter(role='Rcaissier').count(),
-        'Rcomptable': User.objects.filter(role='Rcomptable').count(),
-        'Radmin': User.objects.filter(role='Radmin').count(),
-    }
+    utilisateurs = statistiques_utilisateurs()
+    total_utilisateurs = utilisateurs['nombre']
+    utilisateurs_par_role = utilisateurs['par_role']
     
     # Activités récentes
-    commandes_recentes = Commande.objects.order_by('-date_commande')[:5]
+    commandes_recentes = Commande.objects.select_related('table').order_by('-date_commande')[:5]
     paiements_recentes = Paiement.objects.order_by('-date_paiement')[:5]
     
     context = {